@@ -8,9 +8,9 @@
 # this doc to also define our arguments for the script.
 """List, create or remove authorizations for a Virtualization Engine
 Usage:
-  dx_authorization.py (--create --role <name> --target_type <name> --target <name> --user <name> | --list | --delete --role <name> --target_type <name> --target <name> --user <name>)
+  dx_authorization.py (--create --role <name> --target_type <name> --target <name> --user <name> | --list [--format <type>] | --delete --role <name> --target_type <name> --target <name> --user <name>)
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_authorization.py -h | --help | -v | --version
 List, delete and create authentication objects
@@ -19,6 +19,7 @@ Examples:
   dx_authorization.py --engine landsharkengine --create --role Data --user dev_user --target_type database --target test_vdb
   dx_authorization.py --engine landsharkengine --create --role Data --user dev_user --target_type group --target Sources
   dx_authorization.py --list
+  dx_authorization.py --list --format csv
   dx_authorization.py --delete --role Data --user dev_user --target_type database --target test_vdb
 
 Options:
@@ -30,11 +31,15 @@ Options:
                              group, database
   --user <name>             User for the authorization
   --list                    List all authorizations
+  --format <type>           Output format for --list: text, csv or json
+                            (one JSON object per line) [default: text]
   --delete                  Delete authorization
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -46,6 +51,8 @@ Options:
 """
 from __future__ import print_function
 
+import csv
+import json
 import sys
 import traceback
 from os.path import basename
@@ -65,16 +72,18 @@ from delphixpy.v1_8_0.web import role
 from delphixpy.v1_8_0.web import snapshot
 from delphixpy.v1_8_0.web import user
 from delphixpy.v1_8_0.web.vo import Authorization
-from delphixpy.v1_8_0.web.vo import User
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import get_object_index
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.015"
+VERSION = "v.0.0.017"
 
 
 def create_authorization(dlpx_obj, role_name, target_type, target_name, user_name):
@@ -175,76 +184,87 @@ def find_target_type(dlpx_obj, target_type, target_name):
     return target_obj
 
 
-def list_authorization(dlpx_obj):
+def auth_row_writer(out_format):
+    """
+    Return a function that prints one authorization row in the requested
+    format. The header, if any, is printed straight away.
+
+    :param out_format: text, csv or json
+    :type out_format: str
+    """
+    fields = ["user", "role", "target", "reference"]
+    if out_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(fields)
+        return lambda row: writer.writerow(row)
+    elif out_format == "json":
+        return lambda row: print(json.dumps(dict(zip(fields, row))))
+    print_info("User, Role, Target, Reference")
+    return lambda row: print(", ".join(row))
+
+
+def list_authorization(dlpx_obj, out_format="text"):
     """
     Function to list authorizations for a given engine
 
     :param dlpx_obj: Virtualization Engine session object
+    :param out_format: text, csv or json. Default: text
     """
-    target_obj = None
+    time_start = time()
 
     try:
         auth_objs = authorization.get_all(dlpx_obj.server_session)
-        print_info("User, Role, Target, Reference")
+
+        # Fetch each listing once and resolve the role, user and target
+        # references from memory instead of a get() per authorization
+        names = {}
+        for f_class in [role, user, group, database]:
+            for obj in get_object_index(dlpx_obj.server_session, f_class).objs:
+                names[obj.reference] = obj.name
+        time_prefetch = time() - time_start
+
+        write_row = auth_row_writer(out_format)
         for auth_obj in auth_objs:
-            role_obj = role.get(dlpx_obj.server_session, auth_obj.role)
-            user_obj = user.get(dlpx_obj.server_session, auth_obj.user)
-            if auth_obj.target.startswith("USER"):
-                target_obj = user.get(dlpx_obj.server_session, auth_obj.target)
-            elif auth_obj.target.startswith("GROUP"):
-                target_obj = group.get(dlpx_obj.server_session, auth_obj.target)
-            elif auth_obj.target.startswith("DOMAIN"):
-                target_obj = User()
-                target_obj.name = "DOMAIN"
-            print(
-                "{}, {}, {}, {}".format(
-                    user_obj.name, role_obj.name, target_obj.name, auth_obj.reference
-                )
+            if auth_obj.target.startswith("DOMAIN"):
+                target_name = "DOMAIN"
+            else:
+                # Targets outside the prefetched classes (I.E. snapshots)
+                # are shown by reference
+                target_name = names.get(auth_obj.target, auth_obj.target)
+            write_row(
+                [
+                    names.get(auth_obj.user, auth_obj.user),
+                    names.get(auth_obj.role, auth_obj.role),
+                    target_name,
+                    auth_obj.reference,
+                ]
+            )
+
+        summary = (
+            "{}: Listed {} authorizations in {:.2f}s ({:.2f}s fetching "
+            "roles, users, groups and databases)".format(
+                dlpx_obj.server_session.address,
+                len(auth_objs),
+                time() - time_start,
+                time_prefetch,
             )
+        )
+        if out_format == "text":
+            print_info(summary)
+        else:
+            # Keep stdout parseable for csv and json
+            sys.stderr.write("INFO: {}\n".format(summary))
     except (RequestError, HttpError, JobError, AttributeError) as e:
         print_exception(
             "An error occurred while listing authorizations.:\n" "{}\n".format((e))
         )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     :type engine: dict
@@ -266,7 +286,7 @@ def main_workflow(engine, dlpx_obj):
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--create"]:
                         create_authorization(
@@ -285,18 +305,18 @@ def main_workflow(engine, dlpx_obj):
                             arguments["--user"],
                         )
                     elif arguments["--list"]:
-                        list_authorization(dlpx_obj)
+                        list_authorization(dlpx_obj, arguments["--format"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dlpx_obj.server_session, j)
                     print_debug(job_obj)
                     print_info("{}: : {}".format(engine["hostname"], job_obj.job_state))
                     if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -304,7 +324,7 @@ def main_workflow(engine, dlpx_obj):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dlpx_obj.jobs) > 0:
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception(
@@ -324,8 +344,8 @@ def run_job(dlpx_obj, config_file_path):
     :type config_file_path: str
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -335,8 +355,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
             sys.exit(1)
@@ -377,13 +397,10 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed(time_start):
@@ -414,12 +431,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed(time_start)
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# Description:
+# Runs the scripts against a local mock engine at several object counts and
+# records how many HTTP requests, bytes, seconds and memory each one used.
+# Requirements
+# pip install docopt delphixpy
+
+# The below doc follows the POSIX compliant standards and allows us to use
+# this doc to also define our arguments for the script.
+"""Benchmark the scripts against a mock engine
+Usage:
+  dx_benchmark.py [--scales <list>] [--scenarios <list>] [--latency <seconds>]
+                  [--timeout <seconds>] [--output <path>]
+                  [--compare <path> [--tolerance <percent>]] [--debug]
+                  [--logdir <path_to_file>]
+  dx_benchmark.py --list_scenarios
+  dx_benchmark.py -h | --help | -v | --version
+
+Run each scenario (a script and its arguments, see --list_scenarios) against
+a new lib.DxMockEngine holding the given number of databases, jobs and Jet
+Stream objects. Every run records the HTTP requests it made, in total and
+per endpoint, the bytes the engine sent and received, the wall time and the
+peak RSS of the script. The results are written to a JSON report.
+
+With --compare, the report is checked against an earlier one, I.E. of the
+previous commit. Any growth in the number of requests, or growth in bytes,
+wall time or memory beyond the tolerance, is reported and makes the script
+exit with 1.
+
+Examples:
+  dx_benchmark.py
+  dx_benchmark.py --scales 100 --scenarios list_containers,list_branches
+  dx_benchmark.py --latency 0.005 --output after.json --compare before.json
+
+Options:
+  --scales <list>           Comma separated object counts
+                            [default: 100,1000,10000]
+  --scenarios <list>        Comma separated scenarios. Default: all of them
+  --latency <seconds>       Delay the mock engine adds to each request
+                            [default: 0]
+  --timeout <seconds>       Seconds a single run may take [default: 600]
+  --output <path>           File the JSON report is written to
+                            [default: ./dx_benchmark.json]
+  --compare <path>          Earlier report to check for regressions
+  --tolerance <percent>     Growth allowed in bytes, wall time and memory
+                            [default: 25]
+  --list_scenarios          List the scenarios and what they run
+  --debug                   Enable debug logging
+  --logdir <path_to_file>   The path to the logfile you want to use.
+                            [default: ./dx_benchmark.log]
+  -h --help                 Show this screen.
+  -v --version              Show version.
+"""
+from __future__ import print_function
+
+import json
+import sys
+import traceback
+from os.path import basename
+from time import time
+
+from docopt import docopt
+
+from lib.DlpxException import DlpxException
+from lib.DxBenchmark import SCENARIOS
+from lib.DxBenchmark import compare_reports
+from lib.DxBenchmark import new_report
+from lib.DxBenchmark import run_scenario
+from lib.DxLogging import logging_est
+from lib.DxLogging import print_debug
+from lib.DxLogging import print_exception
+from lib.DxLogging import print_info
+
+VERSION = "v.0.0.001"
+
+
+def print_result(result):
+    """
+    Print the measurements of one run
+
+    result: Dictionary returned by lib.DxBenchmark.run_scenario()
+    """
+    print_info(
+        "{scenario} at {scale}: {requests} requests, {bytes_sent} bytes sent, "
+        "{wall_seconds:.2f}s, peak RSS {peak_rss_kb} KB, exit code "
+        "{exit_code}".format(**result)
+    )
+    for name, count in list(result["requests_by_endpoint"].items())[:3]:
+        print_debug("  {}: {}".format(name, count))
+
+
+def run_benchmarks():
+    """
+    Run the selected scenarios at each scale and write the report
+
+    :return: The exit code of the script
+    """
+    scales = [int(scale) for scale in arguments["--scales"].split(",")]
+    scenarios = list(SCENARIOS)
+    if arguments["--scenarios"]:
+        scenarios = arguments["--scenarios"].split(",")
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise DlpxException(
+                "Unknown scenarios {}. Use --list_scenarios to see them.".format(
+                    ", ".join(unknown)
+                )
+            )
+
+    results = []
+    for scale in scales:
+        for name in scenarios:
+            result = run_scenario(
+                name,
+                scale,
+                float(arguments["--latency"]),
+                float(arguments["--timeout"]),
+            )
+            print_result(result)
+            results.append(result)
+
+    report = new_report(results, float(arguments["--latency"]))
+    with open(arguments["--output"], "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print_info("Wrote {} results to {}".format(len(results), arguments["--output"]))
+
+    failed = [r for r in results if r["exit_code"] != 0]
+    for result in failed:
+        print_exception(
+            "{} at {} {}".format(
+                result["scenario"],
+                result["scale"],
+                "timed out"
+                if result["timed_out"]
+                else "exited with {}".format(result["exit_code"]),
+            )
+        )
+
+    if arguments["--compare"]:
+        with open(arguments["--compare"]) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_reports(
+            baseline, report, float(arguments["--tolerance"]) / 100
+        )
+        for regression in regressions:
+            print_exception("Regression: {}".format(regression))
+        if regressions:
+            return 1
+        print_info("No regressions against {}".format(arguments["--compare"]))
+    return 1 if failed else 0
+
+
+def time_elapsed(time_start):
+    """
+    This function calculates the time elapsed since the beginning of the script.
+    Call this anywhere you want to note the progress in terms of time
+
+    :param time_start:  start time of the script.
+    :type time_start: float
+    """
+    return round((time() - time_start) / 60, +1)
+
+
+def main():
+    time_start = time()
+
+    try:
+        logging_est(arguments["--logdir"], arguments["--debug"])
+        print_debug(arguments)
+
+        if arguments["--list_scenarios"]:
+            for name, command in SCENARIOS.items():
+                print("{}: {}".format(name, " ".join(command)))
+            return
+
+        exit_code = run_benchmarks()
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
+        )
+        if exit_code:
+            sys.exit(exit_code)
+
+    # Here we handle what we do when the unexpected happens
+    except SystemExit as e:
+        # This is what we use to handle our sys.exit(#)
+        sys.exit(e)
+
+    except (DlpxException, IOError, ValueError) as e:
+        # We use this exception handler when an error occurs in a function call.
+        print_exception("ERROR: Please check the ERROR message below:\n{}".format(e))
+        sys.exit(2)
+
+    except KeyboardInterrupt:
+        # We use this exception handler to gracefully handle ctrl+c exits
+        print_debug("You sent a CTRL+C to interrupt the process")
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "{} took {:.2f} minutes to get this far".format(
+                basename(__file__), elapsed_minutes
+            )
+        )
+
+    except:
+        # Everything else gets caught here
+        print_exception("{}\n{}".format(sys.exc_info()[0], traceback.format_exc()))
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "{} took {:.2f} minutes to get this far".format(
+                basename(__file__), elapsed_minutes
+            )
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Grab our arguments from the doc at the top of the script
+    arguments = docopt(__doc__, version=basename(__file__) + " " + VERSION)
+    # Feed our arguments to the main function, and off we go!
+    main()
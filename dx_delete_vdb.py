@@ -11,12 +11,14 @@
 Usage:
   dx_delete_db.py (--group <name> [--name <name>] | --all_dbs )
                   [-d <identifier> | --engine <identifier> | --all]
-                  [--usebackup] [--debug] [--parallel <n>] [--poll <n>]
+                  [--usebackup] [--debug] [--parallel <n>] [--max_engines <n>]
+                  [--parallel_host <n>] [--parallel_total <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_delete_db.py (--host <name> [--group <name>] [--object_type <type>]
                   | --object_type <name> [--group <name>] [--host <type>] )
                   [-d <identifier> | --engine <identifier> | --all]
-                  [--usebackup] [--debug] [--parallel <n>] [--poll <n>]
+                  [--usebackup] [--debug] [--parallel <n>] [--max_engines <n>]
+                  [--parallel_host <n>] [--parallel_total <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_delete_db.py -h | --help | -v | --version
 
@@ -43,6 +45,11 @@ Options:
                             Available for MSSQL and ASE only.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
+  --parallel_host <n>       Limit number of jobs against one source host,
+                            across all engines
+  --parallel_total <n>      Limit number of jobs across all engines
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -63,7 +70,6 @@ import time
 import traceback
 from multiprocessing import Process
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -82,8 +88,14 @@ from delphixpy.v1_6_0.web.vo import ASELatestBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import ASENewBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import ASESpecificBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import MSSqlSyncParameters
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxJobTracker import DxJobTracker
+from lib.DxScheduler import DxScheduler
+from lib.DxScheduler import source_hosts
+from lib.DxSessionPool import get_session
 
-VERSION = "v.0.0.001"
+VERSION = "v.0.0.004"
 
 
 def find_obj_by_name(engine, server, f_class, obj_name):
@@ -297,8 +309,9 @@ def serversess(f_engine_address, f_engine_username, f_engine_password):
     """
     Function to setup the session with the Delphix Engine
     """
-    server_session = DelphixEngine(
-        f_engine_address, f_engine_username, f_engine_password, "DOMAIN"
+    # Sessions come from a pool so a thread reuses its login
+    server_session = get_session(
+        DelphixEngine, f_engine_address, f_engine_username, f_engine_password
     )
     return server_session
 
@@ -310,47 +323,11 @@ def set_exit_handler(func):
     signal.signal(signal.SIGTERM, func)
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function is where the main workflow resides.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
     """
 
     # Pull out the values from the dictionary for this engine
@@ -424,83 +401,112 @@ def main_workflow(engine):
     if not databases or len(databases) == 0:
         print_error("No databases found with the criterion specified")
         return
+    # Follow job completion through the engine's notification channel
+    tracker = DxJobTracker(server, engine_name=engine["hostname"])
+    # Queue the databases with the scheduler shared by all engines
+    hosts = {}
+    if scheduler.host_limit is not None:
+        hosts = source_hosts(server)
+    for database_obj in reversed(databases):
+        scheduler.enqueue(
+            engine["hostname"],
+            "delete",
+            database_obj,
+            hosts.get(database_obj.reference),
+        )
+    slots = {}
     # reset the running job count before we begin
     i = 0
-    with job_mode(server):
-        # While there are still running jobs or databases still to process....
-        while len(jobs) > 0 or len(databases) > 0:
-            # While there are databases still to process and we are still under
-            # the max simultaneous jobs threshold (if specified)
-            while len(databases) > 0 and (
-                arguments["--parallel"] == None or i < int(arguments["--parallel"])
-            ):
-                # Give us the next database in the list, and remove it from the list
-                database_obj = databases.pop()
-                # Get the source of the database.
-                # The source tells us if the database is enabled/disables, virtual, vdb/dSource, or is a staging database.
-                source_obj = find_source_by_database(engine, server, database_obj)
-                # If we applied the environment/server filter AND group filter, find the intersecting matches
-                if environment_obj != None and (arguments["--group"]):
-                    match = False
-                    for env_source_obj in env_source_objs:
-                        if source_obj[0].reference in env_source_obj.reference:
-                            match = True
-                            break
-                    if match == False:
-                        print_error(
-                            engine["hostname"]
-                            + ": "
-                            + database_obj.name
-                            + " does not exist on "
-                            + host_name
-                            + ". Exiting"
-                        )
-                        return
-                # Snapshot the database
-                delete_job = delete_database(
-                    engine,
-                    server,
-                    jobs,
-                    source_obj[0],
-                    database_obj,
-                    arguments["--object_type"],
+    try:
+        with job_mode(server):
+            # While there are still running jobs or databases still to process....
+            while len(jobs) > 0 or scheduler.queued(engine["hostname"]) > 0:
+                # Start the databases the scheduler has a free slot for. It applies
+                # --parallel per engine, plus the per-host and global limits.
+                for item in scheduler.start_ready(engine["hostname"]):
+                    database_obj = item.target
+                    # Get the source of the database.
+                    # The source tells us if the database is enabled/disables, virtual, vdb/dSource, or is a staging database.
+                    source_obj = find_source_by_database(engine, server, database_obj)
+                    # If we applied the environment/server filter AND group filter, find the intersecting matches
+                    if environment_obj != None and (arguments["--group"]):
+                        match = False
+                        for env_source_obj in env_source_objs:
+                            if source_obj[0].reference in env_source_obj.reference:
+                                match = True
+                                break
+                        if match == False:
+                            print_error(
+                                engine["hostname"]
+                                + ": "
+                                + database_obj.name
+                                + " does not exist on "
+                                + host_name
+                                + ". Exiting"
+                            )
+                            return
+                    # Snapshot the database
+                    delete_job = delete_database(
+                        engine,
+                        server,
+                        jobs,
+                        source_obj[0],
+                        database_obj,
+                        arguments["--object_type"],
+                    )
+                    # If delete_job has any value, then we know that a job was initiated.
+                    if delete_job:
+                        # hold the slot until the job finishes
+                        slots[database_obj] = item
+                        # increment the running job count
+                        i += 1
+                    else:
+                        scheduler.finish(item)
+                # Check to see if we are running at max parallel processes, and report if so.
+                if arguments["--parallel"] != None and i >= int(
+                    arguments["--parallel"]
+                ):
+                    print_info(
+                        engine["hostname"] + ": Max jobs reached (" + str(i) + ")"
+                    )
+                # reset the running jobs counter, as we are about to update the count from the jobs report.
+                i = update_jobs_dictionary(engine, tracker, jobs)
+                # Release the slots of the jobs that finished
+                for database_obj in [d for d in slots if d not in jobs]:
+                    scheduler.finish(slots.pop(database_obj))
+                print_info(
+                    engine["hostname"]
+                    + ": "
+                    + str(i)
+                    + " jobs running. "
+                    + str(scheduler.queued(engine["hostname"]))
+                    + " jobs waiting to run"
                 )
-                # If delete_job has any value, then we know that a job was initiated.
-                if delete_job:
-                    # increment the running job count
-                    i += 1
-            # Check to see if we are running at max parallel processes, and report if so.
-            if arguments["--parallel"] != None and i >= int(arguments["--parallel"]):
-                print_info(engine["hostname"] + ": Max jobs reached (" + str(i) + ")")
-            # reset the running jobs counter, as we are about to update the count from the jobs report.
-            i = update_jobs_dictionary(engine, server, jobs)
-            print_info(
-                engine["hostname"]
-                + ": "
-                + str(i)
-                + " jobs running. "
-                + str(len(databases))
-                + " jobs waiting to run"
-            )
-            # If we have running jobs, pause before repeating the checks.
-            if len(jobs) > 0:
-                sleep(float(arguments["--poll"]))
+                # If we have running jobs, wait for one to finish (at most --poll
+                # seconds) before repeating the checks.
+                if len(jobs) > 0:
+                    tracker.wait_any(float(arguments["--poll"]))
+                elif scheduler.queued(engine["hostname"]) > 0:
+                    # Our databases wait on limits held by other engines
+                    scheduler.wait(float(arguments["--poll"]))
+    finally:
+        scheduler.discard(engine["hostname"])
 
 
 def run_job(engine):
     """
     This function runs the main_workflow aynchronously against all the servers specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     # If the --all argument was given, run against every engine in dxtools.conf
     if arguments["--all"]:
         print_info("Executing against all Delphix Engines in the dxtools.conf")
         # For each server in the dxtools.conf...
         for delphix_engine in dxtools_objects:
             engine = dxtools_objects[delphix_engine]
-            # Create a new thread and add it to the list.
-            threads.append(main_workflow(engine))
+            # Queue main_workflow for this engine on the executor.
+            executor.submit(engine["hostname"], main_workflow, engine)
     else:
         # Else if the --engine argument was given, test to see if the engine exists in dxtools.conf
         if arguments["--engine"]:
@@ -544,12 +550,10 @@ def run_job(engine):
                 print_error("No default engine found. Exiting")
                 sys.exit(1)
         # run the job against the engine
-        threads.append(main_workflow(engine))
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def delete_database(engine, server, jobs, source_obj, container_obj, obj_type=None):
@@ -602,7 +606,7 @@ def time_elapsed():
     return elapsed_minutes
 
 
-def update_jobs_dictionary(engine, server, jobs):
+def update_jobs_dictionary(engine, tracker, jobs):
     """
     This function checks each job in the dictionary and updates its status or removes it if the job is complete.
     Return the number of jobs still running.
@@ -610,12 +614,11 @@ def update_jobs_dictionary(engine, server, jobs):
     # Establish the running jobs counter, as we are about to update the count from the jobs report.
     i = 0
     # get all the jobs, then inspect them
-    for j in jobs.keys():
-        job_obj = job.get(server, jobs[j])
-        print_debug(engine["hostname"] + ": " + str(job_obj))
-        print_info(engine["hostname"] + ": " + j.name + ": " + job_obj.job_state)
+    for j in list(jobs.keys()):
+        job_state = tracker.track(jobs[j])
+        print_info(engine["hostname"] + ": " + j.name + ": " + job_state)
 
-        if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+        if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
             # If the job is in a non-running state, remove it from the running jobs list.
             del jobs[j]
         else:
@@ -633,6 +636,7 @@ def main(argv):
     global database_name
     global config_file_path
     global dxtools_objects
+    global scheduler
 
     try:
         # Declare globals that will be used throughout the script.
@@ -647,12 +651,21 @@ def main(argv):
         config_file_path = arguments["--config"]
         # Parse the dxtools.conf and put it into a dictionary
         dxtools_objects = get_config(config_file_path)
+        # Limits shared by the main_workflow threads of every engine
+        scheduler = DxScheduler(
+            arguments["--parallel_total"],
+            arguments["--parallel"],
+            arguments["--parallel_host"],
+        )
 
         # This is the function that will handle processing main_workflow for all the servers.
-        run_job(engine)
+        exit_code = run_job(engine)
+        scheduler.report()
 
         elapsed_minutes = time_elapsed()
         print_info("script took " + str(elapsed_minutes) + " minutes to get this far.")
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -13,11 +13,11 @@ Usage:
   dx_environment.py (--type <name> --env_name <name> --host_user <username> \
 --ip <address> [--toolkit <path_to_the_toolkit>] [--ase --ase_user <name> --ase_pw <name>] \
 |--update_ase_pw <name> --env_name <name> | --update_ase_user <name> --env_name <name> \
-| --delete <env_name> | --refresh <env_name> | --list)
+| --delete <env_name> | --refresh <env_name> | --list [--format <type>])
 [--logdir <directory>][--debug] [--config <filename>] [--connector_name <name>]
-[--pw <password>][--engine <identifier>][--all] [--poll <n>]
-  dx_environment.py (--update_host --old_host_address <name> --new_host_address <name>) [--logdir <directory>][--debug] [--config <filename>]
-  dx_environment.py ([--enable]|[--disable]) --env_name <name> [--logdir <directory>][--debug] [--config <filename>]
+[--pw <password>][--engine <identifier>][--all] [--poll <n>] [--parallel <n>] [--max_engines <n>]
+  dx_environment.py (--update_host --old_host_address <name> --new_host_address <name>) [--logdir <directory>][--debug] [--config <filename>] [--parallel <n>] [--max_engines <n>]
+  dx_environment.py ([--enable]|[--disable]) --env_name <name> [--logdir <directory>][--debug] [--config <filename>] [--parallel <n>] [--max_engines <n>]
   dx_environment.py -h | --help | -v | --version
 
 Create a Delphix environment. (current support for standalone environments only)
@@ -32,12 +32,15 @@ Examples:
   dx_environment.py --enable --env_name SOURCE
   dx_environment.py --disable --env_name SOURCE
   dx_environment.py --list
+  dx_environment.py --list --format csv --all
 
 Options:
   --type <name>             The OS type for the environment
   --env_name <name>         The name of the Delphix environment
   --ip <addr>               The IP address of the Delphix environment
   --list                    List all of the environments for a given engine
+  --format <type>           Output format for --list: text, csv or json
+                            (one JSON object per line) [default: text]
   --toolkit <path>          Path of the toolkit. Required for Unix/Linux
   --host_user <username>    The username on the Delphix environment
   --delete <environment>    The name of the Delphix environment to delete
@@ -52,6 +55,8 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --engine <type>           Identifier of Delphix engine in dxtools.conf.
 
   --poll <n>                The number of seconds to wait between job polls
@@ -71,6 +76,8 @@ Options:
 """
 from __future__ import print_function
 
+import csv
+import json
 import sys
 import traceback
 from os.path import basename
@@ -92,16 +99,22 @@ from delphixpy.v1_8_0.web.vo import UnixHostEnvironment
 from delphixpy.v1_8_0.web.vo import WindowsHost
 from delphixpy.v1_8_0.web.vo import WindowsHostEnvironment
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
 from lib.GetReferences import find_all_objects
 from lib.GetReferences import find_obj_by_name
-from lib.GetReferences import find_obj_name
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.3.612"
+VERSION = "v.0.3.615"
+
+# Columns of the --list output
+ENV_FIELDS = ["engine", "name", "type", "user", "host", "enabled", "ase_params"]
 
 
 def enable_environment(dlpx_obj, env_name):
@@ -167,48 +180,72 @@ def update_host_address(dlpx_obj, old_host_address, new_host_address):
         sys.exit(1)
 
 
-def list_env(dlpx_obj):
-    """
-    List all environments for a given engine
+def list_env(dlpx_obj, engine_name):
     """
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
+    Return one row per environment of a given engine. The environment users
+    and hosts are fetched once and joined in memory.
 
-    all_envs = environment.get_all(dlpx_obj.server_session)
-    for env in all_envs:
-        env_user = find_obj_name(
-            dlpx_obj.server_session, environment.user, env.primary_user
+    :param dlpx_obj: Virtualization Engine session object
+    :param engine_name: Name of the engine, added to every row
+    :return: List of dictionaries with the ENV_FIELDS keys
+    """
+    env_users = get_object_index(dlpx_obj.server_session, environment.user)
+    env_hosts = get_object_index(dlpx_obj.server_session, host)
+
+    rows = []
+    for env in environment.get_all(dlpx_obj.server_session):
+        env_user = env_users.find_by_reference(env.primary_user)
+        # Cluster environments have no single host
+        env_host = env_hosts.find_by_reference(getattr(env, "host", None))
+        ase_params = getattr(env, "ase_host_environment_parameters", None)
+        rows.append(
+            {
+                "engine": engine_name,
+                "name": env.name,
+                "type": env.type,
+                "user": env_user.name if env_user else env.primary_user,
+                "host": env_host.name if env_host else None,
+                "enabled": env.enabled,
+                "ase_params": str(ase_params)
+                if isinstance(ase_params, ASEHostEnvironmentParameters)
+                else "Undefined",
+            }
         )
-        try:
-            env_host = find_obj_name(dlpx_obj.server_session, host, env.host)
-        except AttributeError:
-            pass
+    return rows
 
-        if env.type == "WindowsHostEnvironment":
-            print(
-                "Environment Name: {}, Username: {}, Host: {},"
-                "Enabled: {}, ".format(env.name, env_user, env_host, env.enabled)
-            )
-        elif env.type == "WindowsCluster" or env.type == "OracleCluster":
-            print(
-                "Environment Name: {}, Username: {}"
-                "Enabled: {}, ".format(env.name, env_user, env.enabled)
-            )
-        else:
-            print(
-                "Environment Name: {}, Username: {}, Host: {}, Enabled: {},"
-                " ASE Environment Params: {}".format(
-                    env.name,
-                    env_user,
-                    env_host,
-                    env.enabled,
-                    env.ase_host_environment_parameters
-                    if isinstance(
-                        env.ase_host_environment_parameters,
-                        ASEHostEnvironmentParameters,
-                    )
-                    else "Undefined",
+
+def print_env_rows(rows, out_format="text"):
+    """
+    Print the environment rows of every engine
+
+    :param rows: List of dictionaries returned by list_env()
+    :param out_format: text, csv or json (one object per line). Default: text
+    """
+    if out_format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=ENV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    elif out_format == "json":
+        for row in rows:
+            print(json.dumps(row))
+    else:
+        for row in rows:
+            if row["type"] == "WindowsHostEnvironment":
+                print(
+                    "Engine: {engine}, Environment Name: {name}, Username: {user}, "
+                    "Host: {host}, Enabled: {enabled}".format(**row)
+                )
+            elif row["type"] in ["WindowsCluster", "OracleCluster"]:
+                print(
+                    "Engine: {engine}, Environment Name: {name}, Username: {user}, "
+                    "Enabled: {enabled}".format(**row)
+                )
+            else:
+                print(
+                    "Engine: {engine}, Environment Name: {name}, Username: {user}, "
+                    "Host: {host}, Enabled: {enabled}, "
+                    "ASE Environment Params: {ase_params}".format(**row)
                 )
-            )
 
 
 def delete_env(dlpx_obj, env_name):
@@ -218,13 +255,13 @@ def delete_env(dlpx_obj, env_name):
     engine: Dictionary of engines
     env_name: Name of the environment to delete
     """
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
 
     env_obj = find_obj_by_name(dlpx_obj.server_session, environment, env_name)
 
     if env_obj:
         environment.delete(dlpx_obj.server_session, env_obj.reference)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, environment)
+        dlpx_obj.add_job("delete", env_name)
 
     elif env_obj is None:
         print("Environment was not found in the Engine: {}".format(env_name))
@@ -238,14 +275,14 @@ def refresh_env(dlpx_obj, env_name):
     engine: Dictionary of engines
     env_name: Name of the environment to refresh
     """
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
 
     if env_name == "all":
         env_list = find_all_objects(dlpx_obj.server_session, environment)
         for env_obj in env_list:
             try:
                 environment.refresh(dlpx_obj.server_session, env_obj.reference)
-                dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+                invalidate_cache(dlpx_obj.server_session, environment)
+                dlpx_obj.add_job("refresh", env_obj.name)
 
             except (DlpxException, RequestError) as e:
                 print_exception(
@@ -259,7 +296,8 @@ def refresh_env(dlpx_obj, env_name):
             env_obj = find_obj_by_name(dlpx_obj.server_session, environment, env_name)
 
             environment.refresh(dlpx_obj.server_session, env_obj.reference)
-            dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+            invalidate_cache(dlpx_obj.server_session, environment)
+            dlpx_obj.add_job("refresh", env_name)
 
         except (DlpxException, RequestError) as e:
             print_exception(
@@ -333,7 +371,6 @@ def create_linux_env(dlpx_obj, env_name, host_user, ip_addr, toolkit_path, pw=No
                   writable by the host_user
     pw: Password of the user. Default: None (use SSH keys instead)
     """
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     env_params_obj = HostEnvironmentCreateParameters()
 
     if pw is None:
@@ -386,7 +423,8 @@ def create_linux_env(dlpx_obj, env_name, host_user, ip_addr, toolkit_path, pw=No
 
     try:
         environment.create(dlpx_obj.server_session, env_params_obj)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, environment)
+        dlpx_obj.add_job("create", env_name)
 
     except (DlpxException, RequestError, HttpError) as e:
         print(
@@ -413,7 +451,6 @@ def create_windows_env(
                   writable by the host_user
     pw: Password of the user. Default: None (use SSH keys instead)
     """
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
 
     env_params_obj = HostEnvironmentCreateParameters()
 
@@ -453,7 +490,8 @@ def create_windows_env(
 
     try:
         environment.create(dlpx_obj.server_session, env_params_obj)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, environment)
+        dlpx_obj.add_job("create", env_name)
 
     except (DlpxException, RequestError, HttpError) as e:
         print(
@@ -462,48 +500,11 @@ def create_windows_env(
         )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     :param engine: Dictionary of engines
     :type engine: dictionary
@@ -525,9 +526,10 @@ def main_workflow(engine, dlpx_obj):
         sys.exit(1)
 
     thingstodo = ["thingtodo"]
+    env_rows = None
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if (
                         arguments["--type"] == "linux"
@@ -565,7 +567,7 @@ def main_workflow(engine, dlpx_obj):
                     elif arguments["--update_ase_user"]:
                         update_ase_username(dlpx_obj)
                     elif arguments["--list"]:
-                        list_env(dlpx_obj)
+                        env_rows = list_env(dlpx_obj, engine["hostname"])
                     elif arguments["--update_host"]:
                         update_host_address(
                             dlpx_obj,
@@ -580,8 +582,8 @@ def main_workflow(engine, dlpx_obj):
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dlpx_obj.server_session, j)
                     print_debug(job_obj)
                     print_info(
                         "{} Environment: {}".format(
@@ -591,7 +593,7 @@ def main_workflow(engine, dlpx_obj):
                     if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -599,7 +601,7 @@ def main_workflow(engine, dlpx_obj):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dlpx_obj.jobs) > 0:
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception(
@@ -608,6 +610,7 @@ def main_workflow(engine, dlpx_obj):
             )
         )
         sys.exit(1)
+    return env_rows
 
 
 def run_job(dlpx_obj, config_file_path):
@@ -620,8 +623,8 @@ def run_job(dlpx_obj, config_file_path):
     engines
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -632,8 +635,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -674,12 +677,17 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
+    # Wait for every engine to finish and pass back the worst exit code
+    exit_code = executor.wait()
+
+    if arguments["--list"]:
+        # Merge the environments of every engine, in dxtools.conf order
+        rows = []
+        for engine_name in executor.futures:
+            rows.extend(executor.result(engine_name) or [])
+        print_env_rows(rows, arguments["--format"])
+    return exit_code
 
 
 def time_elapsed(time_start):
@@ -711,12 +719,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed(time_start)
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# Description:
+# Collects the groups, environments, databases, sources and capacity
+# consumers of every engine in dxtools.conf into a single snapshot file.
+# Meant to be run periodically (I.E. from cron); a lock file keeps one run
+# from overlapping the next.
+# Requirements
+# pip install docopt delphixpy
+
+# The below doc follows the POSIX compliant standards and allows us to use
+# this doc to also define our arguments for the script.
+"""Collect a fleet inventory
+Usage:
+  dx_inventory.py [--output <path>] [--format <type>]
+                  [--engine <identifier>] [--parallel <n>]
+                  [--store <path>] [--lock_file <path>] [--debug]
+                  [--config <path_to_file>] [--logdir <path_to_file>]
+  dx_inventory.py -h | --help | -v | --version
+
+Collect the groups, environments, databases, sources and capacity consumers
+of every engine in dxtools.conf into one JSONL or CSV file. Every row
+carries the engine and the kind of object; one "engine" row per engine
+records how long it took and whether it failed.
+
+With --store, every run also updates a SQLite store of the last seen
+objects and jobs, and reports what was created, deleted or changed state
+since the previous run. dx_operations.py --list and dx_jobs.py --list can
+answer from that store.
+
+Examples:
+  dx_inventory.py
+  dx_inventory.py --format csv --output /var/tmp/inventory.csv --parallel 16
+  dx_inventory.py --engine landsharkengine
+  dx_inventory.py --store ./dx_inventory.db
+
+Options:
+  --output <path>           File the inventory is written to
+                            [default: ./dx_inventory.jsonl]
+  --format <type>           jsonl (one JSON object per line) or csv
+                            [default: jsonl]
+  --engine <type>           Only collect this engine from dxtools.conf.
+  --parallel <n>            Number of engines collected at the same time
+                            [default: 8]
+  --store <path>            SQLite store updated with the objects and jobs
+                            of every engine that was collected
+  --lock_file <path>        Lock file that stops overlapping runs
+                            [default: ./dx_inventory.lock]
+  --debug                   Enable debug logging
+  --config <path_to_file>   The path to the dxtools.conf file
+                            [default: ./dxtools.conf]
+  --logdir <path_to_file>   The path to the logfile you want to use.
+                            [default: ./dx_inventory.log]
+  -h --help                 Show this screen.
+  -v --version              Show version.
+"""
+from __future__ import print_function
+
+import sys
+import traceback
+from datetime import datetime
+from os.path import basename
+from time import time
+
+from docopt import docopt
+
+from delphixpy.v1_8_0.exceptions import HttpError
+from delphixpy.v1_8_0.exceptions import JobError
+from delphixpy.v1_8_0.exceptions import RequestError
+from lib.DlpxException import DlpxException
+from lib.DxExecutor import DxExecutor
+from lib.DxInventory import DxLockFile
+from lib.DxInventory import collect_inventory
+from lib.DxInventory import engine_row
+from lib.DxInventory import write_inventory
+from lib.DxInventoryStore import DxInventoryStore
+from lib.DxInventoryStore import sync_inventory
+from lib.DxInventoryStore import sync_jobs
+from lib.DxLogging import logging_est
+from lib.DxLogging import print_debug
+from lib.DxLogging import print_exception
+from lib.DxLogging import print_info
+from lib.GetSession import GetSession
+
+VERSION = "v.0.0.002"
+
+
+def main_workflow(engine, dlpx_obj, store=None):
+    """
+    Collect the inventory of one engine.
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
+
+    :param engine: Dictionary of engines
+    :type engine: dictionary
+    :param dlpx_obj: Virtualization Engine session object
+    :type dlpx_obj: lib.GetSession.GetSession
+    :param store: Store to update with the rows and jobs. Default: None
+    :type store: lib.DxInventoryStore.DxInventoryStore
+    :return: List of inventory rows, ending with the engine's row
+    """
+    time_start = time()
+    try:
+        # Setup the connection to the Delphix Engine
+        dlpx_obj.serversess(
+            engine["ip_address"], engine["username"], engine["password"]
+        )
+        rows, timings = collect_inventory(dlpx_obj.server_session, engine["hostname"])
+        if store is not None:
+            changes = sync_inventory(store, engine["hostname"], rows)
+            changes.extend(
+                sync_jobs(store, dlpx_obj.server_session, engine["hostname"])
+            )
+            for change in changes:
+                print_info(
+                    "{engine}: {kind} {name} {change} "
+                    "({old_state} -> {new_state})".format(**change)
+                )
+
+    # IOError covers engines that cannot be reached
+    except (DlpxException, HttpError, RequestError, JobError, IOError) as e:
+        print_exception(
+            "ERROR: Could not collect the inventory of {}:\n{}".format(
+                engine["hostname"], e
+            )
+        )
+        return [engine_row(engine["hostname"], time() - time_start, "FAILED", e)]
+
+    seconds = time() - time_start
+    print_info(
+        "{}: Collected {} objects in {:.2f}s ({})".format(
+            engine["hostname"],
+            len(rows),
+            seconds,
+            ", ".join(
+                "{} {:.2f}s".format(kind, timings[kind]) for kind in sorted(timings)
+            ),
+        )
+    )
+    return rows + [engine_row(engine["hostname"], seconds, "OK")]
+
+
+def run_job(dlpx_obj, config_file_path):
+    """
+    Collect every engine (or the one given with --engine) on a bounded pool
+    of worker threads and write the merged inventory
+
+    dlpx_obj: Virtualization Engine session object
+    config_file_path: filename of the configuration file for virtualization
+    engines
+    """
+    if arguments["--engine"]:
+        try:
+            engines = [dlpx_obj.dlpx_engines[arguments["--engine"]]]
+        except KeyError:
+            raise DlpxException(
+                "\nERROR: Delphix Engine {} cannot be "
+                "found in {}. Please check your value "
+                "and try again. Exiting.\n".format(
+                    arguments["--engine"], config_file_path
+                )
+            )
+    else:
+        engines = list(dlpx_obj.dlpx_engines.values())
+
+    collected_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    store = None
+    if arguments["--store"]:
+        store = DxInventoryStore(arguments["--store"])
+
+    executor = DxExecutor(int(arguments["--parallel"]))
+    for engine in engines:
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj, store)
+    exit_code = executor.wait()
+    if store is not None:
+        store.close()
+
+    # Merge the rows of every engine, in dxtools.conf order
+    rows = []
+    failed = 0
+    for engine_name in executor.futures:
+        engine_rows = executor.result(engine_name) or [
+            engine_row(engine_name, 0, "FAILED", executor.error(engine_name))
+        ]
+        if engine_rows[-1]["status"] != "OK":
+            failed += 1
+        rows.extend(engine_rows)
+
+    write_inventory(arguments["--output"], rows, arguments["--format"], collected_at)
+    print_info(
+        "Wrote {} rows from {} engines ({} failed) to {}".format(
+            len(rows), len(engines), failed, arguments["--output"]
+        )
+    )
+    return exit_code or (1 if failed else 0)
+
+
+def time_elapsed(time_start):
+    """
+    This function calculates the time elapsed since the beginning of the script.
+    Call this anywhere you want to note the progress in terms of time
+
+    :param time_start:  start time of the script.
+    :type time_start: float
+    """
+    return round((time() - time_start) / 60, +1)
+
+
+def main():
+    time_start = time()
+
+    try:
+        dx_session_obj = GetSession()
+        logging_est(arguments["--logdir"], arguments["--debug"])
+        print_debug(arguments)
+        config_file_path = arguments["--config"]
+        # Parse the dxtools.conf and put it into a dictionary
+        dx_session_obj.get_config(config_file_path)
+
+        try:
+            lock = DxLockFile(arguments["--lock_file"])
+            lock.acquire()
+        except DlpxException as e:
+            # The previous run is still going; leave it to finish
+            print_info("Skipping this run: {}".format(e))
+            return
+
+        try:
+            exit_code = run_job(dx_session_obj, config_file_path)
+        finally:
+            lock.release()
+
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
+        )
+        if exit_code:
+            sys.exit(exit_code)
+
+    # Here we handle what we do when the unexpected happens
+    except SystemExit as e:
+        # This is what we use to handle our sys.exit(#)
+        sys.exit(e)
+
+    except DlpxException as e:
+        # We use this exception handler when an error occurs in a function call.
+        print_exception("ERROR: Please check the ERROR message below:\n{}".format(e))
+        sys.exit(2)
+
+    except KeyboardInterrupt:
+        # We use this exception handler to gracefully handle ctrl+c exits
+        print_debug("You sent a CTRL+C to interrupt the process")
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "{} took {:.2f} minutes to get this far".format(
+                basename(__file__), elapsed_minutes
+            )
+        )
+
+    except:
+        # Everything else gets caught here
+        print_exception("{}\n{}".format(sys.exc_info()[0], traceback.format_exc()))
+        elapsed_minutes = time_elapsed(time_start)
+        print_info(
+            "{} took {:.2f} minutes to get this far".format(
+                basename(__file__), elapsed_minutes
+            )
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Grab our arguments from the doc at the top of the script
+    arguments = docopt(__doc__, version=basename(__file__) + " " + VERSION)
+    # Feed our arguments to the main function, and off we go!
+    main()
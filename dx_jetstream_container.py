@@ -13,7 +13,7 @@ Usage:
   dx_jetstream_container.py --template <name> (--container <name> | --all_containers )
                   --operation <name> [-d <identifier> | --engine <identifier> | --all]
                   [--bookmark_name <name>] [--bookmark_tags <tags>] [--bookmark_shared <bool>]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_jetstream_container.py -h | --help | -v | --version
 
@@ -43,6 +43,8 @@ Options:
   --host <name>             Name of environment in Delphix to execute against.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -59,7 +61,6 @@ import json
 import logging
 import signal
 import sys
-import threading
 import time
 import traceback
 from multiprocessing import Process
@@ -78,49 +79,16 @@ from delphixpy.v1_6_0.web import job
 from delphixpy.v1_6_0.web.vo import JSBookmark
 from delphixpy.v1_6_0.web.vo import JSBookmarkCreateParameters
 from delphixpy.v1_6_0.web.vo import JSTimelinePointLatestTimeInput
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxSessionPool import get_session
 
-VERSION = "v.0.0.005"
+VERSION = "v.0.0.007"
 
 
 # from delphixpy.v1_6_0.web.vo import
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    # from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = threading.Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def container_bookmark(
     engine, server, container_obj, bookmark_name, bookmark_shared, tags
 ):
@@ -156,13 +124,11 @@ def container_recover(engine, server, container_obj):
         return container_obj
 
 
-@run_async
 def container_recover_async(engine, server, container_obj):
     """This function recovers all specified containers asynchronously"""
     container_recover(engine, server, container_obj)
 
 
-@run_async
 def container_refresh(engine, server, container_obj):
     """This function refreshes a container"""
     # But first, let's make sure it is in a CONSISTENT state
@@ -173,7 +139,6 @@ def container_refresh(engine, server, container_obj):
     refresh_job = jetstream.container.refresh(server, container_obj.reference)
 
 
-@run_async
 def container_reset(engine, server, container_obj):
     """This function resets a container"""
     # But first, let's make sure it is in a CONSISTENT state
@@ -191,7 +156,6 @@ def container_start(engine, server, container_obj):
         jetstream.container.enable(server, container_obj.reference)
 
 
-@run_async
 def container_start_async(engine, server, container_obj):
     """This function starts all specified containers asynchronously"""
     container_start(engine, server, container_obj)
@@ -204,7 +168,6 @@ def container_stop(engine, server, container_obj):
         jetstream.container.disable(server, container_obj.reference)
 
 
-@run_async
 def container_stop_async(engine, server, container_obj):
     """This function starts all specified containers asynchronously"""
     container_stop(engine, server, container_obj)
@@ -393,8 +356,9 @@ def serversess(f_engine_address, f_engine_username, f_engine_password):
     """
     Function to setup the session with the Delphix Engine
     """
-    server_session = DelphixEngine(
-        f_engine_address, f_engine_username, f_engine_password, "DOMAIN"
+    # Sessions come from a pool so a thread reuses its login
+    server_session = get_session(
+        DelphixEngine, f_engine_address, f_engine_username, f_engine_password
     )
     return server_session
 
@@ -406,7 +370,6 @@ def set_exit_handler(func):
     signal.signal(signal.SIGTERM, func)
 
 
-@run_async
 def main_workflow(engine):
     """
     This function is where the main workflow resides.
@@ -444,6 +407,8 @@ def main_workflow(engine):
         return
     # reset the running job count before we begin
     i = 0
+    # Run the container operations on a pool bounded by --parallel
+    container_executor = DxExecutor(int(arguments["--parallel"] or DEFAULT_MAX_WORKERS))
     container_threads = []
     # While there are still running jobs or containers still to process....
     while i > 0 or len(containers) > 0:
@@ -458,21 +423,53 @@ def main_workflow(engine):
             if arguments["--operation"] == "refresh":
                 # refresh the container
                 container_threads.append(
-                    container_refresh(engine, server, container_obj)
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_refresh,
+                        engine,
+                        server,
+                        container_obj,
+                    )
                 )
             elif arguments["--operation"] == "reset":
-                container_threads.append(container_reset(engine, server, container_obj))
+                container_threads.append(
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_reset,
+                        engine,
+                        server,
+                        container_obj,
+                    )
+                )
             elif arguments["--operation"] == "start":
                 container_threads.append(
-                    container_start_async(engine, server, container_obj)
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_start_async,
+                        engine,
+                        server,
+                        container_obj,
+                    )
                 )
             elif arguments["--operation"] == "stop":
                 container_threads.append(
-                    container_stop_async(engine, server, container_obj)
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_stop_async,
+                        engine,
+                        server,
+                        container_obj,
+                    )
                 )
             elif arguments["--operation"] == "recover":
                 container_threads.append(
-                    container_recover_async(engine, server, container_obj)
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_recover_async,
+                        engine,
+                        server,
+                        container_obj,
+                    )
                 )
             elif arguments["--operation"] == "bookmark":
                 if arguments["--bookmark_tags"]:
@@ -498,7 +495,9 @@ def main_workflow(engine):
                 else:
                     bookmark_shared = False
                 container_threads.append(
-                    container_bookmark(
+                    container_executor.submit(
+                        container_obj.reference,
+                        container_bookmark,
                         engine,
                         server,
                         container_obj,
@@ -515,7 +514,7 @@ def main_workflow(engine):
         # reset the running jobs counter, as we are about to update the count from the jobs report.
         i = 0
         for t in container_threads:
-            if t.isAlive():
+            if not t.done():
                 i += 1
         print_info(
             engine["hostname"]
@@ -529,26 +528,26 @@ def main_workflow(engine):
         if i > 0:
             sleep(float(arguments["--poll"]))
     print("made it out")
-    # For each thread in the list...
-    for each in container_threads:
-        # join them back together so that we wait for all threads to complete before moving on
-        each.join()
+    # Wait for the container operations and report any that failed
+    exit_code = container_executor.wait()
+    if exit_code:
+        sys.exit(exit_code)
 
 
 def run_job(engine):
     """
     This function runs the main_workflow aynchronously against all the servers specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     # If the --all argument was given, run against every engine in dxtools.conf
     if arguments["--all"]:
         print_info("Executing against all Delphix Engines in the dxtools.conf")
         # For each server in the dxtools.conf...
         for delphix_engine in dxtools_objects:
             engine = dxtools_objects[delphix_engine]
-            # Create a new thread and add it to the list.
-            threads.append(main_workflow(engine))
+            # Queue main_workflow for this engine on the executor.
+            executor.submit(engine["hostname"], main_workflow, engine)
     else:
         # Else if the --engine argument was given, test to see if the engine exists in dxtools.conf
         if arguments["--engine"]:
@@ -592,12 +591,10 @@ def run_job(engine):
                 print_error("No default engine found. Exiting")
                 sys.exit(1)
         # run the job against the engine
-        threads.append(main_workflow(engine))
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -652,10 +649,12 @@ def main(argv):
         dxtools_objects = get_config(config_file_path)
 
         # This is the function that will handle processing main_workflow for all the servers.
-        run_job(engine)
+        exit_code = run_job(engine)
 
         elapsed_minutes = time_elapsed()
         print_info("script took " + str(elapsed_minutes) + " minutes to get this far.")
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
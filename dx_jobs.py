@@ -10,9 +10,10 @@
 # this doc to also define our arguments for the script.
 """List jobs on an engine
 Usage:
-  dx_jobs.py (--list [--state <name>][--title <name>])
+  dx_jobs.py (--list [--state <name>][--title <name>][--page_size <n>][--store <path>]
+                  [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>])
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_jobs.py -h | --help | -v | --version
 
@@ -22,16 +23,31 @@ Examples:
     dx_jobs.py --list --state failed
     dx_jobs.py --list --title snapsync
     dx_jobs.py --list --state failed --title snapsync
+    dx_jobs.py --list --state running --store ./dx_inventory.db
+    dx_jobs.py --list --state failed --cached --max_age 60
 
 
 Options:
   --list                    List all jobs on an engine.
   --title <name>            Filter job by title name. Note: The search is case insensitive.
   --state <name>            Filter jobs by state: RUNNING, SUSPENDED, CANCELED, COMPLETED, FAILED
+  --page_size <n>           Number of jobs fetched per request
+                            [default: 100]
+  --store <path>            Answer from the store kept by
+                            dx_inventory.py --store instead of the engine
+  --cached                  Answer the listing from the local cache if it is
+                            younger than --max_age
+  --max_age <seconds>       Oldest cached listing --cached accepts
+                            [default: 300]
+  --refresh_cache           List from the engine and update the local cache
+  --cache_file <path>       The SQLite file of the listing cache
+                            [default: ./dx_query_cache.db]
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -56,22 +72,48 @@ from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import job
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxInventoryStore import DxInventoryStore
+from lib.DxInventoryStore import job_row
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxQueryCache import cached_rows
+from lib.GetReferences import get_all_paged
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.002"
+VERSION = "v.0.0.006"
 
 
-def list_jobs():
+def print_job(job_info):
+    """
+    Print one job
+
+    job_info: Dictionary returned by lib.DxInventoryStore.job_row()
+    """
+    print(
+        "Action={action_type}, Job State={job_state}, Parent Action State="
+        "{parent_action_state},Percent Complete={percent_complete}, "
+        "Reference={reference}, Target={target},Target Name={target_name}, "
+        "Title={title}, User={user}\n".format(**job_info)
+    )
+
 
+def list_jobs(engine_name):
+    """
+    List the jobs of an engine, from the engine or, with --store, from the
+    store dx_inventory.py keeps
+
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    """
+    job_state = None
     if arguments["--state"]:
         if re.match(
             "RUNNING|SUSPENDED|CANCELED|COMPLETED|FAILED", arguments["--state"].upper()
         ):
-            pass
+            job_state = arguments["--state"].upper()
         else:
             print_info(
                 "The state should be one of these options:\n"
@@ -79,127 +121,73 @@ def list_jobs():
             )
             sys.exit(1)
 
-        for job_info in job.get_all(
-            dx_session_obj.server_session, job_state=arguments["--state"].upper()
-        ):
-
-            if arguments["--title"]:
-                if re.search(arguments["--title"], job_info.title, re.IGNORECASE):
-                    print(
-                        "Action={}, Job State={}, Parent Action State={},"
-                        "Percent Complete={}, Reference={}, Target={},"
-                        "Target Name={}, Title={}, User={}\n".format(
-                            job_info.action_type,
-                            job_info.job_state,
-                            job_info.parent_action_state,
-                            job_info.percent_complete,
-                            job_info.reference,
-                            job_info.target,
-                            job_info.target_name,
-                            job_info.title,
-                            job_info.user,
-                        )
-                    )
-            else:
-                print(
-                    "Action=%s, Job State=%s, Parent Action State=%s,"
-                    "Percent Complete=%s, Reference=%s, Target=%s,"
-                    "Target Name=%s, Title=%s, User=%s\n"
-                    % (
-                        job_info.action_type,
-                        job_info.job_state,
-                        job_info.parent_action_state,
-                        job_info.percent_complete,
-                        job_info.reference,
-                        job_info.target,
-                        job_info.target_name,
-                        job_info.title,
-                        job_info.user,
-                    )
+    if arguments["--store"]:
+        store = DxInventoryStore(arguments["--store"])
+        synced_at, _ = store.last_sync(engine_name, "job")
+        if synced_at is None:
+            print_info(
+                "{}: No jobs in {}. Run dx_inventory.py --store {} first.".format(
+                    engine_name, arguments["--store"], arguments["--store"]
                 )
+            )
+            store.close()
+            return
+        print_info(
+            "{}: Jobs as of {:.0f} seconds ago".format(engine_name, time() - synced_at)
+        )
+        job_rows = sorted(
+            store.objects(engine_name, "job"), key=lambda r: r["start_time"] or ""
+        )
+        store.close()
+        if job_state:
+            job_rows = [r for r in job_rows if r["job_state"] == job_state]
     else:
-        for job_info in job.get_all(dx_session_obj.server_session):
-
-            if arguments["--title"]:
-                if re.search(arguments["--title"], job_info.title, re.IGNORECASE):
-                    print(
-                        "Action=%s, Job State=%s, Parent Action State=%s,"
-                        "Percent Complete=%s, Reference=%s, Target=%s,"
-                        "Target Name=%s, Title=%s, User=%s\n"
-                        % (
-                            job_info.action_type,
-                            job_info.job_state,
-                            job_info.parent_action_state,
-                            job_info.percent_complete,
-                            job_info.reference,
-                            job_info.target,
-                            job_info.target_name,
-                            job_info.title,
-                            job_info.user,
-                        )
-                    )
-            else:
-                print(
-                    "Action=%s, Job State=%s, Parent Action State=%s,"
-                    "Percent Complete=%s, Reference=%s, Target=%s,"
-                    "Target Name=%s, Title=%s, User=%s\n"
-                    % (
-                        job_info.action_type,
-                        job_info.job_state,
-                        job_info.parent_action_state,
-                        job_info.percent_complete,
-                        job_info.reference,
-                        job_info.target,
-                        job_info.target_name,
-                        job_info.title,
-                        job_info.user,
-                    )
-                )
-
-
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
+        kwargs = {"job_state": job_state} if job_state else {}
+        # Page through every job instead of the engine's default 25; the
+        # jobs are printed as the pages arrive
+        job_rows = (
+            job_row(engine_name, job_obj)
+            for job_obj in get_all_paged(
+                dx_session_obj.server_session,
+                job,
+                page_size=int(arguments["--page_size"]),
+                **kwargs
+            )
+        )
+        # --title is applied below, so the cached listing only depends on
+        # the state
+        if arguments["--cached"] or arguments["--refresh_cache"]:
+            live_rows = job_rows
+            job_rows = cached_rows(
+                arguments,
+                engine_name,
+                "jobs:{}".format(job_state or "ALL"),
+                lambda: list(live_rows),
+            )
 
-    return async_func
+    for job_info in job_rows:
+        if arguments["--title"] and not re.search(
+            arguments["--title"], job_info["title"] or "", re.IGNORECASE
+        ):
+            continue
+        print_job(job_info)
 
 
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
     jobs = {}
 
+    if arguments["--store"]:
+        # Answer from the local store without contacting the engine
+        list_jobs(engine["hostname"])
+        return
+
     try:
         # Setup the connection to the Delphix Engine
         dx_session_obj.serversess(
@@ -213,19 +201,25 @@ def main_workflow(engine):
         )
         sys.exit(1)
 
+    if arguments["--list"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_jobs(engine["hostname"])
+        return
+
     thingstodo = ["thingtodo"]
     with dx_session_obj.job_mode(single_thread):
-        while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+        while dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
             if len(thingstodo) > 0:
 
                 if arguments["--list"]:
-                    list_jobs()
+                    list_jobs(engine["hostname"])
                 thingstodo.pop()
 
             # get all the jobs, then inspect them
             i = 0
-            for j in dx_session_obj.jobs.keys():
-                job_obj = job.get(dx_session_obj.server_session, dx_session_obj.jobs[j])
+            for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                job_obj = job.get(dx_session_obj.server_session, j)
                 print_debug(job_obj)
                 print_info(
                     "{}: Operations: {}".format(engine["hostname"], job_obj.job_state)
@@ -233,7 +227,7 @@ def main_workflow(engine):
                 if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                     # If the job is in a non-running state, remove it from the
                     # running jobs list.
-                    del dx_session_obj.jobs[j]
+                    dx_session_obj.jobs.remove(engine["hostname"], j)
                 elif job_obj.job_state in "RUNNING":
                     # If the job is in a running state, increment the running
                     # job count.
@@ -242,7 +236,7 @@ def main_workflow(engine):
                 print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
 
             # If we have running jobs, pause before repeating the checks.
-            if len(dx_session_obj.jobs) > 0:
+            if dx_session_obj.jobs.count(engine["hostname"]) > 0:
                 sleep(float(arguments["--poll"]))
 
 
@@ -251,8 +245,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
 
     # If the --all argument was given, run against every engine in dxtools.conf
     if arguments["--all"]:
@@ -262,8 +256,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -304,14 +298,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -349,10 +340,12 @@ def main(argv):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info("script took " + str(elapsed_minutes) + " minutes to get this far.")
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
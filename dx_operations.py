@@ -8,9 +8,9 @@
 # this doc to also define our arguments for the script.
 """List all VDBs or Start, stop, enable, disable a VDB
 Usage:
-  dx_operations_vdb.py (--vdb <name> [--stop | --start | --enable | --disable] | --list | --all_dbs <name>)
+  dx_operations_vdb.py (--vdb <name> [--stop | --start | --enable | --disable] | --list [--store <path>] | --all_dbs <name>)
                   [-d <identifier> | --engine <identifier> | --all]
-                  [--force] [--debug] [--parallel <n>] [--poll <n>]
+                  [--force] [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_operations_vdb.py -h | --help | -v | --version
 List all VDBs, start, stop, enable, disable a VDB
@@ -21,6 +21,7 @@ Examples:
   dx_operations_vdb.py --all_dbs enable
   dx_operations_vdb.py --all_dbs disable
   dx_operations_vdb.py --list
+  dx_operations_vdb.py --list --store ./dx_inventory.db
 
 Options:
   --vdb <name>              Name of the VDB to stop or start
@@ -28,6 +29,8 @@ Options:
   --stop                    Stop the VDB
   --all_dbs <name>          Enable or disable all dSources and VDBs
   --list                    List all databases from an engine
+  --store <path>            Answer --list from the store kept by
+                            dx_inventory.py --store instead of the engine
   --enable                  Enable the VDB
   --disable                 Disable the VDB
   -d <identifier>           Identifier of Delphix engine in dxtools.conf.
@@ -36,6 +39,8 @@ Options:
   --force                   Do not clean up target in VDB disable operations
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -59,22 +64,25 @@ from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web import source
 from delphixpy.v1_8_0.web.capacity import consumer
 from delphixpy.v1_8_0.web.source import source
 from delphixpy.v1_8_0.web.vo import SourceDisableParameters
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxInventory import inventory_rows
+from lib.DxInventoryStore import DxInventoryStore
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
 from lib.GetReferences import find_all_objects
 from lib.GetReferences import find_obj_by_name
-from lib.GetReferences import find_obj_list
+from lib.GetReferences import get_object_index
 from lib.GetSession import GetSession
 
-VERSION = "v.0.3.018"
+VERSION = "v.0.3.021"
 
 
 def dx_obj_operation(dlpx_obj, vdb_name, operation):
@@ -90,7 +98,6 @@ def dx_obj_operation(dlpx_obj, vdb_name, operation):
     """
 
     print_debug("Searching for {} reference.\n".format(vdb_name))
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     vdb_obj = find_obj_by_name(dlpx_obj.server_session, source, vdb_name)
     try:
         if vdb_obj:
@@ -108,7 +115,7 @@ def dx_obj_operation(dlpx_obj, vdb_name, operation):
                 source.disable(
                     dlpx_obj.server_session, vdb_obj.reference, disable_params
                 )
-            dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+            dlpx_obj.add_job(operation, vdb_name)
     except (RequestError, HttpError, JobError, AttributeError) as e:
         print_exception(
             "An error occurred while performing {} on {}:\n"
@@ -136,106 +143,113 @@ def all_databases(dlpx_obj, operation):
         sleep(2)
 
 
-def list_databases(dlpx_obj):
+def print_database_stats(rows):
     """
-    Function to list all databases and stats for an engine
+    Print the disk usage and status of every database
+
+    :param rows: Inventory rows from lib.DxInventory, of the consumer and
+                 source kinds
+    :type rows: list
+    """
+    sources = dict((r["container"], r) for r in rows if r["kind"] == "source")
+    for db_stats in [r for r in rows if r["kind"] == "consumer"]:
+        source_stats = sources.get(db_stats["container"])
+        if source_stats is None:
+            print(
+                "name: {},provision container: {},database disk "
+                "usage: {:.2f} GB,Size of Snapshots: {:.2f} GB,"
+                "Could not find source information. This could be a "
+                "result of an unlinked object".format(
+                    db_stats["name"],
+                    db_stats["parent"],
+                    db_stats["active_space"] / 1024 / 1024 / 1024,
+                    db_stats["sync_space"] / 1024 / 1024 / 1024,
+                )
+            )
+        elif source_stats["virtual"] is False:
+            print(
+                "name: {}, provision container: dSource, disk usage: "
+                "{:.2f}GB, Size of Snapshots: {:.2f}GB, "
+                "dSource Size: {:.2f}GB, Log Size: {:.2f}MB,"
+                "Enabled: {}, Status: {}".format(
+                    db_stats["name"],
+                    db_stats["active_space"] / 1024 / 1024 / 1024,
+                    db_stats["sync_space"] / 1024 / 1024 / 1024,
+                    source_stats["size"] / 1024 / 1024 / 1024,
+                    db_stats["log_space"] / 1024 / 1024,
+                    source_stats["enabled"],
+                    source_stats["status"],
+                )
+            )
+        elif source_stats["virtual"] is True:
+            print(
+                "name: {}, provision container: {}, disk usage: "
+                "{:.2f}GB, Size of Snapshots: {:.2f}GB, "
+                "Log Size: {:.2f}MB, Enabled: {}, "
+                "Status: {}".format(
+                    db_stats["name"],
+                    db_stats["parent"],
+                    db_stats["active_space"] / 1024 / 1024 / 1024,
+                    db_stats["sync_space"] / 1024 / 1024 / 1024,
+                    db_stats["log_space"] / 1024 / 1024,
+                    source_stats["enabled"],
+                    source_stats["status"],
+                )
+            )
+
+
+def list_databases(dlpx_obj, engine_name):
+    """
+    Function to list all databases and stats for an engine, from the engine
+    or, with --store, from the store dx_inventory.py keeps
 
     :param dlpx_obj: Virtualization Engine session object
     :type dlpx_obj: lib.GetSession.GetSession
+    :param engine_name: Name of the engine, I.E. engine["hostname"]
+    :type engine_name: str
     """
 
-    source_stats_lst = find_all_objects(dlpx_obj.server_session, source)
-    is_dSource = None
     try:
-        for db_stats in find_all_objects(dlpx_obj.server_session, consumer):
-            source_stats = find_obj_list(source_stats_lst, db_stats.name)
-            if source_stats is not None:
-                if source_stats.virtual is False:
-                    db_size = source_stats.runtime.database_size / 1024 / 1024 / 1024
-                    print(
-                        "name: {}, provision container: dSource, disk usage: "
-                        "{:.2f}GB, Size of Snapshots: {:.2f}GB, "
-                        "dSource Size: {:.2f}GB, Log Size: {:.2f}MB,"
-                        "Enabled: {}, Status: {}".format(
-                            str(db_stats.name),
-                            db_stats.breakdown.active_space / 1024 / 1024 / 1024,
-                            db_stats.breakdown.sync_space / 1024 / 1024 / 1024,
-                            source_stats.runtime.database_size / 1024 / 1024 / 1024,
-                            db_stats.breakdown.log_space / 1024 / 1024,
-                            source_stats.runtime.enabled,
-                            source_stats.runtime.status,
-                        )
-                    )
-                elif source_stats.virtual is True:
-                    print(
-                        "name: {}, provision container: {}, disk usage: "
-                        "{:.2f}GB, Size of Snapshots: {:.2f}GB, "
-                        "Log Size: {:.2f}MB, Enabled: {}, "
-                        "Status: {}".format(
-                            str(db_stats.name),
-                            db_stats.parent,
-                            db_stats.breakdown.active_space / 1024 / 1024 / 1024,
-                            db_stats.breakdown.sync_space / 1024 / 1024 / 1024,
-                            db_stats.breakdown.log_space / 1024 / 1024,
-                            source_stats.runtime.enabled,
-                            source_stats.runtime.status,
-                        )
-                    )
-            elif source_stats is None:
-                print(
-                    "name: {},provision container: {},database disk "
-                    "usage: {:.2f} GB,Size of Snapshots: {:.2f} GB,"
-                    "Could not find source information. This could be a "
-                    "result of an unlinked object".format(
-                        str(db_stats.name),
-                        str(db_stats.parent),
-                        db_stats.breakdown.active_space / 1024 / 1024 / 1024,
-                        db_stats.breakdown.sync_space / 1024 / 1024 / 1024,
+        if arguments["--store"]:
+            store = DxInventoryStore(arguments["--store"])
+            synced_at, _ = store.last_sync(engine_name, "consumer")
+            rows = store.objects(engine_name, "consumer") + store.objects(
+                engine_name, "source"
+            )
+            store.close()
+            if synced_at is None:
+                print_info(
+                    "{}: No databases in {}. Run dx_inventory.py --store {} "
+                    "first.".format(
+                        engine_name, arguments["--store"], arguments["--store"]
                     )
                 )
-    except (RequestError, JobError, AttributeError, DlpxException) as err:
+                return
+            print_info(
+                "{}: Databases as of {:.0f} seconds ago".format(
+                    engine_name, time() - synced_at
+                )
+            )
+        else:
+            rows = inventory_rows(
+                engine_name,
+                [],
+                [],
+                [],
+                [],
+                get_object_index(dlpx_obj.server_session, source).objs,
+                find_all_objects(dlpx_obj.server_session, consumer),
+            )
+        print_database_stats(rows)
+    except (RequestError, JobError, AttributeError, TypeError, DlpxException) as err:
         print("An error occurred while listing databases: {}".format(err))
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     :param engine: Dictionary of engines
     :type engine: dictionary
@@ -243,6 +257,11 @@ def main_workflow(engine, dlpx_obj):
     :type dlpx_obj: lib.GetSession.GetSession
     """
 
+    if arguments["--list"] and arguments["--store"]:
+        # Answer from the local store without contacting the engine
+        list_databases(dlpx_obj, engine["hostname"])
+        return
+
     try:
         # Setup the connection to the Delphix Engine
         dlpx_obj.serversess(
@@ -259,7 +278,7 @@ def main_workflow(engine, dlpx_obj):
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--start"]:
                         dx_obj_operation(dlpx_obj, arguments["--vdb"], "start")
@@ -275,33 +294,32 @@ def main_workflow(engine, dlpx_obj):
                         else:
                             dx_obj_operation(dlpx_obj, arguments["--vdb"], "disable")
                     elif arguments["--list"]:
-                        list_databases(dlpx_obj)
+                        list_databases(dlpx_obj, engine["hostname"])
                     elif arguments["--all_dbs"]:
                         all_databases(dlpx_obj, arguments["--all_dbs"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_state = dlpx_obj.job_tracker().track(j)
                     print_info(
                         "{}: Running JS Bookmark: {}".format(
-                            engine["hostname"], job_obj.job_state
+                            engine["hostname"], job_state
                         )
                     )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
+                    elif job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
                         i += 1
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+                    # If we have running jobs, wait for one to finish (at most
+                    # --poll seconds) before repeating the checks.
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
+                        dlpx_obj.job_tracker().wait_any(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception("Error in js_bookmark: {}\n{}".format(engine["hostname"], e))
         sys.exit(1)
@@ -329,8 +347,8 @@ def run_job(dlpx_obj, config_file_path):
     :type config_file_path: str
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -340,8 +358,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
             sys.exit(1)
@@ -382,13 +400,10 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def main():
@@ -409,12 +424,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed(time_start)
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -13,15 +13,15 @@ Usage:
   dx_provision_dsource.py (--type <name>)
   dx_provision_dsource.py --type <name> --dsource_name <name> --ip_addr <name> --db_name <name> --env_name <name> --db_install_path <name> --dx_group <name> --db_passwd <name> --db_user <name> [--port_num <name>][--num_connections <name>][--link_now <name>][--files_per_set <name>][--rman_channels <name>]
     [--engine <identifier> | --all]
-    [--debug] [--parallel <n>] [--poll <n>]
+    [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
     [--config <path_to_file>] [--logdir <path_to_file>]
   dx_provision_dsource.py --type <name> --dsource_name <name> --ase_user <name> --ase_passwd <name> --backup_path <name> --source_user <name> --stage_user aseadmin --stage_repo ASE1570_S2 --src_config <name> --env_name <name> --dx_group <name> [--bck_file <name>][--create_bckup]
     [--engine <identifier> | --all]
-    [--debug] [--parallel <n>] [--poll <n>]
+    [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
     [--config <path_to_file>] [--logdir <path_to_file>]
   dx_provision_dsource.py --type <name> --dsource_name <name> --dx_group <name> --db_passwd <name> --db_user <name> --stage_instance <name> --stage_env <name> --backup_path <name> [--backup_loc_passwd <passwd> --backup_loc_user <name> --logsync [--sync_mode <mode>] --load_from_backup]
     [--engine <identifier> | --all]
-    [--debug] [--parallel <n>] [--poll <n>]
+    [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
     [--config <path_to_file>] [--logdir <path_to_file>]
   dx_provision_dsource.py -h | --help | -v | --version
 
@@ -84,6 +84,8 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -124,6 +126,8 @@ from delphixpy.v1_8_0.web.vo import OracleSIConfig
 from delphixpy.v1_8_0.web.vo import OracleSourcingPolicy
 from delphixpy.v1_8_0.web.vo import SourcingPolicy
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
@@ -133,7 +137,7 @@ from lib.GetReferences import find_obj_by_name
 from lib.GetReferences import get_running_job
 from lib.GetSession import GetSession
 
-VERSION = "v.0.2.0018"
+VERSION = "v.0.2.0020"
 
 
 def create_ora_sourceconfig(engine_name, port_num=1521):
@@ -205,16 +209,21 @@ def create_ora_sourceconfig(engine_name, port_num=1521):
             sleep(3)
             link_job_obj = job.get(dx_session_obj.server_session, link_job_ref)
 
-        # Add the snapsync job to the jobs dictionary
-        dx_session_obj.jobs[engine_name + "snap"] = get_running_job(
-            dx_session_obj.server_session,
-            find_obj_by_name(
-                dx_session_obj.server_session, database, arguments["--dsource_name"]
-            ).reference,
+        # Add the snapsync job to the jobs of the engine
+        snap_job = dx_session_obj.jobs.add(
+            engine_name,
+            get_running_job(
+                dx_session_obj.server_session,
+                find_obj_by_name(
+                    dx_session_obj.server_session, database, arguments["--dsource_name"]
+                ).reference,
+            ),
+            "snapsync",
+            arguments["--dsource_name"],
         )
         print_debug(
             "Snapshot Job Reference: {}.\n".format(
-                dx_session_obj.jobs[engine_name + "snap"]
+                snap_job.reference if snap_job else None
             )
         )
     except (HttpError, RequestError) as e:
@@ -320,12 +329,22 @@ def link_mssql_dsource(engine_name):
 
     try:
         database.link(dx_session_obj.server_session, link_params)
-        dx_session_obj.jobs[engine_name] = dx_session_obj.server_session.last_job
-        dx_session_obj.jobs[engine_name + "snap"] = get_running_job(
-            dx_session_obj.server_session,
-            find_obj_by_name(
-                dx_session_obj.server_session, database, arguments["--dsource_name"]
-            ).reference,
+        dx_session_obj.jobs.add(
+            engine_name,
+            dx_session_obj.server_session.last_job,
+            "link",
+            arguments["--dsource_name"],
+        )
+        dx_session_obj.jobs.add(
+            engine_name,
+            get_running_job(
+                dx_session_obj.server_session,
+                find_obj_by_name(
+                    dx_session_obj.server_session, database, arguments["--dsource_name"]
+                ).reference,
+            ),
+            "snapsync",
+            arguments["--dsource_name"],
         )
 
     except (HttpError, RequestError, JobError) as e:
@@ -385,12 +404,22 @@ def link_ase_dsource(engine_name):
 
     try:
         dsource_ref = database.link(dx_session_obj.server_session, link_params)
-        dx_session_obj.jobs[engine_name] = dx_session_obj.server_session.last_job
-        dx_session_obj.jobs[engine_name + "snap"] = get_running_job(
-            dx_session_obj.server_session,
-            find_obj_by_name(
-                dx_session_obj.server_session, database, arguments["--dsource_name"]
-            ).reference,
+        dx_session_obj.jobs.add(
+            engine_name,
+            dx_session_obj.server_session.last_job,
+            "link",
+            arguments["--dsource_name"],
+        )
+        dx_session_obj.jobs.add(
+            engine_name,
+            get_running_job(
+                dx_session_obj.server_session,
+                find_obj_by_name(
+                    dx_session_obj.server_session, database, arguments["--dsource_name"]
+                ).reference,
+            ),
+            "snapsync",
+            arguments["--dsource_name"],
         )
         print(
             "{} sucessfully linked {}".format(dsource_ref, arguments["--dsource_name"])
@@ -401,44 +430,11 @@ def link_ase_dsource(engine_name):
         )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -461,7 +457,9 @@ def main_workflow(engine):
     thingstodo = ["thingtodo"]
     try:
         with dx_session_obj.job_mode(single_thread):
-            while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+            while (
+                dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0
+            ):
                 if len(thingstodo) > 0:
                     if arguments["--type"].lower() == "oracle":
                         create_ora_sourceconfig(engine["hostname"])
@@ -472,10 +470,8 @@ def main_workflow(engine):
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dx_session_obj.jobs.keys():
-                    job_obj = job.get(
-                        dx_session_obj.server_session, dx_session_obj.jobs[j]
-                    )
+                for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dx_session_obj.server_session, j)
                     print_debug(job_obj)
                     print_info(
                         "{}: Provisioning dSource: {}".format(
@@ -486,7 +482,7 @@ def main_workflow(engine):
                         # If the job is in a non-running state, remove it
                         # from the
                         # running jobs list.
-                        del dx_session_obj.jobs[j]
+                        dx_session_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -494,7 +490,7 @@ def main_workflow(engine):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dx_session_obj.jobs) > 0:
+                    if dx_session_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
 
     except (HttpError, RequestError, JobError, DlpxException) as e:
@@ -509,8 +505,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -521,8 +517,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n%s" % (e))
@@ -566,14 +562,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -611,12 +604,14 @@ def main(argv):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {} minutes to get this far.".format(str(elapsed_minutes))
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
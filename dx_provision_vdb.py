@@ -25,8 +25,9 @@ Usage:
                   [--uniqname <name>][--source_grp <name>] 
                   [--engine <identifier> | --all]
                   [--vdb_restart <bool> ]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
+                  [--metrics_file <path>] [--metrics_port <port>]
                   [--postrefresh <name>] [--prerefresh <name>]
                   [--configure-clone <name>]
                   [--prerollback <name>] [--postrollback <name>]
@@ -88,12 +89,18 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
                             [default: ./dxtools.conf]
   --logdir <path_to_file>    The path to the logfile you want to use.
                             [default: ./dx_provision_vdb.log]
+  --metrics_file <path>     Write job and request metrics to this file at
+                            exit, for the node_exporter textfile collector
+  --metrics_port <port>     Serve job and request metrics on this port, at
+                            /metrics, while the script runs
   -h --help                 Show this screen.
   -v --version              Show version.
 """
@@ -144,15 +151,19 @@ from delphixpy.v1_8_0.web.vo import TimeflowPointSemantic
 from delphixpy.v1_8_0.web.vo import TimeflowPointTimestamp
 from delphixpy.v1_8_0.web.vo import VirtualSourceOperations
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_info
+from lib.DxMetrics import start_metrics
 from lib.DxTimeflow import DxTimeflow
 from lib.GetReferences import find_dbrepo
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.2.305"
+VERSION = "v.0.2.308"
 
 
 def create_ase_vdb(
@@ -195,6 +206,7 @@ def create_ase_vdb(
         vdb_params.timeflow_point_parameters.container = container_obj.reference
         print_info("Provisioning " + vdb_name)
         database.provision(server, vdb_params)
+        invalidate_cache(server, database)
 
         # Add the job into the jobs dictionary so we can track its progress
         jobs[engine["hostname"]] = server.last_job
@@ -245,6 +257,7 @@ def create_mssql_vdb(engine, jobs, vdb_group, vdb_name, environment_obj, contain
         vdb_params.timeflow_point_parameters.container = container_obj.reference
         print_info(engine["hostname"] + ":Provisioning " + vdb_name)
         database.provision(dx_session_obj.server_session, vdb_params)
+        invalidate_cache(dx_session_obj.server_session, database)
         # Add the job into the jobs dictionary so we can track its progress
         jobs[engine["hostname"]] = dx_session_obj.server_session.last_job
         # return the job object to the calling statement so that we can tell if
@@ -378,6 +391,7 @@ def create_vfiles_vdb(
 
         try:
             database.provision(dx_session_obj.server_session, vfiles_params)
+            invalidate_cache(dx_session_obj.server_session, database)
 
         except (JobError, RequestError, HttpError) as e:
             raise DlpxException(
@@ -515,6 +529,7 @@ def create_oracle_si_vdb(
         print(vdb_params, "\n\n\n")
         print_info(engine["hostname"] + ": Provisioning " + vdb_name)
         database.provision(dx_session_obj.server_session, vdb_params)
+        invalidate_cache(dx_session_obj.server_session, database)
         # Add the job into the jobs dictionary so we can track its progress
 
         jobs[engine["hostname"]] = dx_session_obj.server_session.last_job
@@ -776,44 +791,11 @@ def find_source_by_database(engine, database_obj):
     return source_obj
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary containing engine information
     """
@@ -924,14 +906,12 @@ def main_workflow(engine):
 
                 # get all the jobs, then inspect them
                 i = 0
-                for j in jobs.keys():
-                    job_obj = job.get(dx_session_obj.server_session, jobs[j])
-                    print_debug(job_obj, debug)
-                    print_info(
-                        engine["hostname"] + ": VDB Provision: " + job_obj.job_state
-                    )
+                tracker = dx_session_obj.job_tracker()
+                for j in list(jobs.keys()):
+                    job_state = tracker.track(jobs[j])
+                    print_info(engine["hostname"] + ": VDB Provision: " + job_state)
 
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it from
                         # the running jobs list.
                         del jobs[j]
@@ -942,9 +922,10 @@ def main_workflow(engine):
 
                 print_info("%s: %s jobs running." % (engine["hostname"], str(i)))
 
-                # If we have running jobs, pause before repeating the checks.
+                # If we have running jobs, wait for one to finish (at most
+                # --poll seconds) before repeating the checks.
                 if len(jobs) > 0:
-                    sleep(float(arguments["--poll"]))
+                    tracker.wait_any(float(arguments["--poll"]))
 
     except (DlpxException, JobError) as e:
         print("\nError while provisioning %s:\n%s" % (database_name, e.message))
@@ -958,8 +939,8 @@ def run_job():
 
     No arguments required for run_job().
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
 
     # If the --all argument was given, run against every engine in dxtools.conf
     if arguments["--all"]:
@@ -969,8 +950,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in main_workflow:\n%s" % (e))
@@ -1012,13 +993,10 @@ def run_job():
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine))
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def serversess(f_engine_address, f_engine_username, f_engine_password):
@@ -1160,7 +1138,7 @@ def main(argv):
     global debug
 
     try:
-        dx_session_obj = GetSession()
+        dx_session_obj = GetSession(metrics=start_metrics(arguments))
         debug = arguments["--debug"]
         logging_est(arguments["--logdir"], debug)
         print_debug(arguments, debug)
@@ -1178,10 +1156,12 @@ def main(argv):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info("script took %s minutes to get this far. " % (str(elapsed_minutes)))
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -10,12 +10,16 @@
 # this doc to also define our arguments for the script. This thing is brilliant.
 """Refresh a vdb
 Usage:
-  dx_refresh_db.py (--name <name> | --dsource <name> | --all_vdbs [--group_name <name>]| --host <name> | --list_timeflows | --list_snapshots)
+  dx_refresh_db.py (--name <name> | --dsource <name> | --all_vdbs | --host <name> | --list_timeflows | --list_snapshots [--container <name>])
+                   [--group_name <name>]
                    [--timestamp_type <type>]
                    [--timestamp <timepoint_semantic> --timeflow <timeflow>]
                    [-d <identifier> | --engine <identifier> | --all]
-                   [--debug] [--parallel <n>] [--poll <n>]
+                   [--debug] [--parallel <n>] [--max_engines <n>]
+                  [--parallel_host <n>] [--parallel_total <n>] [--poll <n>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
+                   [--metrics_file <path>] [--metrics_port <port>]
+                   [--trace] [--trace_file <path>] [--log_json]
   dx_refresh_db.py -h | --help | -v | --version
 Refresh a Delphix VDB
 Examples:
@@ -30,6 +34,7 @@ Options:
   --group_name <name>       Name of the group to execute against.
   --list_timeflows          List all timeflows
   --list_snapshots          List all snapshots
+  --container <name>        Only list snapshots of this database
   --host <name>             Name of environment in Delphix to execute against.
   --timestamp_type <type>   The type of timestamp you are specifying.
                             Acceptable Values: TIME, SNAPSHOT
@@ -49,12 +54,26 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
+  --parallel_host <n>       Limit number of jobs against one source host,
+                            across all engines
+  --parallel_total <n>      Limit number of jobs across all engines
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
                             [default: ./dxtools.conf]
   --logdir <path_to_file>   The path to the logfile you want to use.
                             [default: ./dx_refresh_db.log]
+  --trace                   Print a latency histogram of the requests made
+                            to each engine, per endpoint, at exit
+  --trace_file <path>       Also append the requests to this file as
+                            OpenTelemetry spans (OTLP JSON)
+  --log_json                Write the logfile as JSON, one record per line
+  --metrics_file <path>     Write job and request metrics to this file at
+                            exit, for the node_exporter textfile collector
+  --metrics_port <port>     Serve job and request metrics on this port, at
+                            /metrics, while the script runs
   -h --help                 Show this screen.
   -v --version              Show version.
 """
@@ -64,8 +83,8 @@ import json
 import logging
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -88,46 +107,26 @@ from delphixpy.v1_8_0.web.vo import TimeflowPointLocation
 from delphixpy.v1_8_0.web.vo import TimeflowPointSemantic
 from delphixpy.v1_8_0.web.vo import TimeflowPointTimestamp
 from lib.DlpxException import DlpxException
+from lib.DxCache import DxCache
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxJobTracker import DxJobTracker
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxMetrics import start_metrics
+from lib.DxScheduler import DxScheduler
+from lib.DxScheduler import source_hosts
+from lib.DxSessionPool import get_session
+from lib.DxTrace import start_trace
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import get_cached_objects
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.1.615"
-
-
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
+VERSION = "v.0.1.621"
 
 
 def find_all_databases_by_dsource_name(
@@ -138,11 +137,12 @@ def find_all_databases_by_dsource_name(
     """
 
     # First search for the dSource name specified and return its reference
-    dsource_obj = find_obj_by_name(engine, server, database, dsource_name)
+    dsource_obj = find_obj_by_name(server, database, dsource_name)
 
     if dsource_obj:
-        return database.get_all(
+        return get_cached_objects(
             server,
+            database,
             provision_container=dsource_obj.reference,
             no_js_container_data_source=exclude_js_container,
         )
@@ -156,10 +156,11 @@ def find_all_databases_by_group_name(
     """
 
     # First search groups for the name specified and return its reference
-    group_obj = find_obj_by_name(engine, server, group, group_name)
+    group_obj = find_obj_by_name(server, group, group_name)
     if group_obj:
-        return database.get_all(
+        return get_cached_objects(
             server,
+            database,
             group=group_obj.reference,
             no_js_container_data_source=exclude_js_container,
         )
@@ -248,7 +249,7 @@ def find_snapshot_by_database_and_time(engine, server, database_obj, snap_time):
 def find_source_by_database(engine, server, database_obj):
     # The source tells us if the database is enabled/disables, virtual,
     # vdb/dSource, or is a staging database.
-    source_obj = source.get_all(server, database=database_obj.reference)
+    source_obj = get_cached_objects(server, source, database=database_obj.reference)
 
     # We'll just do a little sanity check here to ensure we only have a
     # 1:1 result.
@@ -369,37 +370,69 @@ def get_obj_name(server, f_object, obj_reference):
         raise DlpxException(e)
 
 
-def list_snapshots(server):
+def list_snapshots(engine, server, group_name=None, container_name=None):
     """
-    List all snapshots with timestamps
+    List all snapshots with timestamps. Container names come from one
+    database listing and the timeflow ranges are fetched concurrently, on
+    at most DEFAULT_MAX_WORKERS threads.
+
+    engine: Dictionary of the engine from dxtools.conf
+    server: A Delphix engine session object
+    group_name: Only list snapshots of databases in this group. Default: None
+    container_name: Only list snapshots of this database. Default: None
     """
 
-    header = "Snapshot Name, First Change Point, Location, Latest Change Point"
-    snapshots = snapshot.get_all(server)
+    database_index = get_object_index(server, database)
+    container_names = dict(
+        (db_obj.reference, db_obj.name) for db_obj in database_index.objs
+    )
 
-    print(header)
-    for snap in snapshots:
-        container_name = get_obj_name(server, database, snap.container)
-        snap_range = snapshot.timeflow_range(server, snap.reference)
+    if group_name or container_name:
+        containers = database_index.objs
+        if container_name:
+            containers = [find_obj_by_name(server, database, container_name)]
+        if group_name:
+            group_ref = find_obj_by_name(server, group, group_name).reference
+            containers = [db_obj for db_obj in containers if db_obj.group == group_ref]
+        snapshots = []
+        for db_obj in containers:
+            snapshots.extend(snapshot.get_all(server, database=db_obj.reference))
+    else:
+        snapshots = snapshot.get_all(server)
+
+    def snapshot_range(snap):
+        # Each worker thread uses its own handle from the session pool
+        session = serversess(
+            engine["ip_address"],
+            engine["username"],
+            engine["password"],
+            engine["hostname"],
+        )
+        return snapshot.timeflow_range(session, snap.reference)
 
-        print(
-            "{}, {}, {}, {}, {}".format(
-                str(snap.name),
-                container_name,
-                snap_range.start_point.timestamp,
-                snap_range.start_point.location,
-                snap_range.end_point.timestamp,
+    # --parallel limits the jobs of the engine, not these lookups
+    max_workers = DEFAULT_MAX_WORKERS
+    print(
+        "Snapshot Name, Container, First Change Point, Location, " "Latest Change Point"
+    )
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for snap, snap_range in zip(snapshots, pool.map(snapshot_range, snapshots)):
+            print(
+                "{}, {}, {}, {}, {}".format(
+                    str(snap.name),
+                    container_names.get(snap.container, snap.container),
+                    snap_range.start_point.timestamp,
+                    snap_range.start_point.location,
+                    snap_range.end_point.timestamp,
+                )
             )
-        )
 
 
-@run_async
 def main_workflow(engine):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
     """
 
     # Pull out the values from the dictionary for this engine
@@ -413,13 +446,15 @@ def main_workflow(engine):
     jobs = {}
 
     # Setup the connection to the Delphix Engine
-    server = serversess(engine_address, engine_username, engine_password)
+    server = serversess(
+        engine_address, engine_username, engine_password, engine["hostname"]
+    )
 
     # If an environment/server was specified
     if host_name:
         print_debug(engine["hostname"] + ": Getting environment for " + host_name)
         # Get the environment object by the hostname
-        environment_obj = find_obj_by_name(engine, server, environment, host_name)
+        environment_obj = find_obj_by_name(server, environment, host_name)
 
         if environment_obj != None:
             # Get all the sources running on the server
@@ -454,11 +489,19 @@ def main_workflow(engine):
             )
             sys.exit(1)
 
+    if arguments["--list_timeflows"]:
+        list_timeflows(server)
+
+    elif arguments["--list_snapshots"]:
+        list_snapshots(
+            engine, server, arguments["--group_name"], arguments["--container"]
+        )
+
     # If we specified a specific database by name....
-    if arguments["--name"]:
+    elif arguments["--name"]:
         # Get the database object from the name
 
-        database_obj = find_obj_by_name(engine, server, database, arguments["--name"])
+        database_obj = find_obj_by_name(server, database, arguments["--name"])
         if database_obj:
             databases.append(database_obj)
 
@@ -495,79 +538,107 @@ def main_workflow(engine):
         # containers, because we can't refresh those this way.
         databases = database.get_all(server, no_js_container_data_source=True)
 
-    elif arguments["--list_timeflows"]:
-        list_timeflows(server)
-
-    elif arguments["--list_snapshots"]:
-        list_snapshots(server)
-
+    # Follow job completion through the engine's notification channel
+    tracker = DxJobTracker(server, engine_name=engine["hostname"])
+
+    # Queue the databases with the scheduler shared by all engines
+    hosts = {}
+    if scheduler.host_limit is not None:
+        hosts = source_hosts(server)
+    for database_obj in reversed(databases):
+        scheduler.enqueue(
+            engine["hostname"],
+            "refresh",
+            database_obj,
+            hosts.get(database_obj.reference),
+        )
+    slots = {}
     # reset the running job count before we begin
     i = 0
-    with job_mode(server):
-        # While there are still running jobs or databases still to process....
-
-        while len(jobs) > 0 or len(databases) > 0:
-
-            # While there are databases still to process and we are still under
-            # the max simultaneous jobs threshold (if specified)
-            while len(databases) > 0 and (
-                arguments["--parallel"] == None or i < int(arguments["--parallel"])
-            ):
-
-                # Give us the next database in the list, and then remove it
-                database_obj = databases.pop()
-                # Get the source of the database.
-                source_obj = find_source_by_database(engine, server, database_obj)
-
-                # If we applied the environment/server filter AND group filter,
-                # find the intersecting matches
-                if environment_obj != None and (arguments["--group_name"]):
-                    match = False
-
-                    for env_source_obj in env_source_objs:
-                        if source_obj[0].reference in env_source_obj.reference:
-                            match = True
-                            break
-                    if match == False:
-                        print_error(
-                            engine["hostname"]
-                            + ": "
-                            + database_obj.name
-                            + " does not exist on "
-                            + host_name
-                            + ". Exiting"
-                        )
-                        return
-
-                # Refresh the database
-                refresh_job = refresh_database(
-                    engine, server, jobs, source_obj[0], database_obj
-                )
-                # If refresh_job has any value, then we know that a job was
-                # initiated.
-
-                if refresh_job:
-                    # increment the running job count
-                    i += 1
-            # Check to see if we are running at max parallel processes, and
-            # report if so.
-            if arguments["--parallel"] != None and i >= int(arguments["--parallel"]):
+    try:
+        with job_mode(server):
+            # While there are still running jobs or databases still to process....
+
+            while len(jobs) > 0 or scheduler.queued(engine["hostname"]) > 0:
+
+                # Start the databases the scheduler has a free slot for. It applies
+                # --parallel per engine, plus the per-host and global limits.
+                for item in scheduler.start_ready(engine["hostname"]):
+                    database_obj = item.target
+                    # Get the source of the database.
+                    source_obj = find_source_by_database(engine, server, database_obj)
+
+                    # If we applied the environment/server filter AND group filter,
+                    # find the intersecting matches
+                    if environment_obj != None and (arguments["--group_name"]):
+                        match = False
+
+                        for env_source_obj in env_source_objs:
+                            if source_obj[0].reference in env_source_obj.reference:
+                                match = True
+                                break
+                        if match == False:
+                            print_error(
+                                engine["hostname"]
+                                + ": "
+                                + database_obj.name
+                                + " does not exist on "
+                                + host_name
+                                + ". Exiting"
+                            )
+                            return
+
+                    # Refresh the database
+                    refresh_job = refresh_database(
+                        engine, server, jobs, source_obj[0], database_obj
+                    )
+                    # If refresh_job has any value, then we know that a job was
+                    # initiated.
+
+                    if refresh_job:
+                        # hold the slot until the job finishes
+                        slots[database_obj] = item
+                        # increment the running job count
+                        i += 1
+                    else:
+                        scheduler.finish(item)
+                # Check to see if we are running at max parallel processes, and
+                # report if so.
+                if arguments["--parallel"] != None and i >= int(
+                    arguments["--parallel"]
+                ):
 
-                print_info(engine["hostname"] + ": Max jobs reached (" + str(i) + ")")
+                    print_info(
+                        engine["hostname"] + ": Max jobs reached (" + str(i) + ")"
+                    )
 
-            i = update_jobs_dictionary(engine, server, jobs)
-            print_info(
-                engine["hostname"]
-                + ": "
-                + str(i)
-                + " jobs running. "
-                + str(len(databases))
-                + " jobs waiting to run"
-            )
+                i = update_jobs_dictionary(engine, tracker, jobs)
+                # Release the slots of the jobs that finished
+                for database_obj in [d for d in slots if d not in jobs]:
+                    scheduler.finish(slots.pop(database_obj))
+                print_info(
+                    engine["hostname"]
+                    + ": "
+                    + str(i)
+                    + " jobs running. "
+                    + str(scheduler.queued(engine["hostname"]))
+                    + " jobs waiting to run",
+                    engine=engine["hostname"],
+                )
 
-            # If we have running jobs, pause before repeating the checks.
-            if len(jobs) > 0:
-                sleep(float(arguments["--poll"]))
+                # If we have running jobs, wait for one to finish (at most --poll
+                # seconds) before repeating the checks.
+                if len(jobs) > 0:
+                    tracker.wait_any(float(arguments["--poll"]))
+                elif scheduler.queued(engine["hostname"]) > 0:
+                    # Our databases wait on limits held by other engines
+                    scheduler.wait(float(arguments["--poll"]))
+    finally:
+        scheduler.discard(engine["hostname"])
+
+    print_debug(
+        "{}: Lookup cache {}".format(engine["hostname"], server.dx_cache.stats())
+    )
 
 
 def print_error(print_obj):
@@ -630,7 +701,9 @@ def refresh_database(engine, server, jobs, source_obj, container_obj):
                 + ": Refreshing "
                 + container_obj.name
                 + " from "
-                + source_db.name
+                + source_db.name,
+                engine=engine["hostname"],
+                operation="refresh",
             )
             print_debug(engine["hostname"] + ": Type: " + source_obj.type)
             print_debug(engine["hostname"] + ":" + source_obj.type)
@@ -647,10 +720,15 @@ def refresh_database(engine, server, jobs, source_obj, container_obj):
                 refresh_params.timeflow_point_parameters = set_timeflow_point(
                     engine, server, source_db
                 )
-                print_debug(engine["hostname"] + ":" + str(refresh_params))
+                print_debug(
+                    lambda: engine["hostname"] + ":" + str(refresh_params),
+                    engine=engine["hostname"],
+                    operation="refresh",
+                )
 
                 # Sync it
                 database.refresh(server, container_obj.reference, refresh_params)
+                invalidate_cache(server, database)
                 jobs[container_obj] = server.last_job
 
             except RequestError as e:
@@ -683,8 +761,8 @@ def run_job(engine):
     servers specified
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     # If the --all argument was given, run against every engine in dxtools.conf
 
     if arguments["--all"]:
@@ -693,8 +771,8 @@ def run_job(engine):
         # For each server in the dxtools.conf...
         for delphix_engine in dxtools_objects:
             engine = dxtools_objects[delphix_engine]
-            # Create a new thread and add it to the list.
-            threads.append(main_workflow(engine))
+            # Queue main_workflow for this engine on the executor.
+            executor.submit(engine["hostname"], main_workflow, engine)
 
     else:
         # Else if the --engine argument was given, test to see if the engine
@@ -744,22 +822,33 @@ def run_job(engine):
                 print_error("No default engine found. Exiting")
                 sys.exit(1)
         # run the job against the engine
-        threads.append(main_workflow(engine))
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
-def serversess(f_engine_address, f_engine_username, f_engine_password):
+def serversess(
+    f_engine_address, f_engine_username, f_engine_password, engine_name=None
+):
     """
-    Function to setup the session with the Delphix Engine
+    Function to setup the session with the Delphix Engine. Every session
+    handle is recorded by --trace and the metrics, including the handles of
+    worker threads.
+
+    engine_name: Name the requests are recorded under, I.E.
+                 engine["hostname"]. Default: f_engine_address
     """
-    server_session = DelphixEngine(
-        f_engine_address, f_engine_username, f_engine_password, "DOMAIN"
+    # Sessions come from a pool so a thread reuses its login
+    server_session = get_session(
+        DelphixEngine, f_engine_address, f_engine_username, f_engine_password
     )
+    # Memoize lookups made through lib.GetReferences for this engine
+    if getattr(server_session, "dx_cache", None) is None:
+        server_session.dx_cache = DxCache()
+    for recorder in [trace, metrics]:
+        if recorder is not None:
+            recorder.instrument(server_session, engine_name or f_engine_address)
     return server_session
 
 
@@ -862,9 +951,7 @@ def set_timeflow_point(engine, server, container_obj):
         elif arguments["--timestamp"]:
             timeflow_point_parameters = TimeflowPointTimestamp()
             timeflow_point_parameters.type = "TimeflowPointTimestamp"
-            timeflow_obj = find_obj_by_name(
-                engine, server, timeflow, arguments["--timeflow"]
-            )
+            timeflow_obj = find_obj_by_name(server, timeflow, arguments["--timeflow"])
 
             timeflow_point_parameters.timeflow = timeflow_obj.reference
             timeflow_point_parameters.timestamp = arguments["--timestamp"]
@@ -887,7 +974,7 @@ def time_elapsed():
     return elapsed_minutes
 
 
-def update_jobs_dictionary(engine, server, jobs):
+def update_jobs_dictionary(engine, tracker, jobs):
     """
     This function checks each job in the dictionary and updates its status or
     removes it if the job is complete.
@@ -897,12 +984,16 @@ def update_jobs_dictionary(engine, server, jobs):
     # from the jobs report.
     i = 0
     # get all the jobs, then inspect them
-    for j in jobs.keys():
-        job_obj = job.get(server, jobs[j])
-        print_debug(engine["hostname"] + ": " + str(job_obj))
-        print_info(engine["hostname"] + ": " + j.name + ": " + job_obj.job_state)
+    for j in list(jobs.keys()):
+        job_state = tracker.track(jobs[j])
+        print_info(
+            engine["hostname"] + ": " + j.name + ": " + job_state,
+            engine=engine["hostname"],
+            job=jobs[j],
+            operation="refresh",
+        )
 
-        if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+        if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
             # If the job is in a non-running state, remove it from the running
             # jobs list.
             del jobs[j]
@@ -921,10 +1012,18 @@ def main(argv):
     global database_name
     global config_file_path
     global dxtools_objects
+    global scheduler
+    global trace
+    global metrics
 
     try:
         # Declare globals that will be used throughout the script.
-        logging_est(arguments["--logdir"])
+        logging_est(
+            arguments["--logdir"],
+            arguments["--debug"],
+            arguments["--log_json"],
+            queued=True,
+        )
         print_debug(arguments)
         time_start = time()
         engine = None
@@ -934,13 +1033,27 @@ def main(argv):
         config_file_path = arguments["--config"]
         # Parse the dxtools.conf and put it into a dictionary
         dxtools_objects = get_config(config_file_path)
+        # Records the engine requests if --trace or --trace_file was given
+        trace = start_trace(arguments)
+        # Exports job and request metrics if --metrics_file or
+        # --metrics_port was given
+        metrics = start_metrics(arguments)
+        # Limits shared by the main_workflow threads of every engine
+        scheduler = DxScheduler(
+            arguments["--parallel_total"],
+            arguments["--parallel"],
+            arguments["--parallel_host"],
+        )
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(engine)
+        exit_code = run_job(engine)
+        scheduler.report()
 
         elapsed_minutes = time_elapsed()
         print_info("script took " + str(elapsed_minutes) + " minutes to get this far.")
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
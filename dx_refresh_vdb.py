@@ -13,8 +13,10 @@ Usage:
                    [--timestamp_type <type>]
                    [--timestamp <timepoint_semantic> --timeflow <timeflow>]
                    [-d <identifier> | --engine <identifier> | --all]
-                   [--debug] [--parallel <n>] [--poll <n>]
+                   [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
+                   [--metrics_file <path>] [--metrics_port <port>]
+                   [--trace] [--trace_file <path>] [--log_json]
   dx_refresh_vdb.py -h | --help | -v | --version
 Refresh a Delphix VDB
 Examples:
@@ -48,12 +50,23 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
                             [default: ./dxtools.conf]
   --logdir <path_to_file>   The path to the logfile you want to use.
                             [default: ./dx_refresh_db.log]
+  --trace                   Print a latency histogram of the requests made
+                            to each engine, per endpoint, at exit
+  --trace_file <path>       Also append the requests to this file as
+                            OpenTelemetry spans (OTLP JSON)
+  --log_json                Write the logfile as JSON, one record per line
+  --metrics_file <path>     Write job and request metrics to this file at
+                            exit, for the node_exporter textfile collector
+  --metrics_port <port>     Serve job and request metrics on this port, at
+                            /metrics, while the script runs
   -h --help                 Show this screen.
   -v --version              Show version.
 """
@@ -62,7 +75,6 @@ from __future__ import print_function
 import sys
 import traceback
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -73,7 +85,6 @@ from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
 from delphixpy.v1_8_0.web import environment
 from delphixpy.v1_8_0.web import group
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web import source
 from delphixpy.v1_8_0.web import timeflow
 from delphixpy.v1_8_0.web.snapshot import snapshot
@@ -83,16 +94,21 @@ from delphixpy.v1_8_0.web.vo import TimeflowPointLocation
 from delphixpy.v1_8_0.web.vo import TimeflowPointSemantic
 from delphixpy.v1_8_0.web.vo import TimeflowPointTimestamp
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxMetrics import start_metrics
 from lib.DxTimeflow import DxTimeflow
+from lib.DxTrace import start_trace
 from lib.GetReferences import find_obj_by_name
 from lib.GetReferences import find_source_by_dbname
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.3.004"
+VERSION = "v.0.3.009"
 
 
 def refresh_database(vdb_name, timestamp, timestamp_type="SNAPSHOT"):
@@ -195,9 +211,8 @@ def refresh_database(vdb_name, timestamp, timestamp_type="SNAPSHOT"):
                     container_obj.reference,
                     refresh_params,
                 )
-                dx_session_obj.jobs[
-                    dx_session_obj.server_session.address
-                ] = dx_session_obj.server_session.last_job
+                invalidate_cache(dx_session_obj.server_session, database)
+                dx_session_obj.add_job("refresh", container_obj.name)
 
             except RequestError as e:
                 print(
@@ -216,44 +231,11 @@ def refresh_database(vdb_name, timestamp, timestamp_type="SNAPSHOT"):
             )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -274,7 +256,7 @@ def main_workflow(engine):
 
     thingstodo = ["thingtodo"]
     with dx_session_obj.job_mode(single_thread):
-        while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+        while dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
             if len(thingstodo) > 0:
                 refresh_database(
                     arguments["--vdb"],
@@ -285,26 +267,29 @@ def main_workflow(engine):
 
             # get all the jobs, then inspect them
             i = 0
-            for j in dx_session_obj.jobs.keys():
-                job_obj = job.get(dx_session_obj.server_session, dx_session_obj.jobs[j])
-                print_debug(job_obj)
+            for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                job_state = dx_session_obj.job_tracker().track(j)
                 print_info(
-                    "{}: Operations: {}".format(engine["hostname"], job_obj.job_state)
+                    "{}: Operations: {}".format(engine["hostname"], job_state),
+                    engine=engine["hostname"],
+                    job=j,
+                    operation="refresh",
                 )
-                if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                     # If the job is in a non-running state, remove it from the
                     # running jobs list.
-                    del dx_session_obj.jobs[j]
-                elif job_obj.job_state in "RUNNING":
+                    dx_session_obj.jobs.remove(engine["hostname"], j)
+                elif job_state in "RUNNING":
                     # If the job is in a running state, increment the running
                     # job count.
                     i += 1
 
                 print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
 
-            # If we have running jobs, pause before repeating the checks.
-            if len(dx_session_obj.jobs) > 0:
-                sleep(float(arguments["--poll"]))
+            # If we have running jobs, wait for one to finish (at most --poll
+            # seconds) before repeating the checks.
+            if dx_session_obj.jobs.count(engine["hostname"]) > 0:
+                dx_session_obj.job_tracker().wait_any(float(arguments["--poll"]))
 
 
 def run_job():
@@ -312,8 +297,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -324,8 +309,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -369,14 +354,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -402,8 +384,15 @@ def main(arguments):
         debug = True
 
     try:
-        dx_session_obj = GetSession()
-        logging_est(arguments["--logdir"])
+        dx_session_obj = GetSession(
+            trace=start_trace(arguments), metrics=start_metrics(arguments)
+        )
+        logging_est(
+            arguments["--logdir"],
+            arguments["--debug"],
+            arguments["--log_json"],
+            queued=True,
+        )
         print_debug(arguments)
         time_start = time()
         engine = None
@@ -414,10 +403,12 @@ def main(arguments):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         # elapsed_minutes = time_elapsed()
         print_info("script took {:.2f} minutes to get this far.".format(time_elapsed()))
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
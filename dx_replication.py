@@ -13,9 +13,9 @@ Usage:
   dx_replication.py --rep_name <name> --target_host <target> --target_user <name> --target_pw <password> --rep_objs <objects> [--schedule <name> --bandwidth <MBs> --num_cons <connections> --enabled]
   dx_replication.py --delete <rep_name>
   dx_replication.py --execute <rep_name>
-  dx_replication.py --list
+  dx_replication.py --list [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>]
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   
   dx_replication.py -h | --help | -v | --version
@@ -27,6 +27,7 @@ dx_replication.py --rep_name mytest --target_host 172.16.169.141 --target_user d
 dx_replication.py --rep_name mytest --target_host 172.16.169.141 --target_user delphix_admin --target_pw delphix --rep_objs mytest1 --schedule '0 40 20 */4 * ?' --bandwidth 5 --num_cons 2 --enabled
 
 dx_replication.py --delete mytest
+dx_replication.py --list --cached
 
 Options:
   --rep_name <name>         Name of the replication job.
@@ -40,11 +41,20 @@ Options:
   --bandwidth <MBs>         Limit bandwidth to MB/s.
   --num_cons <connections>  Number of network connections for the replication job.
   --list                    List all of the replication jobs.
+  --cached                  Answer the listing from the local cache if it is
+                            younger than --max_age
+  --max_age <seconds>       Oldest cached listing --cached accepts
+                            [default: 300]
+  --refresh_cache           List from the engine and update the local cache
+  --cache_file <path>       The SQLite file of the listing cache
+                            [default: ./dx_query_cache.db]
   --execute <rep_name>      Name of the replication job to execute.
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -72,15 +82,18 @@ from delphixpy.v1_8_0.web.replication import spec
 from delphixpy.v1_8_0.web.vo import ReplicationList
 from delphixpy.v1_8_0.web.vo import ReplicationSpec
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxQueryCache import cached_rows
 from lib.GetReferences import find_obj_by_name
 from lib.GetReferences import find_obj_specs
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.002"
+VERSION = "v.0.0.005"
 
 
 def create_replication_job():
@@ -112,10 +125,7 @@ def create_replication_job():
         )
 
         ref = spec.create(dx_session_obj.server_session, rep_spec)
-        if dx_session_obj.server_session.last_job:
-            dx_session_obj.jobs[
-                dx_session_obj.server_session.address
-            ] = dx_session_obj.server_session.last_job
+        dx_session_obj.add_job("create", arguments["--rep_name"])
         print_info(
             "Successfully created {} with reference "
             "{}\n".format(arguments["--rep_name"], ref)
@@ -141,10 +151,7 @@ def delete_replication_job():
                 dx_session_obj.server_session, spec, arguments["--delete"]
             ).reference,
         )
-        if dx_session_obj.server_session.last_job:
-            dx_session_obj.jobs[
-                dx_session_obj.server_session.address
-            ] = dx_session_obj.server_session.last_job
+        dx_session_obj.add_job("delete", arguments["--delete"])
         print_info("Successfully deleted {}.\n".format(arguments["--delete"]))
 
     except (HttpError, RequestError, DlpxException) as e:
@@ -153,29 +160,38 @@ def delete_replication_job():
         )
 
 
-def list_replication_jobs():
+def list_replication_jobs(engine_name):
     """
     List the replication jobs on a given engine
+
+    engine_name: Name of the engine, I.E. engine["hostname"]
     """
-    obj_names_lst = []
 
-    for rep_job in spec.get_all(dx_session_obj.server_session):
-        for obj_spec_ref in rep_job.object_specification.objects:
-            obj_names_lst.append(
-                database.get(dx_session_obj.server_session, obj_spec_ref).name
+    def fetch():
+        rows = []
+        obj_names_lst = []
+        for rep_job in spec.get_all(dx_session_obj.server_session):
+            for obj_spec_ref in rep_job.object_specification.objects:
+                obj_names_lst.append(
+                    database.get(dx_session_obj.server_session, obj_spec_ref).name
+                )
+            rows.append(
+                [
+                    rep_job.name,
+                    ", ".join(obj_names_lst),
+                    rep_job.enabled,
+                    rep_job.encrypted,
+                    rep_job.reference,
+                    rep_job.schedule,
+                    rep_job.target_host,
+                ]
             )
+        return rows
 
+    for row in cached_rows(arguments, engine_name, "replication_specs", fetch):
         print(
             "Name: {}\nReplicated Objects: {}\nEnabled: {}\nEncrypted: {}\n"
-            "Reference: {}\nSchedule: {}\nTarget Host: {}\n\n".format(
-                rep_job.name,
-                ", ".join(obj_names_lst),
-                rep_job.enabled,
-                rep_job.encrypted,
-                rep_job.reference,
-                rep_job.schedule,
-                rep_job.target_host,
-            )
+            "Reference: {}\nSchedule: {}\nTarget Host: {}\n\n".format(*row)
         )
 
 
@@ -189,53 +205,17 @@ def execute_replication_job(obj_name):
             dx_session_obj.server_session,
             find_obj_by_name(dx_session_obj.server_session, spec, obj_name).reference,
         )
-        if dx_session_obj.server_session.last_job:
-            dx_session_obj.jobs[
-                dx_session_obj.server_session.address
-            ] = dx_session_obj.server_session.last_job
+        dx_session_obj.add_job("execute", obj_name)
         print_info("Successfully executed {}.\n".format(obj_name))
     except (HttpError, RequestError, DlpxException, JobError) as e:
         print_exception("Could not execute job {}:\n{}".format(obj_name, e))
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -253,26 +233,32 @@ def main_workflow(engine):
         )
         sys.exit(1)
 
+    if arguments["--list"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_replication_jobs(engine["hostname"])
+        return
+
     thingstodo = ["thingtodo"]
     try:
         with dx_session_obj.job_mode(single_thread):
-            while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+            while (
+                dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0
+            ):
                 if len(thingstodo) > 0:
                     if arguments["--rep_name"]:
                         create_replication_job()
                     elif arguments["--delete"]:
                         delete_replication_job()
                     elif arguments["--list"]:
-                        list_replication_jobs()
+                        list_replication_jobs(engine["hostname"])
                     elif arguments["--execute"]:
                         execute_replication_job(arguments["--execute"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dx_session_obj.jobs.keys():
-                    job_obj = job.get(
-                        dx_session_obj.server_session, dx_session_obj.jobs[j]
-                    )
+                for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dx_session_obj.server_session, j)
                     print_debug(job_obj)
                     print_info(
                         "{}: Replication operations: {}".format(
@@ -283,7 +269,7 @@ def main_workflow(engine):
                         # If the job is in a non-running state, remove it
                         # from the
                         # running jobs list.
-                        del dx_session_obj.jobs[j]
+                        dx_session_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -291,7 +277,7 @@ def main_workflow(engine):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dx_session_obj.jobs) > 0:
+                    if dx_session_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
 
     except (HttpError, RequestError, JobError, DlpxException) as e:
@@ -305,8 +291,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -317,8 +303,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -361,14 +347,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -403,12 +386,14 @@ def main(arguments):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -9,10 +9,11 @@
 
 """Rewinds a vdb
 Usage:
-  dx_rewind_vdb.py (--vdb <name> [--timestamp_type <type>] [--timestamp <timepoint_semantic>])
+  dx_rewind_vdb.py (--vdb <name> | --vdbs <names> | --group <name> | --all_vdbs)
+                   [--timestamp_type <type>] [--timestamp <timepoint_semantic>]
                    [--bookmark <type>] 
                    [ --engine <identifier> --all]
-                   [--debug] [--parallel <n>] [--poll <n>]
+                   [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
   dx_rewind_vdb.py -h | --help | -v | --version
 
@@ -22,10 +23,15 @@ Examples:
       dx_rewind_vdb.py --vdb testVdbUF
     Rollback using a specific timestamp:
       dx_rewind_vdb.py --vdb testVdbUF --timestamp_type snapshot --timestamp 2016-11-15T11:30:17.857Z
+    Rollback every VDB of a group, 20 at a time:
+      dx_rewind_vdb.py --group Test --timestamp 2016-11-15T11:30 --parallel 20
   
 
 Options:
   --vdb <name>              Name of VDB to rewind
+  --vdbs <names>            Comma separated names of the VDBs to rewind
+  --group <name>            Rewind every VDB of this group
+  --all_vdbs                Rewind every VDB of the engine
   --type <database_type>    Type of database: oracle, mssql, ase, vfiles
   --timestamp_type <type>   The type of timestamp being used for the reqwind.
                             Acceptable Values: TIME, SNAPSHOT
@@ -42,7 +48,10 @@ Options:
                             [default: LATEST]
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --debug                   Enable debug logging
-  --parallel <n>            Limit number of jobs to maxjob
+  --parallel <n>            Limit number of rewind jobs running at the same
+                            time on each engine
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -53,13 +62,13 @@ Options:
   -v --version              Show version.
 """
 
-VERSION = "v.0.2.016"
+VERSION = "v.0.2.021"
 
 
 import sys
 import traceback
+from collections import OrderedDict
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -68,134 +77,227 @@ from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
-from delphixpy.v1_8_0.web import job
+from delphixpy.v1_8_0.web import group
+from delphixpy.v1_8_0.web import source
 from delphixpy.v1_8_0.web.vo import OracleRollbackParameters
 from delphixpy.v1_8_0.web.vo import RollbackParameters
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxJobTracker import JOB_DONE_STATES
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
 from lib.DxTimeflow import DxTimeflow
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
 
-def rewind_database(dlpx_obj, vdb_name, timestamp, timestamp_type="SNAPSHOT"):
+def find_vdbs(dlpx_obj, engine_name):
     """
-    This function performs the rewind (rollback)
+    Return the result rows of the VDBs selected by --vdb, --vdbs, --group or
+    --all_vdbs, in the order they are rewound. The databases and their
+    sources come from one listing each. Names that are not found, or are not
+    VDBs, get a row that is already SKIPPED.
 
     dlpx_obj: Virtualization Engine session object
-    vdb_name: VDB to be rewound
-    timestamp: Point in time to rewind the VDB
-    timestamp_type: The type of timestamp being used for the rewind
+    engine_name: Name of the engine, I.E. engine["hostname"]
     """
+    database_index = get_object_index(dlpx_obj.server_session, database)
+    source_index = get_object_index(dlpx_obj.server_session, source)
+
+    def is_vdb(container_obj):
+        return any(
+            getattr(source_obj, "virtual", False)
+            and not getattr(source_obj, "staging", False)
+            for source_obj in source_index.find_by_container(container_obj.reference)
+        )
 
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
-    dx_timeflow_obj = DxTimeflow(dlpx_obj.server_session)
-    container_obj = find_obj_by_name(dlpx_obj.server_session, database, vdb_name)
-    # Sanity check to make sure our container object has a reference
-    if container_obj.reference:
-        try:
-            if container_obj.virtual is not True:
-                raise DlpxException(
-                    "{} in engine {} is not a virtual object. "
-                    "Skipping.\n".format(container_obj.name, engine_name)
-                )
-            elif container_obj.staging is True:
-                raise DlpxException(
-                    "{} in engine {} is a virtual object. "
-                    "Skipping.\n".format(container_obj.name, engine_name)
-                )
-            elif container_obj.runtime.enabled == "ENABLED":
-                print_info(
-                    "\nINFO: {} Rewinding {} to {}\n".format(
-                        engine_name, container_obj.name, timestamp
-                    )
+    def new_row(vdb_name, container_obj=None, state=None, error=None):
+        return {
+            "engine": engine_name,
+            "vdb": vdb_name,
+            "container": container_obj,
+            "state": state,
+            "job": None,
+            "seconds": None,
+            "error": error,
+        }
+
+    if arguments["--vdb"] or arguments["--vdbs"]:
+        rows = []
+        for vdb_name in (arguments["--vdb"] or arguments["--vdbs"]).split(","):
+            vdb_name = vdb_name.strip()
+            container_obj = database_index.find_by_name(vdb_name)
+            if container_obj is None:
+                rows.append(new_row(vdb_name, state="SKIPPED", error="not found"))
+            elif not is_vdb(container_obj):
+                rows.append(
+                    new_row(vdb_name, state="SKIPPED", error="not a virtual database")
                 )
+            else:
+                rows.append(new_row(vdb_name, container_obj))
+        return rows
+
+    if arguments["--group"]:
+        group_ref = find_obj_by_name(
+            dlpx_obj.server_session, group, arguments["--group"]
+        ).reference
+        container_objs = database_index.find_by_group(group_ref)
+    else:
+        container_objs = database_index.objs
+    return [
+        new_row(container_obj.name, container_obj)
+        for container_obj in container_objs
+        if is_vdb(container_obj)
+    ]
 
-        # This exception is raised if rewinding a vFiles VDB
-        # since AppDataContainer does not have virtual, staging or
-        # enabled attributes.
-        except AttributeError:
-            pass
 
-        print_debug("{}: Type: {}".format(engine_name, container_obj.type))
+def rewind_database(
+    dlpx_obj, container_obj, timestamp, timestamp_type="SNAPSHOT", dx_timeflow_obj=None
+):
+    """
+    This function submits the rewind (rollback) of a VDB, and returns the
+    DxJob registered for it
 
-        # If the vdb is a Oracle type, we need to use a OracleRollbackParameters
-        if str(container_obj.reference).startswith("ORACLE"):
-            rewind_params = OracleRollbackParameters()
-        else:
-            rewind_params = RollbackParameters()
-        rewind_params.timeflow_point_parameters = dx_timeflow_obj.set_timeflow_point(
-            container_obj, timestamp_type, timestamp
-        )
-        print_debug("{}: {}".format(engine_name, str(rewind_params)))
+    dlpx_obj: Virtualization Engine session object
+    container_obj: The database object of the VDB to be rewound
+    timestamp: Point in time to rewind the VDB
+    timestamp_type: The type of timestamp being used for the rewind
+    dx_timeflow_obj: DxTimeflow of the session, I.E. with prefetched
+                     snapshots. Default: a new DxTimeflow
+    """
+
+    engine_name = dlpx_obj.engine_name(dlpx_obj.server_session.address)
+    if dx_timeflow_obj is None:
+        dx_timeflow_obj = DxTimeflow(dlpx_obj.server_session)
+    print_info(
+        "{}: Rewinding {} to {}".format(engine_name, container_obj.name, timestamp)
+    )
+    print_debug("{}: Type: {}".format(engine_name, container_obj.type))
+
+    # If the vdb is a Oracle type, we need to use a OracleRollbackParameters
+    if str(container_obj.reference).startswith("ORACLE"):
+        rewind_params = OracleRollbackParameters()
+    else:
+        rewind_params = RollbackParameters()
+    rewind_params.timeflow_point_parameters = dx_timeflow_obj.set_timeflow_point(
+        container_obj, timestamp_type, timestamp
+    )
+    print_debug("{}: {}".format(engine_name, str(rewind_params)))
+    # Rewind the VDB
+    database.rollback(dlpx_obj.server_session, container_obj.reference, rewind_params)
+    invalidate_cache(dlpx_obj.server_session, database)
+    return dlpx_obj.add_job("rewind", container_obj.name)
+
+
+def rewind_vdbs(dlpx_obj, engine_name, rows):
+    """
+    Submit the rewinds of the VDBs of rows, keeping at most --parallel of
+    them running, and wait for all of them. Fills in the state, job and
+    seconds of each row.
+
+    dlpx_obj: Virtualization Engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    rows: Result rows returned by find_vdbs()
+    """
+    parallel = int(arguments["--parallel"] or 0)
+    tracker = dlpx_obj.job_tracker()
+    dx_timeflow_obj = DxTimeflow(dlpx_obj.server_session)
+    timestamp = arguments["--timestamp"]
+    pending = sum(1 for row in rows if row["state"] is None)
+    if (
+        pending > 1
+        and arguments["--timestamp_type"].upper() == "SNAPSHOT"
+        and timestamp.upper() != "LATEST"
+    ):
+        # One snapshot listing for every VDB, instead of one per VDB. A
+        # single VDB only lists its own snapshots.
+        dx_timeflow_obj.prefetch_snapshots()
+    rows_by_job = {}
+
+    def wait_for(limit):
+        # Collect finished rewinds until at most limit are still running
+        while True:
+            for job_ref in dlpx_obj.jobs.pending(engine_name):
+                state = tracker.state(job_ref)
+                if state in JOB_DONE_STATES:
+                    entry = dlpx_obj.jobs.get(engine_name, job_ref)
+                    dlpx_obj.jobs.remove(engine_name, job_ref)
+                    # Followed here, so job_mode() does not wait for it again
+                    dlpx_obj.server_session.clear_registered_job(job_ref)
+                    row = rows_by_job[job_ref]
+                    row["state"] = state
+                    row["seconds"] = round(time() - entry.submitted_at, 1)
+            running = dlpx_obj.jobs.count(engine_name)
+            if running <= limit:
+                return
+            print_info("{}: {:d} jobs running.".format(engine_name, running))
+            tracker.wait_any(float(arguments["--poll"]))
+
+    for row in rows:
+        if row["state"] is not None:
+            continue
+        if parallel:
+            wait_for(parallel - 1)
         try:
-            # Rewind the VDB
-            database.rollback(
-                dlpx_obj.server_session, container_obj.reference, rewind_params
+            entry = rewind_database(
+                dlpx_obj,
+                row["container"],
+                timestamp,
+                arguments["--timestamp_type"],
+                dx_timeflow_obj,
             )
-            dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
-            print_info("VDB {} was rolled back.".format(container_obj.name))
-        except (RequestError, HttpError, JobError) as e:
+        except (DlpxException, RequestError, HttpError, JobError) as e:
             print_exception(
                 "ERROR: {} encountered an error on {}"
-                " during the rewind process:\n{}".format(
-                    engine_name, container_obj.name, e
-                )
-            )
-    # Don't do anything if the database is disabled
-    else:
-        print_info(
-            "{}: {} is not enabled. Skipping sync.".format(
-                engine_name, container_obj.name
+                " during the rewind process:\n{}".format(engine_name, row["vdb"], e)
             )
-        )
-
-
-def run_async(func):
+            row["state"] = "ERROR"
+            row["error"] = str(e).strip()
+            continue
+        if entry is None:
+            # The rewind finished without a job
+            row["state"] = "COMPLETED"
+            continue
+        row["job"] = entry.reference
+        rows_by_job[entry.reference] = row
+        tracker.track(entry.reference)
+    wait_for(0)
+    return rows
+
+
+def print_rewind_rows(rows):
     """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
+    Print the result of the rewind of every VDB
 
-    return async_func
+    rows: Result rows returned by rewind_vdbs()
+    """
+    print("Engine, VDB, State, Job, Seconds, Error")
+    for row in rows:
+        print(
+            "{}, {}, {}, {}, {}, {}".format(
+                row["engine"],
+                row["vdb"],
+                row["state"],
+                row["job"] or "",
+                "" if row["seconds"] is None else row["seconds"],
+                row["error"] or "",
+            )
+        )
+    rewound = sum(1 for row in rows if row["state"] == "COMPLETED")
+    print_info("{} of {} VDBs were rewound.".format(rewound, len(rows)))
 
 
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously.
+    Returns the result rows of the VDBs of the engine.
 
     :param engine: Dictionary of engines
     :type engine: dictionary
@@ -211,48 +313,27 @@ def main_workflow(engine, dlpx_obj):
     except DlpxException as e:
         print_exception(
             "ERROR: Engine {} encountered an error while"
-            "rewinding {}:\n{}\n".format(engine["hostname"], arguments["--target"], e)
+            "rewinding:\n{}\n".format(engine["hostname"], e)
         )
+        sys.exit(1)
 
-    thingstodo = ["thingtodo"]
+    # The rows are kept outside of job_mode(), so a failed rewind does not
+    # lose the results of the other VDBs of the engine
+    rows = []
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
-                if len(thingstodo) > 0:
-                    rewind_database(
-                        dlpx_obj,
-                        arguments["--vdb"],
-                        arguments["--timestamp"],
-                        arguments["--timestamp_type"],
-                    )
-                    thingstodo.pop()
-
-                # get all the jobs, then inspect them
-                i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
-                    print_info(
-                        "{}: Refresh of {}: {}".format(
-                            engine["hostname"], arguments["--vdb"], job_obj.job_state
-                        )
-                    )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
-                        # If the job is in a non-running state, remove it
-                        # from the running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
-                        # If the job is in a running state, increment the
-                        # running job count.
-                        i += 1
-                    print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+            rows = find_vdbs(dlpx_obj, engine["hostname"])
+            print_info("{}: Rewinding {:d} VDBs.".format(engine["hostname"], len(rows)))
+            rewind_vdbs(dlpx_obj, engine["hostname"], rows)
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception("Error in dx_rewind_vdb: {}\n{}".format(engine["hostname"], e))
-        sys.exit(1)
+        if not rows:
+            sys.exit(1)
+        for row in rows:
+            if row["state"] not in JOB_DONE_STATES + ["SKIPPED", "ERROR"]:
+                row["state"] = "ERROR"
+                row["error"] = row["error"] or str(e).strip()
+    return rows
 
 
 def time_elapsed(time_start):
@@ -276,8 +357,8 @@ def run_job(dlpx_obj, config_file_path):
     :type config_file_path: str
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -287,8 +368,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
             sys.exit(1)
@@ -329,13 +410,19 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
+
+    # Wait for every engine to finish and pass back the worst exit code
+    exit_code = executor.wait()
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Merge the results of every engine, in dxtools.conf order
+    rows = []
+    for engine_name in executor.futures:
+        rows.extend(executor.result(engine_name) or [])
+    print_rewind_rows(rows)
+    if any(row["state"] != "COMPLETED" for row in rows):
+        exit_code = max(exit_code, 1)
+    return exit_code
 
 
 def main():
@@ -356,12 +443,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed(time_start)
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -13,7 +13,7 @@
 Usage:
   dx_skel.py ()
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_skel.py -h | --help | -v | --version
 Description
@@ -26,6 +26,8 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -49,6 +51,8 @@ from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import job
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
@@ -56,47 +60,14 @@ from lib.DxLogging import print_info
 from lib.GetReferences import find_obj_by_name
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.001"
+VERSION = "v.0.0.003"
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -122,7 +93,9 @@ def main_workflow(engine):
     thingstodo = ["thingtodo"]
     try:
         with dx_session_obj.job_mode(single_thread):
-            while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+            while (
+                dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0
+            ):
                 if len(thingstodo) > 0:
                     if OPERATION:
                         method_call
@@ -132,10 +105,8 @@ def main_workflow(engine):
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dx_session_obj.jobs.keys():
-                    job_obj = job.get(
-                        dx_session_obj.server_session, dx_session_obj.jobs[j]
-                    )
+                for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dx_session_obj.server_session, j)
                     print_debug(job_obj)
                     print_info(
                         "{}: Replication operations: {}".format(
@@ -146,7 +117,7 @@ def main_workflow(engine):
                         # If the job is in a non-running state, remove it
                         # from the
                         # running jobs list.
-                        del dx_session_obj.jobs[j]
+                        dx_session_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -154,7 +125,7 @@ def main_workflow(engine):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dx_session_obj.jobs) > 0:
+                    if dx_session_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
 
     except (HttpError, RequestError, JobError, DlpxException) as e:
@@ -168,8 +139,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -180,8 +151,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -226,14 +197,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -270,12 +238,14 @@ def main(arguments):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except DlpxException as e:
@@ -13,14 +13,18 @@
 Usage:
   dx_snapshot_db.py (--group <name> [--name <name>] | --all_dbs )
                   [--engine <identifier> | --all]
-                  [--usebackup] [--bck_file <name>] [--debug] [--parallel <n>]
+                  [--usebackup] [--bck_file <name>] [--debug] [--parallel <n>] [--max_engines <n>]
+                  [--parallel_host <n>] [--parallel_total <n>]
                   [--poll <n>][--create_bckup]
                   [--config <path_to_file>] [--logdir <path_to_file>]
+                  [--metrics_file <path>] [--metrics_port <port>]
   dx_snapshot_db.py (--host <name> [--group <name>] [--object_type <type>]
                   | --object_type <name> [--group <name>] [--host <type>] )
                   [-d <identifier> | --engine <identifier> | --all]
-                  [--usebackup] [--debug] [--parallel <n>] [--poll <n>]
+                  [--usebackup] [--debug] [--parallel <n>] [--max_engines <n>]
+                  [--parallel_host <n>] [--parallel_total <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
+                  [--metrics_file <path>] [--metrics_port <port>]
   dx_snapshot_db.py -h | --help | -v | --version
 
 Snapshot a Delphix dSource or VDB
@@ -49,12 +53,21 @@ Options:
   --create_bckup            Create and ingest a new Sybase backup
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
+  --parallel_host <n>       Limit number of jobs against one source host,
+                            across all engines
+  --parallel_total <n>      Limit number of jobs across all engines
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
                             [default: ./dxtools.conf]
   --logdir <path_to_file>    The path to the logfile you want to use.
                             [default: ./dx_snapshot_db.log]
+  --metrics_file <path>     Write job and request metrics to this file at
+                            exit, for the node_exporter textfile collector
+  --metrics_port <port>     Serve job and request metrics on this port, at
+                            /metrics, while the script runs
   -h --help                 Show this screen.
   -v --version              Show version.
 
@@ -69,7 +82,6 @@ import time
 import traceback
 from multiprocessing import Process
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -88,8 +100,16 @@ from delphixpy.v1_6_0.web.vo import ASELatestBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import ASENewBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import ASESpecificBackupSyncParameters
 from delphixpy.v1_6_0.web.vo import MSSqlSyncParameters
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
+from lib.DxJobTracker import DxJobTracker
+from lib.DxMetrics import start_metrics
+from lib.DxObjectIndex import DxObjectIndex
+from lib.DxScheduler import DxScheduler
+from lib.DxScheduler import source_hosts
+from lib.DxSessionPool import get_session
 
-VERSION = "v.0.0.100"
+VERSION = "v.0.0.103"
 
 
 def ase_latest_backup_sync_parameters():
@@ -147,9 +167,11 @@ def find_database_by_name_and_group_name(engine, server, group_name, database_na
     print_info('Unable to find "' + database_name + '" in ' + group_name)
 
 
-def find_source_by_database(engine, server, database_obj):
+def find_source_by_database(engine, source_index, database_obj):
     # The source tells us if the database is enabled/disables, virtual, vdb/dSource, or is a staging database.
-    source_obj = source.get_all(server, database=database_obj.reference)
+    # source_index is built once per engine, so this is a dictionary lookup
+    # rather than a source.get_all() call per database.
+    source_obj = source_index.find_by_container(database_obj.reference)
     # We'll just do a little sanity check here to ensure we only have a 1:1 result.
     if len(source_obj) == 0:
         print_error(
@@ -307,8 +329,9 @@ def serversess(f_engine_address, f_engine_username, f_engine_password):
     """
     Function to setup the session with the Delphix Engine
     """
-    server_session = DelphixEngine(
-        f_engine_address, f_engine_username, f_engine_password, "DOMAIN"
+    # Sessions come from a pool so a thread reuses its login
+    server_session = get_session(
+        DelphixEngine, f_engine_address, f_engine_username, f_engine_password
     )
     return server_session
 
@@ -320,47 +343,11 @@ def set_exit_handler(func):
     signal.signal(signal.SIGTERM, func)
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function is where the main workflow resides.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
     """
 
     # Pull out the values from the dictionary for this engine
@@ -375,6 +362,8 @@ def main_workflow(engine):
 
     # Setup the connection to the Delphix Engine
     server = serversess(engine_address, engine_username, engine_password)
+    if metrics is not None:
+        metrics.instrument(server, engine["hostname"])
 
     # If an environment/server was specified
     if host_name:
@@ -393,12 +382,14 @@ def main_workflow(engine):
             # If we are only filtering by the server, then put those objects in the main list for processing
             if not (arguments["--group"] and database_name):
                 source_objs = env_source_objs
-                all_dbs = database.get_all(server, no_js_container_data_source=False)
+                all_dbs = DxObjectIndex(
+                    database.get_all(server, no_js_container_data_source=False)
+                )
                 databases = []
                 for source_obj in source_objs:
                     if source_obj.staging == False and source_obj.virtual == True:
-                        database_obj = database.get(server, source_obj.container)
-                        if database_obj in all_dbs:
+                        database_obj = all_dbs.find_by_reference(source_obj.container)
+                        if database_obj is not None:
                             databases.append(database_obj)
         else:
             print_error(
@@ -434,83 +425,115 @@ def main_workflow(engine):
     if not databases or len(databases) == 0:
         print_error("No databases found with the criterion specified")
         return
+    # Fetch every source once and index it by container
+    source_index = DxObjectIndex(source.get_all(server))
+    if environment_obj != None:
+        env_source_refs = set(
+            env_source_obj.reference for env_source_obj in env_source_objs
+        )
+    # Follow job completion through the engine's notification channel
+    tracker = DxJobTracker(server, engine_name=engine["hostname"])
+    # Queue the databases with the scheduler shared by all engines
+    hosts = {}
+    if scheduler.host_limit is not None:
+        hosts = source_hosts(server)
+    for database_obj in reversed(databases):
+        scheduler.enqueue(
+            engine["hostname"],
+            "snapshot",
+            database_obj,
+            hosts.get(database_obj.reference),
+        )
+    slots = {}
     # reset the running job count before we begin
     i = 0
-    with job_mode(server):
-        # While there are still running jobs or databases still to process....
-        while len(jobs) > 0 or len(databases) > 0:
-            # While there are databases still to process and we are still under
-            # the max simultaneous jobs threshold (if specified)
-            while len(databases) > 0 and (
-                arguments["--parallel"] == None or i < int(arguments["--parallel"])
-            ):
-                # Give us the next database in the list, and remove it from the list
-                database_obj = databases.pop()
-                # Get the source of the database.
-                # The source tells us if the database is enabled/disables, virtual, vdb/dSource, or is a staging database.
-                source_obj = find_source_by_database(engine, server, database_obj)
-                # If we applied the environment/server filter AND group filter, find the intersecting matches
-                if environment_obj != None and (arguments["--group"]):
-                    match = False
-                    for env_source_obj in env_source_objs:
-                        if source_obj[0].reference in env_source_obj.reference:
-                            match = True
-                            break
-                    if match == False:
-                        print_error(
-                            engine["hostname"]
-                            + ": "
-                            + database_obj.name
-                            + " does not exist on "
-                            + host_name
-                            + ". Exiting"
-                        )
-                        return
-                # Snapshot the database
-                snapshot_job = snapshot_database(
-                    engine,
-                    server,
-                    jobs,
-                    source_obj[0],
-                    database_obj,
-                    arguments["--object_type"],
+    try:
+        with job_mode(server):
+            # While there are still running jobs or databases still to process....
+            while len(jobs) > 0 or scheduler.queued(engine["hostname"]) > 0:
+                # Start the databases the scheduler has a free slot for. It applies
+                # --parallel per engine, plus the per-host and global limits.
+                for item in scheduler.start_ready(engine["hostname"]):
+                    database_obj = item.target
+                    # Get the source of the database.
+                    # The source tells us if the database is enabled/disables, virtual, vdb/dSource, or is a staging database.
+                    source_obj = find_source_by_database(
+                        engine, source_index, database_obj
+                    )
+                    # If we applied the environment/server filter AND group filter, find the intersecting matches
+                    if environment_obj != None and (arguments["--group"]):
+                        if source_obj[0].reference not in env_source_refs:
+                            print_error(
+                                engine["hostname"]
+                                + ": "
+                                + database_obj.name
+                                + " does not exist on "
+                                + host_name
+                                + ". Exiting"
+                            )
+                            return
+                    # Snapshot the database
+                    snapshot_job = snapshot_database(
+                        engine,
+                        server,
+                        jobs,
+                        source_obj[0],
+                        database_obj,
+                        arguments["--object_type"],
+                    )
+                    # If snapshot_job has any value, then we know that a job was initiated.
+                    if snapshot_job:
+                        # hold the slot until the job finishes
+                        slots[database_obj] = item
+                        # increment the running job count
+                        i += 1
+                    else:
+                        scheduler.finish(item)
+                # Check to see if we are running at max parallel processes, and report if so.
+                if arguments["--parallel"] != None and i >= int(
+                    arguments["--parallel"]
+                ):
+                    print_info(
+                        engine["hostname"] + ": Max jobs reached (" + str(i) + ")"
+                    )
+                # reset the running jobs counter, as we are about to update the count from the jobs report.
+                i = update_jobs_dictionary(engine, tracker, jobs)
+                # Release the slots of the jobs that finished
+                for database_obj in [d for d in slots if d not in jobs]:
+                    scheduler.finish(slots.pop(database_obj))
+                print_info(
+                    engine["hostname"]
+                    + ": "
+                    + str(i)
+                    + " jobs running. "
+                    + str(scheduler.queued(engine["hostname"]))
+                    + " jobs waiting to run"
                 )
-                # If snapshot_job has any value, then we know that a job was initiated.
-                if snapshot_job:
-                    # increment the running job count
-                    i += 1
-            # Check to see if we are running at max parallel processes, and report if so.
-            if arguments["--parallel"] != None and i >= int(arguments["--parallel"]):
-                print_info(engine["hostname"] + ": Max jobs reached (" + str(i) + ")")
-            # reset the running jobs counter, as we are about to update the count from the jobs report.
-            i = update_jobs_dictionary(engine, server, jobs)
-            print_info(
-                engine["hostname"]
-                + ": "
-                + str(i)
-                + " jobs running. "
-                + str(len(databases))
-                + " jobs waiting to run"
-            )
-            # If we have running jobs, pause before repeating the checks.
-            if len(jobs) > 0:
-                sleep(float(arguments["--poll"]))
+                # If we have running jobs, wait for one to finish (at most --poll
+                # seconds) before repeating the checks.
+                if len(jobs) > 0:
+                    tracker.wait_any(float(arguments["--poll"]))
+                elif scheduler.queued(engine["hostname"]) > 0:
+                    # Our databases wait on limits held by other engines
+                    scheduler.wait(float(arguments["--poll"]))
+    finally:
+        scheduler.discard(engine["hostname"])
 
 
 def run_job(engine):
     """
     This function runs the main_workflow aynchronously against all the servers specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     # If the --all argument was given, run against every engine in dxtools.conf
     if arguments["--all"]:
         print_info("Executing against all Delphix Engines in the dxtools.conf")
         # For each server in the dxtools.conf...
         for delphix_engine in dxtools_objects:
             engine = dxtools_objects[delphix_engine]
-            # Create a new thread and add it to the list.
-            threads.append(main_workflow(engine))
+            # Queue main_workflow for this engine on the executor.
+            executor.submit(engine["hostname"], main_workflow, engine)
     else:
         # Else if the --engine argument was given, test to see if the engine exists in dxtools.conf
         if arguments["--engine"]:
@@ -554,12 +577,10 @@ def run_job(engine):
                 print_error("No default engine found. Exiting")
                 sys.exit(1)
         # run the job against the engine
-        threads.append(main_workflow(engine))
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def snapshot_database(engine, server, jobs, source_obj, container_obj, obj_type=None):
@@ -676,7 +697,7 @@ def time_elapsed():
     return elapsed_minutes
 
 
-def update_jobs_dictionary(engine, server, jobs):
+def update_jobs_dictionary(engine, tracker, jobs):
     """
     This function checks each job in the dictionary and updates its status or removes it if the job is complete.
     Return the number of jobs still running.
@@ -684,12 +705,11 @@ def update_jobs_dictionary(engine, server, jobs):
     # Establish the running jobs counter, as we are about to update the count from the jobs report.
     i = 0
     # get all the jobs, then inspect them
-    for j in jobs.keys():
-        job_obj = job.get(server, jobs[j])
-        print_debug(engine["hostname"] + ": " + str(job_obj))
-        print_info(engine["hostname"] + ": " + j.name + ": " + job_obj.job_state)
+    for j in list(jobs.keys()):
+        job_state = tracker.track(jobs[j])
+        print_info(engine["hostname"] + ": " + j.name + ": " + job_state)
 
-        if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+        if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
             # If the job is in a non-running state, remove it from the running jobs list.
             del jobs[j]
         else:
@@ -707,6 +727,8 @@ def main(argv):
     global database_name
     global config_file_path
     global dxtools_objects
+    global scheduler
+    global metrics
 
     try:
         # Declare globals that will be used throughout the script.
@@ -721,12 +743,24 @@ def main(argv):
         config_file_path = arguments["--config"]
         # Parse the dxtools.conf and put it into a dictionary
         dxtools_objects = get_config(config_file_path)
+        # Exports job and request metrics if --metrics_file or
+        # --metrics_port was given
+        metrics = start_metrics(arguments)
+        # Limits shared by the main_workflow threads of every engine
+        scheduler = DxScheduler(
+            arguments["--parallel_total"],
+            arguments["--parallel"],
+            arguments["--parallel_host"],
+        )
 
         # This is the function that will handle processing main_workflow for all the servers.
-        run_job(engine)
+        exit_code = run_job(engine)
+        scheduler.report()
 
         elapsed_minutes = time_elapsed()
         print_info("script took " + str(elapsed_minutes) + " minutes to get this far.")
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
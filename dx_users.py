@@ -13,15 +13,15 @@
 Usage:
   dx_users.py (--user_name <name> [(--add --password <password> --email <email_address> [--jsonly]) |--delete])
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_users.py --update --user_name <name> [ --password <password> ] [--email <email_address> ] [ --delete ] [--jsonly]
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]      
-  dx_users.py (--list)
+  dx_users.py (--list) [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>]
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   dx_users.py -h | --help | -v | --version
 Description
@@ -31,6 +31,7 @@ Examples:
     dx_users.py --debug --config delphixpy.v1_8_0-examples/dxtools_1.conf  --update --user_name dev --password not_delphix --email "test@somethingelse.com"
     dx_users.py --delete --user_name dev
     dx_users.py --list
+    dx_users.py --list --cached --max_age 600
 
 Options:
   --user_name <name>        The name of the user
@@ -40,10 +41,20 @@ Options:
   --add                     Add the identified user
   --update                  Update the identified user
   --delete                  Delete the identified user
+  --list                    List all users
+  --cached                  Answer the listing from the local cache if it is
+                            younger than --max_age
+  --max_age <seconds>       Oldest cached listing --cached accepts
+                            [default: 300]
+  --refresh_cache           List from the engine and update the local cache
+  --cache_file <path>       The SQLite file of the listing cache
+                            [default: ./dx_query_cache.db]
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -74,15 +85,19 @@ from delphixpy.v1_8_0.web.vo import CredentialUpdateParameters
 from delphixpy.v1_8_0.web.vo import PasswordCredential
 from delphixpy.v1_8_0.web.vo import User
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxQueryCache import cached_rows
 from lib.GetReferences import find_all_objects
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.004"
+VERSION = "v.0.0.007"
 
 
 def add_user(user_name, user_password, user_email, jsonly=None):
@@ -97,6 +112,7 @@ def add_user(user_name, user_password, user_email, jsonly=None):
 
     try:
         user.create(dx_session_obj.server_session, user_obj)
+        invalidate_cache(dx_session_obj.server_session, user)
         print("Attempting to create {}".format(user_name))
     except (DlpxException, RequestError) as e:
         print_exception(
@@ -122,6 +138,7 @@ def js_only(user_name, jsonly=None):
         authorization_obj.user = user_obj.reference
 
         authorization.create(dx_session_obj.server_session, authorization_obj)
+        invalidate_cache(dx_session_obj.server_session, authorization)
     else:
 
         auth_name = (
@@ -139,6 +156,7 @@ def js_only(user_name, jsonly=None):
                 dx_session_obj.server_session, authorization, auth_name
             ).reference,
         )
+        invalidate_cache(dx_session_obj.server_session, authorization)
 
 
 def update_user(user_name, user_password=None, user_email=None, jsonly=None):
@@ -198,6 +216,7 @@ def delete_user(user_name):
 
     try:
         user.delete(dx_session_obj.server_session, user_obj.reference)
+        invalidate_cache(dx_session_obj.server_session, user)
         print("Attempting to delete {}".format(user_name))
     except (DlpxException, RequestError) as e:
         print_exception(
@@ -207,54 +226,28 @@ def delete_user(user_name):
         sys.exit(1)
 
 
-def list_users():
+def list_users(engine_name):
     """
     This function lists all users
-    """
-    user_list = find_all_objects(dx_session_obj.server_session, user)
-
-    for user_obj in user_list:
-        print("User: {}".format(user_obj.name))
-
 
-def run_async(func):
+    engine_name: Name of the engine, I.E. engine["hostname"]
     """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
 
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
+    def fetch():
+        return [
+            user_obj.name
+            for user_obj in find_all_objects(dx_session_obj.server_session, user)
+        ]
 
-    return async_func
+    for user_name in cached_rows(arguments, engine_name, "users", fetch):
+        print("User: {}".format(user_name))
 
 
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -271,10 +264,18 @@ def main_workflow(engine):
         )
         sys.exit(1)
 
+    if arguments["--list"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_users(engine["hostname"])
+        return
+
     thingstodo = ["thingtodo"]
     try:
         with dx_session_obj.job_mode(single_thread):
-            while len(dx_session_obj.jobs) > 0 or len(thingstodo) > 0:
+            while (
+                dx_session_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0
+            ):
                 if len(thingstodo) > 0:
                     if arguments["--add"]:
                         add_user(
@@ -293,14 +294,12 @@ def main_workflow(engine):
                     elif arguments["--delete"]:
                         delete_user(arguments["--user_name"])
                     elif arguments["--list"]:
-                        list_users()
+                        list_users(engine["hostname"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dx_session_obj.jobs.keys():
-                    job_obj = job.get(
-                        dx_session_obj.server_session, dx_session_obj.jobs[j]
-                    )
+                for j in dx_session_obj.jobs.pending(engine["hostname"]):
+                    job_obj = job.get(dx_session_obj.server_session, j)
                     print_debug(job_obj)
                     print_info(
                         "{}: User: {}".format(engine["hostname"], job_obj.job_state)
@@ -309,7 +308,7 @@ def main_workflow(engine):
                         # If the job is in a non-running state, remove it
                         # from the
                         # running jobs list.
-                        del dx_session_obj.jobs[j]
+                        dx_session_obj.jobs.remove(engine["hostname"], j)
                     elif job_obj.job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
@@ -317,7 +316,7 @@ def main_workflow(engine):
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
                     # If we have running jobs, pause before repeating the
                     # checks.
-                    if len(dx_session_obj.jobs) > 0:
+                    if dx_session_obj.jobs.count(engine["hostname"]) > 0:
                         sleep(float(arguments["--poll"]))
 
     except (HttpError, RequestError, JobError, DlpxException) as e:
@@ -329,8 +328,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -341,8 +340,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -387,14 +386,11 @@ def run_job():
             if engine == None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -431,12 +427,14 @@ def main(arguments):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except DlpxException as e:
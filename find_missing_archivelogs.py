@@ -12,7 +12,7 @@
 Usage:
   find_missing_archivelogs.py --outdir <dir>
                   [--engine <identifier> | --all]
-                  [--debug] [--parallel <n>] [--poll <n>]
+                  [--debug] [--parallel <n>] [--max_engines <n>] [--poll <n>]
                   [--config <path_to_file>] [--logdir <path_to_file>]
   find_missing_archivelogs.py -h | --help | -v | --version
 Description
@@ -28,6 +28,8 @@ Options:
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -54,15 +56,18 @@ from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web import source
 from delphixpy.v1_8_0.web.timeflow import oracle
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
 from lib.GetReferences import find_all_objects
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import get_all_paged
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.005"
+VERSION = "v.0.0.007"
 
 
 def find_missing_archivelogs(hostname):
@@ -78,70 +83,41 @@ def find_missing_archivelogs(hostname):
 
     for src_obj in src_objs:
         if src_obj.virtual is False and src_obj.type == "OracleLinkedSource":
-            ora_logs = oracle.log.get_all(
+            # Stream the missing logs page by page rather than holding every
+            # record for the dSource in memory
+            ora_logs = get_all_paged(
                 dx_session_obj.server_session,
+                oracle.log,
+                page_size=1000,
                 database=find_obj_by_name(
                     dx_session_obj.server_session, database, src_obj.name
                 ).reference,
                 missing=True,
-                page_size=1000,
             )
 
-            if ora_logs:
-                for log_data in ora_logs:
-                    log_file.write(
-                        "{}, {}, {}, {}, {}, {}\n".format(
-                            src_obj.name,
-                            log_data.instance_num,
-                            log_data.instance_num,
-                            log_data.sequence,
-                            log_data.start_scn,
-                            log_data.end_scn,
-                        )
+            found = False
+            for log_data in ora_logs:
+                found = True
+                log_file.write(
+                    "{}, {}, {}, {}, {}, {}\n".format(
+                        src_obj.name,
+                        log_data.instance_num,
+                        log_data.instance_num,
+                        log_data.sequence,
+                        log_data.start_scn,
+                        log_data.end_scn,
                     )
-            elif not ora_logs:
+                )
+            if not found:
                 log_file.write("{} has no missing files.\n".format(src_obj.name))
     log_file.close()
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-        @run_async
-        def task2():
-            do_something_too
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
-@run_async
 def main_workflow(engine):
     """
     This function actually runs the jobs.
-    Use the @run_async decorator to run this function asynchronously.
-    This allows us to run against multiple Delphix Engine simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     """
@@ -203,8 +179,8 @@ def run_job():
     This function runs the main_workflow aynchronously against all the servers
     specified
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -215,8 +191,8 @@ def run_job():
             # For each server in the dxtools.conf...
             for delphix_engine in dx_session_obj.dlpx_engines:
                 engine = dx_session_obj[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine)
 
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
@@ -259,14 +235,11 @@ def run_job():
         if engine is None:
             print_exception("\nERROR: No default engine found. Exiting\n")
 
-    # run the job against the engine
-    threads.append(main_workflow(engine))
+        # run the job against the engine
+        executor.submit(engine["hostname"], main_workflow, engine)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def time_elapsed():
@@ -303,12 +276,14 @@ def main(arguments):
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job()
+        exit_code = run_job()
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
@@ -16,8 +16,8 @@
 #
 """Creates, lists, removes a Jet Stream Bookmark
 Usage:
-  js_bookmark.py (--create_bookmark <name> --data_layout <name> [--tags <tags> --description <name> --branch_name <name>]| --list_bookmarks [--tags <tags>] | --delete_bookmark <name> | --activate_bookmark <name> | --update_bookmark <name> | --share_bookmark <name> | --unshare_bookmark <name>)
-                   [--engine <identifier> | --all] [--parallel <n>]
+  js_bookmark.py (--create_bookmark <name> --data_layout <name> [--tags <tags> --description <name> --branch_name <name>]| --list_bookmarks [--tags <tags>] [--page_size <n> [--page <n>]] | --delete_bookmark <name> | --activate_bookmark <name> | --update_bookmark <name> | --share_bookmark <name> | --unshare_bookmark <name>)
+                   [--engine <identifier> | --all] [--parallel <n>] [--max_engines <n>]
                    [--poll <n>] [--debug]
                    [--config <path_to_file>] [--logdir <path_to_file>]
   js_bookmark.py -h | --help | -v | --version
@@ -27,6 +27,7 @@ Creates, Lists, Removes a Jet Stream Bookmark
 Examples:
   js_bookmark.py --list_bookmarks
   js_bookmark.py --list_bookmarks --tags "Jun 17, 25pct"
+  js_bookmark.py --list_bookmarks --page_size 50 --page 2
   js_bookmark.py --create_bookmark jsbookmark1 --data_layout jstemplate1
   js_bookmark.py --create_bookmark jsbookmark1 --data_layout jstemplate1 --tags "1.86.2,bobby" --description "Before commit"
   js_bookmark.py --create_bookmark jsbookmark1 --data_layout jstemplate1 --branch_name jsbranch1
@@ -49,10 +50,15 @@ Options:
   --activate_bookmark <name>  Name of the bookmark to activate
   --delete_bookmark <name>    Delete the JS Bookmark
   --list_bookmarks            List the bookmarks on a given engine
+  --page_size <n>             Number of bookmarks per page of output
+                              [default: 100]
+  --page <n>                  Only list this page of bookmarks, from 1
   --engine <type>             Alt Identifier of Delphix engine in dxtools.conf.
   --all                       Run against all engines.
   --debug                     Enable debug logging
   --parallel <n>              Limit number of jobs to maxjob
+  --max_engines <n>           Limit number of engines worked on at the same
+                              time. Default: 8
   --poll <n>                  The number of seconds to wait between job polls
                               [default: 10]
   --config <path_to_file>     The path to the dxtools.conf file
@@ -67,7 +73,6 @@ from __future__ import print_function
 import sys
 import traceback
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -75,7 +80,6 @@ from docopt import docopt
 from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web.jetstream import bookmark
 from delphixpy.v1_8_0.web.jetstream import branch
 from delphixpy.v1_8_0.web.jetstream import container
@@ -83,16 +87,20 @@ from delphixpy.v1_8_0.web.jetstream import template
 from delphixpy.v1_8_0.web.vo import JSBookmark
 from delphixpy.v1_8_0.web.vo import JSBookmarkCreateParameters
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.GetReferences import DEFAULT_PAGE_SIZE
 from lib.GetReferences import find_obj_by_name
-from lib.GetReferences import find_obj_name
 from lib.GetReferences import get_obj_reference
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.019"
+VERSION = "v.0.0.022"
 
 
 def create_bookmark(
@@ -122,7 +130,7 @@ def create_bookmark(
 
     branch_ref = None
     source_layout_ref = None
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
+    engine_name = dlpx_obj.engine_name(dlpx_obj.server_session.address)
     js_bookmark_params = JSBookmarkCreateParameters()
     if branch_name:
         try:
@@ -172,7 +180,8 @@ def create_bookmark(
     }
     try:
         bookmark.create(dlpx_obj.server_session, js_bookmark_params)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, bookmark)
+        dlpx_obj.add_job("create", bookmark_name)
         print_info("JS Bookmark {} was created successfully.".format(bookmark_name))
 
     except (DlpxException, RequestError, HttpError) as e:
@@ -182,47 +191,68 @@ def create_bookmark(
         )
 
 
-def list_bookmarks(dlpx_obj, tags=None):
+def bookmark_tag_index(js_bookmarks):
     """
-    List all bookmarks on a given engine
+    Build an inverted index of tag to the references of the bookmarks
+    carrying it
+
+    :param js_bookmarks: List of bookmarks from bookmark.get_all()
+    :return: Dictionary of tag to a set of bookmark references
+    """
+    tag_index = {}
+    for js_bookmark in js_bookmarks:
+        for tag in js_bookmark.tags or []:
+            tag_index.setdefault(tag, set()).add(js_bookmark.reference)
+    return tag_index
 
-    :param dlpx_obj: Virtualization Engine session object
-    :param tag_filter: Only list bookmarks with given tag
 
+def list_bookmarks(dlpx_obj, tags=None, page_size=DEFAULT_PAGE_SIZE, page=None):
+    """
+    List all bookmarks on a given engine. Rows are flushed to stdout one
+    page at a time, so a consumer sees output while a long list prints.
+
+    :param dlpx_obj: Virtualization Engine session object
+    :param tags: Only list bookmarks with all of the given tags
+                 (comma-delimited)
+    :param page_size: Number of bookmarks per page. Default: DEFAULT_PAGE_SIZE
+    :param page: Only list this page, counting from 1. Default: all pages
     """
 
     header = "\nName, Reference, Branch Name, Template Name, Tags"
     try:
         js_bookmarks = bookmark.get_all(dlpx_obj.server_session)
-        print(header)
-        for js_bookmark in js_bookmarks:
-            branch_name = find_obj_name(
-                dlpx_obj.server_session, branch, js_bookmark.branch
+        # One branch listing resolves the branch name of every bookmark
+        branch_names = dict(
+            (branch_obj.reference, branch_obj.name)
+            for branch_obj in get_object_index(dlpx_obj.server_session, branch).objs
+        )
+
+        if tags:
+            if isinstance(tags, bytes):
+                tags = tags.decode("utf-8", "ignore")
+            tag_index = bookmark_tag_index(js_bookmarks)
+            matches = set.intersection(
+                *[tag_index.get(tag.strip(), set()) for tag in tags.split(",")]
             )
-            tag_filter = [x.strip() for x in tags.decode("utf-8", "ignore").split(",")]
-            if all(tag in js_bookmark.tags for tag in tag_filter):
-                print(
-                    "{}, {}, {}, {}, {}".format(
-                        js_bookmark.name,
-                        js_bookmark.reference,
-                        branch_name,
-                        js_bookmark.template_name,
-                        ", ".join(tag for tag in js_bookmark.tags),
-                    )
-                )
-            elif tag_filter is None:
-                tag = js_bookmark.tags if js_bookmark.tags else None
-                if tag:
-                    tag = ", ".join(tag for tag in js_bookmark.tags)
-                print(
-                    "{}, {}, {}, {}, {}".format(
-                        js_bookmark.name,
-                        js_bookmark.reference,
-                        branch_name,
-                        js_bookmark.template_name,
-                        tag,
-                    )
+            js_bookmarks = [b for b in js_bookmarks if b.reference in matches]
+
+        if page is not None:
+            start = (page - 1) * page_size
+            js_bookmarks = js_bookmarks[start : start + page_size]
+
+        print(header)
+        for count, js_bookmark in enumerate(js_bookmarks, 1):
+            print(
+                "{}, {}, {}, {}, {}".format(
+                    js_bookmark.name,
+                    js_bookmark.reference,
+                    branch_names.get(js_bookmark.branch, js_bookmark.branch),
+                    js_bookmark.template_name,
+                    ", ".join(js_bookmark.tags) if js_bookmark.tags else None,
                 )
+            )
+            if count % page_size == 0:
+                sys.stdout.flush()
         print("\n")
 
     except (DlpxException, HttpError, RequestError) as e:
@@ -313,6 +343,7 @@ def delete_bookmark(dlpx_obj, bookmark_name):
             dlpx_obj.server_session,
             get_obj_reference(dlpx_obj.server_session, bookmark, bookmark_name).pop(),
         )
+        invalidate_cache(dlpx_obj.server_session, bookmark)
         print_info("The bookmark {} was deleted successfully.".format(bookmark_name))
     except (DlpxException, HttpError, RequestError) as e:
         print_exception(
@@ -321,41 +352,6 @@ def delete_bookmark(dlpx_obj, bookmark_name):
         )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
 def time_elapsed(time_start):
     """
     This function calculates the time elapsed since the beginning of the script.
@@ -367,13 +363,11 @@ def time_elapsed(time_start):
     return round((time() - time_start) / 60, +1)
 
 
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     :param engine: Dictionary of engines
     :type engine: dictionary
@@ -396,7 +390,7 @@ def main_workflow(engine, dlpx_obj):
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--create_bookmark"]:
                         create_bookmark(
@@ -423,31 +417,32 @@ def main_workflow(engine, dlpx_obj):
                         list_bookmarks(
                             dlpx_obj,
                             arguments["--tags"] if arguments["--tags"] else None,
+                            int(arguments["--page_size"]),
+                            int(arguments["--page"]) if arguments["--page"] else None,
                         )
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_state = dlpx_obj.job_tracker().track(j)
                     print_info(
                         "{}: Running JS Bookmark: {}".format(
-                            engine["hostname"], job_obj.job_state
+                            engine["hostname"], job_state
                         )
                     )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
+                    elif job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
                         i += 1
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+                    # If we have running jobs, wait for one to finish (at most
+                    # --poll seconds) before repeating the checks.
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
+                        dlpx_obj.job_tracker().wait_any(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception("Error in js_bookmark: {}\n{}".format(engine["hostname"], e))
         sys.exit(1)
@@ -464,8 +459,8 @@ def run_job(dlpx_obj, config_file_path):
     :type config_file_path: str
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -475,8 +470,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
             sys.exit(1)
@@ -517,13 +512,10 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def main():
@@ -544,12 +536,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed(time_start)
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
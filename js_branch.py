@@ -17,8 +17,8 @@
 """Creates, updates, deletes, activates and lists branches
 Usage:
   js_branch.py (--create_branch <name> --container_name <name> [--template_name <name> | --bookmark_name <name>]| --list_branches | --delete_branch <name> | --activate_branch <name> | --update_branch <name>)
-                   [--engine <identifier> | --all] [--parallel <n>]
-                   [--poll <n>] [--debug]
+                   [--engine <identifier> | --all] [--parallel <n>] [--max_engines <n>]
+                   [--poll <n>] [--debug] [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
   js_branch.py -h | --help | -v | --version
 
@@ -26,6 +26,7 @@ Creates, Lists, Removes a Jet Stream Branch
 
 Examples:
   js_branch.py --list_branches
+  js_branch.py --list_branches --cached
   js_branch.py --create_branch jsbranch1 --container_name jscontainer --template_name jstemplate1
   js_branch.py --activate_branch jsbranch1
   js_branch.py --delete_branch jsbranch1
@@ -40,10 +41,19 @@ Options:
   --activate_branch <name>  Name of the branch to activate
   --delete_branch <name>    Delete the JS Branch
   --list_branches           List the branchs on a given engine
+  --cached                  Answer the listing from the local cache if it is
+                            younger than --max_age
+  --max_age <seconds>       Oldest cached listing --cached accepts
+                            [default: 300]
+  --refresh_cache           List from the engine and update the local cache
+  --cache_file <path>       The SQLite file of the listing cache
+                            [default: ./dx_query_cache.db]
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -59,7 +69,6 @@ import re
 import sys
 import traceback
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -67,7 +76,6 @@ from docopt import docopt
 from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web.jetstream import bookmark
 from delphixpy.v1_8_0.web.jetstream import branch
 from delphixpy.v1_8_0.web.jetstream import container
@@ -78,15 +86,20 @@ from delphixpy.v1_8_0.web.vo import JSBranchCreateParameters
 from delphixpy.v1_8_0.web.vo import JSTimelinePointBookmarkInput
 from delphixpy.v1_8_0.web.vo import JSTimelinePointLatestTimeInput
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
+from lib.DxQueryCache import cached_rows
 from lib.GetReferences import find_obj_by_name
 from lib.GetReferences import find_obj_name
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.015"
+VERSION = "v.0.0.019"
 
 
 def create_branch(
@@ -104,7 +117,6 @@ def create_branch(
 
     js_branch = JSBranchCreateParameters()
     js_branch.name = branch_name
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     data_container_obj = find_obj_by_name(
         dlpx_obj.server_session, container, container_name
     )
@@ -124,42 +136,58 @@ def create_branch(
 
     try:
         branch.create(dlpx_obj.server_session, js_branch)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, branch)
+        dlpx_obj.add_job("create", branch_name)
     except (DlpxException, RequestError, HttpError) as e:
         print_exception("\nThe branch was not created. The error was:" "\n{}".format(e))
     print_info("JS Branch {} was created successfully.".format(branch_name))
 
 
-def list_branches(dlpx_obj):
+def list_branches(dlpx_obj, engine_name):
     """
     List all branches on a given engine
 
     :param dlpx_obj: Virtualization Engine session object
+    :param engine_name: Name of the engine, I.E. engine["hostname"]
     """
 
-    try:
-        header = "\nBranch Name, Data Layout, Reference, End Time"
+    def fetch():
+        rows = []
         js_data_layout = ""
-        js_branches = branch.get_all(dlpx_obj.server_session)
-
-        print(header)
-        for js_branch in js_branches:
+        # One listing of each data layout class names every branch
+        layout_indexes = [
+            (layout_type, f_class, get_object_index(dlpx_obj.server_session, f_class))
+            for layout_type, f_class in [
+                ("TEMPLATE", template),
+                ("CONTAINER", container),
+            ]
+        ]
+        for js_branch in branch.get_all(dlpx_obj.server_session):
             js_end_time = operation.get(
                 dlpx_obj.server_session, js_branch.first_operation
             ).end_time
-            if re.search("TEMPLATE", js_branch.data_layout):
-                js_data_layout = find_obj_name(
-                    dlpx_obj.server_session, template, js_branch.data_layout
-                )
-            elif re.search("CONTAINER", js_branch.data_layout):
-                js_data_layout = find_obj_name(
-                    dlpx_obj.server_session, container, js_branch.data_layout
-                )
-            print_info(
-                "{} {}, {}, {}".format(
-                    js_branch._name[0], js_data_layout, js_branch.reference, js_end_time
-                )
+            for layout_type, f_class, index in layout_indexes:
+                if re.search(layout_type, js_branch.data_layout):
+                    layout_obj = index.find_by_reference(js_branch.data_layout)
+                    js_data_layout = (
+                        layout_obj.name
+                        if layout_obj is not None
+                        else find_obj_name(
+                            dlpx_obj.server_session, f_class, js_branch.data_layout
+                        )
+                    )
+                    break
+            rows.append(
+                [js_branch._name[0], js_data_layout, js_branch.reference, js_end_time]
             )
+        return rows
+
+    try:
+        header = "\nBranch Name, Data Layout, Reference, End Time"
+        rows = cached_rows(arguments, engine_name, "branches", fetch)
+        print(header)
+        for row in rows:
+            print_info("{} {}, {}, {}".format(*row))
     except (DlpxException, HttpError, RequestError) as e:
         print_exception(
             "\nERROR: JS Branches could not be listed. The "
@@ -195,11 +223,10 @@ def activate_branch(dlpx_obj, branch_name):
     :param branch_name: Name of the branch to activate
     """
 
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     try:
         branch_obj = find_obj_by_name(dlpx_obj.server_session, branch, branch_name)
         branch.activate(dlpx_obj.server_session, branch_obj.reference)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        dlpx_obj.add_job("activate", branch_name)
         print_info("The branch {} was activated successfully.".format(branch_name))
     except RequestError as e:
         print_exception("\nAn error occurred activating the " "branch:\n{}".format(e))
@@ -215,6 +242,7 @@ def delete_branch(dlpx_obj, branch_name):
     try:
         branch_obj = find_obj_by_name(dlpx_obj.server_session, branch, branch_name)
         branch.delete(dlpx_obj.server_session, branch_obj.reference)
+        invalidate_cache(dlpx_obj.server_session, branch)
     except (DlpxException, HttpError, RequestError) as e:
         print_exception(
             "\nERROR: The branch was not deleted. The "
@@ -222,41 +250,6 @@ def delete_branch(dlpx_obj, branch_name):
         )
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
 def time_elapsed():
     """
     This function calculates the time elapsed since the beginning of the script.
@@ -265,13 +258,11 @@ def time_elapsed():
     return round((time() - time_start) / 60, +1)
 
 
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     :param engine: Dictionary of engines
     :param dlpx_obj: Virtualization Engine session object
@@ -295,10 +286,16 @@ def main_workflow(engine, dlpx_obj):
         )
         sys.exit(1)
 
+    if arguments["--list_branches"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_branches(dlpx_obj, engine["hostname"])
+        return
+
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--create_branch"]:
                         create_branch(
@@ -319,31 +316,30 @@ def main_workflow(engine, dlpx_obj):
                     elif arguments["--activate_branch"]:
                         activate_branch(dlpx_obj, arguments["--activate_branch"])
                     elif arguments["--list_branches"]:
-                        list_branches(dlpx_obj)
+                        list_branches(dlpx_obj, engine["hostname"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_state = dlpx_obj.job_tracker().track(j)
                     print_info(
                         "{}: Provisioning JS Branch: {}".format(
-                            engine["hostname"], job_obj.job_state
+                            engine["hostname"], job_state
                         )
                     )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
+                    elif job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
                         i += 1
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+                    # If we have running jobs, wait for one to finish (at most
+                    # --poll seconds) before repeating the checks.
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
+                        dlpx_obj.job_tracker().wait_any(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception("\nError in js_branch: {}\n{}".format(engine["hostname"], e))
 
@@ -356,8 +352,8 @@ def run_job(dlpx_obj, config_file_path):
     dlpx_obj: Virtualization Engine session object
     config_file_path: path containing the dxtools.conf file.
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -367,8 +363,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
         except DlpxException as e:
             print_exception("Error encountered in run_job():\n{}".format(e))
@@ -409,13 +405,10 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def main():
@@ -436,11 +429,13 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
         elapsed_minutes = time_elapsed()
         print_info(
             "Script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
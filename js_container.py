@@ -17,8 +17,8 @@
 """Create, delete, refresh and list JS containers.
 Usage:
   js_container.py (--create_container <name> --template_name <name> --database <name> | --reset <name> | --list_hierarchy <name> | --list | --delete_container <name> [--keep_vdbs]| --refresh_container <name> | --add_owner <name> --container_name <name> | --remove_owner <name> --container_name <name> | --restore_container <name> --bookmark_name <name>)
-                   [--engine <identifier> | --all] [--parallel <n>]
-                   [--poll <n>] [--debug]
+                   [--engine <identifier> | --all] [--parallel <n>] [--max_engines <n>]
+                   [--poll <n>] [--debug] [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
   js_container.py -h | --help | -v | --version
 
@@ -26,7 +26,9 @@ Creates, Lists, Removes a Jet Stream Template
 
 Examples:
   js_container.py --list
+  js_container.py --list --cached
   js_container.py --list_hierarchy jscontainer1
+  js_container.py --list_hierarchy all --all
   js_container.py --add_owner jsuser
   js_container.py --create_container jscontainer1 --database <name> --template_name jstemplate1
   js_container.py --delete_container jscontainer1
@@ -49,15 +51,25 @@ Options:
   --bookmark_name <name>     Name of the JS Bookmark to restore the container
   --keep_vdbs                If set, deleting the container will not remove
                              the underlying VDB(s)
-  --list_hierarchy <name>     Lists hierarchy of a given container name
+  --list_hierarchy <name>    Lists hierarchy of the given container names,
+                             separated by commas, or of all containers
   --delete_container <name>  Delete the JS Container
   --database <name>          Name of the child database(s) to use for the
                                 JS Container
-  --list_containers          List the containers on a given engine
+  --list                     List the containers on a given engine
+  --cached                   Answer the listing from the local cache if it is
+                             younger than --max_age
+  --max_age <seconds>        Oldest cached listing --cached accepts
+                             [default: 300]
+  --refresh_cache            List from the engine and update the local cache
+  --cache_file <path>        The SQLite file of the listing cache
+                             [default: ./dx_query_cache.db]
   --engine <type>            Alt Identifier of Delphix engine in dxtools.conf.
   --all                      Run against all engines.
   --debug                    Enable debug logging
   --parallel <n>             Limit number of jobs to maxjob
+  --max_engines <n>          Limit number of engines worked on at the same
+                             time. Default: 8
   --poll <n>                 The number of seconds to wait between job polls
                              [default: 10]
   --config <path_to_file>    The path to the dxtools.conf file
@@ -71,8 +83,8 @@ from __future__ import print_function
 
 import sys
 import traceback
+from collections import OrderedDict
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -81,7 +93,6 @@ from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web import user
 from delphixpy.v1_8_0.web.jetstream import bookmark
 from delphixpy.v1_8_0.web.jetstream import container
@@ -93,17 +104,21 @@ from delphixpy.v1_8_0.web.vo import JSDataContainerModifyOwnerParameters
 from delphixpy.v1_8_0.web.vo import JSDataSourceCreateParameters
 from delphixpy.v1_8_0.web.vo import JSTimelinePointBookmarkInput
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
-from lib.GetReferences import convert_timestamp
+from lib.DxQueryCache import cached_rows
+from lib.GetReferences import convert_timestamps
 from lib.GetReferences import find_obj_by_name
-from lib.GetReferences import find_obj_name
 from lib.GetReferences import get_obj_reference
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.020"
+VERSION = "v.0.0.025"
 
 
 def create_container(dlpx_obj, template_name, container_name, database_name):
@@ -117,7 +132,6 @@ def create_container(dlpx_obj, template_name, container_name, database_name):
 
     js_container_params = JSDataContainerCreateParameters()
     container_ds_lst = []
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     for db in database_name.split(":"):
         container_ds_lst.append(build_ds_params(dlpx_obj, database, db))
 
@@ -133,7 +147,8 @@ def create_container(dlpx_obj, template_name, container_name, database_name):
         js_container_params.data_sources = container_ds_lst
         js_container_params.name = container_name
         container.create(dlpx_obj.server_session, js_container_params)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, container)
+        dlpx_obj.add_job("create", container_name)
         print_info("JS Container {} was created successfully.".format(container_name))
     except (DlpxException, RequestError, HttpError) as e:
         print_exception(
@@ -183,14 +198,13 @@ def restore_container(dlpx_obj, container_name, bookmark_name):
     bookmark_params.bookmark = get_obj_reference(
         dlpx_obj.server_session, bookmark, bookmark_name
     ).pop()
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     try:
         container.restore(
             dlpx_obj.server_session,
             get_obj_reference(dlpx_obj.server_session, container, container_name).pop(),
             bookmark_params,
         )
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        dlpx_obj.add_job("restore", container_name)
         print_info(
             "Container {} was restored successfully with "
             "bookmark {}".format(container_name, bookmark_name)
@@ -240,13 +254,13 @@ def refresh_container(dlpx_obj, container_name):
     container_name: Name of the container to refresh
     """
 
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
     try:
         container.refresh(
             dlpx_obj.server_session,
             get_obj_reference(dlpx_obj.server_session, container, container_name).pop(),
         )
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, container)
+        dlpx_obj.add_job("refresh", container_name)
         print_info("The container {} was refreshed.".format(container_name))
     except (DlpxException, RequestError, HttpError) as e:
         print_exception(
@@ -274,6 +288,7 @@ def delete_container(dlpx_obj, container_name, keep_vdbs=False):
                 ).pop(),
                 js_container_params,
             )
+            invalidate_cache(dlpx_obj.server_session, container)
         elif keep_vdbs is False:
             container.delete(
                 dlpx_obj.server_session,
@@ -281,6 +296,7 @@ def delete_container(dlpx_obj, container_name, keep_vdbs=False):
                     dlpx_obj.server_session, container, container_name
                 ).pop(),
             )
+            invalidate_cache(dlpx_obj.server_session, container)
     except (DlpxException, RequestError, HttpError) as e:
         print_exception(
             "\nContainer {} was not deleted. The error "
@@ -288,31 +304,39 @@ def delete_container(dlpx_obj, container_name, keep_vdbs=False):
         )
 
 
-def list_containers(dlpx_obj):
+def list_containers(dlpx_obj, engine_name):
     """
     List all containers on a given engine
 
     dlpx_obj: Virtualization Engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
     """
 
     header = "Name, Active Branch, Owner, Reference, Template, Last Updated"
-    js_containers = container.get_all(dlpx_obj.server_session)
+
+    def fetch():
+        js_containers = container.get_all(dlpx_obj.server_session)
+        last_updated = convert_timestamps(
+            dlpx_obj.server_session,
+            [js_container.last_updated[:-5] for js_container in js_containers],
+        )
+        return [
+            [
+                js_container.name,
+                js_container.active_branch,
+                str(js_container.owner),
+                str(js_container.reference),
+                str(js_container.template),
+                updated,
+            ]
+            for js_container, updated in zip(js_containers, last_updated)
+        ]
+
     try:
+        rows = cached_rows(arguments, engine_name, "containers", fetch)
         print(header)
-        for js_container in js_containers:
-            last_updated = convert_timestamp(
-                dlpx_obj.server_session, js_container.last_updated[:-5]
-            )
-            print_info(
-                "{}, {}, {}, {}, {}, {}".format(
-                    js_container.name,
-                    js_container.active_branch,
-                    str(js_container.owner),
-                    str(js_container.reference),
-                    str(js_container.template),
-                    last_updated,
-                )
-            )
+        for row in rows:
+            print_info("{}, {}, {}, {}, {}, {}".format(*row))
     except (DlpxException, HttpError, RequestError) as e:
         print_exception(
             "\nERROR: JS Containers could not be listed. The "
@@ -340,32 +364,96 @@ def reset_container(dlpx_obj, container_name):
     print("Container {} was reset.\n".format(container_name))
 
 
+def hierarchy_rows(dlpx_obj, engine_name, container_names):
+    """
+    Return the VDBs of JS containers, with their JDBC strings. The
+    containers, databases and data sources each come from one listing.
+
+    dlpx_obj: Virtualization Engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    container_names: Names of the containers, or ["all"] for every container
+    :return: List of dictionaries with the engine, container and databases
+    """
+    container_index = get_object_index(dlpx_obj.server_session, container)
+    if container_names == ["all"]:
+        js_containers = container_index.objs
+    else:
+        js_containers = []
+        for container_name in container_names:
+            js_container = container_index.find_by_name(container_name.strip())
+            if js_container is None:
+                raise DlpxException(
+                    "{} was not found on engine {}.\n".format(
+                        container_name, engine_name
+                    )
+                )
+            js_containers.append(js_container)
+
+    if len(js_containers) == 1:
+        datasources = datasource.get_all(
+            dlpx_obj.server_session, data_layout=js_containers[0].reference
+        )
+    else:
+        datasources = datasource.get_all(dlpx_obj.server_session)
+    datasources_by_layout = {}
+    for ds in datasources:
+        datasources_by_layout.setdefault(ds.data_layout, []).append(ds)
+    database_index = get_object_index(dlpx_obj.server_session, database)
+
+    rows = []
+    for js_container in js_containers:
+        database_dct = OrderedDict()
+        for ds in datasources_by_layout.get(js_container.reference, []):
+            db_obj = database_index.find_by_reference(ds.container)
+            db_name = ds.container if db_obj is None else db_obj.name
+            if hasattr(ds.runtime, "jdbc_strings"):
+                database_dct[db_name] = ds.runtime.jdbc_strings
+            else:
+                database_dct[db_name] = "None"
+        rows.append(
+            {
+                "engine": engine_name,
+                "container": js_container.name,
+                "databases": database_dct,
+            }
+        )
+    return rows
+
+
+def print_hierarchy(rows):
+    """
+    Print the VDBs of JS containers
+
+    rows: List of dictionaries returned by hierarchy_rows()
+    """
+    for row in rows:
+        try:
+            print_info(
+                "{}: Container: {}\nRelated VDBs: {}\n".format(
+                    row["engine"], row["container"], convert_dct_str(row["databases"])
+                )
+            )
+        except (AttributeError, DlpxException) as e:
+            print_exception(e)
+
+
 def list_hierarchy(dlpx_obj, container_name):
     """
     Filter container listing.
 
     dlpx_obj: Virtualization Engine session object
-    container_name: Name of the container to list child VDBs.
+    container_name: Name of the container to list child VDBs. Several
+                    names can be separated by commas, all lists every
+                    container.
     """
 
-    database_dct = {}
-    layout_ref = find_obj_by_name(
-        dlpx_obj.server_session, container, container_name
-    ).reference
-    for ds in datasource.get_all(dlpx_obj.server_session, data_layout=layout_ref):
-        db_name = find_obj_name(dlpx_obj.server_session, database, ds.container)
-        if hasattr(ds.runtime, "jdbc_strings"):
-            database_dct[db_name] = ds.runtime.jdbc_strings
-        else:
-            database_dct[db_name] = "None"
-    try:
-        print_info(
-            "Container: {}\nRelated VDBs: {}\n".format(
-                container_name, convert_dct_str(database_dct)
-            )
+    print_hierarchy(
+        hierarchy_rows(
+            dlpx_obj,
+            dlpx_obj.engine_name(dlpx_obj.server_session.address),
+            container_name.split(","),
         )
-    except (AttributeError, DlpxException) as e:
-        print_exception(e)
+    )
 
 
 def convert_dct_str(obj_dct):
@@ -378,7 +466,7 @@ def convert_dct_str(obj_dct):
     js_str = ""
 
     if isinstance(obj_dct, dict):
-        for js_db, js_jdbc in obj_dct.iteritems():
+        for js_db, js_jdbc in obj_dct.items():
             if isinstance(js_jdbc, list):
                 js_str += "{}: {}\n".format(js_db, ", ".join(js_jdbc))
             elif isinstance(js_jdbc, str):
@@ -409,41 +497,6 @@ def build_ds_params(dlpx_obj, obj, db):
         print_exception("\nCould not find {}\n{}".format(db, e.message))
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
 def time_elapsed():
     """
     This function calculates the time elapsed since the beginning of the script.
@@ -452,13 +505,11 @@ def time_elapsed():
     return round((time() - time_start) / 60, +1)
 
 
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     dlpx_obj: Virtualization Engine session object
@@ -477,10 +528,32 @@ def main_workflow(engine, dlpx_obj):
         )
         sys.exit(1)
 
+    if arguments["--list"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_containers(dlpx_obj, engine["hostname"])
+        return
+
+    if arguments["--list_hierarchy"]:
+        # Listings start no jobs, so skip job_mode. run_job() prints the
+        # hierarchies of every engine once all of them answered.
+        try:
+            return hierarchy_rows(
+                dlpx_obj,
+                engine["hostname"],
+                arguments["--list_hierarchy"].split(","),
+            )
+        except (DlpxException, RequestError, HttpError) as e:
+            print_exception(
+                "\nERROR: The hierarchy of {} could not be listed on {}:"
+                "\n{}".format(arguments["--list_hierarchy"], engine["hostname"], e)
+            )
+            sys.exit(1)
+
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--create_container"]:
                         create_container(
@@ -496,7 +569,7 @@ def main_workflow(engine, dlpx_obj):
                             arguments["--keep_vdbs"],
                         )
                     elif arguments["--list"]:
-                        list_containers(dlpx_obj)
+                        list_containers(dlpx_obj, engine["hostname"])
                     elif arguments["--remove_owner"]:
                         remove_owner(
                             dlpx_obj,
@@ -517,35 +590,32 @@ def main_workflow(engine, dlpx_obj):
                         )
                     elif arguments["--refresh_container"]:
                         refresh_container(dlpx_obj, arguments["--refresh_container"])
-                    elif arguments["--list_hierarchy"]:
-                        list_hierarchy(dlpx_obj, arguments["--list_hierarchy"])
                     elif arguments["--reset"]:
                         reset_container(dlpx_obj, arguments["--reset"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_state = dlpx_obj.job_tracker().track(j)
                     print_info(
                         "{}: JS Container operations: {}".format(
-                            engine["hostname"], job_obj.job_state
+                            engine["hostname"], job_state
                         )
                     )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the
                         # running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
+                    elif job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
                         i += 1
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+                    # If we have running jobs, wait for one to finish (at most
+                    # --poll seconds) before repeating the checks.
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
+                        dlpx_obj.job_tracker().wait_any(float(arguments["--poll"]))
 
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print("\nError in js_container: {}:\n{}".format(engine["hostname"], e))
@@ -562,8 +632,8 @@ def run_job(dlpx_obj, config_file_path):
     engines
     """
 
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -574,8 +644,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
@@ -616,12 +686,17 @@ def run_job(dlpx_obj, config_file_path):
                 raise DlpxException("\nERROR: No default engine found. Exiting")
 
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
+    # Wait for every engine to finish and pass back the worst exit code
+    exit_code = executor.wait()
+
+    if arguments["--list_hierarchy"]:
+        # Merge the hierarchies of every engine, in dxtools.conf order
+        rows = []
+        for engine_name in executor.futures:
+            rows.extend(executor.result(engine_name) or [])
+        print_hierarchy(rows)
+    return exit_code
 
 
 def main():
@@ -647,12 +722,14 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed()
         print_info(
             "script took {:.2f} minutes to get this far.".format(elapsed_minutes)
         )
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
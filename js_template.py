@@ -17,8 +17,8 @@
 """Creates, deletes and lists JS templates.
 Usage:
   js_template.py (--create_template <name> --database <name> | --list_templates | --delete_template <name>)
-                   [--engine <identifier> | --all] [--parallel <n>]
-                   [--poll <n>] [--debug]
+                   [--engine <identifier> | --all] [--parallel <n>] [--max_engines <n>]
+                   [--poll <n>] [--debug] [--cached [--max_age <seconds>] | --refresh_cache] [--cache_file <path>]
                    [--config <path_to_file>] [--logdir <path_to_file>]
   js_template.py -h | --help | -v | --version
 
@@ -26,6 +26,7 @@ Creates, Lists, Removes a Jet Stream Template
 
 Examples:
   js_template.py --list_templates
+  js_template.py --list_templates --cached --max_age 60
   js_template.py --create_template jstemplate1 --database <name>
   js_template.py --create_template jstemplate2 --database <name:name:name>
   js_template.py --delete_template jstemplate1
@@ -37,10 +38,19 @@ Options:
                                 Note: If adding multiple template DBs, use a
                                 comma (:) to delineate between the DB names.
   --list_templates          List the templates on a given engine
+  --cached                  Answer the listing from the local cache if it is
+                            younger than --max_age
+  --max_age <seconds>       Oldest cached listing --cached accepts
+                            [default: 300]
+  --refresh_cache           List from the engine and update the local cache
+  --cache_file <path>       The SQLite file of the listing cache
+                            [default: ./dx_query_cache.db]
   --engine <type>           Alt Identifier of Delphix engine in dxtools.conf.
   --all                     Run against all engines.
   --debug                   Enable debug logging
   --parallel <n>            Limit number of jobs to maxjob
+  --max_engines <n>         Limit number of engines worked on at the same
+                            time. Default: 8
   --poll <n>                The number of seconds to wait between job polls
                             [default: 10]
   --config <path_to_file>   The path to the dxtools.conf file
@@ -55,7 +65,6 @@ from __future__ import print_function
 import sys
 import traceback
 from os.path import basename
-from time import sleep
 from time import time
 
 from docopt import docopt
@@ -64,20 +73,23 @@ from delphixpy.v1_8_0.exceptions import HttpError
 from delphixpy.v1_8_0.exceptions import JobError
 from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
-from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web.jetstream import template
 from delphixpy.v1_8_0.web.vo import JSDataSourceCreateParameters
 from delphixpy.v1_8_0.web.vo import JSDataTemplateCreateParameters
 from lib.DlpxException import DlpxException
+from lib.DxExecutor import DEFAULT_MAX_WORKERS
+from lib.DxExecutor import DxExecutor
 from lib.DxLogging import logging_est
 from lib.DxLogging import print_debug
 from lib.DxLogging import print_exception
 from lib.DxLogging import print_info
-from lib.GetReferences import convert_timestamp
+from lib.DxQueryCache import cached_rows
+from lib.GetReferences import convert_timestamps
 from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import invalidate_cache
 from lib.GetSession import GetSession
 
-VERSION = "v.0.0.015"
+VERSION = "v.0.0.019"
 
 
 def create_template(dlpx_obj, template_name, database_name):
@@ -92,7 +104,6 @@ def create_template(dlpx_obj, template_name, database_name):
     js_template_params = JSDataTemplateCreateParameters()
     js_template_params.name = template_name
     template_ds_lst = []
-    engine_name = dlpx_obj.dlpx_engines.keys()[0]
 
     for db in database_name.split(":"):
         template_ds_lst.append(build_ds_params(dlpx_obj, database, db))
@@ -100,7 +111,8 @@ def create_template(dlpx_obj, template_name, database_name):
         js_template_params.data_sources = template_ds_lst
         js_template_params.type = "JSDataTemplateCreateParameters"
         template.create(dlpx_obj.server_session, js_template_params)
-        dlpx_obj.jobs[engine_name] = dlpx_obj.server_session.last_job
+        invalidate_cache(dlpx_obj.server_session, template)
+        dlpx_obj.add_job("create", template_name)
         print_info("Template {} was created successfully.\n".format(template_name))
     except (DlpxException, RequestError, HttpError) as e:
         print_exception(
@@ -109,30 +121,37 @@ def create_template(dlpx_obj, template_name, database_name):
         )
 
 
-def list_templates(dlpx_obj):
+def list_templates(dlpx_obj, engine_name):
     """
     List all templates on a given engine
 
     dlpx_obj: Virtualization Engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
     """
 
     header = "Name, Reference, Active Branch, Last Updated"
 
+    def fetch():
+        js_templates = template.get_all(dlpx_obj.server_session)
+        last_updated = convert_timestamps(
+            dlpx_obj.server_session,
+            [js_template.last_updated[:-5] for js_template in js_templates],
+        )
+        return [
+            [
+                js_template.name,
+                js_template.reference,
+                js_template.active_branch,
+                updated,
+            ]
+            for js_template, updated in zip(js_templates, last_updated)
+        ]
+
     try:
+        rows = cached_rows(arguments, engine_name, "templates", fetch)
         print(header)
-        js_templates = template.get_all(dlpx_obj.server_session)
-        for js_template in js_templates:
-            last_updated = convert_timestamp(
-                dlpx_obj.server_session, js_template.last_updated[:-5]
-            )
-            print_info(
-                "{}, {}, {}, {}".format(
-                    js_template.name,
-                    js_template.reference,
-                    js_template.active_branch,
-                    last_updated,
-                )
-            )
+        for row in rows:
+            print_info("{}, {}, {}, {}".format(*row))
     except (DlpxException, HttpError, RequestError) as e:
         raise DlpxException(
             "\nERROR: The templates could not be listed. "
@@ -153,6 +172,7 @@ def delete_template(dlpx_obj, template_name):
             dlpx_obj.server_session, template, template_name
         )
         template.delete(dlpx_obj.server_session, template_obj.reference)
+        invalidate_cache(dlpx_obj.server_session, template)
         print("Template {} is deleted.".format(template_name))
     except (DlpxException, HttpError, RequestError) as e:
         print_exception(
@@ -180,41 +200,6 @@ def build_ds_params(dlpx_obj, obj, db):
         print_exception("\nCould not find {}\n{}".format(db, e.message))
 
 
-def run_async(func):
-    """
-    http://code.activestate.com/recipes/576684-simple-threading-decorator/
-    run_async(func)
-        function decorator, intended to make "func" run in a separate
-        thread (asynchronously).
-        Returns the created Thread object
-
-        E.g.:
-        @run_async
-        def task1():
-            do_something
-
-        @run_async
-        def task2():
-            do_something_too
-
-        t1 = task1()
-        t2 = task2()
-        ...
-        t1.join()
-        t2.join()
-    """
-    from threading import Thread
-    from functools import wraps
-
-    @wraps(func)
-    def async_func(*args, **kwargs):
-        func_hl = Thread(target=func, args=args, kwargs=kwargs)
-        func_hl.start()
-        return func_hl
-
-    return async_func
-
-
 def time_elapsed():
     """
     This function calculates the time elapsed since the beginning of the script.
@@ -223,13 +208,11 @@ def time_elapsed():
     return round((time() - time_start) / 60, +1)
 
 
-@run_async
 def main_workflow(engine, dlpx_obj):
     """
     This function is where we create our main workflow.
-    Use the @run_async decorator to run this function asynchronously.
-    The @run_async decorator allows us to run against multiple Delphix Engine
-    simultaneously
+    run_job() runs this function on a DxExecutor worker thread, which
+    allows us to run against multiple Delphix Engines simultaneously
 
     engine: Dictionary of engines
     dlpx_obj: Virtualization Engine session object
@@ -249,10 +232,16 @@ def main_workflow(engine, dlpx_obj):
         )
         sys.exit(1)
 
+    if arguments["--list_templates"] and arguments["--cached"]:
+        # Listings start no jobs, so skip job_mode; a cache hit then never
+        # contacts the engine
+        list_templates(dlpx_obj, engine["hostname"])
+        return
+
     thingstodo = ["thingtodo"]
     try:
         with dlpx_obj.job_mode(single_thread):
-            while len(dlpx_obj.jobs) > 0 or len(thingstodo) > 0:
+            while dlpx_obj.jobs.count(engine["hostname"]) > 0 or len(thingstodo) > 0:
                 if len(thingstodo) > 0:
                     if arguments["--create_template"]:
                         create_template(
@@ -263,31 +252,30 @@ def main_workflow(engine, dlpx_obj):
                     elif arguments["--delete_template"]:
                         delete_template(dlpx_obj, arguments["--delete_template"])
                     elif arguments["--list_templates"]:
-                        list_templates(dlpx_obj)
+                        list_templates(dlpx_obj, engine["hostname"])
                     thingstodo.pop()
                 # get all the jobs, then inspect them
                 i = 0
-                for j in dlpx_obj.jobs.keys():
-                    job_obj = job.get(dlpx_obj.server_session, dlpx_obj.jobs[j])
-                    print_debug(job_obj)
+                for j in dlpx_obj.jobs.pending(engine["hostname"]):
+                    job_state = dlpx_obj.job_tracker().track(j)
                     print_info(
                         "{}: Provisioning JS Template: {}".format(
-                            engine["hostname"], job_obj.job_state
+                            engine["hostname"], job_state
                         )
                     )
-                    if job_obj.job_state in ["CANCELED", "COMPLETED", "FAILED"]:
+                    if job_state in ["CANCELED", "COMPLETED", "FAILED"]:
                         # If the job is in a non-running state, remove it
                         # from the running jobs list.
-                        del dlpx_obj.jobs[j]
-                    elif job_obj.job_state in "RUNNING":
+                        dlpx_obj.jobs.remove(engine["hostname"], j)
+                    elif job_state in "RUNNING":
                         # If the job is in a running state, increment the
                         # running job count.
                         i += 1
                     print_info("{}: {:d} jobs running.".format(engine["hostname"], i))
-                    # If we have running jobs, pause before repeating the
-                    # checks.
-                    if len(dlpx_obj.jobs) > 0:
-                        sleep(float(arguments["--poll"]))
+                    # If we have running jobs, wait for one to finish (at most
+                    # --poll seconds) before repeating the checks.
+                    if dlpx_obj.jobs.count(engine["hostname"]) > 0:
+                        dlpx_obj.job_tracker().wait_any(float(arguments["--poll"]))
     except (DlpxException, RequestError, JobError, HttpError) as e:
         print_exception("\nError in js_template: {}:\n{}".format(engine["hostname"], e))
         sys.exit(1)
@@ -301,8 +289,8 @@ def run_job(dlpx_obj, config_file_path):
     dlpx_obj: Virtualization Engine session object
     config_file_path: path containing the dxtools.conf file.
     """
-    # Create an empty list to store threads we create.
-    threads = []
+    # Run main_workflow for each engine on a bounded pool of worker threads
+    executor = DxExecutor(int(arguments["--max_engines"] or DEFAULT_MAX_WORKERS))
     engine = None
 
     # If the --all argument was given, run against every engine in dxtools.conf
@@ -313,8 +301,8 @@ def run_job(dlpx_obj, config_file_path):
             # For each server in the dxtools.conf...
             for delphix_engine in dlpx_obj.dlpx_engines:
                 engine = dlpx_obj.dlpx_engines[delphix_engine]
-                # Create a new thread and add it to the list.
-                threads.append(main_workflow(engine, dlpx_obj))
+                # Queue main_workflow for this engine on the executor.
+                executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
         except DlpxException as e:
             print("Error encountered in run_job():\n{}".format(e))
             sys.exit(1)
@@ -353,13 +341,10 @@ def run_job(dlpx_obj, config_file_path):
             if engine is None:
                 raise DlpxException("\nERROR: No default engine found. Exiting")
         # run the job against the engine
-        threads.append(main_workflow(engine, dlpx_obj))
+        executor.submit(engine["hostname"], main_workflow, engine, dlpx_obj)
 
-    # For each thread in the list...
-    for each in threads:
-        # join them back together so that we wait for all threads to complete
-        # before moving on
-        each.join()
+    # Wait for every engine to finish and pass back the worst exit code
+    return executor.wait()
 
 
 def main():
@@ -383,10 +368,12 @@ def main():
 
         # This is the function that will handle processing main_workflow for
         # all the servers.
-        run_job(dx_session_obj, config_file_path)
+        exit_code = run_job(dx_session_obj, config_file_path)
 
         elapsed_minutes = time_elapsed()
         print_info("script took {:.2f} to get this far.".format(elapsed_minutes))
+        if exit_code:
+            sys.exit(exit_code)
 
     # Here we handle what we do when the unexpected happens
     except SystemExit as e:
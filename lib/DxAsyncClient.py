@@ -0,0 +1,359 @@
+"""
+Package DxAsyncClient
+
+asyncio client for raw REST access to Delphix Engines, in the style of
+via_httplib.py. One client keeps a cookie jar and a small pool of keep-alive
+connections per engine, so queries against many engines can run
+concurrently in one event loop. Python 3 only; uses asyncio streams so no
+extra dependency is needed.
+"""
+
+import asyncio
+import json
+import ssl
+from urllib.parse import urlencode
+
+from .DlpxException import DlpxException
+
+VERSION = "v.0.0.003"
+
+# API version used to open sessions, matching lib.GetSession
+API_VERSION = (1, 8, 0)
+
+# Default number of concurrent requests per engine, and engines per fan out
+DEFAULT_CONNECTIONS = 4
+DEFAULT_ENGINES = 10
+
+
+class _Connection(object):
+    """
+    One keep-alive HTTP/1.1 connection
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def _read_body(self, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+        if "content-length" in headers:
+            return await self.reader.readexactly(int(headers["content-length"]))
+        return await self.reader.read()
+
+    async def request(self, method, host, path, headers, body):
+        """
+        Send one request and return (status, headers, set_cookies, data,
+        keep_alive)
+        """
+        lines = [
+            "{} {} HTTP/1.1".format(method, path),
+            "Host: {}".format(host),
+            "Content-Length: {}".format(len(body)),
+        ]
+        lines.extend("{}: {}".format(k, v) for k, v in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by {}".format(host))
+        status = int(status_line.split()[1])
+        resp_headers = {}
+        set_cookies = []
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "set-cookie":
+                set_cookies.append(value)
+            resp_headers[name] = value
+        data = await self._read_body(resp_headers)
+        keep_alive = resp_headers.get("connection", "").lower() != "close"
+        return status, resp_headers, set_cookies, data, keep_alive
+
+    def close(self):
+        self.writer.close()
+
+
+class DxAsyncClient(object):
+    """
+    Client for one Delphix Engine. Use it as an async context manager:
+
+        async with DxAsyncClient("engine", "admin", "delphix") as client:
+            users = await client.list("delphix/user")
+    """
+
+    def __init__(
+        self,
+        address,
+        user,
+        password,
+        namespace="DOMAIN",
+        port=None,
+        use_https=False,
+        max_connections=DEFAULT_CONNECTIONS,
+        api_version=API_VERSION,
+    ):
+        """
+        address: The engine's address (IP/DNS Name)
+        user: Username to authenticate
+        password: User's password
+        namespace: Namespace to use for this session. Default: DOMAIN
+        port: TCP port. Default: 443 with use_https, else 80
+        use_https: Connect with TLS. Default: False
+        max_connections: Maximum concurrent requests to this engine.
+                         Default: DEFAULT_CONNECTIONS
+        api_version: (major, minor, micro) of the API. Default: API_VERSION
+        """
+        self.address = address
+        self.user = user
+        self.password = password
+        self.namespace = namespace
+        self.use_https = use_https
+        self.port = int(port) if port else (443 if use_https else 80)
+        self.api_version = api_version
+        self.cookies = {}
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._login_lock = asyncio.Lock()
+        self._logged_in = False
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _connect(self):
+        context = None
+        if self.use_https:
+            context = ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            self.address, self.port, ssl=context
+        )
+        return _Connection(reader, writer)
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                "{}={}".format(k, v) for k, v in self.cookies.items()
+            )
+        return headers
+
+    def _save_cookies(self, set_cookies):
+        for cookie in set_cookies:
+            name, _, value = cookie.split(";")[0].partition("=")
+            self.cookies[name.strip()] = value.strip()
+
+    async def _send(self, method, path, body):
+        async with self._semaphore:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await self._connect()
+            try:
+                result = await conn.request(
+                    method, self.address, path, self._headers(), body
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                if not reused:
+                    raise
+                # The engine closed an idle connection; retry on a new one
+                conn = await self._connect()
+                try:
+                    result = await conn.request(
+                        method, self.address, path, self._headers(), body
+                    )
+                except BaseException:
+                    conn.close()
+                    raise
+            except BaseException:
+                # Never return a connection in an unknown state to the pool
+                conn.close()
+                raise
+            status, headers, set_cookies, data, keep_alive = result
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn.close()
+        self._save_cookies(set_cookies)
+        return status, data
+
+    async def request(self, method, resource, payload=None, params=None, retry=True):
+        """
+        Perform a request and return the parsed JSON response. A 401 logs in
+        again and retries once.
+
+        method: GET or POST
+        resource: Path below /resources/json/, I.E. delphix/user
+        payload: Dictionary sent as the JSON body. Default: None
+        params: Dictionary of query parameters. Default: None
+        """
+        path = "/resources/json/" + resource
+        if params:
+            path += "?" + urlencode(params)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        status, data = await self._send(method, path, body)
+        if status == 401 and retry:
+            self._logged_in = False
+            await self.login()
+            return await self.request(method, resource, payload, params, False)
+        if status not in (200, 202):
+            raise DlpxException(
+                "HTTP status was {} when doing {} to {} on {}: {}".format(
+                    status, method, path, self.address, data.decode("utf-8", "replace")
+                )
+            )
+        response = json.loads(data.decode("utf-8"))
+        if response.get("type") == "ErrorResult":
+            raise DlpxException(
+                "{}: {} {} failed: {}".format(
+                    self.address, method, path, response.get("error")
+                )
+            )
+        return response
+
+    async def login(self):
+        """
+        Open an API session and log in, once per client
+        """
+        async with self._login_lock:
+            if self._logged_in:
+                return
+            major, minor, micro = self.api_version
+            await self.request(
+                "POST",
+                "delphix/session",
+                {
+                    "type": "APISession",
+                    "version": {
+                        "type": "APIVersion",
+                        "major": major,
+                        "minor": minor,
+                        "micro": micro,
+                    },
+                },
+                retry=False,
+            )
+            await self.request(
+                "POST",
+                "delphix/login",
+                {
+                    "type": "LoginRequest",
+                    "username": self.user,
+                    "password": self.password,
+                    "target": self.namespace,
+                },
+                retry=False,
+            )
+            self._logged_in = True
+
+    async def get(self, resource, params=None):
+        """
+        GET a resource and return its result
+
+        resource: Path below /resources/json/, I.E. delphix/user
+        params: Dictionary of query parameters. Default: None
+        """
+        return (await self.request("GET", resource, params=params))["result"]
+
+    async def post(self, resource, payload=None):
+        """
+        POST to a resource and return the parsed response
+
+        resource: Path below /resources/json/, I.E. delphix/database
+        payload: Dictionary sent as the JSON body. Default: None
+        """
+        return await self.request("POST", resource, payload)
+
+    async def paginate(self, resource, page_size=100, params=None):
+        """
+        Yield the results of a paged listing one page at a time
+
+        resource: Path below /resources/json/, I.E. delphix/job
+        page_size: Number of objects per request. Default: 100
+        params: Other query parameters. Default: None
+        """
+        page_offset = 0
+        first_ref = None
+        while True:
+            page_params = dict(params or {})
+            page_params.update({"pageSize": page_size, "pageOffset": page_offset})
+            page = await self.get(resource, page_params)
+            if not page:
+                return
+            # Guard against a listing that ignores pageOffset and keeps
+            # returning the same page
+            if page_offset > 0 and page[0].get("reference") == first_ref:
+                return
+            first_ref = page[0].get("reference")
+            yield page
+            if len(page) < page_size:
+                return
+            page_offset += 1
+
+    async def list(self, resource, page_size=None, params=None):
+        """
+        Return every object of a listing. page_size pages through resources
+        that support it (jobs, faults, alerts, actions).
+
+        resource: Path below /resources/json/, I.E. delphix/user
+        page_size: Number of objects per request. Default: not paged
+        params: Other query parameters. Default: None
+        """
+        if page_size is None:
+            return await self.get(resource, params)
+        objs = []
+        async for page in self.paginate(resource, page_size, params):
+            objs.extend(page)
+        return objs
+
+    async def close(self):
+        """
+        Close the idle connections
+        """
+        while self._idle:
+            self._idle.pop().close()
+
+
+async def fan_out(engines, func, limit=DEFAULT_ENGINES):
+    """
+    Run func(client) against several engines concurrently and return a
+    dictionary of engine hostname to result, or to the exception raised.
+
+    engines: List of engine dictionaries from dxtools.conf
+    func: Coroutine function taking a logged in DxAsyncClient
+    limit: Maximum engines worked on at the same time. Default: DEFAULT_ENGINES
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(engine):
+        async with semaphore:
+            client = DxAsyncClient(
+                engine["ip_address"],
+                engine["username"],
+                engine["password"],
+                port=engine.get("port"),
+                use_https=str(engine.get("use_https", "false")).lower() == "true",
+            )
+            async with client:
+                return await func(client)
+
+    results = await asyncio.gather(
+        *[run(engine) for engine in engines], return_exceptions=True
+    )
+    return dict(
+        (engine["hostname"], result) for engine, result in zip(engines, results)
+    )
@@ -0,0 +1,250 @@
+"""
+Package DxBenchmark
+
+Runs the scripts against a lib.DxMockEngine at a given number of objects and
+measures what each run cost: HTTP requests (in total and per endpoint), bytes
+transferred, wall time and the peak RSS of the script's process. Reports are
+JSON, so the report of a change can be compared with the report of the
+commit before it.
+"""
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from time import time
+
+from .DlpxException import DlpxException
+from .DxMockEngine import DxMockEngine
+from .DxTrace import endpoint
+
+VERSION = "v.0.0.003"
+
+# Object counts the suite runs at by default
+DEFAULT_SCALES = [100, 1000, 10000]
+
+# Seconds a single run may take before it is stopped
+DEFAULT_TIMEOUT = 600
+
+# Name of each scenario, and the script and arguments it runs
+SCENARIOS = OrderedDict(
+    [
+        ("refresh_all_vdbs", ["dx_refresh_db.py", "--all_vdbs"]),
+        ("list_snapshots", ["dx_refresh_db.py", "--list_snapshots"]),
+        ("list_databases", ["dx_operations.py", "--list"]),
+        ("list_environments", ["dx_environment.py", "--list"]),
+        ("list_jobs", ["dx_jobs.py", "--list"]),
+        ("list_groups", ["dx_groups.py", "--list"]),
+        ("list_users", ["dx_users.py", "--list"]),
+        ("list_containers", ["js_container.py", "--list"]),
+        ("list_hierarchy", ["js_container.py", "--list_hierarchy", "all"]),
+        ("list_templates", ["js_template.py", "--list_templates"]),
+        ("list_branches", ["js_branch.py", "--list_branches"]),
+        ("list_bookmarks", ["js_bookmark.py", "--list_bookmarks"]),
+        ("inventory", ["dx_inventory.py"]),
+    ]
+)
+
+# Measurements compared by compare_reports(). Request counts are exact, so
+# any growth is a regression; the others may vary by the tolerance.
+EXACT_MEASURES = ["requests"]
+TOLERANT_MEASURES = ["bytes_sent", "wall_seconds", "peak_rss_kb"]
+
+# Imports a script and runs its main() with the given arguments. Scripts
+# are run this way, instead of as __main__, so deprecated scripts that exit
+# before parsing their arguments are measured too. On exit the peak RSS is
+# written to the file named by DX_BENCHMARK_RSS_FILE. VmHWM is used where
+# available; ru_maxrss also counts the memory of the parent at fork.
+RUNNER = (
+    "import atexit\n"
+    "import os\n"
+    "import sys\n"
+    "def peak_rss():\n"
+    "    try:\n"
+    "        with open('/proc/self/status') as status:\n"
+    "            for line in status:\n"
+    "                if line.startswith('VmHWM:'):\n"
+    "                    return int(line.split()[1])\n"
+    "    except IOError:\n"
+    "        pass\n"
+    "    import resource\n"
+    "    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "    return peak // 1024 if sys.platform == 'darwin' else peak\n"
+    "def write_peak_rss():\n"
+    "    with open(os.environ['DX_BENCHMARK_RSS_FILE'], 'w') as rss_file:\n"
+    "        rss_file.write(str(peak_rss()))\n"
+    "atexit.register(write_peak_rss)\n"
+    "sys.path.insert(0, {root!r})\n"
+    "from docopt import docopt\n"
+    "import {module} as script\n"
+    "script.arguments = docopt(script.__doc__, argv=sys.argv[1:])\n"
+    "if script.main.__code__.co_argcount:\n"
+    "    script.main(script.arguments)\n"
+    "else:\n"
+    "    script.main()\n"
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def mock_counts(scale):
+    """
+    Return the DxMockEngine object counts used for a scale
+
+    scale: Number of databases, jobs and Jet Stream data layouts
+    """
+    return {
+        "databases": scale,
+        "snapshots": 2,
+        "jobs": scale,
+        "groups": max(1, scale // 100),
+        "environments": max(1, scale // 100),
+        "users": max(1, scale // 100),
+        "js_objects": max(1, scale // 2),
+    }
+
+
+def run_scenario(name, scale, latency=0, timeout=DEFAULT_TIMEOUT):
+    """
+    Run one scenario against a new mock engine and return its measurements
+
+    name: Key of SCENARIOS
+    scale: Number of objects, see mock_counts()
+    latency: Seconds the mock engine delays each request by. Default: 0
+    timeout: Seconds the run may take. Default: DEFAULT_TIMEOUT
+    :return: Dictionary of the measurements
+    """
+    try:
+        script, args = SCENARIOS[name][0], SCENARIOS[name][1:]
+    except KeyError:
+        raise DlpxException("Unknown benchmark scenario {}".format(name))
+
+    work_dir = tempfile.mkdtemp(prefix="dx_benchmark.")
+    mock = DxMockEngine(latency=latency, **mock_counts(scale))
+    try:
+        with open(os.path.join(work_dir, "dxtools.conf"), "w") as config_file:
+            json.dump(
+                {
+                    "data": [
+                        {
+                            "hostname": "mock",
+                            "ip_address": mock.address,
+                            "username": "delphix_admin",
+                            "password": "delphix",
+                            "default": "true",
+                        }
+                    ]
+                },
+                config_file,
+            )
+        command = [
+            sys.executable,
+            "-c",
+            RUNNER.format(root=ROOT, module=os.path.splitext(script)[0]),
+        ] + args
+        mock.start()
+        time_start = time()
+        rss_path = os.path.join(work_dir, "peak_rss")
+        with open(os.path.join(work_dir, "output.log"), "w") as output:
+            process = subprocess.Popen(
+                command,
+                cwd=work_dir,
+                stdout=output,
+                stderr=subprocess.STDOUT,
+                env=dict(os.environ, DX_BENCHMARK_RSS_FILE=rss_path),
+            )
+            timed_out = False
+            try:
+                exit_code = process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                exit_code, timed_out = None, True
+        wall_seconds = time() - time_start
+        peak_rss = None
+        if os.path.exists(rss_path):
+            with open(rss_path) as rss_file:
+                peak_rss = int(rss_file.read())
+    finally:
+        mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    by_endpoint = {}
+    for (method, path), count in mock.requests.items():
+        key = endpoint(method, path)
+        by_endpoint[key] = by_endpoint.get(key, 0) + count
+    return {
+        "scenario": name,
+        "scale": scale,
+        "command": " ".join([script] + args),
+        "exit_code": exit_code,
+        "timed_out": timed_out,
+        "requests": sum(mock.requests.values()),
+        "requests_by_endpoint": OrderedDict(
+            sorted(by_endpoint.items(), key=lambda item: (-item[1], item[0]))
+        ),
+        "bytes_sent": mock.traffic["sent"],
+        "bytes_received": mock.traffic["received"],
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_kb": peak_rss,
+    }
+
+
+def new_report(results, latency=0):
+    """
+    Return a report of the results of run_scenario()
+
+    results: List of measurements
+    latency: Seconds the mock engine delayed each request by. Default: 0
+    """
+    return OrderedDict(
+        [
+            ("version", VERSION),
+            ("created_at", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")),
+            ("python", platform.python_version()),
+            ("platform", platform.platform()),
+            ("latency", latency),
+            ("results", results),
+        ]
+    )
+
+
+def compare_reports(baseline, report, tolerance=0.25):
+    """
+    Return the regressions of report against baseline, one line each.
+    Scenarios and scales missing from either report are skipped.
+
+    baseline: A report from new_report(), I.E. of the previous commit
+    report: A report from new_report()
+    tolerance: Fraction by which a measurement in TOLERANT_MEASURES may
+               grow. Default: 0.25
+    """
+    before = dict(((r["scenario"], r["scale"]), r) for r in baseline["results"])
+    regressions = []
+    for result in report["results"]:
+        old = before.get((result["scenario"], result["scale"]))
+        if old is None:
+            continue
+        label = "{} at {}".format(result["scenario"], result["scale"])
+        if old["exit_code"] == 0 and result["exit_code"] != 0:
+            regressions.append(
+                "{}: exit code {} (was 0)".format(label, result["exit_code"])
+            )
+        for measure in EXACT_MEASURES + TOLERANT_MEASURES:
+            if old.get(measure) is None or result.get(measure) is None:
+                continue
+            limit = old[measure]
+            if measure in TOLERANT_MEASURES:
+                limit *= 1 + tolerance
+            if result[measure] > limit:
+                regressions.append(
+                    "{}: {} {} (was {})".format(
+                        label, measure, result[measure], old[measure]
+                    )
+                )
+    return regressions
@@ -0,0 +1,249 @@
+"""
+Package DxCache
+
+Memoizes lookups made against a Delphix Engine so repeated searches within a
+session reuse one API listing instead of issuing the same request again.
+"""
+
+import threading
+from time import time
+
+from .DxObjectIndex import DxObjectIndex
+
+VERSION = "v.0.0.004"
+
+# Number of seconds a cached listing is considered current
+DEFAULT_TTL = 300
+
+# A job that changes the objects of a class also changes the objects of the
+# related classes, I.E. a rollback changes the database, its source and its
+# snapshots
+RELATED_CLASSES = {
+    "database": ("source", "snapshot", "timeflow"),
+    "source": ("database", "snapshot", "timeflow"),
+    "snapshot": ("database", "source", "timeflow"),
+    "timeflow": ("database", "source", "snapshot"),
+    "environment": ("host", "repository", "sourceconfig"),
+    "container": ("branch", "bookmark", "datasource", "operation"),
+    "template": ("branch", "bookmark", "datasource", "operation"),
+    "branch": ("container", "bookmark", "operation"),
+}
+
+
+def _short_name(class_name):
+    # delphixpy web classes are modules, I.E. delphixpy.v1_8_0.web.database
+    return class_name.rsplit(".", 1)[-1]
+
+
+def related_classes(f_class):
+    """
+    Return the names of f_class and of the classes a job that changes its
+    objects also changes
+
+    f_class: The objects class. I.E. database or timeflow.
+    """
+    name = _short_name(f_class.__name__)
+    return set((name,) + RELATED_CLASSES.get(name, ()))
+
+
+class DxCache(object):
+    """
+    Per-session cache of get_all() / get() results, keyed by the engine
+    address, the delphixpy object class and the filter kwargs used.
+
+    While a job that changes a class is running, lookups of that class and
+    of its related classes go to the engine and are not saved, so they do
+    not keep the state from before the job. job_finished() drops them again
+    once the job reached a final state.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        ttl: Number of seconds a cached result stays valid. A ttl of 0
+             disables caching. Default: DEFAULT_TTL
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._store = {}
+        # Engine address: {job reference: names of the classes it changes,
+        # or None for every class}
+        self._running = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(engine, f_class, op, args):
+        return (engine.address, f_class.__name__, op, args)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and time() - entry[0] < self.ttl:
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+            return False, None
+
+    def _in_flight(self, engine, f_class):
+        name = _short_name(f_class.__name__)
+        with self._lock:
+            return any(
+                names is None or name in names
+                for names in self._running.get(engine.address, {}).values()
+            )
+
+    def _save(self, key, value):
+        if self.ttl > 0:
+            with self._lock:
+                self._store[key] = (time(), value)
+        return value
+
+    def get_all(self, engine, f_class, **kwargs):
+        """
+        Return f_class.get_all(engine, **kwargs), served from the cache when
+        an unexpired result exists. The returned list is a copy.
+
+        engine: A Delphix engine session object
+        f_class: The objects class. I.E. database or timeflow.
+        kwargs: Filter arguments passed through to get_all()
+        """
+        if self._in_flight(engine, f_class):
+            return list(f_class.get_all(engine, **kwargs))
+        key = self._key(engine, f_class, "get_all", tuple(sorted(kwargs.items())))
+        found, value = self._lookup(key)
+        if not found:
+            value = self._save(key, f_class.get_all(engine, **kwargs))
+        # Callers often pop() from the returned list, so hand out a copy
+        return list(value)
+
+    def get(self, engine, f_class, obj_reference):
+        """
+        Return f_class.get(engine, obj_reference), served from the cache when
+        an unexpired result exists.
+
+        engine: A Delphix engine session object
+        f_class: The objects class. I.E. database or timeflow.
+        obj_reference: Reference of the object to retrieve
+        """
+        if self._in_flight(engine, f_class):
+            return f_class.get(engine, obj_reference)
+        key = self._key(engine, f_class, "get", obj_reference)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        return self._save(key, f_class.get(engine, obj_reference))
+
+    def get_index(self, engine, f_class, index_class=DxObjectIndex, **kwargs):
+        """
+        Return an index built from one f_class.get_all() call. The index is
+        cached and invalidated along with the listing.
+
+        engine: A Delphix engine session object
+        f_class: The objects class. I.E. database or timeflow.
+        index_class: Class of the index, built from the list of objects.
+                     Default: DxObjectIndex
+        kwargs: Filter arguments passed through to get_all()
+        """
+        if self._in_flight(engine, f_class):
+            return index_class(f_class.get_all(engine, **kwargs))
+        key = self._key(
+            engine,
+            f_class,
+            ("index", index_class.__name__),
+            tuple(sorted(kwargs.items())),
+        )
+        found, value = self._lookup(key)
+        if found:
+            return value
+        return self._save(key, index_class(self.get_all(engine, f_class, **kwargs)))
+
+    def peek_index(self, engine, f_class, index_class=DxObjectIndex, **kwargs):
+        """
+        Return the cached index of get_index() if an unexpired one exists,
+        or None. Never calls the engine, so a lookup of a single object can
+        use an index another lookup already built, and fall back to a get()
+        otherwise.
+
+        engine: A Delphix engine session object
+        f_class: The objects class. I.E. database or timeflow.
+        index_class: Class of the index. Default: DxObjectIndex
+        kwargs: Filter arguments the index was built with
+        """
+        if self.ttl <= 0 or self._in_flight(engine, f_class):
+            return None
+        key = self._key(
+            engine,
+            f_class,
+            ("index", index_class.__name__),
+            tuple(sorted(kwargs.items())),
+        )
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and time() - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def _drop(self, address, names):
+        with self._lock:
+            for key in list(self._store):
+                if address is not None and key[0] != address:
+                    continue
+                if names is not None and _short_name(key[1]) not in names:
+                    continue
+                del self._store[key]
+
+    def invalidate(self, engine=None, f_class=None, job_ref=None):
+        """
+        Drop cached results. Call this after a mutating API call
+        (provision, delete, refresh, ...) so later lookups see the change.
+
+        engine: Only drop entries for this engine session. Default: all engines
+        f_class: Only drop entries for this object class and its related
+                 classes. Default: all classes
+        job_ref: Job of the mutating call that is still running. The classes
+                 are not cached until job_finished() is called for it.
+                 Default: None, the call already finished
+        """
+        names = None if f_class is None else related_classes(f_class)
+        if job_ref is not None and engine is not None:
+            with self._lock:
+                self._running.setdefault(engine.address, {})[job_ref] = names
+        self._drop(None if engine is None else engine.address, names)
+
+    def running(self, engine):
+        """
+        Return the references of the jobs passed to invalidate() that have
+        not finished yet
+        """
+        with self._lock:
+            return list(self._running.get(engine.address, {}))
+
+    def job_finished(self, engine, job_ref):
+        """
+        Drop the results a job changed once it reached a final state, and
+        cache its classes again. Jobs that were not passed to invalidate()
+        are ignored.
+
+        engine: A Delphix engine session object
+        job_ref: Reference of the job
+        """
+        with self._lock:
+            jobs = self._running.get(engine.address, {})
+            if job_ref not in jobs:
+                return
+            names = jobs.pop(job_ref)
+            if not jobs:
+                del self._running[engine.address]
+        self._drop(engine.address, names)
+
+    def stats(self):
+        """
+        Return a dictionary with the hit/miss counters and number of entries
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._store),
+            }
@@ -0,0 +1,161 @@
+"""
+Package DxExecutor
+
+Runs a function against several Delphix Engines on a bounded pool of worker
+threads. Replaces the run_async decorator the scripts used to carry, which
+started one unbounded thread per engine and dropped return values and
+exceptions.
+"""
+
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ALL_COMPLETED
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from .DlpxException import DlpxException
+from .DxLogging import print_debug
+from .DxLogging import print_exception
+
+VERSION = "v.0.0.002"
+
+# Upper bound on the number of engines worked on at the same time
+DEFAULT_MAX_WORKERS = 8
+
+
+def exit_code_of(error):
+    """
+    Translate an exception raised by a worker into a process exit code
+
+    error: The exception, or None if the worker succeeded
+    """
+    if error is None:
+        return 0
+    if isinstance(error, SystemExit):
+        if error.code is None:
+            return 0
+        if isinstance(error.code, int):
+            return error.code
+        return 1
+    return 1
+
+
+class DxExecutor(object):
+    """
+    Submits one function call per engine and collects the results.
+
+    E.g.:
+        executor = DxExecutor()
+        for engine in engines:
+            executor.submit(engine["hostname"], main_workflow, engine)
+        sys.exit(executor.wait())
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        max_workers: Maximum number of engines worked on concurrently.
+                     Default: DEFAULT_MAX_WORKERS
+        """
+        self.max_workers = max_workers
+        self.futures = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, engine_name, func, *args, **kwargs):
+        """
+        Schedule func(*args, **kwargs) and return its future.
+
+        engine_name: Name used to report the result, I.E. engine["hostname"].
+                     Each name can only be submitted once.
+        func: Function to call, I.E. main_workflow
+        """
+        if engine_name in self.futures:
+            raise DlpxException(
+                "{} was already submitted to this executor".format(engine_name)
+            )
+        future = self._pool.submit(func, *args, **kwargs)
+        self.futures[engine_name] = future
+        return future
+
+    def cancel(self):
+        """
+        Cancel every call that has not started yet. Calls already running
+        finish on their own; jobs they submitted keep running on the engine.
+        """
+        cancelled = [name for name, f in self.futures.items() if f.cancel()]
+        if cancelled:
+            print_debug("Cancelled before starting: {}".format(", ".join(cancelled)))
+        self._pool.shutdown(wait=False)
+
+    def wait(self, fail_fast=False):
+        """
+        Wait for the submitted calls, report the ones that raised and return
+        the highest exit code among them (0 when every call succeeded).
+        A CTRL+C cancels the calls still queued and is re-raised.
+
+        fail_fast: Cancel the queued calls as soon as one raises. Default: False
+        """
+        pending = set(self.futures.values())
+        try:
+            while pending:
+                # A timeout keeps the main thread responsive to CTRL+C
+                done, pending = wait(
+                    pending,
+                    timeout=1,
+                    return_when=FIRST_EXCEPTION if fail_fast else ALL_COMPLETED,
+                )
+                if fail_fast and any(
+                    not f.cancelled() and f.exception() is not None for f in done
+                ):
+                    self.cancel()
+                    pending = set(f for f in pending if not f.cancelled())
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        self._pool.shutdown(wait=True)
+        for name in self.futures:
+            error = self.error(name)
+            if error is not None and not isinstance(error, SystemExit):
+                print_exception(
+                    "{}: {}".format(
+                        name,
+                        "".join(
+                            traceback.format_exception(
+                                type(error),
+                                error,
+                                getattr(error, "__traceback__", None),
+                            )
+                        ),
+                    )
+                )
+        return max([self.exit_code(name) for name in self.futures] or [0])
+
+    def error(self, engine_name):
+        """
+        Return the exception raised for an engine, or None
+        """
+        future = self.futures[engine_name]
+        if future.cancelled() or not future.done():
+            return None
+        return future.exception()
+
+    def result(self, engine_name):
+        """
+        Return the value returned for an engine, or None if it raised
+        """
+        if self.error(engine_name) is not None:
+            return None
+        future = self.futures[engine_name]
+        if future.cancelled() or not future.done():
+            return None
+        return future.result()
+
+    def exit_code(self, engine_name):
+        """
+        Return the exit code for an engine. Calls that were cancelled
+        count as failed.
+        """
+        future = self.futures[engine_name]
+        if future.cancelled():
+            return 1
+        return exit_code_of(self.error(engine_name))
@@ -0,0 +1,304 @@
+"""
+Package DxInventory
+
+Collects a flat inventory of the groups, environments, databases, sources and
+capacity consumers of an engine. Every object becomes one row with the
+INVENTORY_FIELDS columns, so the rows of a whole fleet can be written to a
+single JSONL or CSV snapshot.
+"""
+
+import csv
+import errno
+import json
+import os
+from time import time
+
+from delphixpy.v1_8_0.web import database
+from delphixpy.v1_8_0.web import environment
+from delphixpy.v1_8_0.web import group
+from delphixpy.v1_8_0.web import host
+from delphixpy.v1_8_0.web import source
+from delphixpy.v1_8_0.web.capacity import consumer
+
+from .DlpxException import DlpxException
+
+VERSION = "v.0.0.001"
+
+# Object classes collected, in the order they are fetched
+INVENTORY_KINDS = ["group", "environment", "database", "source", "consumer"]
+
+# Columns of every inventory row. Columns that do not apply to a kind of
+# object are left empty.
+INVENTORY_FIELDS = [
+    "collected_at",
+    "engine",
+    "kind",
+    "reference",
+    "name",
+    "type",
+    "group",
+    "container",
+    "parent",
+    "host",
+    "virtual",
+    "enabled",
+    "status",
+    "size",
+    "active_space",
+    "sync_space",
+    "log_space",
+    "seconds",
+    "error",
+]
+
+# Seconds an empty lock file is assumed to belong to a starting process
+LOCK_GRACE = 60
+
+
+def _row(engine_name, kind, obj=None, **columns):
+    row = dict.fromkeys(INVENTORY_FIELDS)
+    row["engine"] = engine_name
+    row["kind"] = kind
+    if obj is not None:
+        # Capacity consumers have no reference of their own
+        row["reference"] = getattr(obj, "reference", None)
+        row["name"] = obj.name
+        row["type"] = obj.type
+    row.update(columns)
+    return row
+
+
+def inventory_rows(
+    engine_name, groups, environments, hosts, databases, sources, consumers
+):
+    """
+    Join the listings of one engine into inventory rows. References to
+    groups, hosts and databases are resolved to names.
+
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    groups, environments, hosts, databases, sources, consumers: Lists from
+        the get_all() of each class
+    :return: List of dictionaries with the INVENTORY_FIELDS keys
+    """
+    group_names = dict((obj.reference, obj.name) for obj in groups)
+    host_names = dict((obj.reference, obj.name) for obj in hosts)
+    db_names = dict((obj.reference, obj.name) for obj in databases)
+
+    rows = []
+    for obj in groups:
+        rows.append(_row(engine_name, "group", obj))
+    for obj in environments:
+        rows.append(
+            _row(
+                engine_name,
+                "environment",
+                obj,
+                # Cluster environments have no single host
+                host=host_names.get(getattr(obj, "host", None)),
+                enabled=obj.enabled,
+            )
+        )
+    for obj in databases:
+        rows.append(
+            _row(
+                engine_name,
+                "database",
+                obj,
+                group=group_names.get(obj.group, obj.group),
+                parent=db_names.get(obj.provision_container, obj.provision_container),
+            )
+        )
+    for obj in sources:
+        runtime = obj.runtime
+        rows.append(
+            _row(
+                engine_name,
+                "source",
+                obj,
+                container=db_names.get(obj.container, obj.container),
+                virtual=obj.virtual,
+                enabled=getattr(runtime, "enabled", None),
+                status=getattr(runtime, "status", None),
+                size=getattr(runtime, "database_size", None),
+            )
+        )
+    for obj in consumers:
+        breakdown = obj.breakdown
+        rows.append(
+            _row(
+                engine_name,
+                "consumer",
+                obj,
+                reference=obj.container,
+                group=obj.group_name,
+                container=db_names.get(obj.container, obj.container),
+                parent=db_names.get(obj.parent, obj.parent),
+                size=getattr(breakdown, "actual_space", None),
+                active_space=getattr(breakdown, "active_space", None),
+                sync_space=getattr(breakdown, "sync_space", None),
+                log_space=getattr(breakdown, "log_space", None),
+            )
+        )
+    return rows
+
+
+def collect_inventory(engine, engine_name):
+    """
+    Fetch each inventory class of an engine once and return the inventory
+    rows and the seconds spent fetching each class
+
+    engine: A Delphix engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    :return: Tuple of (rows, timings)
+    """
+    listings = {}
+    timings = {}
+    for kind, f_class in [
+        ("group", group),
+        ("environment", environment),
+        ("host", host),
+        ("database", database),
+        ("source", source),
+        ("consumer", consumer),
+    ]:
+        time_start = time()
+        listings[kind] = f_class.get_all(engine)
+        timings[kind] = time() - time_start
+
+    rows = inventory_rows(
+        engine_name,
+        listings["group"],
+        listings["environment"],
+        listings["host"],
+        listings["database"],
+        listings["source"],
+        listings["consumer"],
+    )
+    return rows, timings
+
+
+def engine_row(engine_name, seconds, status, error=None):
+    """
+    Return the inventory row recording how collecting one engine went
+
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    seconds: Seconds spent connecting to and collecting the engine
+    status: OK or FAILED
+    error: The error that stopped the collection. Default: None
+    """
+    return _row(
+        engine_name,
+        "engine",
+        name=engine_name,
+        status=status,
+        seconds=round(seconds, 3),
+        error=str(error) if error is not None else None,
+    )
+
+
+def write_inventory(path, rows, out_format="jsonl", collected_at=None):
+    """
+    Write the inventory rows to path. The file is written under a temporary
+    name and renamed into place, so readers never see a partial snapshot.
+
+    path: File to write
+    rows: List of dictionaries returned by inventory_rows()/engine_row()
+    out_format: jsonl (one JSON object per line) or csv. Default: jsonl
+    collected_at: Timestamp stored in the collected_at column. Default: None
+    """
+    if out_format not in ["jsonl", "csv"]:
+        raise DlpxException("Unknown inventory format {}".format(out_format))
+
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w") as out_file:
+        if out_format == "csv":
+            writer = csv.DictWriter(out_file, fieldnames=INVENTORY_FIELDS)
+            writer.writeheader()
+        for row in rows:
+            row = dict(row, collected_at=collected_at)
+            if out_format == "csv":
+                writer.writerow(row)
+            else:
+                out_file.write(json.dumps(row, sort_keys=True) + "\n")
+    os.rename(tmp_path, path)
+
+
+class DxLockFile(object):
+    """
+    Lock file that keeps a periodic job from overlapping itself. A lock left
+    behind by a process that no longer runs is taken over.
+
+        with DxLockFile("./dx_inventory.lock"):
+            ...
+    """
+
+    def __init__(self, path):
+        """
+        path: The lock file to create
+        """
+        self.path = path
+
+    def _age(self):
+        try:
+            return time() - os.path.getmtime(self.path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _running(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    def acquire(self):
+        """
+        Create the lock file, or raise DlpxException if another running
+        process holds it
+        """
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                try:
+                    with open(self.path) as lock_file:
+                        pid = int(lock_file.read().strip() or 0)
+                except (IOError, ValueError):
+                    pid = 0
+                if pid and self._running(pid):
+                    raise DlpxException(
+                        "{} is held by running process {}".format(self.path, pid)
+                    )
+                # An empty lock may belong to a process that has not written
+                # its pid yet
+                if not pid and self._age() < LOCK_GRACE:
+                    raise DlpxException("{} is being created".format(self.path))
+                # Stale lock; remove it and try once more
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+                continue
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return
+        raise DlpxException("Could not create {}".format(self.path))
+
+    def release(self):
+        """
+        Remove the lock file
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
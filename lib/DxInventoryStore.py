@@ -0,0 +1,323 @@
+"""
+Package DxInventoryStore
+
+SQLite store of the last seen state of each engine's objects. Every sync
+records which objects were created, deleted or changed state since the
+previous one, and the list modes of the scripts can answer from the store
+instead of asking the engine.
+
+Only jobs are fetched incrementally, by start time. The engine keeps no
+modification time on groups, environments, databases, sources or capacity
+consumers, so sync_inventory() is given their full listings, and only the
+writes to the store are incremental.
+"""
+
+import json
+import sqlite3
+import threading
+from time import time
+
+from .DxInventory import INVENTORY_KINDS
+from .DxJobTracker import JOB_DONE_STATES
+from .DxJobTracker import api_module
+from .GetReferences import DEFAULT_PAGE_SIZE
+from .GetReferences import get_all_paged
+
+VERSION = "v.0.0.002"
+
+# Columns of a change, as returned by sync() and changes()
+CHANGE_FIELDS = [
+    "engine",
+    "kind",
+    "reference",
+    "name",
+    "change",
+    "old_state",
+    "new_state",
+    "changed_at",
+]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS objects ("
+    " engine TEXT, kind TEXT, reference TEXT, name TEXT, state TEXT,"
+    " data TEXT, updated_at REAL, PRIMARY KEY (engine, kind, reference))",
+    "CREATE TABLE IF NOT EXISTS changes ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, engine TEXT, kind TEXT,"
+    " reference TEXT, name TEXT, change TEXT, old_state TEXT,"
+    " new_state TEXT, changed_at REAL)",
+    "CREATE INDEX IF NOT EXISTS changes_engine ON changes (engine, changed_at)",
+    "CREATE TABLE IF NOT EXISTS syncs ("
+    " engine TEXT, kind TEXT, synced_at REAL, cursor TEXT,"
+    " PRIMARY KEY (engine, kind))",
+]
+
+
+def row_state(row):
+    """
+    Return the part of a row whose change is reported as a state change:
+    the job state of jobs, the enabled flag and status of everything else
+
+    row: Dictionary from lib.DxInventory or job_row()
+    """
+    if row.get("kind") == "job":
+        return row.get("job_state")
+    if row.get("enabled") is None and row.get("status") is None:
+        return None
+    return "{}/{}".format(row.get("enabled"), row.get("status"))
+
+
+def job_row(engine_name, job_obj):
+    """
+    Return the store row of a job
+
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    job_obj: A Job object from job.get() or job.get_all()
+    """
+    return {
+        "engine": engine_name,
+        "kind": "job",
+        "reference": job_obj.reference,
+        "name": job_obj.title,
+        "title": job_obj.title,
+        "job_state": job_obj.job_state,
+        "action_type": job_obj.action_type,
+        "parent_action_state": job_obj.parent_action_state,
+        "percent_complete": job_obj.percent_complete,
+        "target": job_obj.target,
+        "target_name": job_obj.target_name,
+        "user": job_obj.user,
+        "start_time": job_obj.start_time,
+        "update_time": job_obj.update_time,
+    }
+
+
+class DxInventoryStore(object):
+    """
+    Last seen objects of every engine, with a log of the changes between
+    syncs. Safe to share between the main_workflow threads of all engines.
+    """
+
+    def __init__(self, path):
+        """
+        path: The SQLite database file. It is created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def sync(self, engine_name, kind, rows, complete=True, cursor=None, deleted=None):
+        """
+        Apply a listing of one kind of object to the store and return the
+        changes it made, as dictionaries with the columns of the changes
+        table.
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        kind: Kind of object, I.E. database or job
+        rows: Dictionaries with at least reference and name
+        complete: rows is the whole listing, so stored objects missing from
+                  it were deleted. Pass False when rows only holds the
+                  objects fetched because they may have changed.
+                  Default: True
+        cursor: Opaque position saved for the next incremental sync, I.E.
+                the newest job start time seen. Default: None
+        deleted: References of stored objects known to be deleted, I.E.
+                 jobs purged from the engine, when complete is False.
+                 Default: None
+        """
+        now = time()
+        changes = []
+        with self._lock, self._conn:
+            stored = dict(
+                (reference, (name, state, data))
+                for reference, name, state, data in self._conn.execute(
+                    "SELECT reference, name, state, data FROM objects "
+                    "WHERE engine = ? AND kind = ?",
+                    (engine_name, kind),
+                )
+            )
+            seen = set()
+            for row in rows:
+                reference = row["reference"]
+                seen.add(reference)
+                state = row_state(row)
+                data = json.dumps(row, sort_keys=True, default=str)
+                old = stored.get(reference)
+                if old is not None and old[2] == data:
+                    continue
+                if old is None:
+                    change = ("created", None, state)
+                elif old[1] != state:
+                    change = ("state-changed", old[1], state)
+                else:
+                    change = None
+                if change is not None:
+                    changes.append(
+                        (engine_name, kind, reference, row["name"]) + change + (now,)
+                    )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (engine_name, kind, reference, row["name"], state, data, now),
+                )
+
+            gone = set(stored) - seen
+            if not complete:
+                gone &= set(deleted or [])
+            for reference in sorted(gone):
+                name, state, _ = stored[reference]
+                changes.append(
+                    (
+                        engine_name,
+                        kind,
+                        reference,
+                        name,
+                        "deleted",
+                        state,
+                        None,
+                        now,
+                    )
+                )
+                self._conn.execute(
+                    "DELETE FROM objects WHERE engine = ? AND kind = ? "
+                    "AND reference = ?",
+                    (engine_name, kind, reference),
+                )
+
+            self._conn.executemany(
+                "INSERT INTO changes (engine, kind, reference, name, change, "
+                "old_state, new_state, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                changes,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?)",
+                (engine_name, kind, now, cursor),
+            )
+        return [dict(zip(CHANGE_FIELDS, change)) for change in changes]
+
+    def objects(self, engine_name, kind):
+        """
+        Return the stored rows of one kind of object, ordered by name
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        kind: Kind of object, I.E. database or job
+        """
+        with self._lock:
+            return [
+                json.loads(data)
+                for (data,) in self._conn.execute(
+                    "SELECT data FROM objects WHERE engine = ? AND kind = ? "
+                    "ORDER BY name, reference",
+                    (engine_name, kind),
+                )
+            ]
+
+    def last_sync(self, engine_name, kind):
+        """
+        Return (synced_at, cursor) of the last sync of one kind of object,
+        or (None, None) if it was never synced
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        kind: Kind of object, I.E. database or job
+        """
+        with self._lock:
+            result = self._conn.execute(
+                "SELECT synced_at, cursor FROM syncs WHERE engine = ? AND kind = ?",
+                (engine_name, kind),
+            ).fetchone()
+        return result if result is not None else (None, None)
+
+    def changes(self, engine_name=None, kind=None, since=None):
+        """
+        Return the recorded changes, oldest first
+
+        engine_name: Only changes of this engine. Default: all engines
+        kind: Only changes of this kind of object. Default: all kinds
+        since: Only changes after this time (seconds since the epoch).
+               Default: all changes
+        """
+        query = "SELECT engine, kind, reference, name, change, old_state, "
+        query += "new_state, changed_at FROM changes WHERE 1 = 1"
+        params = []
+        for column, value in [("engine", engine_name), ("kind", kind)]:
+            if value is not None:
+                query += " AND {} = ?".format(column)
+                params.append(value)
+        if since is not None:
+            query += " AND changed_at > ?"
+            params.append(since)
+        with self._lock:
+            return [
+                dict(zip(CHANGE_FIELDS, change))
+                for change in self._conn.execute(query + " ORDER BY id", params)
+            ]
+
+    def close(self):
+        """
+        Close the database
+        """
+        with self._lock:
+            self._conn.close()
+
+
+def sync_inventory(store, engine_name, rows):
+    """
+    Apply the inventory rows of one engine to the store and return the
+    changes. Only call this with the rows of a successful collection, or
+    every object would be recorded as deleted.
+
+    store: A DxInventoryStore
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    rows: The rows returned by lib.DxInventory.collect_inventory()
+    """
+    changes = []
+    for kind in INVENTORY_KINDS:
+        changes.extend(
+            store.sync(engine_name, kind, [r for r in rows if r["kind"] == kind])
+        )
+    return changes
+
+
+def sync_jobs(store, engine, engine_name, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch the jobs started since the previous sync, and the current state of
+    the stored jobs that had not finished, then apply them to the store and
+    return the changes. The first sync fetches every job.
+
+    store: A DxInventoryStore
+    engine: A Delphix engine session object
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    page_size: Number of jobs fetched per request. Default: DEFAULT_PAGE_SIZE
+    """
+    job = api_module(engine, "web.job")
+    exceptions = api_module(engine, "exceptions")
+    _, cursor = store.last_sync(engine_name, "job")
+    kwargs = {"from_date": cursor} if cursor else {}
+
+    rows = {}
+    for job_obj in get_all_paged(engine, job, page_size, **kwargs):
+        rows[job_obj.reference] = job_row(engine_name, job_obj)
+    # Jobs stored before they finished are looked up again. The engine may
+    # have purged them since.
+    purged = []
+    for row in store.objects(engine_name, "job"):
+        if row["job_state"] not in JOB_DONE_STATES and row["reference"] not in rows:
+            try:
+                job_obj = job.get(engine, row["reference"])
+            except (exceptions.HttpError, exceptions.RequestError):
+                purged.append(row["reference"])
+                continue
+            rows[row["reference"]] = job_row(engine_name, job_obj)
+
+    start_times = [r["start_time"] for r in rows.values() if r["start_time"]]
+    if cursor:
+        start_times.append(cursor)
+    return store.sync(
+        engine_name,
+        "job",
+        list(rows.values()),
+        complete=False,
+        cursor=max(start_times) if start_times else None,
+        deleted=purged,
+    )
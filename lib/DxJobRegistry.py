@@ -0,0 +1,134 @@
+"""
+Package DxJobRegistry
+
+Keeps every job a script submitted, per engine and in submit order, with the
+operation and target it was submitted for. A script can queue several
+operations on one engine and follow all of their jobs, instead of keeping a
+single job reference per engine that the next operation overwrites.
+"""
+
+import threading
+from collections import OrderedDict
+from time import time
+
+from .DxJobTracker import JOB_DONE_STATES
+
+VERSION = "v.0.0.001"
+
+
+class DxJob(object):
+    """
+    A submitted job and what it was submitted for
+    """
+
+    __slots__ = ("reference", "engine_name", "operation", "target", "submitted_at")
+
+    def __init__(self, reference, engine_name, operation=None, target=None):
+        self.reference = reference
+        self.engine_name = engine_name
+        self.operation = operation
+        self.target = target
+        self.submitted_at = time()
+
+    def __repr__(self):
+        return "DxJob({}, {}, {}, {})".format(
+            self.reference, self.engine_name, self.operation, self.target
+        )
+
+
+class DxJobRegistry(object):
+    """
+    Jobs of each engine that have not been removed yet. Safe to share
+    between the main_workflow threads of all engines.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+
+    def add(self, engine_name, job_ref, operation=None, target=None):
+        """
+        Register a job and return its DxJob. Operations that finished
+        without a job, I.E. engine.last_job is None, are ignored. A job that
+        is already registered keeps its first registration.
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        job_ref: Reference of the job, I.E. engine.last_job
+        operation: What the job does, I.E. rewind
+        target: Name or reference of the object the job works on
+        """
+        if job_ref is None:
+            return None
+        with self._lock:
+            jobs = self._jobs.setdefault(engine_name, OrderedDict())
+            if job_ref not in jobs:
+                jobs[job_ref] = DxJob(job_ref, engine_name, operation, target)
+            return jobs[job_ref]
+
+    def remove(self, engine_name, job_ref):
+        """
+        Stop following a job, I.E. once it finished
+        """
+        with self._lock:
+            jobs = self._jobs.get(engine_name)
+            if jobs is not None:
+                jobs.pop(job_ref, None)
+                if not jobs:
+                    del self._jobs[engine_name]
+
+    def get(self, engine_name, job_ref):
+        """
+        Return the DxJob of a registered job, or None
+        """
+        with self._lock:
+            return self._jobs.get(engine_name, {}).get(job_ref)
+
+    def entries(self, engine_name=None):
+        """
+        Return the DxJobs of one engine, or of all engines, in submit order
+        """
+        with self._lock:
+            if engine_name is not None:
+                return list(self._jobs.get(engine_name, {}).values())
+            return [entry for jobs in self._jobs.values() for entry in jobs.values()]
+
+    def pending(self, engine_name):
+        """
+        Return the references of the registered jobs of an engine, in submit
+        order. The list is a copy, so jobs can be removed while iterating.
+        """
+        with self._lock:
+            return list(self._jobs.get(engine_name, {}))
+
+    def count(self, engine_name=None):
+        """
+        Return the number of registered jobs of one engine, or of all engines
+        """
+        with self._lock:
+            if engine_name is not None:
+                return len(self._jobs.get(engine_name, {}))
+            return sum(len(jobs) for jobs in self._jobs.values())
+
+    def __len__(self):
+        return self.count()
+
+    def wait(self, engine_name, tracker, timeout=None):
+        """
+        Wait for the registered jobs of an engine to finish, through one
+        DxJobTracker instead of a job.get() per job and poll. Finished jobs
+        are removed. Returns an OrderedDict of job reference to state, in
+        submit order.
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        tracker: DxJobTracker of the engine's session
+        timeout: Seconds to wait. Default: until every job finished
+        """
+        refs = self.pending(engine_name)
+        for job_ref in refs:
+            tracker.track(job_ref)
+        tracker.wait_all(timeout)
+        states = OrderedDict((job_ref, tracker.state(job_ref)) for job_ref in refs)
+        for job_ref, state in states.items():
+            if state in JOB_DONE_STATES:
+                self.remove(engine_name, job_ref)
+        return states
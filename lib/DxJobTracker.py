@@ -0,0 +1,218 @@
+"""
+Package DxJobTracker
+
+Follows job completion through the engine's notification channel. Instead of
+calling job.get() for every tracked job on each poll interval, the tracker
+holds one long-poll request open and only re-reads the jobs the engine
+reports as changed.
+"""
+
+import importlib
+import uuid
+from collections import OrderedDict
+from time import sleep
+from time import time
+
+from .DxLogging import print_debug
+from .DxMetrics import METRICS
+
+VERSION = "v.0.0.003"
+
+# Job states that will not change again
+JOB_DONE_STATES = ["CANCELED", "COMPLETED", "FAILED"]
+
+
+def api_module(engine, name):
+    """
+    Import the delphixpy module matching the API version of an engine
+    session. Scripts in this repo use more than one API version, and
+    delphixpy refuses to mix them.
+
+    engine: A Delphix engine session object
+    name: Module path below the version package. I.E. web.job
+    """
+    version = "v" + engine.API_VERSION.replace(".", "_")
+    return importlib.import_module("delphixpy.{}.{}".format(version, name))
+
+
+class DxJobTracker(object):
+    """
+    Tracks the state of jobs on one engine session. Not thread-safe; use one
+    tracker per engine session.
+    """
+
+    def __init__(
+        self, engine, timeout=30, reconcile_interval=300, engine_name=None, metrics=None
+    ):
+        """
+        engine: A Delphix engine session object
+        timeout: Seconds a single notification request waits for events.
+                 Default: 30
+        reconcile_interval: Seconds between full job.get() refreshes, as a
+                            safety net for missed notifications. Default: 300
+        engine_name: Name the jobs are counted under, I.E. engine["hostname"].
+                     Default: the engine's address
+        metrics: DxMetrics counting the jobs that start and finish.
+                 Default: lib.DxMetrics.METRICS
+        """
+        self.engine = engine
+        self.engine_name = engine_name or engine.address
+        self.metrics = METRICS if metrics is None else metrics
+        self._tracked_at = {}
+        self.timeout = timeout
+        self.reconcile_interval = reconcile_interval
+        self.channel = "dxjobtracker-{}".format(uuid.uuid4())
+        self.states = OrderedDict()
+        self._callbacks = {}
+        self._subscribed = False
+        self._last_reconcile = time()
+        self._job = api_module(engine, "web.job")
+        self._notification = api_module(engine, "web.notification")
+        exceptions = api_module(engine, "exceptions")
+        self._errors = (exceptions.HttpError, exceptions.RequestError, IOError)
+
+    def _subscribe(self):
+        # The first request on a channel registers it with the engine. Events
+        # raised after that are queued for us until the next request.
+        if not self._subscribed:
+            self._notification.get_all(self.engine, channel=self.channel, timeout="0")
+            self._subscribed = True
+
+    def _refresh(self, job_ref):
+        job_obj = self._job.get(self.engine, job_ref)
+        state = job_obj.job_state
+        if job_ref not in self.states:
+            self.metrics.job_started(self.engine_name, job_obj)
+            self._tracked_at[job_ref] = time()
+        self.states[job_ref] = state
+        if state in JOB_DONE_STATES:
+            # Lookups of what the job changed can be cached again
+            cache = getattr(self.engine, "dx_cache", None)
+            if cache is not None:
+                cache.job_finished(self.engine, job_ref)
+            tracked_at = self._tracked_at.pop(job_ref, None)
+            self.metrics.job_finished(
+                self.engine_name,
+                job_obj,
+                None if tracked_at is None else time() - tracked_at,
+            )
+            callback = self._callbacks.pop(job_ref, None)
+            if callback is not None:
+                callback(job_ref, state)
+            return True
+        return False
+
+    def _reconcile(self):
+        self._last_reconcile = time()
+        return [job_ref for job_ref in self.pending() if self._refresh(job_ref)]
+
+    def track(self, job_ref, callback=None):
+        """
+        Start tracking a job and return its current state.
+
+        job_ref: Reference of the job, I.E. engine.last_job
+        callback: Optional function called as callback(job_ref, state) once
+                  the job reaches CANCELED, COMPLETED or FAILED
+        """
+        if job_ref not in self.states:
+            self._subscribe()
+            if callback is not None:
+                self._callbacks[job_ref] = callback
+            self._refresh(job_ref)
+        return self.states[job_ref]
+
+    def state(self, job_ref):
+        """
+        Return the last known state of a tracked job, or None
+        """
+        return self.states.get(job_ref)
+
+    def pending(self):
+        """
+        Return the references of tracked jobs that have not finished
+        """
+        return [
+            job_ref
+            for job_ref, state in self.states.items()
+            if state not in JOB_DONE_STATES
+        ]
+
+    def poll(self, timeout=None):
+        """
+        Wait up to timeout seconds for job notifications and apply them.
+        Returns the references of the jobs that finished.
+
+        timeout: Seconds to wait. Default: self.timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            self._subscribe()
+            notifications = self._notification.get_all(
+                self.engine,
+                channel=self.channel,
+                timeout=str(int(timeout * 1000)),
+            )
+        except self._errors as e:
+            # Fall back to polling each job if the channel is unavailable
+            print_debug(
+                "{}: Notification channel failed, polling jobs: {}".format(
+                    self.engine.address, e
+                )
+            )
+            self._subscribed = False
+            sleep(timeout)
+            return self._reconcile()
+
+        changed = []
+        for event in notifications:
+            if event.type == "NotificationDrop":
+                # The engine discarded events, so we cannot trust what we have
+                return self._reconcile()
+            if event.type == "ObjectNotification" and event.object in self.states:
+                if event.object not in changed:
+                    changed.append(event.object)
+
+        if time() - self._last_reconcile >= self.reconcile_interval:
+            return self._reconcile()
+
+        return [
+            job_ref
+            for job_ref in changed
+            if self.states[job_ref] not in JOB_DONE_STATES and self._refresh(job_ref)
+        ]
+
+    def wait_any(self, timeout=None):
+        """
+        Block until at least one pending job finishes, or timeout seconds have
+        passed. Returns the references of the jobs that finished.
+
+        timeout: Seconds to wait. Default: wait until a job finishes
+        """
+        deadline = None if timeout is None else time() + timeout
+        while self.pending():
+            remaining = self.timeout
+            if deadline is not None:
+                remaining = min(remaining, deadline - time())
+                if remaining <= 0:
+                    break
+            finished = self.poll(remaining)
+            if finished:
+                return finished
+        return []
+
+    def wait_all(self, timeout=None):
+        """
+        Block until every tracked job finishes, or timeout seconds have
+        passed. Returns a dictionary of job reference to state.
+
+        timeout: Seconds to wait. Default: wait until all jobs finish
+        """
+        deadline = None if timeout is None else time() + timeout
+        while self.pending():
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+            self.wait_any(remaining)
+        return dict(self.states)
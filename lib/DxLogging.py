@@ -3,68 +3,166 @@ Package DxLogging
 """
 from __future__ import print_function
 
+import atexit
+import copy
+import json
 import logging
+from datetime import datetime
 
-VERSION = "v.0.1.005"
+try:
+    from logging.handlers import QueueHandler
+    from logging.handlers import QueueListener
+    from queue import Queue
+except ImportError:
+    QueueHandler = object
+    QueueListener = Queue = None
 
+VERSION = "v.0.1.006"
 
-def logging_est(logfile_path, debug=False):
+# Format of the records of the log file, unless JSON was asked for
+LOG_FORMAT = "%(levelname)s:%(asctime)s:%(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+# Fields the print_* functions accept and DxJsonFormatter writes
+FIELDS = ("engine", "job", "operation")
+
+
+class DxJsonFormatter(logging.Formatter):
+    """
+    Formats each record as one line of JSON with its time, level, thread,
+    message and the FIELDS given to the print_* functions
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.utcfromtimestamp(record.created).strftime(
+                "%Y-%m-%dT%H:%M:%S.%fZ"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            if getattr(record, field, None) is not None:
+                entry[field] = str(getattr(record, field))
+        if record.exc_info and record.exc_info[0] is not None:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _DxQueueHandler(QueueHandler):
+    """
+    Queues records for the QueueListener writing the logfile. Unlike
+    QueueHandler it leaves the exception of a record to the formatter of
+    the logfile, so DxJsonFormatter can write it as its own field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def logging_est(logfile_path, debug=False, json_format=False, queued=False):
     """
     Establish Logging
 
     logfile_path: path to the logfile. Default: current directory.
     debug: Set debug mode on (True) or off (False). Default: False
+    json_format: Write the logfile as one JSON object per record (True) or
+                 as text (False). Default: False
+    queued: Hand records to a background thread that writes the logfile
+            (True), so a slow disk never blocks the caller. Default: False
     """
 
-    logging.basicConfig(
-        filename=logfile_path,
-        format="%(levelname)s:%(asctime)s:%(message)s",
-        level=logging.INFO,
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-
     logger = logging.getLogger()
 
+    # Like logging.basicConfig, only the first call adds the logfile
+    if not logger.handlers:
+        handler = logging.FileHandler(logfile_path)
+        if json_format:
+            handler.setFormatter(DxJsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATEFMT))
+        if queued and Queue is not None:
+            records = Queue(-1)
+            listener = QueueListener(records, handler)
+            listener.start()
+            # Write out the queued records before the logfile is closed
+            atexit.register(listener.stop)
+            handler = _DxQueueHandler(records)
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
     if debug is True:
-        logger.setLevel(10)
+        logger.setLevel(logging.DEBUG)
         print_info("Debug Logging is enabled.")
 
 
-def print_debug(print_obj, debug=False):
+def _message(print_obj):
+    # Functions are only called here, once debug logging is known to be
+    # enabled, so callers can defer building expensive messages. Classes,
+    # I.E. sys.exc_info()[0], are printed as they are.
+    if callable(print_obj) and not isinstance(print_obj, type):
+        print_obj = print_obj()
+    return str(print_obj)
+
+
+def _fields(fields):
+    return dict((key, value) for key, value in fields.items() if value is not None)
+
+
+def print_debug(print_obj, debug=False, **fields):
     """
-    Call this function with a log message to prefix the message with DEBUG
+    Call this function with a log message to prefix the message with DEBUG.
+    The message is only built if debug logging is enabled, by the debug
+    flag or by logging_est().
 
-    print_obj: Object to print to logfile and stdout
+    print_obj: Object to print to logfile and stdout, or a function
+               returning it
     debug: Flag to enable debug logging. Default: False
+    fields: engine, job and operation the message is about
     :rtype: None
     """
     try:
-        if debug is True:
-            print("DEBUG: {}".format(str(print_obj)))
-            logging.debug(str(print_obj))
+        if debug is True or logging.getLogger().isEnabledFor(logging.DEBUG):
+            message = _message(print_obj)
+            print("DEBUG: {}".format(message))
+            logging.getLogger().log(logging.DEBUG, message, extra=_fields(fields))
     except:
         pass
 
 
-def print_info(print_obj):
+def print_info(print_obj, **fields):
     """
     Call this function with a log message to prefix the message with INFO
+
+    fields: engine, job and operation the message is about
     """
-    print("INFO: {}".format(str(print_obj)))
-    logging.info(str(print_obj))
+    message = str(print_obj)
+    print("INFO: {}".format(message))
+    logging.info(message, extra=_fields(fields))
 
 
-def print_warning(print_obj):
+def print_warning(print_obj, **fields):
     """
-    Call this function with a log message to prefix the message with INFO
+    Call this function with a log message to prefix the message with WARN
+
+    fields: engine, job and operation the message is about
     """
-    print("WARN: %s" % (str(print_obj)))
-    logging.warn(str(print_obj))
+    message = str(print_obj)
+    print("WARN: %s" % (message))
+    logging.warning(message, extra=_fields(fields))
 
 
-def print_exception(print_obj):
+def print_exception(print_obj, **fields):
     """
     Call this function with a log message to prefix the message with EXCEPTION
+
+    fields: engine, job and operation the message is about
     """
-    print(str(print_obj))
-    logging.exception("EXCEPTION: {}".format(str(print_obj)))
+    message = str(print_obj)
+    print(message)
+    logging.exception("EXCEPTION: {}".format(message), extra=_fields(fields))
@@ -0,0 +1,371 @@
+"""
+Package DxMetrics
+
+Counters and histograms of the jobs the scripts run and the requests they
+make, in the Prometheus text format: jobs started and finished by engine
+and type, job durations, time spent waiting in a DxScheduler queue and
+engine API latency. The metrics can be written to a file for the
+node_exporter textfile collector, or served over HTTP while a script runs.
+"""
+
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from .DxLogging import print_info
+from .DxTrace import LATENCY_BUCKETS_MS
+from .DxTrace import endpoint
+from .DxTrace import instrument
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+VERSION = "v.0.0.001"
+
+# Upper bounds, in seconds, of the job duration and queue wait buckets
+JOB_BUCKETS = [1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400]
+
+# Upper bounds, in seconds, of the API latency buckets
+REQUEST_BUCKETS = [bound / 1000.0 for bound in LATENCY_BUCKETS_MS]
+
+# Name of each metric, and its type, help text, labels and buckets
+METRICS_SPEC = OrderedDict(
+    [
+        (
+            "dx_jobs_started_total",
+            ("counter", "Jobs started, by engine and job type", ["engine", "type"]),
+        ),
+        (
+            "dx_jobs_finished_total",
+            (
+                "counter",
+                "Jobs that reached COMPLETED, FAILED or CANCELED",
+                ["engine", "type", "state"],
+            ),
+        ),
+        (
+            "dx_job_duration_seconds",
+            (
+                "histogram",
+                "Seconds from the start of a job to its last update",
+                ["engine", "type", "state"],
+                JOB_BUCKETS,
+            ),
+        ),
+        (
+            "dx_queue_wait_seconds",
+            (
+                "histogram",
+                "Seconds work waited for a DxScheduler slot",
+                ["engine", "operation"],
+                JOB_BUCKETS,
+            ),
+        ),
+        (
+            "dx_api_request_duration_seconds",
+            (
+                "histogram",
+                "Seconds engine API requests took, by endpoint",
+                ["engine", "endpoint"],
+                REQUEST_BUCKETS,
+            ),
+        ),
+        (
+            "dx_api_request_errors_total",
+            (
+                "counter",
+                "Engine API requests that failed or returned an HTTP error",
+                ["engine", "endpoint"],
+            ),
+        ),
+    ]
+)
+
+# Format of the job timestamps, I.E. 2016-10-14T13:27:05.617Z
+JOB_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{{{}}}".format(
+        ",".join('{}="{}"'.format(name, _escape(value)) for name, value in pairs)
+    )
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def job_duration(job_obj):
+    """
+    Return the seconds from the start_time to the update_time of a job, or
+    None if either is missing
+
+    job_obj: A delphixpy Job object
+    """
+    try:
+        start = datetime.strptime(job_obj.start_time[:19], JOB_TIME_FORMAT)
+        end = datetime.strptime(job_obj.update_time[:19], JOB_TIME_FORMAT)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return max(0.0, (end - start).total_seconds())
+
+
+class DxMetrics(object):
+    """
+    Metrics of one script run. Safe to share between the main_workflow
+    threads of all engines.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def _key(self, name, labels):
+        return name, tuple(
+            str(labels.get(label, "")) for label in METRICS_SPEC[name][2]
+        )
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add value to a counter of METRICS_SPEC
+
+        name: Name of the counter, I.E. dx_jobs_started_total
+        value: Amount to add. Default: 1
+        labels: Values of the labels of the counter
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a histogram of METRICS_SPEC
+
+        name: Name of the histogram, I.E. dx_job_duration_seconds
+        value: The observed value
+        labels: Values of the labels of the histogram
+        """
+        key = self._key(name, labels)
+        buckets = METRICS_SPEC[name][3]
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                # One count per bucket, then the sum and the total count
+                counts = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def job_started(self, engine_name, job_obj):
+        """
+        Count a job that started
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        job_obj: A delphixpy Job object
+        """
+        self.inc(
+            "dx_jobs_started_total",
+            engine=engine_name,
+            type=getattr(job_obj, "action_type", None) or "UNKNOWN",
+        )
+
+    def job_finished(self, engine_name, job_obj, seconds=None):
+        """
+        Count a job that finished, and observe its duration
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        job_obj: A delphixpy Job object in a finished state
+        seconds: Duration to use if the job has no start and update time
+        """
+        labels = {
+            "engine": engine_name,
+            "type": getattr(job_obj, "action_type", None) or "UNKNOWN",
+            "state": job_obj.job_state,
+        }
+        self.inc("dx_jobs_finished_total", **labels)
+        duration = job_duration(job_obj)
+        if duration is None:
+            duration = seconds
+        if duration is not None:
+            self.observe("dx_job_duration_seconds", duration, **labels)
+
+    def instrument(self, engine, engine_name=None):
+        """
+        Observe the latency of every request of a DelphixEngine session
+
+        engine: The DelphixEngine session
+        engine_name: Name of the engine, I.E. engine["hostname"].
+                     Default: the engine's address
+        """
+        return instrument(engine, self, engine_name)
+
+    def record(
+        self,
+        engine_name,
+        method,
+        url,
+        status,
+        started,
+        seconds,
+        sent=0,
+        received=0,
+        error=None,
+    ):
+        """
+        Observe one request of an instrumented session. The arguments are
+        those of lib.DxTrace.DxTrace.record().
+        """
+        name = endpoint(method, url)
+        self.observe(
+            "dx_api_request_duration_seconds",
+            seconds,
+            engine=engine_name,
+            endpoint=name,
+        )
+        if error is not None or (status or 0) >= 400:
+            self.inc("dx_api_request_errors_total", engine=engine_name, endpoint=name)
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(
+                (key, list(value)) for key, value in self._histograms.items()
+            )
+
+        lines = []
+        for name, spec in METRICS_SPEC.items():
+            metric_type, help_text, label_names = spec[:3]
+            values = counters if metric_type == "counter" else histograms
+            keys = sorted(key for key in values if key[0] == name)
+            if not keys:
+                continue
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for key in keys:
+                label_values = key[1]
+                if metric_type == "counter":
+                    lines.append(
+                        "{}{} {}".format(
+                            name,
+                            _labels(label_names, label_values),
+                            _number(values[key]),
+                        )
+                    )
+                    continue
+                counts = values[key]
+                for bound, count in zip(
+                    spec[3] + [float("inf")], counts[:-2] + [counts[-1]]
+                ):
+                    lines.append(
+                        "{}_bucket{} {}".format(
+                            name,
+                            _labels(label_names, label_values, ("le", _number(bound))),
+                            count,
+                        )
+                    )
+                lines.append(
+                    "{}_sum{} {}".format(
+                        name, _labels(label_names, label_values), _number(counts[-2])
+                    )
+                )
+                lines.append(
+                    "{}_count{} {}".format(
+                        name, _labels(label_names, label_values), counts[-1]
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """
+        Write the metrics for the node_exporter textfile collector. The file
+        is replaced in one step, so the collector never reads half of it.
+
+        path: The metrics file, I.E. /var/lib/node_exporter/dx_refresh.prom
+        """
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.rename(temp_path, path)
+
+    def serve(self, port, host=""):
+        """
+        Serve the metrics at http://host:port/metrics from a daemon thread,
+        and return the server
+
+        port: TCP port to listen on. 0 picks a free port.
+        host: Address to listen on. Default: every address
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        server = Server((host, int(port)), Handler)
+        thread = threading.Thread(target=server.serve_forever, name="DxMetrics")
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+# Shared by DxJobTracker, DxScheduler and the scripts
+METRICS = DxMetrics()
+
+
+def start_metrics(arguments):
+    """
+    Return METRICS, set up to be written at exit if --metrics_file was
+    given and served if --metrics_port was given. Returns None if neither
+    option was given.
+
+    arguments: The docopt arguments of the script
+    """
+    if not (arguments.get("--metrics_file") or arguments.get("--metrics_port")):
+        return None
+    if arguments.get("--metrics_port"):
+        server = METRICS.serve(arguments["--metrics_port"])
+        print_info(
+            "Serving metrics at http://{}:{}/metrics".format(*server.server_address)
+        )
+    if arguments.get("--metrics_file"):
+        atexit.register(METRICS.write_textfile, arguments["--metrics_file"])
+    return METRICS
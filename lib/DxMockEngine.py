@@ -0,0 +1,688 @@
+"""
+Package DxMockEngine
+
+Local stand-in for a Delphix engine, for tests and benchmarks that cannot
+reach a real one. It serves the subset of /resources/json/delphix that the
+scripts use (session, login, system, groups, environments, databases,
+sources, snapshots, timeflows, jobs, users, capacity and Jet Stream) from
+generated objects, with configurable object counts and injected latency.
+Every POST that acts on an object returns a job that has already
+finished; it completed, unless the object is in failing.
+
+    with DxMockEngine(databases=1000, latency=0.01) as mock:
+        dx_session_obj.serversess(mock.address, "delphix_admin", "delphix")
+
+The address is "host:port", which delphixpy accepts wherever an engine
+address is expected, so it can also be put in the ip_address of a
+dxtools.conf entry.
+"""
+
+import json
+import threading
+from collections import Counter
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+VERSION = "v.0.0.005"
+
+API_PREFIX = "/resources/json/delphix/"
+
+# Number of jobs returned by a job listing without a pageSize, as on a
+# real engine
+DEFAULT_JOB_PAGE_SIZE = 25
+
+# Listings that take pageSize and pageOffset
+PAGED_COLLECTIONS = ["job", "action", "alert", "fault"]
+
+# Query parameters that do not filter on an object field
+IGNORED_PARAMS = ["pageSize", "pageOffset", "timeout", "channel", "toDate"]
+
+# Query parameters whose object field has another name
+PARAM_FIELDS = {"database": "container"}
+
+# Listings served, empty unless generated below
+COLLECTIONS = [
+    "action",
+    "alert",
+    "authorization",
+    "capacity/consumer",
+    "database",
+    "environment",
+    "environment/user",
+    "fault",
+    "group",
+    "host",
+    "jetstream/bookmark",
+    "jetstream/branch",
+    "jetstream/container",
+    "jetstream/datasource",
+    "jetstream/operation",
+    "jetstream/template",
+    "job",
+    "notification",
+    "policy",
+    "replication/spec",
+    "repository",
+    "role",
+    "snapshot",
+    "source",
+    "sourceconfig",
+    "timeflow",
+    "user",
+]
+
+EPOCH = datetime(2026, 1, 1)
+
+
+def _timestamp(minutes):
+    return (EPOCH + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _ok(result, **extra):
+    response = {
+        "type": "ListResult" if isinstance(result, list) else "OKResult",
+        "status": "OK",
+        "result": result,
+        "job": None,
+        "action": None,
+    }
+    response.update(extra)
+    return response
+
+
+def _error(message, error_id="object.missing"):
+    return {
+        "type": "ErrorResult",
+        "status": "ERROR",
+        "error": {
+            "type": "APIError",
+            "details": message,
+            "id": error_id,
+            "commandOutput": None,
+            "diagnoses": [],
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep the connection open between requests, as an engine does
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the body
+    # waits for the client's delayed ACK on every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.mock.count_traffic("sent", len(data))
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.server.mock.count_traffic("received", length)
+            body = json.loads(self.rfile.read(length).decode("utf-8") or "null")
+        status, response, headers = self.server.mock.handle(
+            method, url.path, dict(parse_qsl(url.query)), body
+        )
+        self._reply(status, response, headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class DxMockEngine(object):
+    """
+    HTTP server that answers like a Delphix engine, running on a background
+    thread. Requests served are counted per method and path in requests,
+    and the bytes of their bodies in traffic["received"] and
+    traffic["sent"]. Listings are also counted per collection and query
+    parameters in listings. Jobs that act on a reference added to failing
+    end FAILED.
+    """
+
+    def __init__(
+        self,
+        databases=10,
+        snapshots=2,
+        jobs=25,
+        groups=2,
+        environments=2,
+        users=2,
+        js_objects=2,
+        latency=0,
+        host="127.0.0.1",
+        port=0,
+    ):
+        """
+        databases: Number of databases. Even numbered ones are dSources,
+                   the others VDBs provisioned from the one before.
+                   Default: 10
+        snapshots: Number of snapshots of each database. Default: 2
+        jobs: Number of finished jobs already on the engine. Default: 25
+        groups: Number of groups the databases are spread over. Default: 2
+        environments: Number of environments, each with a host and a user.
+                      Default: 2
+        users: Number of engine users. Default: 2
+        js_objects: Number of Jet Stream templates and containers, each
+                    with a branch, operation, bookmark and data source.
+                    Default: 2
+        latency: Seconds every request is delayed by. Default: 0
+        host: Address to listen on. Default: 127.0.0.1
+        port: Port to listen on. Default: a free port
+        """
+        self.latency = latency
+        self.requests = Counter()
+        self.traffic = Counter()
+        self.listings = Counter()
+        self.failing = set()
+        self.objects = dict((name, OrderedDict()) for name in COLLECTIONS)
+        self._lock = threading.Lock()
+        self._job_count = 0
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+        self._generate(databases, snapshots, jobs, groups, environments, users)
+        self._generate_jetstream(js_objects, databases)
+
+    @property
+    def address(self):
+        """
+        The "host:port" to connect to
+        """
+        host, port = self._server.server_address[:2]
+        return "{}:{}".format(host, port)
+
+    def _add(self, collection, obj, key=None):
+        self.objects[collection][key or obj["reference"]] = obj
+        return obj
+
+    def _generate(self, databases, snapshots, jobs, groups, environments, users):
+        for i in range(1, groups + 1):
+            self._add(
+                "group",
+                {
+                    "type": "Group",
+                    "reference": "GROUP-{}".format(i),
+                    "name": "group{}".format(i),
+                    "description": None,
+                },
+            )
+        for i in range(1, environments + 1):
+            host_ref = "UNIX_HOST-{}".format(i)
+            env_ref = "UNIX_HOST_ENVIRONMENT-{}".format(i)
+            self._add(
+                "host",
+                {
+                    "type": "UnixHost",
+                    "reference": host_ref,
+                    "name": "10.0.0.{}".format(i),
+                    "address": "10.0.0.{}".format(i),
+                },
+            )
+            self._add(
+                "environment",
+                {
+                    "type": "UnixHostEnvironment",
+                    "reference": env_ref,
+                    "name": "env{}".format(i),
+                    "host": host_ref,
+                    "enabled": True,
+                    "primaryUser": "HOST_USER-{}".format(i),
+                },
+            )
+            self._add(
+                "environment/user",
+                {
+                    "type": "EnvironmentUser",
+                    "reference": "HOST_USER-{}".format(i),
+                    "name": "delphix",
+                    "environment": env_ref,
+                },
+            )
+        for i in range(1, users + 1):
+            self._add(
+                "user",
+                {
+                    "type": "User",
+                    "reference": "USER-{}".format(i),
+                    "name": "delphix_admin" if i == 1 else "user{}".format(i),
+                    "enabled": True,
+                },
+            )
+
+        for i in range(1, databases + 1):
+            virtual = i % 2 == 0
+            db_ref = "ORACLE_DB_CONTAINER-{}".format(i)
+            timeflow_ref = "ORACLE_TIMEFLOW-{}".format(i)
+            self._add(
+                "database",
+                {
+                    "type": "OracleDatabaseContainer",
+                    "reference": db_ref,
+                    "name": "{}{}".format("vdb" if virtual else "db", i),
+                    "group": "GROUP-{}".format((i - 1) % max(groups, 1) + 1),
+                    "provisionContainer": "ORACLE_DB_CONTAINER-{}".format(i - 1)
+                    if virtual
+                    else None,
+                    "currentTimeflow": timeflow_ref,
+                    "masked": False,
+                },
+            )
+            self._add(
+                "source",
+                {
+                    "type": "OracleVirtualSource" if virtual else "OracleLinkedSource",
+                    "reference": "ORACLE_{}_SOURCE-{}".format(
+                        "VIRTUAL" if virtual else "LINKED", i
+                    ),
+                    "name": "{}{}".format("vdb" if virtual else "db", i),
+                    "container": db_ref,
+                    "virtual": virtual,
+                    "staging": False,
+                    "runtime": {
+                        "type": "OracleSourceRuntime",
+                        "enabled": "ENABLED",
+                        "status": "RUNNING",
+                        "databaseSize": 1024.0**3 * i,
+                    },
+                },
+            )
+            self._add(
+                "timeflow",
+                {
+                    "type": "OracleTimeflow",
+                    "reference": timeflow_ref,
+                    "name": "default",
+                    "container": db_ref,
+                },
+            )
+            self._add(
+                "capacity/consumer",
+                {
+                    "type": "CurrentConsumerCapacityData",
+                    "name": "{}{}".format("vdb" if virtual else "db", i),
+                    "container": db_ref,
+                    "groupName": "group{}".format((i - 1) % max(groups, 1) + 1),
+                    "parent": "ORACLE_DB_CONTAINER-{}".format(i - 1)
+                    if virtual
+                    else None,
+                    "breakdown": {
+                        "type": "CapacityBreakdown",
+                        "actualSpace": 1024.0**3 * i,
+                        "activeSpace": 1024.0**3,
+                        "syncSpace": 0.0,
+                        "logSpace": 0.0,
+                    },
+                },
+                # Consumers have no reference; they are kept by container
+                key=db_ref,
+            )
+            for j in range(1, snapshots + 1):
+                taken = _timestamp(i * snapshots + j)
+                point = {
+                    "type": "OracleTimeflowPoint",
+                    "timeflow": timeflow_ref,
+                    "location": str(1000 * j),
+                    "timestamp": taken,
+                }
+                self._add(
+                    "snapshot",
+                    {
+                        "type": "OracleSnapshot",
+                        "reference": "ORACLE_SNAPSHOT-{}-{}".format(i, j),
+                        "name": "@{}".format(taken),
+                        "container": db_ref,
+                        "timeflow": timeflow_ref,
+                        "creationTime": taken,
+                        "timezone": "UTC,UTC+0000",
+                        "firstChangePoint": point,
+                        "latestChangePoint": point,
+                    },
+                )
+
+        # Newest first, like the engine's job listing
+        for i in range(jobs, 0, -1):
+            self._add(
+                "job",
+                self._job(
+                    "JOB-{}".format(i),
+                    "FAILED" if i % 10 == 0 else "COMPLETED",
+                    "DB_SYNC",
+                    "ORACLE_DB_CONTAINER-{}".format((i - 1) % max(databases, 1) + 1),
+                    _timestamp(i),
+                ),
+            )
+        self._job_count = jobs
+
+    def _generate_jetstream(self, js_objects, databases):
+        for i in range(1, js_objects + 1):
+            for kind, layout_ref, layout_type in [
+                ("template", "JS_DATA_TEMPLATE-{}".format(i), "JSDataTemplate"),
+                ("container", "JS_DATA_CONTAINER-{}".format(i), "JSDataContainer"),
+            ]:
+                n = i if kind == "template" else js_objects + i
+                branch_ref = "JS_BRANCH-{}".format(n)
+                self._add(
+                    "jetstream/operation",
+                    {
+                        "type": "JSOperation",
+                        "reference": "JS_OPERATION-{}".format(n),
+                        "name": "CREATE_BRANCH",
+                        "endTime": _timestamp(n),
+                    },
+                )
+                self._add(
+                    "jetstream/branch",
+                    {
+                        "type": "JSBranch",
+                        "reference": branch_ref,
+                        "name": "default",
+                        "dataLayout": layout_ref,
+                        "firstOperation": "JS_OPERATION-{}".format(n),
+                    },
+                )
+                self._add(
+                    "jetstream/bookmark",
+                    {
+                        "type": "JSBookmark",
+                        "reference": "JS_BOOKMARK-{}".format(n),
+                        "name": "{}{}-bookmark".format(kind, i),
+                        "branch": branch_ref,
+                        "container": layout_ref if kind == "container" else None,
+                        "template": layout_ref if kind == "template" else None,
+                        "tags": ["mock", kind],
+                        "shared": False,
+                        "timestamp": _timestamp(n),
+                    },
+                )
+                obj = {
+                    "type": layout_type,
+                    "reference": layout_ref,
+                    "name": "js{}{}".format(kind, i),
+                    "activeBranch": branch_ref,
+                    "lastUpdated": _timestamp(n),
+                }
+                if kind == "container":
+                    obj["template"] = "JS_DATA_TEMPLATE-{}".format(i)
+                    obj["owner"] = "USER-1"
+                self._add("jetstream/" + kind, obj)
+                if databases:
+                    # Each data layout has one data source, on a database
+                    db_index = (n - 1) % databases + 1
+                    self._add(
+                        "jetstream/datasource",
+                        {
+                            "type": "JSDataSource",
+                            "reference": "JS_DATA_SOURCE-{}".format(n),
+                            "name": "source{}".format(n),
+                            "dataLayout": layout_ref,
+                            "container": "ORACLE_DB_CONTAINER-{}".format(db_index),
+                            "priority": 1,
+                            "runtime": {
+                                "type": "OracleSISourceConnectionInfo",
+                                "jdbcStrings": [
+                                    "jdbc:oracle:thin:@10.0.0.1:1521:db{}".format(
+                                        db_index
+                                    )
+                                ],
+                            },
+                        },
+                    )
+
+    @staticmethod
+    def _job(reference, job_state, action_type, target, start_time):
+        return {
+            "type": "Job",
+            "reference": reference,
+            "title": "{} {}".format(action_type, target),
+            "jobState": job_state,
+            "parentActionState": job_state,
+            "actionType": action_type,
+            "percentComplete": 100.0,
+            "target": target,
+            "targetName": target,
+            "targetObjectType": None,
+            "user": "USER-1",
+            "startTime": start_time,
+            "updateTime": start_time,
+            "events": [],
+        }
+
+    def _new_job(self, action_type, target):
+        with self._lock:
+            self._job_count += 1
+            job_ref = "JOB-{}".format(self._job_count)
+            job = self._job(
+                job_ref,
+                "FAILED" if target in self.failing else "COMPLETED",
+                action_type,
+                target,
+                datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            )
+            # New jobs go first in the listing
+            jobs = OrderedDict([(job_ref, job)])
+            jobs.update(self.objects["job"])
+            self.objects["job"] = jobs
+        return job_ref
+
+    def _listing(self, collection, params):
+        with self._lock:
+            self.listings[(collection, tuple(sorted(params.items())))] += 1
+        objs = list(self.objects[collection].values())
+        for param, value in params.items():
+            if param in IGNORED_PARAMS:
+                continue
+            if param == "fromDate":
+                objs = [o for o in objs if (o.get("startTime") or "") >= value]
+                continue
+            field = (
+                param if param in (objs[0] if objs else {}) else PARAM_FIELDS.get(param)
+            )
+            if field is None:
+                continue
+            objs = [o for o in objs if str(o.get(field)).lower() == value.lower()]
+        if collection in PAGED_COLLECTIONS:
+            page_size = int(params.get("pageSize", DEFAULT_JOB_PAGE_SIZE))
+            page_offset = int(params.get("pageOffset", 0))
+            objs = objs[page_offset * page_size : (page_offset + 1) * page_size]
+        return objs
+
+    def _find(self, path):
+        """
+        Return (collection, reference, verb) of a path under API_PREFIX
+        """
+        for collection in sorted(COLLECTIONS, key=len, reverse=True):
+            if path == collection:
+                return collection, None, None
+            if path.startswith(collection + "/"):
+                rest = path[len(collection) + 1 :].split("/")
+                if rest[0] in self.objects[collection]:
+                    return collection, rest[0], "/".join(rest[1:]) or None
+                return collection, None, "/".join(rest)
+        return None, None, None
+
+    def count_traffic(self, direction, length):
+        """
+        Add to the bytes received or sent
+
+        direction: received or sent
+        length: Number of bytes
+        """
+        with self._lock:
+            self.traffic[direction] += length
+
+    def handle(self, method, path, params, body):
+        """
+        Answer one request. Returns (HTTP status, response body, headers).
+
+        method: GET or POST
+        path: The URL path
+        params: Dictionary of the query parameters
+        body: The decoded JSON body of a POST, or None
+        """
+        with self._lock:
+            self.requests[(method, path)] += 1
+        if self.latency:
+            sleep(self.latency)
+        if not path.startswith(API_PREFIX):
+            return 404, _error("{} not found".format(path)), None
+        path = path[len(API_PREFIX) :].rstrip("/")
+
+        if method == "POST" and path == "session":
+            return 200, _ok(body), {"Set-Cookie": "JSESSIONID=mock; Path=/"}
+        if method == "POST" and path == "login":
+            return 200, _ok("USER-1"), None
+        if method == "POST" and path == "logout":
+            return 200, _ok(None), None
+        if method == "GET" and path == "system":
+            return (
+                200,
+                _ok(
+                    {
+                        "type": "SystemInfo",
+                        "hostname": "mock-engine",
+                        "productType": "standard",
+                        "buildVersion": {
+                            "type": "VersionInfo",
+                            "major": 6,
+                            "minor": 0,
+                            "micro": 0,
+                            "patch": 0,
+                        },
+                        "apiVersion": {
+                            "type": "APIVersion",
+                            "major": 1,
+                            "minor": 10,
+                            "micro": 6,
+                        },
+                    }
+                ),
+                None,
+            )
+        if method == "GET" and path == "service/time":
+            return (
+                200,
+                _ok(
+                    {
+                        "type": "TimeConfig",
+                        "systemTimeZone": "UTC",
+                        "currentTime": datetime.utcnow().strftime(
+                            "%Y-%m-%dT%H:%M:%S.000Z"
+                        ),
+                    }
+                ),
+                None,
+            )
+
+        collection, reference, verb = self._find(path)
+        if collection is None:
+            return 404, _error("{} not found".format(path)), None
+
+        if method == "GET":
+            if reference is None and verb is None:
+                return 200, _ok(self._listing(collection, params)), None
+            if reference is not None and verb is None:
+                return 200, _ok(self.objects[collection][reference]), None
+            if collection == "snapshot" and verb == "timeflowRange":
+                snapshot = self.objects["snapshot"][reference]
+                return (
+                    200,
+                    _ok(
+                        {
+                            "type": "TimeflowRange",
+                            "provisionable": True,
+                            "startPoint": snapshot["firstChangePoint"],
+                            "endPoint": snapshot["latestChangePoint"],
+                        }
+                    ),
+                    None,
+                )
+            return 404, _error("{} not found".format(path)), None
+
+        if verb == "timeflowRanges":
+            snapshots = [
+                s
+                for s in self.objects["snapshot"].values()
+                if s["timeflow"] == reference
+            ]
+            return (
+                200,
+                _ok(
+                    [
+                        {
+                            "type": "TimeflowRange",
+                            "provisionable": True,
+                            "startPoint": snapshots[0]["firstChangePoint"],
+                            "endPoint": snapshots[-1]["latestChangePoint"],
+                        }
+                    ]
+                    if snapshots
+                    else []
+                ),
+                None,
+            )
+        if reference is None and verb is None and collection == "job":
+            return 404, _error("{} not found".format(path)), None
+
+        # Every other POST creates, updates or acts on an object through a
+        # job that is already finished
+        action_type = (verb or "create").upper()
+        target = reference or "{}-{}".format(
+            collection.split("/")[-1].upper(), self._job_count + 1
+        )
+        job_ref = self._new_job(action_type, target)
+        return (
+            200,
+            _ok(
+                "" if reference else target,
+                job=job_ref,
+                action="ACTION-{}".format(job_ref.split("-")[1]),
+            ),
+            None,
+        )
+
+    def start(self):
+        """
+        Start serving on a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,96 @@
+"""
+Package DxObjectIndex
+
+Hash indexes over a get_all() listing so name, reference, container and group
+lookups do not rescan the whole list for every search.
+"""
+
+from .DxLogging import print_warning
+
+VERSION = "v.0.0.001"
+
+
+class DxObjectIndex(object):
+    """
+    Indexes a list of delphixpy objects by name, reference, container and
+    group. Objects that do not have one of these attributes are simply left
+    out of that index.
+    """
+
+    def __init__(self, objs):
+        """
+        objs: List of objects returned from a get_all() call
+        """
+        self.objs = list(objs)
+        self.by_name = {}
+        self.by_reference = {}
+        self.by_container = {}
+        self.by_group = {}
+
+        # Sort by reference so every lookup returning a list, and every name
+        # shared by more than one object, resolves in the same order each run
+        for obj in sorted(self.objs, key=lambda o: str(getattr(o, "reference", ""))):
+            name = getattr(obj, "name", None)
+            reference = getattr(obj, "reference", None)
+            container = getattr(obj, "container", None)
+            group = getattr(obj, "group", None)
+
+            if name is not None:
+                self.by_name.setdefault(name, []).append(obj)
+            if reference is not None:
+                self.by_reference[reference] = obj
+            if container is not None:
+                self.by_container.setdefault(container, []).append(obj)
+            if group is not None:
+                self.by_group.setdefault(group, []).append(obj)
+
+    def __len__(self):
+        return len(self.objs)
+
+    def find_by_name(self, obj_name, group_ref=None):
+        """
+        Return the object named obj_name, or None if there is no match.
+
+        Names are only unique within a group. When more than one object
+        matches, group_ref narrows the search; if it is still ambiguous the
+        object with the lowest reference is returned.
+
+        obj_name: Name of the object
+        group_ref: Reference of the group the object belongs to. Default: None
+        """
+        matches = self.by_name.get(obj_name, [])
+        if group_ref is not None:
+            matches = [
+                obj for obj in matches if getattr(obj, "group", None) == group_ref
+            ]
+        if len(matches) > 1:
+            print_warning(
+                "{} matches {} objects ({}). Using {}.".format(
+                    obj_name,
+                    len(matches),
+                    ", ".join(obj.reference for obj in matches),
+                    matches[0].reference,
+                )
+            )
+        if matches:
+            return matches[0]
+        return None
+
+    def find_by_reference(self, obj_reference):
+        """
+        Return the object with the given reference, or None
+        """
+        return self.by_reference.get(obj_reference)
+
+    def find_by_container(self, container_ref):
+        """
+        Return the list of objects belonging to a container
+        (sources, snapshots, datasources, timeflows...)
+        """
+        return self.by_container.get(container_ref, [])
+
+    def find_by_group(self, group_ref):
+        """
+        Return the list of objects belonging to a group
+        """
+        return self.by_group.get(group_ref, [])
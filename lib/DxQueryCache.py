@@ -0,0 +1,126 @@
+"""
+Package DxQueryCache
+
+SQLite cache of the rows printed by the read-only listing modes of the
+scripts (--list and friends). With --cached a listing younger than
+--max_age seconds is answered from the cache file without contacting the
+engine; --refresh_cache always asks the engine and stores the new rows.
+"""
+
+import json
+import sqlite3
+import threading
+from time import time
+
+VERSION = "v.0.0.001"
+
+# Defaults of the --cache_file and --max_age options
+DEFAULT_CACHE_FILE = "./dx_query_cache.db"
+DEFAULT_MAX_AGE = 300
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS listings ("
+    " engine TEXT, query TEXT, rows TEXT, stored_at REAL,"
+    " PRIMARY KEY (engine, query))"
+)
+
+
+class DxQueryCache(object):
+    """
+    Rows of listings per engine and query. Safe to share between the
+    main_workflow threads of all engines.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        """
+        path: The SQLite database file. It is created if missing.
+              Default: DEFAULT_CACHE_FILE
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(SCHEMA)
+
+    def get(self, engine_name, query, max_age=DEFAULT_MAX_AGE):
+        """
+        Return (rows, age in seconds) of a stored listing, or (None, None)
+        if there is none younger than max_age
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        query: Identifies the listing and its filters, I.E. "users"
+        max_age: Oldest acceptable listing, in seconds. Default: DEFAULT_MAX_AGE
+        """
+        with self._lock:
+            result = self._conn.execute(
+                "SELECT rows, stored_at FROM listings WHERE engine = ? AND query = ?",
+                (engine_name, query),
+            ).fetchone()
+        if result is None:
+            return None, None
+        age = time() - result[1]
+        if age > float(max_age):
+            return None, None
+        return json.loads(result[0]), age
+
+    def put(self, engine_name, query, rows):
+        """
+        Store the rows of a listing
+
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        query: Identifies the listing and its filters, I.E. "users"
+        rows: List of JSON serializable rows
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)",
+                (engine_name, query, json.dumps(rows, default=str), time()),
+            )
+
+    def invalidate(self, engine_name=None):
+        """
+        Drop the stored listings of one engine, or of every engine
+        """
+        with self._lock, self._conn:
+            if engine_name is None:
+                self._conn.execute("DELETE FROM listings")
+            else:
+                self._conn.execute(
+                    "DELETE FROM listings WHERE engine = ?", (engine_name,)
+                )
+
+    def close(self):
+        """
+        Close the database
+        """
+        with self._lock:
+            self._conn.close()
+
+
+def cached_rows(arguments, engine_name, query, fetch):
+    """
+    Return the rows of a listing according to the --cached, --max_age,
+    --refresh_cache and --cache_file options of a script. Without either
+    flag this is simply fetch().
+
+    arguments: The docopt arguments of the script
+    engine_name: Name of the engine, I.E. engine["hostname"]
+    query: Identifies the listing and its filters, I.E. "users"
+    fetch: Function returning the rows from the engine
+    """
+    if not (arguments.get("--cached") or arguments.get("--refresh_cache")):
+        return fetch()
+
+    cache = DxQueryCache(arguments.get("--cache_file") or DEFAULT_CACHE_FILE)
+    try:
+        if arguments.get("--cached"):
+            rows, _ = cache.get(
+                engine_name, query, arguments.get("--max_age") or DEFAULT_MAX_AGE
+            )
+            if rows is not None:
+                return rows
+        rows = fetch()
+        cache.put(engine_name, query, rows)
+        return rows
+    finally:
+        cache.close()
@@ -0,0 +1,241 @@
+"""
+Package DxScheduler
+
+Decides when queued work items may start so that scripts running against
+several engines at once respect limits per engine, per source host and
+overall. Each engine's main_workflow thread keeps submitting its own jobs;
+the scheduler only tells it which of its items may start now.
+"""
+
+import threading
+from collections import Counter
+from itertools import count
+from time import time
+
+from .DxJobTracker import api_module
+from .DxLogging import print_info
+from .DxMetrics import METRICS
+
+VERSION = "v.0.0.002"
+
+
+def source_hosts(engine):
+    """
+    Map each database (container) reference on an engine to the address of
+    the host its source runs on. Hosts registered on more than one engine
+    share the same key, so a host limit applies across engines.
+
+    engine: A Delphix engine session object
+    """
+    environment = api_module(engine, "web.environment")
+    host = api_module(engine, "web.host")
+    source = api_module(engine, "web.source")
+
+    addresses = dict(
+        (host_obj.reference, host_obj.address) for host_obj in host.get_all(engine)
+    )
+    hosts = {}
+    for env_obj in environment.get_all(engine):
+        # Cluster environments have no single host; fall back to the name
+        host_key = addresses.get(getattr(env_obj, "host", None), env_obj.name)
+        for source_obj in source.get_all(engine, environment=env_obj.reference):
+            hosts[source_obj.container] = host_key
+    return hosts
+
+
+class DxWorkItem(object):
+    """
+    One operation waiting for, or holding, a scheduler slot
+    """
+
+    def __init__(self, engine_name, operation, target, host=None, priority=0):
+        """
+        engine_name: Name of the engine, I.E. engine["hostname"]
+        operation: What will be done, I.E. snapshot or refresh
+        target: The object the operation runs against
+        host: Host the operation loads, used for the host limit. Default: None
+        priority: Items with a higher priority start first. Default: 0
+        """
+        self.engine_name = engine_name
+        self.operation = operation
+        self.target = target
+        self.host = host
+        self.priority = priority
+        self.queued_at = time()
+        self.started_at = None
+        self.seq = None
+
+    def wait_time(self):
+        """
+        Return the seconds this item spent queued (so far)
+        """
+        return (self.started_at or time()) - self.queued_at
+
+
+class DxScheduler(object):
+    """
+    Priority queue of work items with per-engine, per-host and global limits.
+    Safe to share between the main_workflow threads of all engines.
+    """
+
+    def __init__(self, global_limit=None, engine_limit=None, host_limit=None):
+        """
+        global_limit: Maximum items running across all engines. Default: None
+        engine_limit: Maximum items running on one engine. Default: None
+        host_limit: Maximum items running against one host. Default: None
+
+        A limit of None means unlimited. docopt strings are accepted.
+        """
+        self.global_limit = None if global_limit is None else int(global_limit)
+        self.engine_limit = None if engine_limit is None else int(engine_limit)
+        self.host_limit = None if host_limit is None else int(host_limit)
+        self._queue = []
+        self._running = {}
+        self._seq = count()
+        self._cond = threading.Condition()
+        self._started = 0
+        self._max_queued = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _fits(self, item, total, engines, hosts):
+        if self.global_limit is not None and total >= self.global_limit:
+            return False
+        if (
+            self.engine_limit is not None
+            and engines[item.engine_name] >= self.engine_limit
+        ):
+            return False
+        if (
+            self.host_limit is not None
+            and item.host is not None
+            and hosts[item.host] >= self.host_limit
+        ):
+            return False
+        return True
+
+    def enqueue(self, engine_name, operation, target, host=None, priority=0):
+        """
+        Queue a work item and return it. See DxWorkItem for the arguments.
+        """
+        item = DxWorkItem(engine_name, operation, target, host, priority)
+        with self._cond:
+            item.seq = next(self._seq)
+            self._queue.append(item)
+            self._max_queued = max(self._max_queued, len(self._queue))
+        return item
+
+    def start_ready(self, engine_name):
+        """
+        Mark as running, and return, the items of one engine that may start
+        now. Items are considered in priority order across all engines, so
+        a slot another engine's higher priority item could use is left for
+        it.
+
+        engine_name: Name of the engine asking, I.E. engine["hostname"]
+        """
+        with self._cond:
+            running = list(self._running.values())
+            total = len(running)
+            engines = Counter(item.engine_name for item in running)
+            hosts = Counter(item.host for item in running)
+            granted = []
+            for item in sorted(self._queue, key=lambda i: (-i.priority, i.seq)):
+                if not self._fits(item, total, engines, hosts):
+                    continue
+                total += 1
+                engines[item.engine_name] += 1
+                hosts[item.host] += 1
+                if item.engine_name == engine_name:
+                    granted.append(item)
+
+            now = time()
+            for item in granted:
+                self._queue.remove(item)
+                item.started_at = now
+                self._running[(item.engine_name, item.seq)] = item
+                self._started += 1
+                self._wait_total += item.wait_time()
+                self._wait_max = max(self._wait_max, item.wait_time())
+                METRICS.observe(
+                    "dx_queue_wait_seconds",
+                    item.wait_time(),
+                    engine=item.engine_name,
+                    operation=item.operation,
+                )
+            return granted
+
+    def finish(self, item):
+        """
+        Release the slot held by a running item
+
+        item: A DxWorkItem returned by start_ready()
+        """
+        with self._cond:
+            self._running.pop((item.engine_name, item.seq), None)
+            self._cond.notify_all()
+
+    def discard(self, engine_name):
+        """
+        Drop every queued and running item of an engine, I.E. when its
+        main_workflow exits early
+        """
+        with self._cond:
+            self._queue = [i for i in self._queue if i.engine_name != engine_name]
+            for key in [k for k in self._running if k[0] == engine_name]:
+                del self._running[key]
+            self._cond.notify_all()
+
+    def queued(self, engine_name=None):
+        """
+        Return the number of queued items, for one engine or all of them
+        """
+        with self._cond:
+            return len(
+                [
+                    i
+                    for i in self._queue
+                    if engine_name is None or i.engine_name == engine_name
+                ]
+            )
+
+    def running(self, engine_name=None):
+        """
+        Return the number of running items, for one engine or all of them
+        """
+        with self._cond:
+            return len(
+                [k for k in self._running if engine_name is None or k[0] == engine_name]
+            )
+
+    def wait(self, timeout):
+        """
+        Block until another item finishes or timeout seconds pass
+        """
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def stats(self):
+        """
+        Return a dictionary with the queue depth and wait time counters
+        """
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": len(self._running),
+                "max_queued": self._max_queued,
+                "started": self._started,
+                "wait_total": self._wait_total,
+                "wait_max": self._wait_max,
+                "wait_avg": self._wait_total / self._started if self._started else 0.0,
+            }
+
+    def report(self):
+        """
+        Log the queue depth and wait time counters
+        """
+        stats = self.stats()
+        print_info(
+            "Scheduler: {started} started, max queue depth {max_queued}, "
+            "wait avg {wait_avg:.1f}s max {wait_max:.1f}s".format(**stats)
+        )
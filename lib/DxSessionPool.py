@@ -0,0 +1,131 @@
+"""
+Package DxSessionPool
+
+Keeps authenticated Delphix Engine sessions for reuse. Each thread gets its
+own DelphixEngine object per (engine class, address, user, namespace), since
+the object tracks job state and is not safe to share, but a new handle picks
+up the login cookie of an existing one instead of logging in again. Expired
+sessions (HTTP 401) are re-authenticated and the request retried once.
+"""
+
+import threading
+
+from .DxJobTracker import api_module
+from .DxLogging import print_debug
+
+VERSION = "v.0.0.001"
+
+
+class DxSessionPool(object):
+    """
+    Pool of DelphixEngine sessions, safe to share between threads
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._logins = {}
+
+    @staticmethod
+    def _key(engine_class, address, user, namespace):
+        return (engine_class.API_VERSION, address, user, namespace)
+
+    def _handles(self):
+        if not hasattr(self._local, "handles"):
+            self._local.handles = {}
+        return self._local.handles
+
+    def _adopt_login(self, key, engine):
+        # Reuse the cookie of a session another thread already logged in
+        if engine._delphix_session is not None:
+            return
+        with self._lock:
+            login = self._logins.get(key)
+        if login is not None:
+            cookie, delphix_session, logged_in_at = login
+            engine._http_session._cookie = cookie
+            engine._delphix_session = delphix_session
+            engine._login_helper._time_at_last_login = logged_in_at
+
+    def _remember_login(self, key, engine):
+        logged_in_at = engine._login_helper._time_at_last_login
+        if logged_in_at is None or engine._login_helper is not getattr(
+            engine, "_default_login_helper", engine._login_helper
+        ):
+            return
+        with self._lock:
+            self._logins[key] = (
+                engine._http_session._cookie,
+                engine._delphix_session,
+                logged_in_at,
+            )
+
+    def _forget_login(self, key):
+        with self._lock:
+            self._logins.pop(key, None)
+
+    def _wrap(self, key, engine):
+        """
+        Route every request of engine through the login sharing and the
+        retry on an expired session
+        """
+        perform = engine._authenticate_and_perform
+        http_error = api_module(engine, "exceptions").HttpError
+
+        def authenticate_and_perform(action):
+            self._adopt_login(key, engine)
+            try:
+                response = perform(action)
+            except http_error as e:
+                if e.status != 401:
+                    raise
+                print_debug(
+                    "{}: Session expired, logging in again".format(engine.address)
+                )
+                self._forget_login(key)
+                engine.force_relogin()
+                response = perform(action)
+            self._remember_login(key, engine)
+            return response
+
+        engine._authenticate_and_perform = authenticate_and_perform
+
+    def get(self, engine_class, address, user, password, namespace="DOMAIN"):
+        """
+        Return the calling thread's session for an engine, creating it on
+        first use. The login happens lazily on the first request.
+
+        engine_class: The DelphixEngine class of the API version to use
+        address: The engine's address (IP/DNS Name)
+        user: Username to authenticate
+        password: User's password
+        namespace: Namespace to use for this session. Default: DOMAIN
+        """
+        key = self._key(engine_class, address, user, namespace)
+        handles = self._handles()
+        engine = handles.get(key)
+        if engine is None:
+            engine = engine_class(address, user, password, namespace)
+            self._wrap(key, engine)
+            handles[key] = engine
+        return engine
+
+    def discard(self, engine_class, address, user, namespace="DOMAIN"):
+        """
+        Drop the calling thread's session and the shared login for an engine
+        """
+        key = self._key(engine_class, address, user, namespace)
+        self._handles().pop(key, None)
+        self._forget_login(key)
+
+
+# Shared by GetSession and the scripts that build their own sessions
+SESSION_POOL = DxSessionPool()
+
+
+def get_session(engine_class, address, user, password, namespace="DOMAIN"):
+    """
+    Return the calling thread's session from the shared pool. See
+    DxSessionPool.get() for the arguments.
+    """
+    return SESSION_POOL.get(engine_class, address, user, password, namespace)
@@ -0,0 +1,108 @@
+"""
+Package DxSnapshotIndex
+
+Sorted indexes over a snapshot listing, so snapshots are found by name or
+time prefix, or by the nearest change point before or after a time, with a
+binary search instead of a scan of every snapshot.
+"""
+
+from bisect import bisect_left
+from bisect import bisect_right
+
+VERSION = "v.0.0.002"
+
+# Sorts after every character of a timestamp or snapshot name, to find the
+# end of the range of a prefix. The keys are str, which is bytes on Python 2,
+# where "\uffff" is not an escape.
+_PREFIX_END = "\xff" if str is bytes else "\uffff"
+
+
+def normalize_timestamp(timestamp):
+    """
+    Return a timestamp in the engine's format, I.E. 2016-11-15T11:30:17.857Z,
+    so it compares with the change points of the snapshots. The format of
+    the GUI, I.E. "2016-11-15 11:30", only differs by the separator.
+
+    timestamp: The timestamp, or the start of one
+    """
+    return str(timestamp).strip().replace(" ", "T", 1)
+
+
+def change_point_timestamp(snapshot_obj):
+    """
+    Return the timestamp of the latest change point of a snapshot, or an
+    empty string if it has none
+    """
+    point = getattr(snapshot_obj, "latest_change_point", None)
+    return str(getattr(point, "timestamp", None) or "")
+
+
+def _prefix_range(keys, prefix):
+    return bisect_left(keys, prefix), bisect_right(keys, prefix + _PREFIX_END)
+
+
+class DxSnapshotIndex(object):
+    """
+    Indexes the snapshots of a container by the timestamp of their latest
+    change point, and by name
+    """
+
+    def __init__(self, snapshots):
+        """
+        snapshots: List of snapshot objects returned from snapshot.get_all()
+        """
+        # Sort by reference first, so snapshots with the same timestamp or
+        # name resolve in the same order each run
+        snapshots = sorted(snapshots, key=lambda s: str(getattr(s, "reference", "")))
+        self.snapshots = sorted(snapshots, key=change_point_timestamp)
+        self.timestamps = [change_point_timestamp(s) for s in self.snapshots]
+        self._by_name = sorted(snapshots, key=lambda s: str(s.name))
+        self.names = [str(s.name) for s in self._by_name]
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def find_by_name(self, prefix):
+        """
+        Return the snapshots whose name starts with prefix
+
+        prefix: Name of the snapshot, or the start of it
+        """
+        start, end = _prefix_range(self.names, str(prefix))
+        return self._by_name[start:end]
+
+    def find_by_time(self, prefix):
+        """
+        Return the snapshots whose latest change point timestamp starts with
+        prefix, oldest first
+
+        prefix: Timestamp of the snapshot, or the start of it
+        """
+        start, end = _prefix_range(self.timestamps, normalize_timestamp(prefix))
+        return self.snapshots[start:end]
+
+    def before(self, timestamp):
+        """
+        Return the newest snapshot whose latest change point is at or before
+        timestamp, or None
+
+        timestamp: A timestamp in the engine's or the GUI's format
+        """
+        position = bisect_right(self.timestamps, normalize_timestamp(timestamp))
+        return self.snapshots[position - 1] if position else None
+
+    def after(self, timestamp):
+        """
+        Return the oldest snapshot whose latest change point is at or after
+        timestamp, or None
+
+        timestamp: A timestamp in the engine's or the GUI's format
+        """
+        position = bisect_left(self.timestamps, normalize_timestamp(timestamp))
+        return self.snapshots[position] if position < len(self.snapshots) else None
+
+    def latest(self):
+        """
+        Return the snapshot with the newest latest change point, or None
+        """
+        return self.snapshots[-1] if self.snapshots else None
@@ -24,15 +24,17 @@ from delphixpy.v1_8_0.web.vo import TimeflowPointTimestamp
 
 from .DlpxException import DlpxException
 from .DxLogging import print_exception
+from .DxSnapshotIndex import DxSnapshotIndex
 from .GetReferences import convert_timestamp
 from .GetReferences import find_obj_by_name
 from .GetReferences import get_obj_reference
+from .GetReferences import get_snapshot_index
 
 # TODO:
 #    implement debug flag
 
 
-VERSION = "v.0.2.003"
+VERSION = "v.0.2.005"
 
 
 class DxTimeflow(object):
@@ -40,6 +42,35 @@ class DxTimeflow(object):
 
     def __init__(self, engine):
         self.engine = engine
+        # DxSnapshotIndex by container, once prefetch_snapshots() was called
+        self._snapshot_indexes = None
+
+    def prefetch_snapshots(self):
+        """
+        Fetch the snapshots of every database in one call, so find_snapshot
+        does not list the snapshots of each database it is asked about
+        """
+        snapshots = {}
+        for snapshot_obj in snapshot.get_all(self.engine):
+            snapshots.setdefault(snapshot_obj.container, []).append(snapshot_obj)
+        self._snapshot_indexes = dict(
+            (database_ref, DxSnapshotIndex(snapshot_objs))
+            for database_ref, snapshot_objs in snapshots.items()
+        )
+
+    def snapshot_index(self, database_ref):
+        """
+        Return the DxSnapshotIndex of the snapshots of a database. Without
+        prefetch_snapshots() the index is built from one listing of the
+        database's snapshots, kept in the session cache.
+
+        database_ref: Reference of the database
+        """
+        if self._snapshot_indexes is None:
+            return get_snapshot_index(self.engine, database_ref)
+        if database_ref not in self._snapshot_indexes:
+            self._snapshot_indexes[database_ref] = DxSnapshotIndex([])
+        return self._snapshot_indexes[database_ref]
 
     def get_timeflow_reference(self, db_name):
         """
@@ -196,27 +227,26 @@ class DxTimeflow(object):
 
     def find_snapshot(self, database_ref, timestamp, snap_name=None, snap_time=None):
         """
-        Method to find a snapshot by name
+        Method to find a snapshot by the start of its name or of its latest
+        change point timestamp, through the snapshot_index() of the database
 
         database_obj: database reference for the snapshot lookup
+        timestamp: Start of the name or timestamp of the snapshot
         snap_name: name of the snapshot. Default: None
         snap_time: time of the snapshot. Default: None
         """
 
-        snapshots = snapshot.get_all(self.engine, database=database_ref)
-
+        index = self.snapshot_index(database_ref)
         matches = []
-        for snapshot_obj in snapshots:
-            if str(snapshot_obj.name).startswith(timestamp) and snap_name is not None:
-
-                matches.append(snapshot_obj)
-
-            elif (
-                str(snapshot_obj.latest_change_point.timestamp).startswith(timestamp)
-                and snap_time is not None
-            ):
-
-                matches.append(snapshot_obj)
+        if snap_name is not None:
+            matches.extend(index.find_by_name(timestamp))
+        if snap_time is not None:
+            found = set(snapshot_obj.reference for snapshot_obj in matches)
+            matches.extend(
+                snapshot_obj
+                for snapshot_obj in index.find_by_time(timestamp)
+                if snapshot_obj.reference not in found
+            )
 
         if len(matches) == 1:
             return matches[0]
@@ -228,9 +258,17 @@ class DxTimeflow(object):
             )
 
         elif len(matches) < 1:
+            nearest = ""
+            if snap_time is not None:
+                nearest = (
+                    "The nearest snapshots are {} before and {} after it.\n".format(
+                        getattr(index.before(timestamp), "name", None),
+                        getattr(index.after(timestamp), "name", None),
+                    )
+                )
             raise DlpxException(
                 "{}: No matches found for the time "
-                "specified.\n".format(self.engine.address)
+                "specified.\n{}".format(self.engine.address, nearest)
             )
 
     def set_timeflow_point(
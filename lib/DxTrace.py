@@ -0,0 +1,358 @@
+"""
+Package DxTrace
+
+Records every HTTP request made through a DelphixEngine session: the
+method, URL, status, latency and payload sizes, tagged with the calling
+script and the engine. At exit it prints a latency histogram per endpoint
+and can write the requests as OpenTelemetry spans, in the OTLP JSON format
+read by the collector's otlpjsonfile receiver.
+"""
+
+import atexit
+import binascii
+import json
+import os
+import re
+import sys
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from time import time
+
+from .DxLogging import print_info
+
+VERSION = "v.0.0.002"
+
+# Upper bounds, in milliseconds, of the histogram buckets. Slower requests
+# fall in a last, unbounded bucket.
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Path segments that are object references, I.E. ORACLE_DB_CONTAINER-12
+REFERENCE_RE = re.compile(r"^[A-Z][A-Z0-9_]*-[0-9][0-9-]*$")
+
+# OpenTelemetry span kind and status codes
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_UNSET = 0
+STATUS_CODE_ERROR = 2
+
+
+def endpoint(method, path):
+    """
+    Return the endpoint of a request, with references replaced by {ref} so
+    that one request per object adds up to a single endpoint
+
+    method: GET or POST
+    path: The URL path
+    """
+    path = path.lstrip("/").replace("resources/json/delphix/", "", 1)
+    path = path.split("?", 1)[0]
+    return "{} {}".format(
+        method,
+        "/".join(
+            "{ref}" if REFERENCE_RE.match(part) else part for part in path.split("/")
+        ),
+    )
+
+
+def _random_id(size):
+    return binascii.hexlify(os.urandom(size)).decode("ascii")
+
+
+def _attribute(key, value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        return {"key": key, "value": {"stringValue": str(value)}}
+    return {"key": key, "value": {"intValue": str(value)}}
+
+
+class _TracedClient(object):
+    """
+    Stands in for the HttpClient of a DelphixEngine's HttpSession and
+    passes each request to the record() method of a recorder, I.E. a
+    DxTrace
+    """
+
+    def __init__(self, client, recorder, engine_name):
+        self._client = client
+        self._recorder = recorder
+        self._engine_name = engine_name
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def get(self, path, headers):
+        return self._perform("GET", path, "", lambda: self._client.get(path, headers))
+
+    def post(self, path, data, headers):
+        return self._perform(
+            "POST", path, data, lambda: self._client.post(path, data, headers)
+        )
+
+    def _perform(self, method, path, data, request):
+        status, received, error = None, 0, None
+        started = time()
+        try:
+            response = request()
+            status, received = response[0], len(response[2] or b"")
+            return response
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+            raise
+        finally:
+            self._recorder.record(
+                self._engine_name,
+                method,
+                path,
+                status,
+                started,
+                time() - started,
+                len(data or ""),
+                received,
+                error,
+            )
+
+
+def instrument(engine, recorder, engine_name=None):
+    """
+    Pass every request of a DelphixEngine session to recorder.record().
+    Each recorder is added once, however often a session is instrumented.
+
+    engine: The DelphixEngine session
+    recorder: Object with the record() method of DxTrace
+    engine_name: Name the requests are tagged with, I.E.
+                 engine["hostname"]. Default: the engine's address
+    """
+    http_session = engine._http_session
+    client = http_session._client
+    while isinstance(client, _TracedClient):
+        if client._recorder is recorder:
+            return engine
+        client = client._client
+    http_session._client = _TracedClient(
+        http_session._client, recorder, engine_name or engine.address
+    )
+    return engine
+
+
+class DxTrace(object):
+    """
+    Requests of every instrumented session. Safe to share between the
+    main_workflow threads of all engines.
+    """
+
+    def __init__(self, script=None):
+        """
+        script: Name the requests are tagged with.
+                Default: the name of the running script
+        """
+        self.script = script or os.path.basename(sys.argv[0]) or "python"
+        self.trace_id = _random_id(16)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def instrument(self, engine, engine_name=None):
+        """
+        Record the requests of a DelphixEngine session. Instrumenting a
+        session twice has no further effect.
+
+        engine: The DelphixEngine session
+        engine_name: Name the requests are tagged with, I.E.
+                     engine["hostname"]. Default: the engine's address
+        """
+        return instrument(engine, self, engine_name)
+
+    def record(
+        self,
+        engine_name,
+        method,
+        url,
+        status,
+        started,
+        seconds,
+        sent=0,
+        received=0,
+        error=None,
+    ):
+        """
+        Record one request
+
+        engine_name: Engine the request was sent to
+        method: GET or POST
+        url: The URL path
+        status: HTTP status, or None if no response arrived
+        started: Epoch seconds the request was sent at
+        seconds: Latency of the request
+        sent: Bytes in the request body
+        received: Bytes in the response body
+        error: Description of the exception the request raised, if any
+        """
+        with self._lock:
+            self.requests.append(
+                {
+                    "script": self.script,
+                    "engine": engine_name,
+                    "method": method,
+                    "url": url,
+                    "endpoint": endpoint(method, url),
+                    "status": status,
+                    "started": started,
+                    "seconds": seconds,
+                    "sent": sent,
+                    "received": received,
+                    "error": error,
+                    "thread": threading.current_thread().name,
+                    "span_id": _random_id(8),
+                }
+            )
+
+    def histogram(self):
+        """
+        Return the latency statistics of each endpoint, the endpoint taking
+        the most time in total first. Each has the number of requests, the
+        total, median, 95th percentile and maximum latency in seconds, and
+        the number of requests in each bucket of LATENCY_BUCKETS_MS.
+        """
+        with self._lock:
+            requests = list(self.requests)
+        latencies = {}
+        for request in requests:
+            latencies.setdefault(request["endpoint"], []).append(request["seconds"])
+
+        stats = []
+        for name, seconds in latencies.items():
+            seconds.sort()
+            buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for latency in seconds:
+                buckets[bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+            stats.append(
+                OrderedDict(
+                    [
+                        ("endpoint", name),
+                        ("count", len(seconds)),
+                        ("total", sum(seconds)),
+                        ("p50", seconds[(len(seconds) - 1) // 2]),
+                        ("p95", seconds[int(round(0.95 * (len(seconds) - 1)))]),
+                        ("max", seconds[-1]),
+                        ("buckets", buckets),
+                    ]
+                )
+            )
+        return sorted(stats, key=lambda stat: (-stat["total"], stat["endpoint"]))
+
+    def print_histogram(self):
+        """
+        Print the histogram() of the recorded requests
+        """
+        stats = self.histogram()
+        print_info(
+            "{}: {} requests to {} endpoints".format(
+                self.script, sum(stat["count"] for stat in stats), len(stats)
+            )
+        )
+        labels = ["<={}ms".format(bound) for bound in LATENCY_BUCKETS_MS] + [
+            ">{}ms".format(LATENCY_BUCKETS_MS[-1])
+        ]
+        for stat in stats:
+            print_info(
+                "{endpoint}: {count} requests, {total:.3f}s total, p50 "
+                "{p50_ms:.1f}ms, p95 {p95_ms:.1f}ms, max {max_ms:.1f}ms | "
+                "{histogram}".format(
+                    p50_ms=stat["p50"] * 1000,
+                    p95_ms=stat["p95"] * 1000,
+                    max_ms=stat["max"] * 1000,
+                    histogram=" ".join(
+                        "{} {}".format(label, count)
+                        for label, count in zip(labels, stat["buckets"])
+                        if count
+                    ),
+                    **stat
+                )
+            )
+
+    def spans(self):
+        """
+        Return the recorded requests as an OTLP JSON
+        ExportTraceServiceRequest with one span per request
+        """
+        with self._lock:
+            requests = list(self.requests)
+        spans = []
+        for request in requests:
+            attributes = [
+                _attribute("http.method", request["method"]),
+                _attribute("http.url", request["url"]),
+                _attribute("http.request_content_length", request["sent"]),
+                _attribute("http.response_content_length", request["received"]),
+                _attribute("net.peer.name", request["engine"]),
+                _attribute("thread.name", request["thread"]),
+            ]
+            if request["status"] is not None:
+                attributes.append(
+                    _attribute("http.status_code", int(request["status"]))
+                )
+            failed = request["error"] is not None or (request["status"] or 0) >= 400
+            status = {"code": STATUS_CODE_ERROR if failed else STATUS_CODE_UNSET}
+            if request["error"]:
+                status["message"] = request["error"]
+            spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": request["span_id"],
+                    "name": request["endpoint"],
+                    "kind": SPAN_KIND_CLIENT,
+                    "startTimeUnixNano": str(int(request["started"] * 1e9)),
+                    "endTimeUnixNano": str(
+                        int((request["started"] + request["seconds"]) * 1e9)
+                    ),
+                    "attributes": attributes,
+                    "status": status,
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_attribute("service.name", self.script)]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "lib.DxTrace", "version": VERSION},
+                            "spans": spans,
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def write_spans(self, path):
+        """
+        Append the spans() to a file as one line of JSON
+
+        path: The span file. It is created if missing.
+        """
+        with open(path, "a") as span_file:
+            span_file.write(json.dumps(self.spans()) + "\n")
+
+    def report(self, span_path=None):
+        """
+        Print the histogram and, if a path is given, write the spans
+
+        span_path: The span file. Default: None, no spans are written
+        """
+        self.print_histogram()
+        if span_path:
+            self.write_spans(span_path)
+            print_info("Wrote {} spans to {}".format(len(self.requests), span_path))
+
+
+def start_trace(arguments):
+    """
+    Return a DxTrace reporting at exit if the --trace or --trace_file
+    options of a script were given, otherwise None
+
+    arguments: The docopt arguments of the script
+    """
+    if not (arguments.get("--trace") or arguments.get("--trace_file")):
+        return None
+    trace = DxTrace()
+    atexit.register(trace.report, arguments.get("--trace_file"))
+    return trace
@@ -13,6 +13,7 @@ from delphixpy.v1_8_0.exceptions import RequestError
 from delphixpy.v1_8_0.web import database
 from delphixpy.v1_8_0.web import job
 from delphixpy.v1_8_0.web import repository
+from delphixpy.v1_8_0.web import snapshot
 from delphixpy.v1_8_0.web import source
 from delphixpy.v1_8_0.web import sourceconfig
 from delphixpy.v1_8_0.web.service import time
@@ -20,34 +21,204 @@ from delphixpy.v1_8_0.web.service import time
 from .DlpxException import DlpxException
 from .DxLogging import print_debug
 from .DxLogging import print_exception
+from .DxObjectIndex import DxObjectIndex
+from .DxSnapshotIndex import DxSnapshotIndex
 
-VERSION = "v.0.2.0019"
+VERSION = "v.0.2.0026"
 
+# Number of objects requested per call by get_all_paged()
+DEFAULT_PAGE_SIZE = 100
 
-def convert_timestamp(engine, timestamp):
+UTC_TZ = tz.gettz("UTC")
+
+
+def get_cached_objects(engine, f_class, **kwargs):
     """
-    Convert timezone from Zulu/UTC to the Engine's timezone
+    Return f_class.get_all(engine, **kwargs), using the session cache
+    attached by GetSession.serversess when one is present.
+    engine: A Delphix engine session object
+    f_class: The objects class. I.E. database or timeflow.
+    kwargs: Filter arguments passed through to get_all()
+    :return: List of objects
+    """
+    cache = getattr(engine, "dx_cache", None)
+    if cache is None:
+        return f_class.get_all(engine, **kwargs)
+    return cache.get_all(engine, f_class, **kwargs)
+
+
+def get_cached_object(engine, f_class, obj_reference):
+    """
+    Return f_class.get(engine, obj_reference), using the session cache
+    attached by GetSession.serversess when one is present.
+    engine: A Delphix engine session object
+    f_class: The objects class. I.E. database or timeflow.
+    obj_reference: Reference of the object to retrieve
+    """
+    cache = getattr(engine, "dx_cache", None)
+    if cache is None:
+        return f_class.get(engine, obj_reference)
+    return cache.get(engine, f_class, obj_reference)
+
+
+def get_object_index(engine, f_class, **kwargs):
+    """
+    Return a DxObjectIndex (name, reference, container and group lookups)
+    built from a single f_class.get_all(engine, **kwargs) call. The index is
+    kept in the session cache when one is present.
+    engine: A Delphix engine session object
+    f_class: The objects class. I.E. database or timeflow.
+    kwargs: Filter arguments passed through to get_all()
+    """
+    cache = getattr(engine, "dx_cache", None)
+    if cache is None:
+        return DxObjectIndex(f_class.get_all(engine, **kwargs))
+    return cache.get_index(engine, f_class, **kwargs)
+
+
+def peek_object_index(engine, f_class):
+    """
+    Return the DxObjectIndex of f_class if the session cache already holds
+    one, or None. Unlike get_object_index() it never lists the class.
+    engine: A Delphix engine session object
+    f_class: The objects class. I.E. database or timeflow.
+    """
+    cache = getattr(engine, "dx_cache", None)
+    if cache is None:
+        return None
+    return cache.peek_index(engine, f_class)
+
+
+def get_snapshot_index(engine, database_ref=None):
+    """
+    Return a DxSnapshotIndex (name and change point lookups) built from a
+    single snapshot.get_all() call. The index is kept in the session cache
+    when one is present.
+    engine: A Delphix engine session object
+    database_ref: Only index the snapshots of this database.
+                  Default: the snapshots of every database
+    """
+    kwargs = {} if database_ref is None else {"database": database_ref}
+    cache = getattr(engine, "dx_cache", None)
+    if cache is None:
+        return DxSnapshotIndex(snapshot.get_all(engine, **kwargs))
+    return cache.get_index(engine, snapshot, DxSnapshotIndex, **kwargs)
+
+
+def running_job(engine):
+    """
+    Return the job of the last call of an engine session while it is still
+    running, I.E. submitted under job_mode(False) and not waited for yet,
+    or None
+    engine: A Delphix engine session object
+    """
+    if not getattr(engine, "is_async", False):
+        # Without asyncly, delphixpy waited for the job before returning
+        return None
+    if engine.last_job in engine.job_contexts[-1][1]:
+        return engine.last_job
+    return None
+
+
+def invalidate_cache(engine, f_class=None):
+    """
+    Drop cached lookups for an engine after a mutating call
+    (provision, delete, refresh, ...), along with the lookups of the
+    classes the call also changes. When the call's job is still running,
+    the classes are not cached until the job finished, as seen by
+    lib.DxJobTracker or at the end of GetSession.job_mode().
+    engine: A Delphix engine session object
+    f_class: Only drop entries for this class. Default: all classes
+    """
+    cache = getattr(engine, "dx_cache", None)
+    if cache is not None:
+        cache.invalidate(engine, f_class, running_job(engine))
+
+
+def get_all_paged(engine, f_class, page_size=DEFAULT_PAGE_SIZE, limit=None, **kwargs):
+    """
+    Generator that walks a paged listing one page at a time and yields the
+    objects lazily, so only one page is held in memory. Stop iterating, or
+    pass limit, to end early without fetching the remaining pages.
+    engine: A Delphix engine session object
+    f_class: A class whose get_all() takes page_size and page_offset.
+             I.E. job, fault, alert, action or timeflow.oracle.log
+    page_size: Number of objects requested per call. Default: DEFAULT_PAGE_SIZE
+    limit: Stop after this many objects. Default: all objects
+    kwargs: Filter arguments passed through to get_all()
+    """
+    page_offset = 0
+    count = 0
+    first_ref = None
+    while True:
+        page = f_class.get_all(
+            engine, page_size=page_size, page_offset=page_offset, **kwargs
+        )
+        if not page:
+            return
+        # Guard against a listing that ignores page_offset and keeps
+        # returning the same page
+        if page_offset > 0 and getattr(page[0], "reference", None) == first_ref:
+            return
+        first_ref = getattr(page[0], "reference", None)
+        for obj in page:
+            yield obj
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if len(page) < page_size:
+            return
+        page_offset += 1
+
+
+def engine_timezone(engine, refresh=False):
+    """
+    Return the tzinfo of the Engine's system_time_zone. It is looked up once
+    per session and kept on the session object.
     engine: A Delphix engine session object.
-    timestamp: the timstamp in Zulu/UTC to be converted
+    refresh: Look the timezone up again, I.E. after changing it on the
+             engine. Default: False
     """
+    engine_tz = getattr(engine, "dx_time_zone", None)
+    if engine_tz is None or refresh:
+        engine_tz = tz.gettz(time.time.get(engine).system_time_zone)
+        engine.dx_time_zone = engine_tz
+    return engine_tz
 
-    default_tz = tz.gettz("UTC")
-    engine_tz = time.time.get(engine)
 
+def _convert(timestamp, convert_tz):
     try:
-        convert_tz = tz.gettz(engine_tz.system_time_zone)
         utc = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
-        utc = utc.replace(tzinfo=default_tz)
-        converted_tz = utc.astimezone(convert_tz)
-        engine_local_tz = "{} {} {}".format(
-            str(converted_tz.date()),
-            str(converted_tz.time()),
-            str(converted_tz.tzname()),
-        )
-
-        return engine_local_tz
     except TypeError:
         return None
+    converted_tz = utc.replace(tzinfo=UTC_TZ).astimezone(convert_tz)
+    return "{} {} {}".format(
+        str(converted_tz.date()),
+        str(converted_tz.time()),
+        str(converted_tz.tzname()),
+    )
+
+
+def convert_timestamp(engine, timestamp):
+    """
+    Convert timezone from Zulu/UTC to the Engine's timezone
+    engine: A Delphix engine session object.
+    timestamp: the timstamp in Zulu/UTC to be converted
+    """
+    return _convert(timestamp, engine_timezone(engine))
+
+
+def convert_timestamps(engine, timestamps):
+    """
+    Convert a list of timestamps from Zulu/UTC to the Engine's timezone,
+    with one timezone lookup for the whole list
+    engine: A Delphix engine session object.
+    timestamps: List of timestamps in Zulu/UTC, I.E. 2016-10-14T13:27:05.
+                None is converted to None.
+    :return: List of the converted timestamps, in the same order
+    """
+    convert_tz = engine_timezone(engine)
+    return [_convert(timestamp, convert_tz) for timestamp in timestamps]
 
 
 def find_all_objects(engine, f_class):
@@ -61,7 +232,7 @@ def find_all_objects(engine, f_class):
     return_lst = []
 
     try:
-        return f_class.get_all(engine)
+        return get_cached_objects(engine, f_class)
 
     except (JobError, HttpError) as e:
         raise DlpxException(
@@ -95,17 +266,20 @@ def get_running_job(engine, target_ref):
 def find_obj_list(obj_lst, obj_name):
     """
     Function to find an object in a list of objects
-    obj_lst: List containing objects from the get_all() method
+    obj_lst: List containing objects from the get_all() method, or a
+             DxObjectIndex built from one
     obj_name: Name of the object to match
     :return: The named object. None is returned if no match is found.`
     """
+    if isinstance(obj_lst, DxObjectIndex):
+        return obj_lst.find_by_name(obj_name)
     for obj in obj_lst:
         if obj_name == obj.name:
             return obj
     return None
 
 
-def find_obj_by_name(engine, f_class, obj_name, active_branch=False):
+def find_obj_by_name(engine, f_class, obj_name, active_branch=False, group_ref=None):
     """
     Function to find objects by name and object class, and return object's
     reference as a string
@@ -115,34 +289,28 @@ def find_obj_by_name(engine, f_class, obj_name, active_branch=False):
     active_branch: Default = False. If true, return list containing
                    the object's reference and active_branch. Otherwise, return
                    the reference.
+    group_ref: Default = None. Reference of the group to search within when
+               the same name exists in more than one group.
     """
 
-    return_list = []
-
     try:
-        all_objs = f_class.get_all(engine)
+        obj = get_object_index(engine, f_class).find_by_name(obj_name, group_ref)
     except AttributeError as e:
         raise DlpxException(
             "Could not find reference for object class" "{}.\n".format(e)
         )
-    for obj in all_objs:
-        if obj.name == obj_name:
 
-            if active_branch is False:
-                return obj
+    # If the object isn't found, raise an exception.
+    if obj is None:
+        raise DlpxException(
+            "{} was not found on engine {}.\n".format(obj_name, engine.address)
+        )
 
-            # This code is for JS objects only.
-            elif active_branch is True:
-                return_list.append(obj.reference)
-                return_list.append(obj.active_branch)
-                return return_list
+    # This code is for JS objects only.
+    if active_branch is True:
+        return [obj.reference, obj.active_branch]
 
-            return obj
-
-    # If the object isn't found, raise an exception.
-    raise DlpxException(
-        "{} was not found on engine {}.\n".format(obj_name, engine.address)
-    )
+    return obj
 
 
 def find_source_by_dbname(engine, f_class, obj_name, active_branch=False):
@@ -157,23 +325,20 @@ def find_source_by_dbname(engine, f_class, obj_name, active_branch=False):
                    the reference.
     """
 
-    return_list = []
-
     try:
-        all_objs = f_class.get_all(engine)
+        obj = get_object_index(engine, f_class).find_by_name(obj_name)
     except AttributeError as e:
         raise DlpxException(
             "Could not find reference for object class" "{}.\n".format(e)
         )
-    for obj in all_objs:
 
-        if obj.name == obj_name:
-            print_debug("object: {}\n\n".format(obj))
-            print_debug(obj.name)
-            print_debug(obj.reference)
-            source_obj = source.get_all(engine, database=obj.reference)
-            print_debug("source: {}\n\n".format(source_obj))
-            return source_obj[0]
+    if obj is not None:
+        print_debug(obj.name)
+        print_debug(obj.reference)
+        source_objs = get_object_index(engine, source).find_by_container(obj.reference)
+        if source_objs:
+            print_debug("source: {}".format(source_objs[0].reference))
+            return source_objs[0]
 
     # If the object isn't found, raise an exception.
     raise DlpxException(
@@ -191,26 +356,26 @@ def get_obj_reference(engine, obj_type, obj_name, search_str=None, container=Fal
     """
 
     ret_lst = []
+    obj_index = get_object_index(engine, obj_type)
 
-    results = obj_type.get_all(engine)
-
-    for result in results:
-        if container is False:
-            if result.name == obj_name:
-                ret_lst.append(result.reference)
+    if container is False:
+        result = obj_index.find_by_name(obj_name)
+        if result is not None:
+            ret_lst.append(result.reference)
 
-                if search_str:
-                    if re.search(search_str, result.reference, re.IGNORECASE):
-                        ret_lst.append(True)
-                    else:
-                        ret_lst.append(False)
+            if search_str:
+                if re.search(search_str, result.reference, re.IGNORECASE):
+                    ret_lst.append(True)
+                else:
+                    ret_lst.append(False)
 
-                return ret_lst
-        else:
-            if result.container == obj_name:
-                ret_lst.append(result.reference)
+            return ret_lst
+    else:
+        results = obj_index.find_by_container(obj_name)
+        if results:
+            ret_lst.append(results[0].reference)
 
-                return ret_lst
+            return ret_lst
 
     raise DlpxException("Reference not found for {}".format(obj_name))
 
@@ -224,8 +389,13 @@ def find_obj_name(engine, f_class, obj_reference):
     obj_reference: The object reference to retrieve the name
     """
     try:
-        obj_name = f_class.get(engine, obj_reference)
-        return obj_name.name
+        # Resolve from the class listing when another lookup already indexed
+        # it, otherwise get() the one object
+        index = peek_object_index(engine, f_class)
+        obj = None if index is None else index.find_by_reference(obj_reference)
+        if obj is None:
+            obj = get_cached_object(engine, f_class, obj_reference)
+        return obj.name
 
     except RequestError as e:
         raise DlpxException(e)
@@ -290,13 +460,12 @@ def find_sourceconfig(engine, sourceconfig_name, f_environment_ref):
         "environment reference of %s and a name of %s"
         % (f_environment_ref, sourceconfig_name)
     )
-    all_objs = sourceconfig.get_all(engine, environment=f_environment_ref)
-    for obj in all_objs:
-        if obj.name == sourceconfig_name:
-            print_debug("Found a match %s".format(obj.reference))
-            return obj
-        else:
-            raise DlpxException(
-                "No sourceconfig match found for type {}."
-                "\n".format(sourceconfig_name)
-            )
+    obj = get_object_index(
+        engine, sourceconfig, environment=f_environment_ref
+    ).find_by_name(sourceconfig_name)
+    if obj is None:
+        raise DlpxException(
+            "No sourceconfig match found for type {}.\n".format(sourceconfig_name)
+        )
+    print_debug("Found a match {}".format(obj.reference))
+    return obj
@@ -10,6 +10,8 @@
 
 import json
 import ssl
+import threading
+from contextlib import contextmanager
 from distutils.version import LooseVersion
 from time import sleep
 
@@ -23,10 +25,16 @@ from delphixpy.v1_8_0.web import system
 from delphixpy.v1_8_0.web.vo import SystemInfo
 
 from .DlpxException import DlpxException
+from .DxCache import DEFAULT_TTL
+from .DxCache import DxCache
+from .DxJobRegistry import DxJobRegistry
+from .DxJobTracker import DxJobTracker
 from .DxLogging import print_debug
 from .DxLogging import print_info
+from .DxSessionPool import SESSION_POOL
+from .GetReferences import get_all_paged
 
-VERSION = "v.0.2.10"
+VERSION = "v.0.2.16"
 
 
 class GetSession(object):
@@ -35,14 +43,38 @@ class GetSession(object):
     object
     """
 
-    def __init__(self):
-        self.server_session = None
+    def __init__(self, cache_ttl=DEFAULT_TTL, trace=None, metrics=None):
+        """
+        cache_ttl: Number of seconds lookups made through lib.GetReferences
+                   are cached for this session. 0 disables caching.
+        trace: lib.DxTrace.DxTrace recording the requests of the engine
+               sessions. Default: None, requests are not recorded.
+        metrics: lib.DxMetrics.DxMetrics observing the latency of the
+                 requests of the engine sessions. Default: None
+        """
+        self._local = threading.local()
         self.dlpx_engines = {}
-        self.jobs = {}
+        # Every job the scripts submitted, per engine
+        self.jobs = DxJobRegistry()
+        self.cache = DxCache(cache_ttl)
+        self.trace = trace
+        self.metrics = metrics
 
     def __getitem__(self, key):
         return self.data[key]
 
+    @property
+    def server_session(self):
+        """
+        The engine session of the calling thread. Each main_workflow thread
+        works against its own engine, so the session is kept per thread.
+        """
+        return getattr(self._local, "server_session", None)
+
+    @server_session.setter
+    def server_session(self, value):
+        self._local.server_session = value
+
     def get_config(self, config_file_path="./dxtools.conf"):
         """
         This method reads in the dxtools.conf file
@@ -102,17 +134,15 @@ class GetSession(object):
         #                ssl._create_default_https_context = ssl._create_unverified_context
 
         try:
-            if f_engine_password:
-                self.server_session = DelphixEngine(
-                    f_engine_address,
-                    f_engine_username,
-                    f_engine_password,
-                    f_engine_namespace,
-                )
-            elif f_engine_password is None:
-                self.server_session = DelphixEngine(
-                    f_engine_address, f_engine_username, None, f_engine_namespace
-                )
+            # Reuse this thread's session, or the login of another thread's
+            # session, from the pool instead of logging in again
+            self.server_session = SESSION_POOL.get(
+                DelphixEngine,
+                f_engine_address,
+                f_engine_username,
+                f_engine_password,
+                f_engine_namespace,
+            )
 
         except (HttpError, RequestError, JobError) as e:
             raise DlpxException(
@@ -120,6 +150,57 @@ class GetSession(object):
                 " to {}:\n {}\n".format(f_engine_address, e)
             )
 
+        # lib.GetReferences only receives the engine object, so the cache
+        # travels with it.
+        self.server_session.dx_cache = self.cache
+        for recorder in [self.trace, self.metrics]:
+            if recorder is not None:
+                recorder.instrument(
+                    self.server_session, self.engine_name(f_engine_address)
+                )
+
+    def engine_name(self, f_engine_address):
+        """
+        Return the hostname in dxtools.conf of the engine at an address, or
+        the address if it is not in the configuration
+
+        f_engine_address: The Virtualization Engine's address (IP/DNS Name)
+        """
+        for hostname, engine in self.dlpx_engines.items():
+            if engine.get("ip_address") == f_engine_address:
+                return hostname
+        return f_engine_address
+
+    def add_job(self, operation=None, target=None):
+        """
+        Register the last job of the current engine session in self.jobs,
+        under the engine's name in dxtools.conf. Returns its DxJob, or None
+        if the operation did not start a job.
+
+        operation: What the job does, I.E. rewind
+        target: Name of the object the job works on
+        """
+        return self.jobs.add(
+            self.engine_name(self.server_session.address),
+            self.server_session.last_job,
+            operation,
+            target,
+        )
+
+    def job_tracker(self):
+        """
+        Return the DxJobTracker for the current engine session, creating it on
+        first use so the notification channel is subscribed once per session.
+        """
+        tracker = getattr(self.server_session, "dx_job_tracker", None)
+        if tracker is None:
+            tracker = DxJobTracker(
+                self.server_session,
+                engine_name=self.engine_name(self.server_session.address),
+            )
+            self.server_session.dx_job_tracker = tracker
+        return tracker
+
     def job_mode(self, single_thread=True):
         """
         This method tells Delphix how to execute jobs, based on the
@@ -133,7 +214,7 @@ class GetSession(object):
         # Synchronously (one at a time)
         if single_thread is True:
             print_debug("These jobs will be executed synchronously")
-            return job_context.sync(self.server_session)
+            return self._job_context(job_context.sync(self.server_session))
 
         # Or asynchronously
         elif single_thread is False:
@@ -144,9 +225,23 @@ class GetSession(object):
                 "%s.%s.%s"
                 % (build_version.major, build_version.minor, build_version.micro)
             ) < LooseVersion("5.3.5"):
-                return job_context.asyncly(self.server_session)
+                return self._job_context(job_context.asyncly(self.server_session))
             else:
-                return job_context.asyncly(self.server_session)
+                return self._job_context(job_context.asyncly(self.server_session))
+
+    @contextmanager
+    def _job_context(self, context):
+        # On a clean exit, asyncly waited for every job submitted in the
+        # context, so the lookups they changed can be cached again
+        engine = self.server_session
+        cache = getattr(engine, "dx_cache", None)
+        running = cache.running(engine) if cache is not None else []
+        with context:
+            yield
+        if cache is not None:
+            for job_ref in cache.running(engine):
+                if job_ref not in running:
+                    cache.job_finished(engine, job_ref)
 
     def job_wait(self):
         """
@@ -154,20 +249,24 @@ class GetSession(object):
 
         No arguments
         """
-        # Grab all the jos on the server (the last 25, be default)
-        all_jobs = job.get_all(self.server_session)
+        # Walk every page of the unfinished jobs, not just the engine's
+        # default page of the last 25 jobs. Collect them first; the listing
+        # shifts as jobs finish while we wait.
+        unfinished = []
+        for job_state in ["RUNNING", "SUSPENDED"]:
+            unfinished.extend(
+                get_all_paged(self.server_session, job, job_state=job_state)
+            )
 
-        # For each job in the list, check to see if it is running (not ended)
-        for jobobj in all_jobs:
-            if not (jobobj.job_state in ["CANCELED", "COMPLETED", "FAILED"]):
-                print_debug(
-                    "\nDEBUG: Waiting for %s (currently: %s) to "
-                    "finish running against the container.\n"
-                    % (jobobj.reference, jobobj.job_state)
-                )
+        for jobobj in unfinished:
+            print_debug(
+                "\nDEBUG: Waiting for %s (currently: %s) to "
+                "finish running against the container.\n"
+                % (jobobj.reference, jobobj.job_state)
+            )
 
-                # If so, wait
-                job_context.wait(self.server_session, jobobj.reference)
+            # If so, wait
+            job_context.wait(self.server_session, jobobj.reference)
 
     def server_wait(self):
         """
@@ -1,5 +1,18 @@
 from . import DlpxException
+from . import DxCache
+from . import DxExecutor
+from . import DxInventory
+from . import DxInventoryStore
+from . import DxJobRegistry
+from . import DxJobTracker
 from . import DxLogging
+from . import DxMetrics
+from . import DxObjectIndex
+from . import DxQueryCache
+from . import DxScheduler
+from . import DxSessionPool
+from . import DxSnapshotIndex
 from . import DxTimeflow
+from . import DxTrace
 from . import GetReferences
 from . import GetSession
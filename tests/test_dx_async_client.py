@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxAsyncClient asyncio REST client, run against a
+small in-process HTTP server
+"""
+
+import asyncio
+import json
+import unittest
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from lib.DxAsyncClient import DxAsyncClient
+from lib.DxAsyncClient import fan_out
+
+
+class FakeEngine(object):
+    """
+    Answers session, login, user and job requests. Jobs are paged.
+    """
+
+    def __init__(self, jobs=5):
+        self.jobs = [{"reference": "JOB-{}".format(i)} for i in range(jobs)]
+        self.ignore_offset = False
+        self.connections = 0
+        self.logins = 0
+        self.malformed = False
+        self.expire = False
+
+    def answer(self, method, path, cookie):
+        url = urlparse(path)
+        resource = url.path[len("/resources/json/") :]
+        if resource == "delphix/session":
+            return 200, {"type": "OKResult"}, "JSESSIONID=s1; Path=/"
+        if resource == "delphix/login":
+            self.logins += 1
+            return 200, {"type": "OKResult"}, "JSESSIONID=s{}".format(self.logins)
+        if self.expire or "JSESSIONID" not in cookie:
+            self.expire = False
+            return 401, {"type": "ErrorResult"}, None
+        if resource == "delphix/user":
+            return 200, {"type": "ListResult", "result": [{"name": "admin"}]}, None
+        if resource == "delphix/job":
+            query = parse_qs(url.query)
+            size = int(query["pageSize"][0])
+            offset = 0 if self.ignore_offset else int(query["pageOffset"][0])
+            page = self.jobs[offset * size : (offset + 1) * size]
+            return 200, {"type": "ListResult", "result": page}, None
+        return 404, {"type": "ErrorResult"}, None
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode().split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.lower()] = value.strip()
+            await reader.readexactly(int(headers.get("content-length", 0)))
+            status, payload, cookie = self.answer(
+                method, path, headers.get("cookie", "")
+            )
+            if self.malformed:
+                self.malformed = False
+                writer.write(b"garbage\r\n")
+                await writer.drain()
+                continue
+            body = json.dumps(payload).encode()
+            head = "HTTP/1.1 {} X\r\nContent-Length: {}\r\n".format(status, len(body))
+            if cookie:
+                head += "Set-Cookie: {}\r\n".format(cookie)
+            writer.write((head + "\r\n").encode() + body)
+            await writer.drain()
+        writer.close()
+
+
+class DxAsyncClientTests(unittest.TestCase):
+    """
+    Verifies login, keep-alive, paging, relogin on 401 and the fan out.
+    """
+
+    def run_with_engine(self, engine, func):
+        async def scenario():
+            server = await asyncio.start_server(engine.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await func(port)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return asyncio.run(scenario())
+
+    def test_login_and_keep_alive(self):
+        engine = FakeEngine()
+
+        async def func(port):
+            async with DxAsyncClient("127.0.0.1", "admin", "x", port=port) as client:
+                await client.get("delphix/user")
+                return await client.list("delphix/user")
+
+        self.assertEqual([{"name": "admin"}], self.run_with_engine(engine, func))
+        self.assertEqual(1, engine.connections)
+
+    def test_paginated_list(self):
+        engine = FakeEngine(jobs=5)
+
+        async def func(port):
+            async with DxAsyncClient("127.0.0.1", "admin", "x", port=port) as client:
+                return await client.list("delphix/job", page_size=2)
+
+        self.assertEqual(engine.jobs, self.run_with_engine(engine, func))
+
+    def test_paging_stops_when_the_offset_is_ignored(self):
+        engine = FakeEngine(jobs=5)
+        engine.ignore_offset = True
+
+        async def func(port):
+            async with DxAsyncClient("127.0.0.1", "admin", "x", port=port) as client:
+                return await client.list("delphix/job", page_size=2)
+
+        self.assertEqual(engine.jobs[:2], self.run_with_engine(engine, func))
+
+    def test_relogin_on_401(self):
+        engine = FakeEngine()
+
+        async def func(port):
+            async with DxAsyncClient("127.0.0.1", "admin", "x", port=port) as client:
+                engine.expire = True
+                return await client.get("delphix/user")
+
+        self.assertEqual([{"name": "admin"}], self.run_with_engine(engine, func))
+        self.assertEqual(2, engine.logins)
+
+    def test_connection_closed_on_a_malformed_response(self):
+        engine = FakeEngine()
+
+        async def func(port):
+            async with DxAsyncClient("127.0.0.1", "admin", "x", port=port) as client:
+                conn = client._idle[-1]
+                engine.malformed = True
+                with self.assertRaises(IndexError):
+                    await client.get("delphix/user")
+                self.assertTrue(conn.writer.is_closing())
+                self.assertEqual([], client._idle)
+                return await client.get("delphix/user")
+
+        self.assertEqual([{"name": "admin"}], self.run_with_engine(engine, func))
+        self.assertEqual(2, engine.connections)
+
+    def test_fan_out(self):
+        engine = FakeEngine()
+
+        async def func(port):
+            engines = [
+                {
+                    "hostname": "engine{}".format(i),
+                    "ip_address": "127.0.0.1",
+                    "username": "admin",
+                    "password": "x",
+                    "port": str(port),
+                }
+                for i in range(3)
+            ]
+
+            async def users(client):
+                return await client.list("delphix/user")
+
+            return await fan_out(engines, users, limit=2)
+
+        results = self.run_with_engine(engine, func)
+        self.assertEqual(["engine0", "engine1", "engine2"], sorted(results))
+        self.assertEqual([{"name": "admin"}], results["engine2"])
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxBenchmark harness
+"""
+
+import unittest
+
+from lib.DxBenchmark import compare_reports
+from lib.DxBenchmark import endpoint
+from lib.DxBenchmark import new_report
+from lib.DxBenchmark import run_scenario
+
+
+def result(scenario="list_groups", scale=100, **measures):
+    row = {
+        "scenario": scenario,
+        "scale": scale,
+        "exit_code": 0,
+        "requests": 10,
+        "bytes_sent": 1000,
+        "wall_seconds": 1.0,
+        "peak_rss_kb": 50000,
+    }
+    row.update(measures)
+    return row
+
+
+class DxBenchmarkTests(unittest.TestCase):
+    def test_endpoint_groups_references(self):
+        self.assertEqual(
+            "GET jetstream/operation/{ref}",
+            endpoint(
+                "GET", "/resources/json/delphix/jetstream/operation/JS_OPERATION-12"
+            ),
+        )
+        self.assertEqual(
+            "GET snapshot/{ref}/timeflowRange",
+            endpoint(
+                "GET",
+                "/resources/json/delphix/snapshot/ORACLE_SNAPSHOT-3-2/timeflowRange",
+            ),
+        )
+        self.assertEqual(
+            "GET capacity/consumer",
+            endpoint("GET", "/resources/json/delphix/capacity/consumer"),
+        )
+
+    def test_compare_reports(self):
+        baseline = new_report([result(), result(scale=1000, requests=100)])
+        report = new_report(
+            [
+                # Any extra request is a regression
+                result(requests=11),
+                # Within the tolerance
+                result(scale=1000, requests=100, wall_seconds=1.2),
+                # Not in the baseline
+                result(scenario="inventory", requests=1000),
+            ]
+        )
+        regressions = compare_reports(baseline, report, 0.25)
+        self.assertEqual(["list_groups at 100: requests 11 (was 10)"], regressions)
+
+        report = new_report([result(wall_seconds=1.5, exit_code=1)])
+        self.assertEqual(
+            [
+                "list_groups at 100: exit code 1 (was 0)",
+                "list_groups at 100: wall_seconds 1.5 (was 1.0)",
+            ],
+            compare_reports(baseline, report, 0.25),
+        )
+
+    def test_run_scenario(self):
+        measures = run_scenario("list_branches", 4, timeout=120)
+        self.assertEqual(0, measures["exit_code"])
+        # One operation lookup per branch: two templates and two containers
+        self.assertEqual(
+            4, measures["requests_by_endpoint"]["GET jetstream/operation/{ref}"]
+        )
+        self.assertEqual(
+            sum(measures["requests_by_endpoint"].values()), measures["requests"]
+        )
+        self.assertGreater(measures["bytes_sent"], 0)
+        self.assertGreater(measures["peak_rss_kb"], 0)
+
+
+# Run the test case
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
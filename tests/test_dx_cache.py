@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxCache lookup cache
+"""
+
+import unittest
+
+from lib.DxCache import DxCache
+
+
+class FakeEngine(object):
+    def __init__(self, address):
+        self.address = address
+
+
+class FakeClass(object):
+    """
+    Stands in for a delphixpy web class, counting the API calls made
+    """
+
+    __name__ = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_all(self, engine, **kwargs):
+        self.calls += 1
+        return ["{}-{}".format(engine.address, sorted(kwargs.items()))]
+
+    def get(self, engine, ref):
+        self.calls += 1
+        return ref
+
+
+class DxCacheTests(unittest.TestCase):
+    """
+    Verifies memoization, filter keys, invalidation and the counters.
+    """
+
+    def setUp(self):
+        self.engine = FakeEngine("engine1")
+        self.f_class = FakeClass()
+        self.cache = DxCache(ttl=300)
+
+    def test_get_all_is_memoized(self):
+        first = self.cache.get_all(self.engine, self.f_class)
+        second = self.cache.get_all(self.engine, self.f_class)
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.f_class.calls)
+        self.assertEqual({"hits": 1, "misses": 1, "entries": 1}, self.cache.stats())
+
+    def test_returned_list_is_a_copy(self):
+        self.cache.get_all(self.engine, self.f_class).pop()
+        self.assertEqual(1, len(self.cache.get_all(self.engine, self.f_class)))
+
+    def test_filters_and_engines_are_separate_keys(self):
+        self.cache.get_all(self.engine, self.f_class, group="GROUP-1")
+        self.cache.get_all(self.engine, self.f_class, group="GROUP-2")
+        self.cache.get_all(FakeEngine("engine2"), self.f_class, group="GROUP-1")
+        self.assertEqual(3, self.f_class.calls)
+
+    def test_invalidate_drops_only_the_engine(self):
+        other = FakeEngine("engine2")
+        self.cache.get_all(self.engine, self.f_class)
+        self.cache.get_all(other, self.f_class)
+        self.cache.invalidate(self.engine, self.f_class)
+        self.cache.get_all(self.engine, self.f_class)
+        self.cache.get_all(other, self.f_class)
+        self.assertEqual(3, self.f_class.calls)
+
+    def test_invalidate_drops_the_related_classes(self):
+        database = FakeClass()
+        database.__name__ = "delphixpy.v1_8_0.web.database"
+        snapshot = FakeClass()
+        snapshot.__name__ = "delphixpy.v1_8_0.web.snapshot"
+        for f_class in [database, snapshot, self.f_class]:
+            self.cache.get_all(self.engine, f_class)
+        self.cache.invalidate(self.engine, database)
+        for f_class in [database, snapshot, self.f_class]:
+            self.cache.get_all(self.engine, f_class)
+        self.assertEqual(
+            [2, 2, 1], [database.calls, snapshot.calls, self.f_class.calls]
+        )
+
+    def test_not_cached_while_the_job_runs(self):
+        self.cache.invalidate(self.engine, self.f_class, "JOB-1")
+        self.assertEqual(["JOB-1"], self.cache.running(self.engine))
+        self.cache.get_all(self.engine, self.f_class)
+        self.cache.get_index(self.engine, self.f_class)
+        self.cache.get(self.engine, self.f_class, "REF-1")
+        self.assertEqual(3, self.f_class.calls)
+        # Other engines are cached as usual
+        other = FakeEngine("engine2")
+        self.cache.get_all(other, self.f_class)
+        self.cache.get_all(other, self.f_class)
+        self.assertEqual(4, self.f_class.calls)
+
+        self.cache.job_finished(self.engine, "JOB-1")
+        self.assertEqual([], self.cache.running(self.engine))
+        self.cache.get_all(self.engine, self.f_class)
+        self.cache.get_all(self.engine, self.f_class)
+        self.assertEqual(5, self.f_class.calls)
+
+    def test_peek_index_never_lists(self):
+        self.assertIsNone(self.cache.peek_index(self.engine, self.f_class))
+        index = self.cache.get_index(self.engine, self.f_class)
+        self.assertIs(index, self.cache.peek_index(self.engine, self.f_class))
+        self.cache.invalidate(self.engine, self.f_class, "JOB-1")
+        self.assertIsNone(self.cache.peek_index(self.engine, self.f_class))
+        self.assertIsNone(DxCache(ttl=0).peek_index(self.engine, self.f_class))
+        self.assertEqual(1, self.f_class.calls)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = DxCache(ttl=0)
+        cache.get(self.engine, self.f_class, "REF-1")
+        cache.get(self.engine, self.f_class, "REF-1")
+        self.assertEqual(2, self.f_class.calls)
+
+
+# Run the test case
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
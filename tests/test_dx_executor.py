@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxExecutor bounded worker pool
+"""
+
+import sys
+import threading
+import unittest
+
+from lib.DlpxException import DlpxException
+from lib.DxExecutor import DxExecutor
+
+
+class DxExecutorTests(unittest.TestCase):
+    """
+    Verifies results, exit code aggregation and the worker bound.
+    """
+
+    def test_results_and_success(self):
+        executor = DxExecutor()
+        executor.submit("engine1", lambda x: x * 2, 2)
+        executor.submit("engine2", lambda x: x * 3, 2)
+        self.assertEqual(0, executor.wait())
+        self.assertEqual(4, executor.result("engine1"))
+        self.assertEqual(6, executor.result("engine2"))
+
+    def test_engine_submitted_twice(self):
+        executor = DxExecutor()
+        executor.submit("engine1", sys.exit, 2)
+        self.assertRaises(DlpxException, executor.submit, "engine1", lambda: None)
+        # The first call is still reported
+        self.assertEqual(2, executor.wait())
+
+    def test_exit_codes_aggregated(self):
+        def fail(code):
+            sys.exit(code)
+
+        def broken():
+            raise ValueError("broken")
+
+        executor = DxExecutor()
+        executor.submit("engine1", fail, 2)
+        executor.submit("engine2", broken)
+        executor.submit("engine3", lambda: None)
+        self.assertEqual(2, executor.wait())
+        self.assertEqual(1, executor.exit_code("engine2"))
+        self.assertIsInstance(executor.error("engine2"), ValueError)
+        self.assertEqual(0, executor.exit_code("engine3"))
+
+    def test_max_workers_bound(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.05)
+            with lock:
+                running[0] -= 1
+
+        executor = DxExecutor(max_workers=2)
+        for i in range(6):
+            executor.submit("engine{}".format(i), work)
+        self.assertEqual(0, executor.wait())
+        self.assertEqual(2, running[1])
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
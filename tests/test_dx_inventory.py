@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxInventory fleet inventory helpers
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.DlpxException import DlpxException
+from lib.DxInventory import INVENTORY_FIELDS
+from lib.DxInventory import DxLockFile
+from lib.DxInventory import engine_row
+from lib.DxInventory import inventory_rows
+from lib.DxInventory import write_inventory
+
+
+class Obj(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class DxInventoryTests(unittest.TestCase):
+    """
+    Verifies the joined rows, the snapshot formats and the lock file.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def rows(self):
+        groups = [Obj(reference="GROUP-1", name="Analytics", type="Group")]
+        hosts = [Obj(reference="HOST-1", name="linuxsource", type="UnixHost")]
+        environments = [
+            Obj(
+                reference="ENV-1",
+                name="LINUXSOURCE",
+                type="UnixHostEnvironment",
+                host="HOST-1",
+                enabled=True,
+            )
+        ]
+        databases = [
+            Obj(
+                reference="DB-1",
+                name="orcl",
+                type="OracleDatabaseContainer",
+                group="GROUP-1",
+                provision_container=None,
+            ),
+            Obj(
+                reference="DB-2",
+                name="vorcl",
+                type="OracleDatabaseContainer",
+                group="GROUP-1",
+                provision_container="DB-1",
+            ),
+        ]
+        sources = [
+            Obj(
+                reference="SOURCE-2",
+                name="vorcl",
+                type="OracleVirtualSource",
+                container="DB-2",
+                virtual=True,
+                runtime=Obj(enabled="ENABLED", status="RUNNING", database_size=42),
+            )
+        ]
+        consumers = [
+            # Capacity consumers have no reference
+            Obj(
+                name="vorcl",
+                type="CurrentConsumerCapacityData",
+                group_name="Analytics",
+                container="DB-2",
+                parent="DB-1",
+                breakdown=Obj(
+                    actual_space=10, active_space=6, sync_space=3, log_space=1
+                ),
+            )
+        ]
+        return inventory_rows(
+            "engine1", groups, environments, hosts, databases, sources, consumers
+        )
+
+    def test_rows_resolve_references(self):
+        rows = dict(((r["kind"], r["name"]), r) for r in self.rows())
+        self.assertEqual(6, len(rows))
+        self.assertEqual("linuxsource", rows[("environment", "LINUXSOURCE")]["host"])
+        self.assertEqual("Analytics", rows[("database", "vorcl")]["group"])
+        self.assertEqual("orcl", rows[("database", "vorcl")]["parent"])
+        self.assertEqual("vorcl", rows[("source", "vorcl")]["container"])
+        self.assertEqual(42, rows[("source", "vorcl")]["size"])
+        self.assertEqual("orcl", rows[("consumer", "vorcl")]["parent"])
+        self.assertEqual(6, rows[("consumer", "vorcl")]["active_space"])
+        self.assertEqual("DB-2", rows[("consumer", "vorcl")]["reference"])
+        for row in rows.values():
+            self.assertEqual(set(INVENTORY_FIELDS), set(row))
+
+    def test_write_jsonl_and_csv(self):
+        rows = self.rows() + [engine_row("engine1", 1.23456, "OK")]
+        jsonl_path = os.path.join(self.tmpdir, "inventory.jsonl")
+        write_inventory(jsonl_path, rows, "jsonl", "2020-01-01T00:00:00Z")
+        with open(jsonl_path) as jsonl_file:
+            written = [json.loads(line) for line in jsonl_file]
+        self.assertEqual(len(rows), len(written))
+        self.assertEqual(1.235, written[-1]["seconds"])
+        self.assertEqual("2020-01-01T00:00:00Z", written[0]["collected_at"])
+
+        csv_path = os.path.join(self.tmpdir, "inventory.csv")
+        write_inventory(csv_path, rows, "csv")
+        with open(csv_path) as csv_file:
+            reader = csv.DictReader(csv_file)
+            self.assertEqual(INVENTORY_FIELDS, reader.fieldnames)
+            self.assertEqual(len(rows), len(list(reader)))
+        self.assertEqual(
+            ["inventory.csv", "inventory.jsonl"], sorted(os.listdir(self.tmpdir))
+        )
+
+    def test_lock_file(self):
+        path = os.path.join(self.tmpdir, "inventory.lock")
+        with DxLockFile(path):
+            self.assertRaises(DlpxException, DxLockFile(path).acquire)
+        self.assertFalse(os.path.exists(path))
+
+    def test_stale_lock_is_taken_over(self):
+        path = os.path.join(self.tmpdir, "inventory.lock")
+        with open(path, "w") as lock_file:
+            # A pid above the kernel's limit cannot be running
+            lock_file.write("99999999")
+        with DxLockFile(path):
+            with open(path) as lock_file:
+                self.assertEqual(str(os.getpid()), lock_file.read())
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxInventoryStore SQLite inventory store
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lib.DxInventoryStore
+from delphixpy.v1_8_0 import exceptions
+from lib.DxInventoryStore import DxInventoryStore
+from lib.DxInventoryStore import sync_jobs
+
+
+class FakeJobObj(object):
+    def __init__(self, reference, job_state, start_time):
+        self.reference = reference
+        self.job_state = job_state
+        self.start_time = start_time
+        self.update_time = start_time
+        self.title = "Job {}".format(reference)
+        self.action_type = "DB_SYNC"
+        self.parent_action_state = job_state
+        self.percent_complete = 100
+        self.target = "DB-1"
+        self.target_name = "orcl"
+        self.user = "USER-1"
+
+
+class FakeJob(object):
+    """
+    Stands in for delphixpy.web.job
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.calls = []
+
+    def get_all(self, engine, page_size=None, page_offset=None, from_date=None):
+        self.calls.append(("get_all", from_date))
+        jobs = sorted(
+            [
+                j
+                for j in self.jobs.values()
+                if from_date is None or j.start_time >= from_date
+            ],
+            key=lambda j: j.reference,
+        )
+        return jobs[page_offset * page_size : (page_offset + 1) * page_size]
+
+    def get(self, engine, reference):
+        self.calls.append(("get", reference))
+        if reference not in self.jobs:
+            raise exceptions.RequestError("{} was purged".format(reference))
+        return self.jobs[reference]
+
+    def api_module(self, engine, name):
+        return {"web.job": self, "exceptions": exceptions}[name]
+
+
+def source_row(reference, name, status):
+    return {
+        "engine": "engine1",
+        "kind": "source",
+        "reference": reference,
+        "name": name,
+        "enabled": "ENABLED",
+        "status": status,
+    }
+
+
+class DxInventoryStoreTests(unittest.TestCase):
+    """
+    Verifies the recorded changes and the incremental job sync.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = DxInventoryStore(os.path.join(self.tmpdir, "inventory.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_created_changed_deleted(self):
+        changes = self.store.sync(
+            "engine1",
+            "source",
+            [
+                source_row("S-1", "vdb1", "RUNNING"),
+                source_row("S-2", "vdb2", "RUNNING"),
+            ],
+        )
+        self.assertEqual(["created", "created"], [c["change"] for c in changes])
+
+        changes = self.store.sync(
+            "engine1",
+            "source",
+            [
+                source_row("S-1", "vdb1", "INACTIVE"),
+                source_row("S-3", "vdb3", "RUNNING"),
+            ],
+        )
+        self.assertEqual(
+            [
+                ("vdb1", "state-changed", "ENABLED/RUNNING", "ENABLED/INACTIVE"),
+                ("vdb3", "created", None, "ENABLED/RUNNING"),
+                ("vdb2", "deleted", "ENABLED/RUNNING", None),
+            ],
+            [(c["name"], c["change"], c["old_state"], c["new_state"]) for c in changes],
+        )
+        self.assertEqual(
+            ["vdb1", "vdb3"],
+            [r["name"] for r in self.store.objects("engine1", "source")],
+        )
+        self.assertEqual(5, len(self.store.changes("engine1")))
+        self.assertEqual([], self.store.changes("engine2"))
+
+    def test_unchanged_listing_records_nothing(self):
+        rows = [source_row("S-1", "vdb1", "RUNNING")]
+        self.store.sync("engine1", "source", rows)
+        self.assertEqual([], self.store.sync("engine1", "source", rows))
+        self.assertIsNotNone(self.store.last_sync("engine1", "source")[0])
+        self.assertEqual((None, None), self.store.last_sync("engine1", "database"))
+
+    def test_partial_sync_keeps_missing_objects(self):
+        self.store.sync("engine1", "source", [source_row("S-1", "vdb1", "RUNNING")])
+        changes = self.store.sync(
+            "engine1", "source", [source_row("S-2", "vdb2", "RUNNING")], complete=False
+        )
+        self.assertEqual(["created"], [c["change"] for c in changes])
+        self.assertEqual(2, len(self.store.objects("engine1", "source")))
+
+    def test_sync_jobs_is_incremental(self):
+        fake_job = FakeJob()
+        fake_job.jobs["JOB-1"] = FakeJobObj("JOB-1", "COMPLETED", "2020-01-01T00:00:00")
+        fake_job.jobs["JOB-2"] = FakeJobObj("JOB-2", "RUNNING", "2020-01-02T00:00:00")
+        api_module = lib.DxInventoryStore.api_module
+        lib.DxInventoryStore.api_module = fake_job.api_module
+        try:
+            changes = sync_jobs(self.store, None, "engine1")
+            self.assertEqual(2, len(changes))
+            self.assertEqual(
+                "2020-01-02T00:00:00", self.store.last_sync("engine1", "job")[1]
+            )
+
+            # JOB-2 finished and JOB-3 started since the last sync
+            fake_job.jobs["JOB-2"].job_state = "FAILED"
+            fake_job.jobs["JOB-3"] = FakeJobObj(
+                "JOB-3", "RUNNING", "2020-01-03T00:00:00"
+            )
+            fake_job.calls = []
+            changes = sync_jobs(self.store, None, "engine1")
+        finally:
+            lib.DxInventoryStore.api_module = api_module
+
+        self.assertEqual(("get_all", "2020-01-02T00:00:00"), fake_job.calls[0])
+        self.assertNotIn(("get", "JOB-1"), fake_job.calls)
+        self.assertEqual(
+            [("JOB-2", "state-changed", "FAILED"), ("JOB-3", "created", "RUNNING")],
+            sorted((c["reference"], c["change"], c["new_state"]) for c in changes),
+        )
+
+    def test_sync_jobs_records_purged_jobs(self):
+        fake_job = FakeJob()
+        fake_job.jobs["JOB-1"] = FakeJobObj("JOB-1", "RUNNING", "2020-01-01T00:00:00")
+        fake_job.jobs["JOB-2"] = FakeJobObj("JOB-2", "RUNNING", "2020-01-02T00:00:00")
+        api_module = lib.DxInventoryStore.api_module
+        lib.DxInventoryStore.api_module = fake_job.api_module
+        try:
+            sync_jobs(self.store, None, "engine1")
+            # JOB-1 was purged before it was seen finishing
+            del fake_job.jobs["JOB-1"]
+            changes = sync_jobs(self.store, None, "engine1")
+        finally:
+            lib.DxInventoryStore.api_module = api_module
+
+        self.assertEqual(
+            [("JOB-1", "deleted", "RUNNING")],
+            [(c["reference"], c["change"], c["old_state"]) for c in changes],
+        )
+        self.assertEqual(
+            ["JOB-2"], [r["reference"] for r in self.store.objects("engine1", "job")]
+        )
+        self.assertEqual(
+            "2020-01-02T00:00:00", self.store.last_sync("engine1", "job")[1]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for lib.DxJobRegistry, alone and through GetSession against a
+lib.DxMockEngine
+"""
+
+import unittest
+
+from delphixpy.v1_8_0.web import database
+from lib.DxJobRegistry import DxJobRegistry
+from lib.DxMockEngine import DxMockEngine
+from lib.GetSession import GetSession
+
+
+class DxJobRegistryTests(unittest.TestCase):
+    def test_jobs_are_kept_per_engine_in_submit_order(self):
+        registry = DxJobRegistry()
+        registry.add("engine1", "JOB-2", "refresh", "vdb1")
+        registry.add("engine2", "JOB-1", "rewind", "vdb2")
+        registry.add("engine1", "JOB-1", "refresh", "vdb2")
+        # Operations without a job and second registrations are ignored
+        self.assertIsNone(registry.add("engine1", None, "refresh", "vdb3"))
+        registry.add("engine1", "JOB-2", "delete", "vdb1")
+
+        self.assertEqual(["JOB-2", "JOB-1"], registry.pending("engine1"))
+        self.assertEqual("refresh", registry.get("engine1", "JOB-2").operation)
+        self.assertEqual("rewind", registry.get("engine2", "JOB-1").operation)
+        self.assertEqual(2, registry.count("engine1"))
+        self.assertEqual(3, len(registry))
+
+        for job_ref in registry.pending("engine1"):
+            registry.remove("engine1", job_ref)
+        self.assertEqual(0, registry.count("engine1"))
+        self.assertEqual([], registry.pending("engine1"))
+        self.assertEqual(
+            ["engine2"], [entry.engine_name for entry in registry.entries()]
+        )
+
+    def test_wait_for_the_jobs_of_a_session(self):
+        with DxMockEngine(databases=3, jobs=0) as mock:
+            server_obj = GetSession()
+            server_obj.dlpx_engines["mockengine"] = {
+                "hostname": "mockengine",
+                "ip_address": mock.address,
+            }
+            server_obj.serversess(mock.address, "delphix_admin", "delphix")
+            with server_obj.job_mode(False):
+                for index in range(1, 4):
+                    name = "ORACLE_DB_CONTAINER-{}".format(index)
+                    database.sync(server_obj.server_session, name)
+                    server_obj.add_job("sync", name)
+
+            self.assertEqual(3, server_obj.jobs.count("mockengine"))
+            self.assertEqual(
+                ["ORACLE_DB_CONTAINER-{}".format(index) for index in range(1, 4)],
+                [entry.target for entry in server_obj.jobs.entries("mockengine")],
+            )
+            states = server_obj.jobs.wait("mockengine", server_obj.job_tracker())
+
+        self.assertEqual(["COMPLETED"] * 3, list(states.values()))
+        self.assertEqual(0, len(server_obj.jobs))
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxJobTracker notification based job tracker
+"""
+
+import unittest
+
+from lib.DxJobTracker import DxJobTracker
+
+
+class FakeEngine(object):
+    API_VERSION = "1.8.0"
+    address = "fake-engine"
+
+
+class FakeJobObj(object):
+    def __init__(self, job_state):
+        self.job_state = job_state
+
+
+class FakeEvent(object):
+    def __init__(self, type, object=None):
+        self.type = type
+        self.object = object
+
+
+class FakeJob(object):
+    """
+    Stands in for delphixpy web.job, counting the job.get() calls made
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self.calls = []
+
+    def get(self, engine, ref):
+        self.calls.append(ref)
+        return FakeJobObj(self.states[ref])
+
+
+class FakeNotification(object):
+    """
+    Stands in for delphixpy web.notification, returning queued batches
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def get_all(self, engine, channel=None, timeout=None):
+        if self.batches:
+            return self.batches.pop(0)
+        return []
+
+
+class DxJobTrackerTests(unittest.TestCase):
+    """
+    Verifies that only notified jobs are re-read and drops trigger a refresh.
+    """
+
+    def setUp(self):
+        self.tracker = DxJobTracker(FakeEngine())
+        self.job = FakeJob({"JOB-1": "RUNNING", "JOB-2": "RUNNING"})
+        self.notification = FakeNotification()
+        self.tracker._job = self.job
+        self.tracker._notification = self.notification
+
+    def test_track_returns_state(self):
+        self.assertEqual("RUNNING", self.tracker.track("JOB-1"))
+        self.assertEqual("RUNNING", self.tracker.track("JOB-1"))
+        self.assertEqual(["JOB-1"], self.job.calls)
+
+    def test_only_notified_jobs_refreshed(self):
+        finished = []
+        self.tracker.track("JOB-1", lambda ref, state: finished.append(ref))
+        self.tracker.track("JOB-2")
+        self.job.states["JOB-1"] = "COMPLETED"
+        self.notification.batches.append([FakeEvent("ObjectNotification", "JOB-1")])
+        self.assertEqual(["JOB-1"], self.tracker.wait_any(1))
+        self.assertEqual(["JOB-1"], finished)
+        self.assertEqual(["JOB-1", "JOB-2", "JOB-1"], self.job.calls)
+        self.assertEqual(["JOB-2"], self.tracker.pending())
+
+    def test_drop_reconciles_all_jobs(self):
+        self.tracker.track("JOB-1")
+        self.tracker.track("JOB-2")
+        self.job.states["JOB-2"] = "FAILED"
+        self.notification.batches.append([FakeEvent("NotificationDrop")])
+        self.assertEqual(["JOB-2"], self.tracker.poll(1))
+        self.assertEqual("FAILED", self.tracker.state("JOB-2"))
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the structured, lazy and queued logging of lib.DxLogging
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.DxLogging import DxJsonFormatter
+from lib.DxLogging import logging_est
+from lib.DxLogging import print_debug
+from lib.DxLogging import print_exception
+from lib.DxLogging import print_info
+
+
+class DxLoggingTests(unittest.TestCase):
+    def setUp(self):
+        # logging_est only configures a root logger without handlers
+        self.root = logging.getLogger()
+        self.saved = (self.root.handlers[:], self.root.level)
+        self.root.handlers = []
+        self.work_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.work_dir, "test.log")
+
+    def tearDown(self):
+        for handler in self.root.handlers:
+            handler.close()
+        self.root.handlers, level = self.saved
+        self.root.setLevel(level)
+        shutil.rmtree(self.work_dir)
+
+    def read_records(self):
+        # Wait for the listener thread to write out the queued records
+        for handler in self.root.handlers:
+            handler.queue.join()
+        with open(self.log_path) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_debug_messages_are_built_lazily(self):
+        calls = []
+
+        def message():
+            calls.append(1)
+            return "built"
+
+        logging_est(self.log_path)
+        print_debug(message)
+        self.assertEqual([], calls)
+        # The debug flag still enables a single message
+        print_debug(message, True)
+        self.assertEqual([1], calls)
+
+        self.root.setLevel(logging.DEBUG)
+        print_debug(message, engine="engine1")
+        self.assertEqual([1, 1], calls)
+
+    def test_json_records_through_the_queue(self):
+        logging_est(self.log_path, debug=True, json_format=True, queued=True)
+        print_info("Refreshing vdb1", engine="engine1", operation="refresh")
+        print_debug(lambda: "job state", engine="engine1", job="JOB-7")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            print_exception("Refresh failed", engine="engine1", job="JOB-7")
+
+        records = self.read_records()
+        self.assertEqual(
+            ["INFO", "INFO", "DEBUG", "ERROR"], [r["level"] for r in records]
+        )
+        self.assertEqual("Debug Logging is enabled.", records[0]["message"])
+        self.assertNotIn("engine", records[0])
+        self.assertEqual("refresh", records[1]["operation"])
+        self.assertEqual("engine1", records[1]["engine"])
+        self.assertEqual("JOB-7", records[2]["job"])
+        self.assertEqual("job state", records[2]["message"])
+        self.assertEqual("EXCEPTION: Refresh failed", records[3]["message"])
+        self.assertIn("ValueError: boom", records[3]["exception"])
+
+    def test_text_format_and_single_configuration(self):
+        logging_est(self.log_path)
+        logging_est(os.path.join(self.work_dir, "other.log"), json_format=True)
+        self.assertEqual(1, len(self.root.handlers))
+        self.assertNotIsInstance(self.root.handlers[0].formatter, DxJsonFormatter)
+        print_info(ValueError)
+        self.root.handlers[0].flush()
+        with open(self.log_path) as log_file:
+            self.assertIn("INFO:", log_file.read().split("<class 'ValueError'>")[0])
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
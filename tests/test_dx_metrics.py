@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for lib.DxMetrics, fed by DxJobTracker and by GetSession sessions
+against a lib.DxMockEngine
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import closing
+
+from delphixpy.v1_8_0.web import database
+from delphixpy.v1_8_0.web.vo import Job
+from lib.DxJobTracker import DxJobTracker
+from lib.DxMetrics import DxMetrics
+from lib.DxMetrics import job_duration
+from lib.DxMockEngine import DxMockEngine
+from lib.GetSession import GetSession
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+
+class DxMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = DxMetrics()
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_render_counters_and_histograms(self):
+        self.metrics.inc("dx_jobs_started_total", engine='eng"1', type="DB_SYNC")
+        self.metrics.inc("dx_jobs_started_total", engine='eng"1', type="DB_SYNC")
+        self.metrics.observe(
+            "dx_queue_wait_seconds", 12, engine="eng2", operation="refresh"
+        )
+        text = self.metrics.render()
+
+        self.assertIn("# TYPE dx_jobs_started_total counter\n", text)
+        self.assertIn(
+            'dx_jobs_started_total{engine="eng\\"1",type="DB_SYNC"} 2\n', text
+        )
+        self.assertIn(
+            'dx_queue_wait_seconds_bucket{engine="eng2",operation="refresh",le="5"} 0\n',
+            text,
+        )
+        self.assertIn(
+            'dx_queue_wait_seconds_bucket{engine="eng2",operation="refresh",le="15"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'dx_queue_wait_seconds_bucket{engine="eng2",operation="refresh",le="+Inf"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'dx_queue_wait_seconds_sum{engine="eng2",operation="refresh"} 12.0\n', text
+        )
+        # Metrics without observations are left out
+        self.assertNotIn("dx_job_duration_seconds", text)
+
+    def test_job_duration(self):
+        job_obj = Job()
+        job_obj.start_time = "2016-10-14T13:27:05.617Z"
+        job_obj.update_time = "2016-10-14T13:29:15.001Z"
+        self.assertEqual(130, job_duration(job_obj))
+        self.assertIsNone(job_duration(Job()))
+
+    def test_jobs_and_requests_from_the_mock_engine(self):
+        with DxMockEngine(databases=2, jobs=0) as mock:
+            server_obj = GetSession(metrics=self.metrics)
+            server_obj.dlpx_engines["mockengine"] = {
+                "hostname": "mockengine",
+                "ip_address": mock.address,
+            }
+            server_obj.serversess(mock.address, "delphix_admin", "delphix")
+            engine = server_obj.server_session
+            with server_obj.job_mode(True):
+                database.sync(engine, "ORACLE_DB_CONTAINER-1")
+            tracker = DxJobTracker(
+                engine, engine_name="mockengine", metrics=self.metrics
+            )
+            self.assertEqual("COMPLETED", tracker.track(engine.last_job))
+            # A finished job is only counted once
+            tracker.track(engine.last_job)
+
+            server = self.metrics.serve(0, "127.0.0.1")
+            try:
+                url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+                with closing(urlopen(url)) as response:
+                    text = response.read().decode("utf-8")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        self.assertIn(
+            'dx_jobs_started_total{engine="mockengine",type="SYNC"} 1\n', text
+        )
+        self.assertIn(
+            'dx_jobs_finished_total{engine="mockengine",type="SYNC",'
+            'state="COMPLETED"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'dx_job_duration_seconds_count{engine="mockengine",type="SYNC",'
+            'state="COMPLETED"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'dx_api_request_duration_seconds_count{engine="mockengine",'
+            'endpoint="POST database/{ref}/sync"} 1\n',
+            text,
+        )
+
+        path = os.path.join(self.work_dir, "dx.prom")
+        self.metrics.write_textfile(path)
+        with open(path) as metrics_file:
+            self.assertEqual(self.metrics.render(), metrics_file.read())
+        self.assertEqual(["dx.prom"], os.listdir(self.work_dir))
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxMockEngine stand-in engine, driven through
+GetSession and delphixpy as the scripts use it
+"""
+
+import unittest
+from time import time
+
+from delphixpy.v1_8_0.exceptions import HttpError
+from delphixpy.v1_8_0.web import database
+from delphixpy.v1_8_0.web import job
+from delphixpy.v1_8_0.web import snapshot
+from delphixpy.v1_8_0.web import timeflow
+from delphixpy.v1_8_0.web.jetstream import datasource
+from delphixpy.v1_8_0.web.vo import TimeflowRangeParameters
+from lib.DxMockEngine import DxMockEngine
+from lib.GetReferences import find_obj_by_name
+from lib.GetReferences import get_all_paged
+from lib.GetSession import GetSession
+
+
+class DxMockEngineTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.mock = DxMockEngine(databases=6, snapshots=3, jobs=60).start()
+        cls.server_obj = GetSession()
+        cls.server_obj.serversess(cls.mock.address, "delphix_admin", "delphix")
+        cls.engine = cls.server_obj.server_session
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mock.stop()
+
+    def test_listings_and_lookups(self):
+        self.assertEqual(6, len(database.get_all(self.engine)))
+        vdb = find_obj_by_name(self.engine, database, "vdb4")
+        self.assertEqual("ORACLE_DB_CONTAINER-3", vdb.provision_container)
+        self.assertEqual(3, len(snapshot.get_all(self.engine, database=vdb.reference)))
+        self.assertEqual(vdb.name, database.get(self.engine, vdb.reference).name)
+        self.assertRaises(
+            HttpError, database.get, self.engine, "ORACLE_DB_CONTAINER-99"
+        )
+
+    def test_job_paging_and_filters(self):
+        self.assertEqual(25, len(job.get_all(self.engine)))
+        # Other tests add jobs
+        self.assertEqual(
+            len(self.mock.objects["job"]), len(list(get_all_paged(self.engine, job)))
+        )
+        failed = job.get_all(self.engine, job_state="FAILED")
+        self.assertEqual(6, len(failed))
+        self.assertTrue(all(j.job_state == "FAILED" for j in failed))
+
+    def test_actions_return_finished_jobs(self):
+        with self.server_obj.job_mode(True):
+            database.sync(self.engine, "ORACLE_DB_CONTAINER-1")
+        job_obj = job.get(self.engine, self.engine.last_job)
+        self.assertEqual("COMPLETED", job_obj.job_state)
+        self.assertEqual("ORACLE_DB_CONTAINER-1", job_obj.target)
+
+    def test_timeflow_ranges(self):
+        ranges = timeflow.timeflow_ranges(
+            self.engine, "ORACLE_TIMEFLOW-2", TimeflowRangeParameters()
+        )
+        self.assertEqual("1000", ranges[0].start_point.location)
+        self.assertEqual("3000", ranges[0].end_point.location)
+
+    def test_jetstream_data_sources(self):
+        self.assertEqual(4, len(datasource.get_all(self.engine)))
+        sources = datasource.get_all(self.engine, data_layout="JS_DATA_CONTAINER-1")
+        self.assertEqual(["ORACLE_DB_CONTAINER-3"], [ds.container for ds in sources])
+        self.assertEqual(
+            ["jdbc:oracle:thin:@10.0.0.1:1521:db3"], sources[0].runtime.jdbc_strings
+        )
+
+    def test_latency_and_request_counts(self):
+        self.mock.requests.clear()
+        self.mock.latency = 0.05
+        try:
+            time_start = time()
+            database.get_all(self.engine)
+            database.get_all(self.engine)
+            self.assertGreaterEqual(time() - time_start, 0.1)
+        finally:
+            self.mock.latency = 0
+        self.assertEqual(
+            2, self.mock.requests[("GET", "/resources/json/delphix/database")]
+        )
+
+
+# Run the test case
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
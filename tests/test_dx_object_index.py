@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for lib.DxObjectIndex
+"""
+
+import unittest
+
+from lib.DxObjectIndex import DxObjectIndex
+
+
+class FakeObj(object):
+    def __init__(self, reference, name, group=None, container=None):
+        self.reference = reference
+        self.name = name
+        self.group = group
+        self.container = container
+
+
+class DxObjectIndexTests(unittest.TestCase):
+    """
+    Verifies the name, reference, container and group lookups.
+    """
+
+    def setUp(self):
+        self.objs = [
+            FakeObj("ORACLE_DB_CONTAINER-3", "vdb1", group="GROUP-2"),
+            FakeObj("ORACLE_DB_CONTAINER-1", "vdb1", group="GROUP-1"),
+            FakeObj("ORACLE_DB_CONTAINER-2", "vdb2", group="GROUP-1"),
+            FakeObj("ORACLE_SOURCE-1", "src1", container="ORACLE_DB_CONTAINER-1"),
+        ]
+        self.index = DxObjectIndex(self.objs)
+
+    def test_finds_by_reference(self):
+        self.assertIs(
+            self.objs[2], self.index.find_by_reference("ORACLE_DB_CONTAINER-2")
+        )
+        self.assertIsNone(self.index.find_by_reference("ORACLE_DB_CONTAINER-9"))
+
+    def test_duplicate_names_resolve_deterministically(self):
+        self.assertEqual(
+            "ORACLE_DB_CONTAINER-1", self.index.find_by_name("vdb1").reference
+        )
+        reversed_index = DxObjectIndex(reversed(self.objs))
+        self.assertEqual(
+            "ORACLE_DB_CONTAINER-1", reversed_index.find_by_name("vdb1").reference
+        )
+
+    def test_group_narrows_duplicate_names(self):
+        self.assertEqual(
+            "ORACLE_DB_CONTAINER-3",
+            self.index.find_by_name("vdb1", group_ref="GROUP-2").reference,
+        )
+        self.assertIsNone(self.index.find_by_name("vdb2", group_ref="GROUP-2"))
+
+    def test_finds_by_container_and_group(self):
+        self.assertEqual(
+            ["ORACLE_SOURCE-1"],
+            [
+                obj.reference
+                for obj in self.index.find_by_container("ORACLE_DB_CONTAINER-1")
+            ],
+        )
+        self.assertEqual(2, len(self.index.find_by_group("GROUP-1")))
+        self.assertEqual([], self.index.find_by_group("GROUP-9"))
+
+
+# Run the test case
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
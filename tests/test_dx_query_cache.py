@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxQueryCache listing cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import lib.DxQueryCache
+from lib.DxQueryCache import DxQueryCache
+from lib.DxQueryCache import cached_rows
+
+
+class DxQueryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "cache.db")
+        self.now = [1000.0]
+        self.real_time = lib.DxQueryCache.time
+        lib.DxQueryCache.time = lambda: self.now[0]
+        self.calls = 0
+
+    def tearDown(self):
+        lib.DxQueryCache.time = self.real_time
+        shutil.rmtree(self.tmp_dir)
+
+    def fetch(self):
+        self.calls += 1
+        return [["orcl", self.calls]]
+
+    def arguments(self, **options):
+        arguments = {
+            "--cached": False,
+            "--refresh_cache": False,
+            "--max_age": "300",
+            "--cache_file": self.path,
+        }
+        arguments.update(("--" + k, v) for k, v in options.items())
+        return arguments
+
+    def test_get_put_max_age(self):
+        cache = DxQueryCache(self.path)
+        self.assertEqual(cache.get("engine1", "users"), (None, None))
+        cache.put("engine1", "users", ["admin"])
+        self.now[0] += 10
+        self.assertEqual(cache.get("engine1", "users", 60), (["admin"], 10))
+        self.assertEqual(cache.get("engine2", "users"), (None, None))
+        self.now[0] += 100
+        self.assertEqual(cache.get("engine1", "users", 60), (None, None))
+        cache.close()
+
+    def test_invalidate(self):
+        cache = DxQueryCache(self.path)
+        cache.put("engine1", "users", ["admin"])
+        cache.put("engine2", "users", ["admin"])
+        cache.invalidate("engine1")
+        self.assertEqual(cache.get("engine1", "users"), (None, None))
+        self.assertEqual(cache.get("engine2", "users")[0], ["admin"])
+        cache.invalidate()
+        self.assertEqual(cache.get("engine2", "users"), (None, None))
+        cache.close()
+
+    def test_without_flags_always_fetches(self):
+        arguments = self.arguments()
+        cached_rows(arguments, "engine1", "users", self.fetch)
+        self.assertEqual(
+            cached_rows(arguments, "engine1", "users", self.fetch), [["orcl", 2]]
+        )
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_cached_reuses_fresh_rows(self):
+        arguments = self.arguments(cached=True)
+        self.assertEqual(
+            cached_rows(arguments, "engine1", "users", self.fetch), [["orcl", 1]]
+        )
+        self.now[0] += 200
+        self.assertEqual(
+            cached_rows(arguments, "engine1", "users", self.fetch), [["orcl", 1]]
+        )
+        self.assertEqual(self.calls, 1)
+        self.now[0] += 200
+        self.assertEqual(
+            cached_rows(arguments, "engine1", "users", self.fetch), [["orcl", 2]]
+        )
+
+    def test_refresh_cache_replaces_rows(self):
+        cached_rows(self.arguments(cached=True), "engine1", "users", self.fetch)
+        self.assertEqual(
+            cached_rows(
+                self.arguments(refresh_cache=True), "engine1", "users", self.fetch
+            ),
+            [["orcl", 2]],
+        )
+        self.assertEqual(
+            cached_rows(self.arguments(cached=True), "engine1", "users", self.fetch),
+            [["orcl", 2]],
+        )
+        self.assertEqual(self.calls, 2)
+
+
+# Run the test case
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for dx_rewind_vdb against a lib.DxMockEngine
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import dx_rewind_vdb
+from docopt import docopt
+
+from lib.DxMockEngine import DxMockEngine
+from lib.GetSession import GetSession
+
+
+class DxRewindVdbTests(unittest.TestCase):
+    def setUp(self):
+        self.mock = DxMockEngine(databases=6, snapshots=2, jobs=0).start()
+        self.engine = {
+            "hostname": "mockengine",
+            "ip_address": self.mock.address,
+            "username": "delphix_admin",
+            "password": "delphix",
+            "default": "true",
+        }
+        self.work_dir = tempfile.mkdtemp(prefix="test_dx_rewind_vdb.")
+        self.config_file_path = os.path.join(self.work_dir, "dxtools.conf")
+        with open(self.config_file_path, "w") as config_file:
+            json.dump({"data": [self.engine]}, config_file)
+        self.server_obj = GetSession()
+        self.server_obj.get_config(self.config_file_path)
+        dx_rewind_vdb.single_thread = False
+
+    def tearDown(self):
+        self.mock.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def set_arguments(self, *argv):
+        dx_rewind_vdb.arguments = docopt(
+            dx_rewind_vdb.__doc__, argv=list(argv) + ["--poll", "1"]
+        )
+
+    def test_failed_rewind_keeps_the_rows_of_the_engine(self):
+        self.mock.failing.add("ORACLE_DB_CONTAINER-4")
+        self.set_arguments("--all_vdbs", "--parallel", "2")
+        rows = dx_rewind_vdb.main_workflow(self.engine, self.server_obj)
+        self.assertEqual(
+            [("vdb2", "COMPLETED"), ("vdb4", "FAILED"), ("vdb6", "COMPLETED")],
+            [(row["vdb"], row["state"]) for row in rows],
+        )
+        self.assertEqual(0, len(self.server_obj.jobs))
+
+    def test_snapshots_are_only_prefetched_for_several_vdbs(self):
+        name = self.mock.objects["snapshot"]["ORACLE_SNAPSHOT-2-1"]["name"]
+        self.set_arguments("--vdb", "vdb2", "--timestamp", name)
+        rows = dx_rewind_vdb.main_workflow(self.engine, self.server_obj)
+        self.assertEqual("COMPLETED", rows[0]["state"])
+        # Only the snapshots of the VDB are listed
+        self.assertEqual(
+            [(("database", "ORACLE_DB_CONTAINER-2"),)],
+            [
+                params
+                for collection, params in self.mock.listings
+                if collection == "snapshot"
+            ],
+        )
+
+        self.set_arguments("--all_vdbs", "--timestamp", "@")
+        dx_rewind_vdb.main_workflow(self.engine, self.server_obj)
+        self.assertEqual(1, self.mock.listings[("snapshot", ())])
+
+    def test_exit_code_of_a_failed_rewind(self):
+        self.mock.failing.add("ORACLE_DB_CONTAINER-2")
+        self.set_arguments("--vdbs", "vdb2,vdb4,nope")
+        self.assertEqual(
+            1, dx_rewind_vdb.run_job(self.server_obj, self.config_file_path)
+        )
+        self.mock.failing.clear()
+        self.set_arguments("--vdbs", "vdb2,vdb4")
+        self.assertEqual(
+            0, dx_rewind_vdb.run_job(self.server_obj, self.config_file_path)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
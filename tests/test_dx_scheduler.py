@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxScheduler cross-engine job scheduler
+"""
+
+import unittest
+
+from lib.DxScheduler import DxScheduler
+
+
+class DxSchedulerTests(unittest.TestCase):
+    """
+    Verifies the engine, host and global limits and the priority order.
+    """
+
+    def test_engine_limit(self):
+        scheduler = DxScheduler(engine_limit=2)
+        for name in ["db1", "db2", "db3"]:
+            scheduler.enqueue("engine1", "snapshot", name)
+        started = scheduler.start_ready("engine1")
+        self.assertEqual(["db1", "db2"], [i.target for i in started])
+        self.assertEqual([], scheduler.start_ready("engine1"))
+        scheduler.finish(started[0])
+        self.assertEqual(["db3"], [i.target for i in scheduler.start_ready("engine1")])
+        self.assertEqual(0, scheduler.queued())
+
+    def test_host_limit_spans_engines(self):
+        scheduler = DxScheduler(host_limit=1)
+        scheduler.enqueue("engine1", "refresh", "db1", host="host1")
+        scheduler.enqueue("engine2", "refresh", "db2", host="host1")
+        scheduler.enqueue("engine2", "refresh", "db3", host="host2")
+        self.assertEqual(["db1"], [i.target for i in scheduler.start_ready("engine1")])
+        self.assertEqual(["db3"], [i.target for i in scheduler.start_ready("engine2")])
+        self.assertEqual(1, scheduler.queued("engine2"))
+
+    def test_global_limit_honours_priority(self):
+        scheduler = DxScheduler(global_limit=1)
+        scheduler.enqueue("engine1", "snapshot", "db1")
+        scheduler.enqueue("engine2", "snapshot", "db2", priority=5)
+        # The free slot is left for the higher priority item on engine2
+        self.assertEqual([], scheduler.start_ready("engine1"))
+        started = scheduler.start_ready("engine2")
+        self.assertEqual(["db2"], [i.target for i in started])
+        scheduler.finish(started[0])
+        self.assertEqual(["db1"], [i.target for i in scheduler.start_ready("engine1")])
+        stats = scheduler.stats()
+        self.assertEqual(2, stats["started"])
+        self.assertEqual(2, stats["max_queued"])
+
+    def test_discard(self):
+        scheduler = DxScheduler(global_limit=1)
+        scheduler.enqueue("engine1", "delete", "db1")
+        scheduler.enqueue("engine1", "delete", "db2")
+        scheduler.start_ready("engine1")
+        scheduler.discard("engine1")
+        self.assertEqual(0, scheduler.queued())
+        self.assertEqual(0, scheduler.running())
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.DxSessionPool engine session pool
+"""
+
+import threading
+import unittest
+
+from delphixpy.v1_8_0.exceptions import HttpError
+from lib.DxSessionPool import DxSessionPool
+
+
+class FakeHelper(object):
+    _time_at_last_login = None
+
+
+class FakeHttpSession(object):
+    _cookie = None
+
+
+class FakeEngine(object):
+    """
+    Stands in for DelphixEngine, counting the logins made
+    """
+
+    API_VERSION = "1.8.0"
+
+    def __init__(self, address, user, password, namespace):
+        self.address = address
+        self.logins = 0
+        self.failures = []
+        self._delphix_session = None
+        self._http_session = FakeHttpSession()
+        self._login_helper = FakeHelper()
+        self._default_login_helper = self._login_helper
+
+    def _authenticate_and_perform(self, action):
+        if self._delphix_session is None:
+            self._delphix_session = "session"
+        if self._login_helper._time_at_last_login is None:
+            self.logins += 1
+            self._login_helper._time_at_last_login = 1.0
+            self._http_session._cookie = "cookie-{}".format(id(self))
+        if self.failures:
+            raise self.failures.pop(0)
+        return action()
+
+    def force_relogin(self):
+        self._delphix_session = None
+        self._login_helper._time_at_last_login = None
+
+
+class DxSessionPoolTests(unittest.TestCase):
+    """
+    Verifies per-thread handles, login sharing and the retry on 401.
+    """
+
+    def setUp(self):
+        self.pool = DxSessionPool()
+
+    def get(self):
+        return self.pool.get(FakeEngine, "engine1", "admin", "secret")
+
+    def other_thread(self):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.get()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_handle_per_thread(self):
+        engine = self.get()
+        self.assertIs(engine, self.get())
+        self.assertIsNot(engine, self.other_thread())
+
+    def test_login_shared_between_threads(self):
+        engine = self.get()
+        engine._authenticate_and_perform(lambda: "ok")
+        other = self.other_thread()
+        self.assertEqual("ok", other._authenticate_and_perform(lambda: "ok"))
+        self.assertEqual(0, other.logins)
+        self.assertEqual(engine._http_session._cookie, other._http_session._cookie)
+
+    def test_relogin_on_401(self):
+        engine = self.get()
+        engine.failures.append(HttpError("expired", status=401))
+        self.assertEqual("ok", engine._authenticate_and_perform(lambda: "ok"))
+        self.assertEqual(2, engine.logins)
+
+    def test_other_errors_raised(self):
+        engine = self.get()
+        engine.failures.append(HttpError("missing", status=404))
+        self.assertRaises(HttpError, engine._authenticate_and_perform, lambda: "ok")
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for lib.DxSnapshotIndex
+"""
+
+import unittest
+
+from lib.DxSnapshotIndex import DxSnapshotIndex
+
+
+class FakePoint(object):
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+
+class FakeSnapshot(object):
+    def __init__(self, reference, timestamp):
+        self.reference = reference
+        self.name = "@{}".format(timestamp)
+        self.latest_change_point = FakePoint(timestamp)
+
+
+class DxSnapshotIndexTests(unittest.TestCase):
+    """
+    Verifies the prefix and nearest change point lookups.
+    """
+
+    def setUp(self):
+        self.snapshots = [
+            FakeSnapshot("SNAPSHOT-3", "2016-11-15T11:30:17.857Z"),
+            FakeSnapshot("SNAPSHOT-1", "2016-11-14T08:00:00.000Z"),
+            FakeSnapshot("SNAPSHOT-4", "2016-11-15T11:30:59.001Z"),
+            FakeSnapshot("SNAPSHOT-2", "2016-11-15T09:12:00.000Z"),
+        ]
+        self.index = DxSnapshotIndex(self.snapshots)
+
+    def references(self, snapshot_objs):
+        return [snapshot_obj.reference for snapshot_obj in snapshot_objs]
+
+    def test_finds_by_name_and_time_prefix(self):
+        self.assertEqual(
+            ["SNAPSHOT-3"],
+            self.references(self.index.find_by_name("@2016-11-15T11:30:17")),
+        )
+        self.assertEqual(
+            ["SNAPSHOT-3", "SNAPSHOT-4"],
+            self.references(self.index.find_by_time("2016-11-15T11:30")),
+        )
+        # The GUI's format only differs by the separator
+        self.assertEqual(
+            ["SNAPSHOT-2"],
+            self.references(self.index.find_by_time("2016-11-15 09:12")),
+        )
+        self.assertEqual([], self.index.find_by_time("2016-11-16"))
+        self.assertEqual(4, len(self.index.find_by_name("@2016")))
+
+    def test_nearest_before_and_after(self):
+        self.assertEqual("SNAPSHOT-2", self.index.before("2016-11-15T10:00").reference)
+        self.assertEqual("SNAPSHOT-3", self.index.after("2016-11-15T10:00").reference)
+        self.assertEqual(
+            "SNAPSHOT-1", self.index.before("2016-11-14T08:00:00.000Z").reference
+        )
+        self.assertIsNone(self.index.before("2016-11-01"))
+        self.assertIsNone(self.index.after("2016-11-16"))
+        self.assertEqual("SNAPSHOT-4", self.index.latest().reference)
+        self.assertIsNone(DxSnapshotIndex([]).latest())
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the snapshot lookups of lib.DxTimeflow against a
+lib.DxMockEngine
+"""
+
+import unittest
+
+from lib.DlpxException import DlpxException
+from lib.DxMockEngine import DxMockEngine
+from lib.DxTimeflow import DxTimeflow
+from lib.GetSession import GetSession
+
+
+class DxTimeflowTests(unittest.TestCase):
+    def setUp(self):
+        self.mock = DxMockEngine(databases=4, snapshots=3, jobs=0).start()
+        self.server_obj = GetSession()
+        self.server_obj.serversess(self.mock.address, "delphix_admin", "delphix")
+        self.timeflow = DxTimeflow(self.server_obj.server_session)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def snapshot_listings(self):
+        return self.mock.requests[("GET", "/resources/json/delphix/snapshot")]
+
+    def test_prefetched_snapshots_are_listed_once(self):
+        self.timeflow.prefetch_snapshots()
+        for index in range(1, 5):
+            name = self.mock.objects["snapshot"]["ORACLE_SNAPSHOT-{}-2".format(index)][
+                "name"
+            ]
+            snapshot_obj = self.timeflow.find_snapshot(
+                "ORACLE_DB_CONTAINER-{}".format(index), name, snap_name=True
+            )
+            self.assertEqual(
+                "ORACLE_SNAPSHOT-{}-2".format(index), snapshot_obj.reference
+            )
+        self.assertEqual(1, self.snapshot_listings())
+
+    def test_no_or_several_matches(self):
+        self.assertRaises(
+            DlpxException,
+            self.timeflow.find_snapshot,
+            "ORACLE_DB_CONTAINER-1",
+            "@",
+            snap_name=True,
+        )
+        self.assertRaises(
+            DlpxException,
+            self.timeflow.find_snapshot,
+            "ORACLE_DB_CONTAINER-1",
+            "1999",
+            snap_time=True,
+        )
+
+    def test_snapshot_index_is_cached_in_the_session(self):
+        snapshots = self.mock.objects["snapshot"]
+        first = snapshots["ORACLE_SNAPSHOT-2-1"]["latestChangePoint"]["timestamp"]
+        second = snapshots["ORACLE_SNAPSHOT-2-2"]["latestChangePoint"]["timestamp"]
+        self.assertEqual(
+            "ORACLE_SNAPSHOT-2-1",
+            self.timeflow.find_snapshot(
+                "ORACLE_DB_CONTAINER-2", first, snap_time=True
+            ).reference,
+        )
+        # A new DxTimeflow of the same session reuses the index
+        timeflow = DxTimeflow(self.server_obj.server_session)
+        self.assertEqual(
+            "ORACLE_SNAPSHOT-2-2",
+            timeflow.find_snapshot(
+                "ORACLE_DB_CONTAINER-2", second, snap_time=True
+            ).reference,
+        )
+        self.assertEqual(1, self.snapshot_listings())
+
+        # Between two snapshots, the error names the nearest ones
+        between = first[:17] + "30.000Z"
+        with self.assertRaises(DlpxException) as raised:
+            timeflow.find_snapshot("ORACLE_DB_CONTAINER-2", between, snap_time=True)
+        self.assertIn(
+            "{} before and {} after".format(
+                snapshots["ORACLE_SNAPSHOT-2-1"]["name"],
+                snapshots["ORACLE_SNAPSHOT-2-2"]["name"],
+            ),
+            str(raised.exception),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
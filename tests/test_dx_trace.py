@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for lib.DxTrace, recording the requests GetSession sessions make
+to a lib.DxMockEngine
+"""
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import dx_refresh_db
+from docopt import docopt
+
+from delphixpy.v1_8_0.exceptions import HttpError
+from delphixpy.v1_8_0.web import database
+from lib.DxMockEngine import DxMockEngine
+from lib.DxTrace import LATENCY_BUCKETS_MS
+from lib.DxTrace import DxTrace
+from lib.DxTrace import endpoint
+from lib.DxTrace import start_trace
+from lib.GetSession import GetSession
+
+
+class DxTraceTests(unittest.TestCase):
+    def setUp(self):
+        self.mock = DxMockEngine(databases=4).start()
+        self.trace = DxTrace("test_dx_trace.py")
+        self.server_obj = GetSession(trace=self.trace)
+        self.server_obj.dlpx_engines["mockengine"] = {
+            "hostname": "mockengine",
+            "ip_address": self.mock.address,
+        }
+        self.server_obj.serversess(self.mock.address, "delphix_admin", "delphix")
+        self.engine = self.server_obj.server_session
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.mock.stop()
+        shutil.rmtree(self.work_dir)
+
+    def test_endpoint_groups_references(self):
+        self.assertEqual(
+            "GET database/{ref}",
+            endpoint("GET", "/resources/json/delphix/database/ORACLE_DB_CONTAINER-3"),
+        )
+        self.assertEqual(
+            "GET database", endpoint("GET", "resources/json/delphix/database?x=1")
+        )
+
+    def test_records_every_request(self):
+        for obj in database.get_all(self.engine):
+            database.get(self.engine, obj.reference)
+        self.assertRaises(HttpError, database.get, self.engine, "ORACLE_DB_CONTAINER-9")
+        # Instrumenting again must not record requests twice
+        self.server_obj.serversess(self.mock.address, "delphix_admin", "delphix")
+        database.get_all(self.engine)
+
+        self.assertEqual(sum(self.mock.requests.values()), len(self.trace.requests))
+        request = self.trace.requests[-1]
+        self.assertEqual("test_dx_trace.py", request["script"])
+        self.assertEqual("mockengine", request["engine"])
+        self.assertEqual("GET database", request["endpoint"])
+        self.assertEqual(200, request["status"])
+        self.assertTrue(request["received"] > 0)
+        self.assertEqual(
+            [404], [r["status"] for r in self.trace.requests if r["status"] != 200]
+        )
+
+        stats = dict((stat["endpoint"], stat) for stat in self.trace.histogram())
+        self.assertEqual(5, stats["GET database/{ref}"]["count"])
+        self.assertEqual(2, stats["GET database"]["count"])
+        self.assertEqual(
+            len(LATENCY_BUCKETS_MS) + 1, len(stats["GET database"]["buckets"])
+        )
+        self.assertEqual(2, sum(stats["GET database"]["buckets"]))
+
+    def test_spans_and_report_at_exit(self):
+        database.get_all(self.engine)
+        span_path = os.path.join(self.work_dir, "spans.json")
+        self.trace.report(span_path)
+        self.trace.report(span_path)
+
+        with open(span_path) as span_file:
+            lines = span_file.read().splitlines()
+        self.assertEqual(2, len(lines))
+        resource = json.loads(lines[0])["resourceSpans"][0]
+        self.assertEqual(
+            "test_dx_trace.py",
+            resource["resource"]["attributes"][0]["value"]["stringValue"],
+        )
+        spans = resource["scopeSpans"][0]["spans"]
+        self.assertEqual(len(self.trace.requests), len(spans))
+        self.assertEqual("GET database", spans[-1]["name"])
+        self.assertTrue(
+            int(spans[-1]["endTimeUnixNano"]) >= int(spans[-1]["startTimeUnixNano"])
+        )
+        self.assertEqual(
+            set([self.trace.trace_id]), set(span["traceId"] for span in spans)
+        )
+
+        self.assertIsNone(start_trace({"--trace": False, "--trace_file": None}))
+        trace = start_trace({"--trace": True})
+        self.assertIsInstance(trace, DxTrace)
+        atexit.unregister(trace.report)
+
+    def test_worker_sessions_of_list_snapshots_are_recorded(self):
+        engine = {
+            "hostname": "mockengine",
+            "ip_address": self.mock.address,
+            "username": "delphix_admin",
+            "password": "delphix",
+        }
+        dx_refresh_db.arguments = docopt(
+            dx_refresh_db.__doc__, argv=["--list_snapshots", "--parallel", "4"]
+        )
+        dx_refresh_db.trace = self.trace
+        dx_refresh_db.metrics = None
+        server = dx_refresh_db.serversess(
+            engine["ip_address"],
+            engine["username"],
+            engine["password"],
+            engine["hostname"],
+        )
+        dx_refresh_db.list_snapshots(engine, server)
+
+        ranges = [
+            request
+            for request in self.trace.requests
+            if request["endpoint"] == "GET snapshot/{ref}/timeflowRange"
+        ]
+        self.assertEqual(8, len(ranges))
+        self.assertEqual(set(["mockengine"]), set(r["engine"] for r in ranges))
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)
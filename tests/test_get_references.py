@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""
+Unit tests for the lib.GetReferences paged listing generator and timestamp
+conversions
+"""
+
+import unittest
+
+from delphixpy.v1_8_0.web import database
+from delphixpy.v1_8_0.web import source
+from lib.DxMockEngine import DxMockEngine
+from lib.GetReferences import convert_timestamp
+from lib.GetReferences import convert_timestamps
+from lib.GetReferences import engine_timezone
+from lib.GetReferences import find_obj_name
+from lib.GetReferences import get_all_paged
+from lib.GetReferences import get_object_index
+from lib.GetReferences import invalidate_cache
+from lib.GetSession import GetSession
+
+
+class FakeObj(object):
+    def __init__(self, reference):
+        self.reference = reference
+
+
+class FakePagedClass(object):
+    """
+    Stands in for a delphixpy web class that supports paging
+    """
+
+    def __init__(self, count, ignore_offset=False):
+        self.objs = [FakeObj("OBJ-{}".format(i)) for i in range(count)]
+        self.ignore_offset = ignore_offset
+        self.calls = []
+
+    def get_all(self, engine, page_size=None, page_offset=None, **kwargs):
+        self.calls.append((page_size, page_offset, kwargs))
+        if self.ignore_offset:
+            page_offset = 0
+        start = page_offset * page_size
+        return self.objs[start : start + page_size]
+
+
+class GetAllPagedTests(unittest.TestCase):
+    """
+    Verifies the page walk, early termination and the filter pass through.
+    """
+
+    def test_walks_every_page(self):
+        f_class = FakePagedClass(25)
+        objs = list(get_all_paged(None, f_class, page_size=10, job_state="FAILED"))
+        self.assertEqual(f_class.objs, objs)
+        self.assertEqual(
+            [(10, 0, {"job_state": "FAILED"}), (10, 1, {"job_state": "FAILED"})],
+            f_class.calls[:2],
+        )
+        self.assertEqual(3, len(f_class.calls))
+
+    def test_exact_multiple_stops_on_empty_page(self):
+        f_class = FakePagedClass(20)
+        self.assertEqual(20, len(list(get_all_paged(None, f_class, page_size=10))))
+        self.assertEqual(3, len(f_class.calls))
+
+    def test_limit_and_lazy_fetch(self):
+        f_class = FakePagedClass(1000)
+        objs = list(get_all_paged(None, f_class, page_size=10, limit=15))
+        self.assertEqual(15, len(objs))
+        self.assertEqual(2, len(f_class.calls))
+
+    def test_offset_ignored(self):
+        f_class = FakePagedClass(30, ignore_offset=True)
+        self.assertEqual(10, len(list(get_all_paged(None, f_class, page_size=10))))
+
+
+class ConvertTimestampTests(unittest.TestCase):
+    """
+    Verifies the engine's timezone is looked up once per session.
+    """
+
+    def test_one_timezone_lookup_per_session(self):
+        with DxMockEngine(databases=0, jobs=0) as mock:
+            server_obj = GetSession()
+            server_obj.serversess(mock.address, "delphix_admin", "delphix")
+            engine = server_obj.server_session
+            self.assertEqual(
+                [
+                    "2016-10-14 13:27:05 UTC",
+                    None,
+                    "2017-01-02 03:04:05 UTC",
+                ],
+                convert_timestamps(
+                    engine, ["2016-10-14T13:27:05", None, "2017-01-02T03:04:05"]
+                ),
+            )
+            self.assertEqual(
+                "2016-10-14 13:27:05 UTC",
+                convert_timestamp(engine, "2016-10-14T13:27:05"),
+            )
+            time_path = ("GET", "/resources/json/delphix/service/time")
+            self.assertEqual(1, mock.requests[time_path])
+            engine_timezone(engine, refresh=True)
+            self.assertEqual(2, mock.requests[time_path])
+
+
+class InvalidateCacheTests(unittest.TestCase):
+    """
+    Verifies lookups are not cached while a job that changes them runs.
+    """
+
+    def test_lookups_are_cached_again_once_the_job_finished(self):
+        with DxMockEngine(databases=2, jobs=0) as mock:
+            server_obj = GetSession()
+            server_obj.serversess(mock.address, "delphix_admin", "delphix")
+            engine = server_obj.server_session
+            source_path = ("GET", "/resources/json/delphix/source")
+
+            get_object_index(engine, source)
+            with server_obj.job_mode(False):
+                database.sync(engine, "ORACLE_DB_CONTAINER-1")
+                invalidate_cache(engine, database)
+                # The sources change with the database, and are listed
+                # again on each lookup until the job finished
+                get_object_index(engine, source)
+                get_object_index(engine, source)
+                self.assertEqual(3, mock.requests[source_path])
+            self.assertEqual([], server_obj.cache.running(engine))
+            get_object_index(engine, source)
+            get_object_index(engine, source)
+            self.assertEqual(4, mock.requests[source_path])
+
+            # The tracker ends the wait as soon as it sees the job finish
+            with server_obj.job_mode(False):
+                database.sync(engine, "ORACLE_DB_CONTAINER-2")
+                invalidate_cache(engine, database)
+                server_obj.job_tracker().track(engine.last_job)
+                get_object_index(engine, source)
+                get_object_index(engine, source)
+            self.assertEqual(5, mock.requests[source_path])
+
+
+class FindObjNameTests(unittest.TestCase):
+    """
+    Verifies a single reference is resolved without listing its class.
+    """
+
+    def test_get_unless_the_class_is_indexed(self):
+        with DxMockEngine(databases=3, jobs=0) as mock:
+            for cache_ttl in [0, 300]:
+                server_obj = GetSession(cache_ttl=cache_ttl)
+                server_obj.serversess(mock.address, "delphix_admin", "delphix")
+                engine = server_obj.server_session
+                self.assertEqual(
+                    "vdb2", find_obj_name(engine, database, "ORACLE_DB_CONTAINER-2")
+                )
+            listing = ("GET", "/resources/json/delphix/database")
+            self.assertEqual(0, mock.requests[listing])
+            self.assertEqual(
+                2, mock.requests[(listing[0], listing[1] + "/ORACLE_DB_CONTAINER-2")]
+            )
+
+            # An index another lookup built resolves the names
+            get_object_index(engine, database)
+            self.assertEqual(
+                "db3", find_obj_name(engine, database, "ORACLE_DB_CONTAINER-3")
+            )
+            self.assertEqual(1, mock.requests[listing])
+            self.assertEqual(
+                0, mock.requests[(listing[0], listing[1] + "/ORACLE_DB_CONTAINER-3")]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main(module=__name__, buffer=True)